@@ -0,0 +1,252 @@
+# benchmarks/bench_checkpoint_io.py
+"""
+Checkpoint I/O benchmark: S3Manager upload + download of a synthetic CRIU
+image set for each compression and transfer configuration.
+
+    python -m benchmarks.bench_checkpoint_io --size-mb 256 --zero-ratio 0.3 --entropy 0.5
+    python -m benchmarks.bench_checkpoint_io --compression none,gz:1,gz:6,xz:0 --modes file,stream \\
+        --chunk-mb 8,64 --concurrency 4,10 --output io.json
+
+Each case runs in a fresh process so peak RSS and CPU time are its own.
+S3 is moto in-process by default (its in-memory objects count towards RSS);
+pass --endpoint-url to target a real S3-compatible endpoint instead.
+
+Reported per case: source MB/s for upload and download (download includes
+extraction), archive size and ratio, CPU seconds, peak RSS growth and peak
+temporary disk used in the S3Manager temp dir.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from benchmarks.checkpoint_images import dir_size, make_checkpoint
+
+MB = 1024 * 1024
+BUCKET = "bench-checkpoints"
+
+COLUMNS = [
+    ("compression", "compression"),
+    ("mode", "mode"),
+    ("chunk_mb", "chunk MB"),
+    ("concurrency", "conc"),
+    ("ratio", "ratio"),
+    ("upload_mbps", "up MB/s"),
+    ("download_mbps", "down MB/s"),
+    ("cpu_s", "cpu s"),
+    ("rss_growth_mb", "rss+ MB"),
+    ("tmp_peak_mb", "tmp MB"),
+]
+
+
+class _DiskSampler:
+    """Polls a directory's size in the background and keeps the peak."""
+
+    def __init__(self, path, interval=0.02):
+        self.path = path
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, dir_size(self.path))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, dir_size(self.path))
+
+
+def _cpu():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def parse_compression(spec):
+    """'gz:6' -> ("gz", 6); 'none' -> ("none", None)."""
+    name, _, level = spec.partition(":")
+    return name, int(level) if level else None
+
+
+def run_case(case, src, work_dir, endpoint_url=None):
+    """
+    Upload then download `src` with one configuration. `case` holds
+    compression, level, mode ("file" or "stream"), chunk_mb, concurrency.
+    Runs in the calling process; main() isolates each case in a child.
+    """
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    mock = None
+    if endpoint_url:
+        os.environ["AWS_ENDPOINT_URL_S3"] = endpoint_url
+    else:
+        from moto import mock_aws
+        mock = mock_aws()
+        mock.start()
+
+    import boto3
+    from storage.s3_manager import S3Manager
+
+    try:
+        s3 = boto3.client("s3")
+        try:
+            s3.create_bucket(Bucket=BUCKET)
+        except s3.exceptions.BucketAlreadyOwnedByYou:
+            pass
+
+        tmp_dir = tempfile.mkdtemp(prefix="tmp-", dir=work_dir)
+        restore = os.path.join(tempfile.mkdtemp(prefix="restore-", dir=work_dir), "checkpoint")
+        manager = S3Manager(
+            BUCKET,
+            compression=case["compression"],
+            level=case.get("level"),
+            chunk_mb=case.get("chunk_mb"),
+            concurrency=case.get("concurrency"),
+            tmp_dir=tmp_dir,
+        )
+        job_id = f"bench-{os.getpid()}"
+        src_bytes = dir_size(src)
+        rss_base = _rss_mb()
+        cpu_start = _cpu()
+
+        with _DiskSampler(tmp_dir) as disk:
+            started = time.perf_counter()
+            if case["mode"] == "stream":
+                manager.upload_stream(job_id, src=src)
+            else:
+                manager.upload(job_id, src=src)
+            upload_s = time.perf_counter() - started
+            archive_bytes = manager.last_transfer["bytes"]
+
+            started = time.perf_counter()
+            if case["mode"] == "stream":
+                manager.download_stream(job_id, dst=restore)
+            else:
+                manager.download(job_id, dst=restore)
+            download_s = time.perf_counter() - started
+
+        restored = dir_size(restore)
+        if restored != src_bytes:
+            raise RuntimeError(f"restored {restored} bytes, expected {src_bytes}")
+        s3.delete_object(Bucket=BUCKET, Key=manager.archive_name(job_id))
+
+        label = case["compression"] + (f":{case['level']}" if case.get("level") is not None else "")
+        return {
+            "compression": label,
+            "mode": case["mode"],
+            "chunk_mb": case.get("chunk_mb"),
+            "concurrency": case.get("concurrency"),
+            "source_mb": round(src_bytes / MB, 2),
+            "archive_mb": round(archive_bytes / MB, 2),
+            "ratio": round(archive_bytes / src_bytes, 3) if src_bytes else None,
+            "upload_s": round(upload_s, 3),
+            "download_s": round(download_s, 3),
+            "upload_mbps": round(src_bytes / MB / upload_s, 1),
+            "download_mbps": round(src_bytes / MB / download_s, 1),
+            "cpu_s": round(_cpu() - cpu_start, 3),
+            "rss_peak_mb": round(_rss_mb(), 1),
+            "rss_growth_mb": round(_rss_mb() - rss_base, 1),
+            "tmp_peak_mb": round(disk.peak / MB, 2),
+        }
+    finally:
+        if mock:
+            mock.stop()
+
+
+def _child(queue, case, src, work_dir, endpoint_url):
+    try:
+        queue.put(run_case(case, src, work_dir, endpoint_url))
+    except Exception as e:
+        queue.put({"error": str(e), **case})
+
+
+def run_isolated(case, src, work_dir, endpoint_url=None):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_child, args=(queue, case, src, work_dir, endpoint_url))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def print_table(reports):
+    widths = [max(len(title), *(len(str(r.get(key, ""))) for r in reports)) for key, title in COLUMNS]
+    print("  ".join(title.rjust(w) for (_, title), w in zip(COLUMNS, widths)))
+    for report in reports:
+        if "error" in report:
+            print(f"{report.get('compression')} {report.get('mode')}: ERROR {report['error']}")
+            continue
+        print("  ".join(str(report.get(key, "")).rjust(w) for (key, _), w in zip(COLUMNS, widths)))
+
+
+def _list(cast):
+    return lambda value: [cast(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark checkpoint upload/download per compression and transfer configuration")
+    parser.add_argument("--size-mb", type=float, default=256, help="Synthetic image set size (default 256)")
+    parser.add_argument("--zero-ratio", type=float, default=0.3, help="Fraction of all-zero pages (default 0.3)")
+    parser.add_argument("--entropy", type=float, default=0.5, help="Random fraction of each non-zero page (default 0.5)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compression", type=_list(str), default=["none", "gz:1", "gz:6", "pack:1"], help="e.g. none,gz:1,gz:6,bz2,xz:0,pack:1")
+    parser.add_argument("--modes", type=_list(str), default=["file", "stream"], help="file (temp archive) and/or stream (pipe)")
+    parser.add_argument("--chunk-mb", type=_list(float), default=[8], help="Multipart chunk sizes in MiB (default 8)")
+    parser.add_argument("--concurrency", type=_list(int), default=[10], help="Multipart concurrency values (default 10)")
+    parser.add_argument("--endpoint-url", help="S3-compatible endpoint instead of in-process moto")
+    parser.add_argument("--work-dir", help="Where to put the image set and temp files (default: a temp dir)")
+    parser.add_argument("--output", help="Write the reports as JSON")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="bench-io-")
+    try:
+        src = os.path.join(work_dir, "checkpoint")
+        stats = make_checkpoint(src, size_mb=args.size_mb, zero_ratio=args.zero_ratio, entropy=args.entropy, seed=args.seed)
+        print(
+            f"image set: {stats['bytes'] / MB:.1f} MiB in {stats['files']} files, "
+            f"{stats['zero_pages'] / max(stats['pages'], 1):.0%} zero pages, entropy {args.entropy}",
+            file=sys.stderr,
+        )
+        reports = []
+        for spec, mode, chunk_mb, concurrency in itertools.product(args.compression, args.modes, args.chunk_mb, args.concurrency):
+            compression, level = parse_compression(spec)
+            case = {"compression": compression, "level": level, "mode": mode, "chunk_mb": chunk_mb, "concurrency": concurrency}
+            reports.append(run_isolated(case, src, work_dir, args.endpoint_url))
+            print(f"done: {spec} {mode} chunk={chunk_mb} conc={concurrency}", file=sys.stderr)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_table(reports)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"image_set": stats, "zero_ratio": args.zero_ratio, "entropy": args.entropy, "cases": reports}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# benchmarks/bench_control_loop.py
+"""
+Control-plane benchmark: tick latency, registry calls per tick, decisions
+per second and memory as the fleet grows.
+
+    python -m benchmarks.bench_control_loop --jobs 1000,10000 --regions 4,16
+    python -m benchmarks.bench_control_loop --jobs 10000 --output bench.json
+    python -m benchmarks.bench_control_loop --jobs 10000 --baseline bench.json
+
+With --baseline, exits non-zero if a case's p95 tick latency or registry
+calls per tick regressed by more than --tolerance against the saved run.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from benchmarks.fleet_sim import simulate
+
+COLUMNS = [
+    ("jobs", "jobs"),
+    ("regions", "regions"),
+    ("backend", "backend"),
+    ("tick_ms_p50", "p50 ms"),
+    ("tick_ms_p95", "p95 ms"),
+    ("tick_ms_max", "max ms"),
+    ("registry_calls_per_tick", "reg calls/tick"),
+    ("decisions_per_s", "decisions/s"),
+    ("migrations", "migrations"),
+    ("rss_mb", "rss MB"),
+]
+# Metrics where larger is worse, compared against a baseline
+REGRESSION_KEYS = ("tick_ms_p95", "registry_calls_per_tick")
+
+
+def _ints(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def case_key(report):
+    return f"{report['backend']}:{report['jobs']}:{report['regions']}:{int(report['migrate'])}"
+
+
+def print_table(reports):
+    widths = [max(len(title), *(len(str(r.get(key, ""))) for r in reports)) for key, title in COLUMNS]
+    print("  ".join(title.rjust(w) for (_, title), w in zip(COLUMNS, widths)))
+    for report in reports:
+        print("  ".join(str(report.get(key, "")).rjust(w) for (key, _), w in zip(COLUMNS, widths)))
+
+
+def compare(reports, baseline, tolerance):
+    """Return human-readable regressions against a baseline run."""
+    previous = {case_key(r): r for r in baseline}
+    regressions = []
+    for report in reports:
+        old = previous.get(case_key(report))
+        if not old:
+            continue
+        for key in REGRESSION_KEYS:
+            if old.get(key) and report[key] > old[key] * (1 + tolerance):
+                regressions.append(f"{case_key(report)} {key}: {old[key]} -> {report[key]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the orchestrator control loop against a simulated fleet")
+    parser.add_argument("--jobs", type=_ints, default=[1000, 10000], help="Comma-separated fleet sizes (default 1000,10000)")
+    parser.add_argument("--regions", type=_ints, default=[4], help="Comma-separated region counts (default 4, max 16)")
+    parser.add_argument("--backend", choices=["json", "dynamo"], default="json", help="Registry backend (dynamo runs on moto)")
+    parser.add_argument("--ticks", type=int, default=20)
+    parser.add_argument("--churn", type=float, default=0.01, help="Fraction of jobs updated between ticks (default 0.01)")
+    parser.add_argument("--migrate", action="store_true", help="Execute migrations (moto EC2/S3, fake SSH) instead of dry-run decisions")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace-memory", action="store_true", help="Also report tracemalloc current/peak (slows ticks)")
+    parser.add_argument("--output", help="Write the reports as JSON")
+    parser.add_argument("--baseline", help="Compare against a previous --output file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed regression vs baseline (default 0.25 = 25%%)")
+    args = parser.parse_args()
+
+    reports = []
+    for regions in args.regions:
+        for jobs in args.jobs:
+            reports.append(simulate(
+                ticks=args.ticks,
+                jobs=jobs,
+                regions=regions,
+                backend=args.backend,
+                migrate=args.migrate,
+                churn=args.churn,
+                seed=args.seed,
+                trace_memory=args.trace_memory,
+            ))
+            print(f"done: {case_key(reports[-1])}", file=sys.stderr)
+
+    print_table(reports)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(reports, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
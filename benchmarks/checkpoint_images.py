@@ -0,0 +1,88 @@
+# benchmarks/checkpoint_images.py
+"""
+Synthetic checkpoint directories shaped like `criu dump` output:
+
+    inventory.img            tiny header
+    core-<pid>.img           per-thread register state (small, fairly random)
+    mm-<pid>.img, pagemap-<pid>.img   small metadata
+    pages-<n>.img            the bulk: 4 KiB pages
+
+Page content is controlled by two knobs:
+    zero_ratio  fraction of pages that are all zero (untouched heap, bss)
+    entropy     fraction of each non-zero page that is random; the rest is a
+                repeating low-entropy pattern, so 0.0 compresses very well
+                and 1.0 not at all
+"""
+import os
+import random
+
+PAGE = 4096
+# Low-entropy filler: looks like structured data / text
+_FILLER = (b"spot-arbitrage checkpoint filler 0123456789 " * 100)[:PAGE]
+_ZERO = bytes(PAGE)
+_WRITE_PAGES = 256
+
+
+def _page(rng, entropy):
+    n_random = int(PAGE * entropy)
+    return rng.randbytes(n_random) + _FILLER[: PAGE - n_random]
+
+
+def make_checkpoint(path, size_mb=64, zero_ratio=0.3, entropy=0.5, pages_files=4, threads=4, pid=4242, seed=0):
+    """
+    Write a synthetic CRIU image set of about `size_mb` MiB into `path`.
+    Returns {"bytes", "files", "pages", "zero_pages"}.
+    """
+    if not 0 <= zero_ratio <= 1 or not 0 <= entropy <= 1:
+        raise ValueError("zero_ratio and entropy must be within [0, 1]")
+    rng = random.Random(seed)
+    os.makedirs(path, exist_ok=True)
+    stats = {"bytes": 0, "files": 0, "pages": 0, "zero_pages": 0}
+
+    def write(name, data):
+        with open(os.path.join(path, name), "wb") as f:
+            f.write(data)
+        stats["bytes"] += len(data)
+        stats["files"] += 1
+
+    write("inventory.img", b"CRIU" + rng.randbytes(60))
+    for tid in range(threads):
+        write(f"core-{pid + tid}.img", _page(rng, 0.6) * 2)
+    write(f"mm-{pid}.img", _page(rng, 0.2))
+
+    total_pages = max(1, int(size_mb * 1024 * 1024) // PAGE)
+    per_file = -(-total_pages // pages_files)
+    pagemap = bytearray()
+    for n in range(pages_files):
+        count = min(per_file, total_pages - n * per_file)
+        if count <= 0:
+            break
+        name = f"pages-{n + 1}.img"
+        with open(os.path.join(path, name), "wb") as f:
+            for start in range(0, count, _WRITE_PAGES):
+                chunk = []
+                for _ in range(min(_WRITE_PAGES, count - start)):
+                    if rng.random() < zero_ratio:
+                        chunk.append(_ZERO)
+                        stats["zero_pages"] += 1
+                    else:
+                        chunk.append(_page(rng, entropy))
+                f.write(b"".join(chunk))
+        stats["pages"] += count
+        stats["bytes"] += count * PAGE
+        stats["files"] += 1
+        pagemap += n.to_bytes(4, "little") + count.to_bytes(8, "little")
+    write(f"pagemap-{pid}.img", bytes(pagemap))
+    return stats
+
+
+def dir_size(path):
+    """Total bytes of regular files under path (0 if it does not exist)."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
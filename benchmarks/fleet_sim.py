@@ -0,0 +1,371 @@
+# benchmarks/fleet_sim.py
+"""
+Fleet-scale simulation harness.
+
+Runs the real control-plane code (ControlLoop, DecisionEngine, JobRegistry or
+DynamoRegistry, Migrator) against local fakes:
+
+- moto for DynamoDB (with a stream), S3 and EC2 (target provisioning)
+- FakeSSHClient in place of orchestrator.utils.SSHClient
+- SyntheticPrices, a seeded per-region random walk with occasional spikes,
+  fed through the real SpotPriceWatcher
+
+Each tick advances prices, applies some job churn through the registry and
+runs ControlLoop.tick(), recording latency, registry calls and decisions.
+"""
+import json
+import logging
+import os
+import random
+import resource
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import ExitStack
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import boto3
+from moto import mock_aws
+
+from orchestrator.control_loop import ControlLoop
+from orchestrator.decision_engine import DecisionEngine
+from orchestrator.migrator import Migrator
+from orchestrator.watcher import SpotPriceWatcher
+from storage.dynamo_registry import DynamoRegistry
+from storage.job_registry import JobRegistry
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+POLICY = os.path.join(ROOT, "orchestrator", "sla_policy.yaml")
+
+ALL_REGIONS = [
+    "us-east-1", "us-east-2", "us-west-1", "us-west-2", "eu-west-1", "eu-west-2", "eu-west-3",
+    "eu-central-1", "eu-north-1", "ap-south-1", "ap-southeast-1", "ap-southeast-2",
+    "ap-northeast-1", "ap-northeast-2", "ca-central-1", "sa-east-1",
+]
+WORKLOADS = ["short", "medium", "long", "stateful", None]
+TABLE = "sim_registry"
+BUCKET = "sim-checkpoints"
+INSTANCE_TYPE = "t3.micro"
+
+REGISTRY_METHODS = (
+    "get", "create", "update", "batch_create", "update_many", "list_by_state", "iter_jobs",
+)
+
+
+class SyntheticPrices:
+    """Seeded per-region random walk; `spike_prob` of a tick doubles one region's price."""
+
+    def __init__(self, regions, seed=0, base=0.10, step=0.002, spike_prob=0.05, floor=0.01):
+        self.rng = random.Random(seed)
+        self.regions = list(regions)
+        self.step_size = step
+        self.spike_prob = spike_prob
+        self.floor = floor
+        self.prices = {r: base * self.rng.uniform(0.7, 1.3) for r in self.regions}
+
+    def step(self):
+        for region in self.regions:
+            drift = self.rng.gauss(0, self.step_size)
+            self.prices[region] = max(self.floor, round(self.prices[region] + drift, 5))
+        if self.rng.random() < self.spike_prob:
+            region = self.rng.choice(self.regions)
+            self.prices[region] = round(self.prices[region] * 2, 5)
+        return dict(self.prices)
+
+
+class _SyntheticEC2:
+    def __init__(self, prices, region):
+        self.prices = prices
+        self.region = region
+
+    def describe_spot_price_history(self, **kwargs):
+        return {"SpotPriceHistory": [{"SpotPrice": str(self.prices.prices[self.region])}]}
+
+
+class SyntheticPriceWatcher(SpotPriceWatcher):
+    """The real watcher (history, volatility) reading SyntheticPrices instead of EC2."""
+
+    def __init__(self, prices, instance_type=INSTANCE_TYPE):
+        super().__init__(prices.regions, instance_type)
+        self.synthetic = prices
+
+    def _client(self, region):
+        if region not in self._clients:
+            self._clients[region] = _SyntheticEC2(self.synthetic, region)
+        return self._clients[region]
+
+
+class FakeSSHClient:
+    """
+    Drop-in for orchestrator.utils.SSHClient. Commands succeed after an
+    optional delay; s3_manager commands print a transfer summary and host
+    preflight probes report one CRIU-capable image.
+    """
+
+    commands = Counter()
+    latency = 0.0
+    checkpoint_bytes = 64 * 1024 * 1024
+    host_facts = {"ami": "ami-sim", "instance_type": "t3.micro", "kernel": "6.1.0-sim"}
+    probe_facts = {"criu_version": "Version: 3.19", "criu_check": "ok", "python": "Python 3.11.4", "cpu_flags": "fpu sse2"}
+
+    def __init__(self, host, *args, **kwargs):
+        self.host = host
+
+    def connect(self):
+        pass
+
+    def close(self):
+        pass
+
+    def run_command(self, command, check=True, capture_output=True):
+        FakeSSHClient.commands[command.split()[0]] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        stdout = ""
+        if "s3_manager.py" in command:
+            stdout = json.dumps({"bytes": self.checkpoint_bytes, "seconds": self.latency})
+        elif "meta-data" in command:
+            facts = dict(self.host_facts, **(self.probe_facts if "criu check" in command else {}))
+            stdout = "".join(f"{k}={v}\n" for k, v in facts.items())
+        return SimpleNamespace(stdout=stdout, stderr="", returncode=0)
+
+
+class SimMigrator(Migrator):
+    """Migrator with per-region provisioning parameters (moto security groups differ by region)."""
+
+    def __init__(self, registry, region_params):
+        super().__init__(registry, checkpoint_bucket=BUCKET)
+        self.region_params = region_params
+
+    def _provision_target(self, target_region, target_ip=None, autoprovision=False, provision_overrides=None):
+        overrides = dict(provision_overrides or {}, **self.region_params[target_region])
+        return super()._provision_target(target_region, target_ip, autoprovision, overrides)
+
+
+class CallCounter:
+    """Wraps a registry instance's public methods and counts calls."""
+
+    def __init__(self, registry):
+        self.calls = Counter()
+        for name in REGISTRY_METHODS:
+            method = getattr(registry, name, None)
+            if method is not None:
+                setattr(registry, name, self._wrap(name, method))
+
+    def _wrap(self, name, method):
+        def counted(*args, **kwargs):
+            self.calls[name] += 1
+            return method(*args, **kwargs)
+        return counted
+
+    def total(self):
+        return sum(self.calls.values())
+
+
+class CountingEngine:
+    """DecisionEngine proxy counting evaluations and actions."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.evaluations = 0
+        self.actions = Counter()
+
+    def evaluate(self, prices, current_region, job=None):
+        decision = self.engine.evaluate(prices, current_region, job=job)
+        self.evaluations += 1
+        self.actions[decision.action] += 1
+        return decision
+
+
+def _rss_mb():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class FleetSimulation:
+    """
+    One simulated fleet. Use as a context manager (it owns the moto mock
+    and temp files), then call run(ticks).
+
+        with FleetSimulation(jobs=10000, regions=8) as sim:
+            report = sim.run(ticks=20)
+    """
+
+    def __init__(
+        self,
+        jobs=1000,
+        regions=4,
+        backend="json",
+        migrate=False,
+        churn=0.01,
+        seed=0,
+        ssh_latency=0.0,
+        trace_memory=False,
+    ):
+        if isinstance(regions, int):
+            if regions > len(ALL_REGIONS):
+                raise ValueError(f"at most {len(ALL_REGIONS)} regions")
+            regions = ALL_REGIONS[:regions]
+        self.n_jobs = jobs
+        self.regions = list(regions)
+        self.backend = backend
+        self.migrate = migrate
+        self.churn = churn
+        self.seed = seed
+        self.ssh_latency = ssh_latency
+        self.trace_memory = trace_memory
+        self.rng = random.Random(seed)
+        self._stack = ExitStack()
+
+    # ------------------------------------------------------------------
+    def __enter__(self):
+        stack = self._stack
+        stack.enter_context(patch.dict(os.environ, {
+            "AWS_ACCESS_KEY_ID": "testing",
+            "AWS_SECRET_ACCESS_KEY": "testing",
+            "AWS_DEFAULT_REGION": self.regions[0],
+        }))
+        stack.enter_context(mock_aws())
+        stack.enter_context(patch("orchestrator.migrator.SSHClient", FakeSSHClient))
+        stack.enter_context(patch("orchestrator.utils.time.sleep", lambda _: None))
+        FakeSSHClient.commands = Counter()
+        FakeSSHClient.latency = self.ssh_latency
+        if self.trace_memory:
+            tracemalloc.start()
+            stack.callback(tracemalloc.stop)
+
+        self.registry = self._make_registry()
+        self._seed_jobs()
+        self.counter = CallCounter(self.registry)
+        self.prices = SyntheticPrices(self.regions, seed=self.seed)
+        self.engine = CountingEngine(DecisionEngine(POLICY))
+        migrator = SimMigrator(self.registry, self._provisioning()) if self.migrate else None
+        self.loop = ControlLoop(
+            SyntheticPriceWatcher(self.prices),
+            self.engine,
+            self.registry,
+            migrator,
+            migrate=self.migrate,
+            price_cache_ttl=0,
+            resync_seconds=10**9,
+            migrate_options={"autoprovision": True, "provision_overrides": {"instance_type": INSTANCE_TYPE}},
+        )
+        started = time.perf_counter()
+        self.loop.start()
+        self.start_seconds = time.perf_counter() - started
+        return self
+
+    def __exit__(self, *exc):
+        self._stack.close()
+        return False
+
+    def _make_registry(self):
+        if self.backend == "dynamo":
+            boto3.client("dynamodb", region_name=self.regions[0]).create_table(
+                TableName=TABLE,
+                KeySchema=[{"AttributeName": "job_id", "KeyType": "HASH"}],
+                AttributeDefinitions=[{"AttributeName": "job_id", "AttributeType": "S"}],
+                BillingMode="PAY_PER_REQUEST",
+                StreamSpecification={"StreamEnabled": True, "StreamViewType": "NEW_AND_OLD_IMAGES"},
+            )
+            return DynamoRegistry(TABLE, region_name=self.regions[0])
+        if self.backend == "json":
+            tmp = self._stack.enter_context(tempfile.TemporaryDirectory())
+            return JobRegistry(os.path.join(tmp, "registry.json"), fsync=False)
+        raise ValueError(f"unknown backend {self.backend}")
+
+    def _seed_jobs(self):
+        rows = (
+            {
+                "job_id": f"sim-{i:06d}",
+                "state": "RUNNING",
+                "region": self.rng.choice(self.regions),
+                "workload_type": self.rng.choice(WORKLOADS),
+                "pid": 1000 + i,
+                "public_ip": f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+            }
+            for i in range(self.n_jobs)
+        )
+        self.registry.batch_create(rows)
+
+    def _provisioning(self):
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET)
+        params = {}
+        for region in self.regions:
+            ec2 = boto3.client("ec2", region_name=region)
+            sg = ec2.create_security_group(GroupName="sim-worker", Description="simulated worker")["GroupId"]
+            ec2.create_key_pair(KeyName="sim-key")
+            ami = ec2.register_image(Name="sim-worker", RootDeviceName="/dev/xvda")["ImageId"]
+            params[region] = {"ami_id": ami, "security_group_id": sg, "ssh_key_name": "sim-key"}
+        return params
+
+    # ------------------------------------------------------------------
+    def _churn(self):
+        """Touch a fraction of jobs through the registry, as workers would."""
+        count = int(self.n_jobs * self.churn)
+        for i in self.rng.sample(range(self.n_jobs), count):
+            job_id = f"sim-{i:06d}"
+            if job_id in self.loop.index:
+                self.registry.update(job_id, "RUNNING", progress=self.rng.randint(0, 100))
+        return count
+
+    def run(self, ticks=10):
+        latencies = []
+        calls = []
+        churn_calls = 0
+        ssh_before = sum(FakeSSHClient.commands.values())
+        rss_before = _rss_mb()
+        for _ in range(ticks):
+            self.prices.step()
+            before = self.counter.total()
+            self._churn()
+            churn_calls += self.counter.total() - before
+
+            before = self.counter.total()
+            started = time.perf_counter()
+            self.loop.tick()
+            latencies.append(time.perf_counter() - started)
+            calls.append(self.counter.total() - before)
+
+        busy = sum(latencies)
+        report = {
+            "jobs": self.n_jobs,
+            "regions": len(self.regions),
+            "backend": self.backend,
+            "migrate": self.migrate,
+            "ticks": ticks,
+            "start_s": round(self.start_seconds, 4),
+            "tick_ms_p50": round(_percentile(latencies, 50) * 1000, 3),
+            "tick_ms_p95": round(_percentile(latencies, 95) * 1000, 3),
+            "tick_ms_max": round(max(latencies) * 1000, 3),
+            "registry_calls_per_tick": round(sum(calls) / ticks, 2),
+            "churn_calls_per_tick": round(churn_calls / ticks, 2),
+            "evaluations": self.engine.evaluations,
+            "decisions_per_s": round(self.engine.evaluations / busy, 1) if busy else 0.0,
+            "migrate_decisions": self.engine.actions["MIGRATE"],
+            "migrations": len(self.loop.last_migration_ts),
+            "ssh_commands": sum(FakeSSHClient.commands.values()) - ssh_before,
+            "rss_mb": round(_rss_mb(), 1),
+            "rss_growth_mb": round(_rss_mb() - rss_before, 1),
+        }
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            report["traced_mb"] = round(current / 2**20, 2)
+            report["traced_peak_mb"] = round(peak / 2**20, 2)
+        return report
+
+
+def simulate(ticks=10, **kwargs):
+    """Run one simulation and return its report dict."""
+    logging.getLogger("orchestrator").setLevel(logging.WARNING)
+    with FleetSimulation(**kwargs) as sim:
+        return sim.run(ticks)
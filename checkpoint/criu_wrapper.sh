@@ -3,14 +3,105 @@ set -e
 
 CMD=$1
 PID=$2
-DIR=/opt/job_workspace/checkpoint
+# Jobs hosted by worker/job_host.py pass their own dir (/opt/job_workspace/jobs/<job_id>/checkpoint)
+DIR=${CHECKPOINT_DIR:-/opt/job_workspace/checkpoint}
+# "app" mode moves only the state the job registered with worker/checkpoint_hooks.py
+case "$CMD" in
+  restore|dump-group|restore-group) MODE=${2:-${CHECKPOINT_MODE:-criu}} ;;
+  *) MODE=${3:-${CHECKPOINT_MODE:-criu}} ;;
+esac
+APP_STATE=${JOB_STATE_FILE:-$DIR/app.ckpt}
+APP_TIMEOUT=${APP_CHECKPOINT_TIMEOUT:-60}
+JOB_RUNNER=${JOB_RUNNER:-/opt/job_workspace/worker/job_runner.py}
+JOB_LOG=${JOB_LOG:-/opt/job_workspace/job.log}
+# Background snapshots (worker/background_checkpointer.py): snapshots/<name>/, newest named in snapshots/LATEST
+SNAP=$DIR/snapshots
+# A final dump holds the snapshot chain it builds on until s3_manager.py has uploaded
+# its archive (which removes HOLD), or for at most this many minutes if that never happens
+SNAPSHOT_HOLD_MINUTES=${SNAPSHOT_HOLD_MINUTES:-60}
 
-if [ "$CMD" == "dump" ]; then
+# Dumps and snapshots of one checkpoint dir never overlap
+if { [ "$CMD" == "dump" ] || [ "$CMD" == "snapshot" ]; } && [ -z "$CHECKPOINT_LOCKED" ]; then
   mkdir -p "$DIR"
-  criu dump -t "$PID" --images-dir "$DIR" --shell-job --leave-running
+  exec 9>"${DIR%/}.lock"
+  flock 9
+  export CHECKPOINT_LOCKED=1
+fi
+
+if [ "$CMD" == "dump" ] && [ "$MODE" == "app" ]; then
+  mkdir -p "$DIR"
+  # Drop stale CRIU images so the upload carries only the application state
+  find "$DIR" -maxdepth 1 -name '*.img' -delete
+  rm -f "$DIR/parent" "$DIR/chain.json"
+  rm -f "$APP_STATE.ready"
+  kill -USR1 "$PID"
+  for _ in $(seq "$((APP_TIMEOUT * 10))"); do
+    [ -f "$APP_STATE.ready" ] && exit 0
+    # A job that finished wrote its final state on the way out
+    kill -0 "$PID" 2>/dev/null || { [ -f "$APP_STATE" ] && exit 0; }
+    sleep 0.1
+  done
+  echo "Timed out waiting for $APP_STATE.ready" >&2
+  exit 1
+elif [ "$CMD" == "dump" ]; then
+  rm -f "$DIR/parent" "$DIR/chain.json"
+  if [ -f "$SNAP/LATEST" ]; then
+    # Incremental on top of the staged chain: only pages dirtied since the last snapshot
+    touch "$SNAP/HOLD"
+    cp "$SNAP/chain.json" "$DIR/chain.json"
+    criu dump -t "$PID" --images-dir "$DIR" --shell-job --leave-running --track-mem --prev-images-dir "snapshots/$(cat "$SNAP/LATEST")"
+  else
+    criu dump -t "$PID" --images-dir "$DIR" --shell-job --leave-running
+  fi
+elif [ "$CMD" == "snapshot" ]; then
+  # snapshot <pid> <mode> <name> [<previous name>]: non-disruptive dump into snapshots/<name>
+  NAME=$4
+  PREV=$5
+  if [ -n "$(find "$SNAP/HOLD" -mmin "-$SNAPSHOT_HOLD_MINUTES" 2>/dev/null)" ]; then
+    echo "Snapshots held by a dump in progress" >&2
+    exit 3
+  fi
+  mkdir -p "$SNAP/$NAME"
+  if [ "$MODE" == "app" ]; then
+    bash "$0" dump "$PID" app
+    cp "$APP_STATE" "$SNAP/$NAME/app.ckpt"
+  else
+    criu dump -t "$PID" --images-dir "$SNAP/$NAME" --shell-job --leave-running --track-mem ${PREV:+--prev-images-dir "../$PREV"}
+  fi
+  # The checkpointer runs unprivileged and prunes old snapshots itself
+  if [ -n "$SUDO_UID" ]; then
+    chown -R "$SUDO_UID:$SUDO_GID" "$SNAP"
+  fi
+elif [ "$CMD" == "restore" ] && [ "$MODE" == "app" ]; then
+  JOB_STATE_FILE="$APP_STATE" nohup python3 "$JOB_RUNNER" --resume >> "$JOB_LOG" 2>&1 < /dev/null &
+  echo $!
 elif [ "$CMD" == "restore" ]; then
-  criu restore --images-dir "$DIR" --shell-job
+  criu restore --images-dir "$DIR" --shell-job --restore-detached
+  # The restored job starts a new chain; memory tracking does not survive the move
+  rm -rf "$SNAP" "$DIR/parent" "$DIR/chain.json"
+elif [ "$CMD" == "dump-group" ]; then
+  # Co-located jobs in one pass: dump-group <mode> <pid>:<dir> ... (dumps run in parallel)
+  shift 2
+  pids=()
+  for spec in "$@"; do
+    CHECKPOINT_DIR="${spec#*:}" bash "$0" dump "${spec%%:*}" "$MODE" &
+    pids+=($!)
+  done
+  status=0
+  for p in "${pids[@]}"; do
+    wait "$p" || status=1
+  done
+  exit $status
+elif [ "$CMD" == "restore-group" ]; then
+  # restore-group <mode> <job_id>:<dir> ...; prints "<job_id> <pid>" per job (app mode)
+  shift 2
+  for spec in "$@"; do
+    job="${spec%%:*}"
+    dir="${spec#*:}"
+    out=$(JOB_ID="$job" CHECKPOINT_DIR="$dir" JOB_LOG="$(dirname "$dir")/job.log" bash "$0" restore "$MODE")
+    echo "$job ${out##*$'\n'}"
+  done
 else
-  echo "Usage: $0 dump <pid> | restore"
+  echo "Usage: $0 dump <pid> [criu|app] | snapshot <pid> <criu|app> <name> [<prev>] | restore [criu|app] | dump-group <mode> <pid>:<dir>... | restore-group <mode> <job_id>:<dir>..."
   exit 1
 fi
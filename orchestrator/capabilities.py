@@ -0,0 +1,146 @@
+# orchestrator/capabilities.py
+"""
+Worker host capabilities, cached in the registry.
+
+A host built from the same AMI and booted into the same kernel answers the
+CRIU preflight the same way every time, so the answer is stored as a
+registry meta record keyed by (AMI ID, kernel):
+
+    capabilities#<ami>#<kernel> -> CRIU version, `criu check` result,
+                                   python version, CPU flags per instance type
+    capabilities#<ami>          -> the kernel last seen for that AMI
+
+A migration target is identified with one cheap SSH call (IDENTIFY_COMMAND).
+The full probe (PROBE_COMMAND: criu --version, criu check, /proc/cpuinfo)
+only runs for images that are not yet known-good. With the CPU flags of
+both ends cached, a CRIU restore onto a CPU missing features the source
+used is refused before the job is frozen, instead of failing in restore.
+Only the FPU/xsave features CRIU itself compares on restore (its default
+--cpu-cap=fpu) count; flags such as hypervisor or constant_tsc differ
+between instance families without affecting restore.
+"""
+import json
+import logging
+import time
+
+log = logging.getLogger("orchestrator.capabilities")
+
+CAPABILITIES_KEY = "capabilities"
+# Seconds a capability record read from the registry is reused before it is read again
+CACHE_TTL = 300
+
+# /proc/cpuinfo flags behind the FPU and xsave state CRIU checks before restoring
+RESTORE_CPU_FEATURES = frozenset({
+    "fpu", "fxsr", "sse", "xsave", "xsaveopt", "xsavec", "xsaves",
+    "avx", "mpx", "avx512f", "pku", "amx_tile",
+})
+
+_IMDS = (
+    "T=$(curl -s -m 2 -X PUT http://169.254.169.254/latest/api/token "
+    "-H 'X-aws-ec2-metadata-token-ttl-seconds: 60'); "
+    "md() { curl -s -m 2 -H \"X-aws-ec2-metadata-token: $T\" http://169.254.169.254/latest/meta-data/$1; }; "
+)
+IDENTIFY_COMMAND = (
+    _IMDS
+    + "echo ami=$(md ami-id); echo instance_type=$(md instance-type); echo kernel=$(uname -r)"
+)
+PROBE_COMMAND = (
+    IDENTIFY_COMMAND
+    + "; echo criu_version=$(criu --version 2>/dev/null | head -n1)"
+    + "; if sudo -n criu check >/dev/null 2>&1; then echo criu_check=ok; else echo criu_check=failed; fi"
+    + "; echo python=$(python3 --version 2>&1)"
+    + "; echo cpu_flags=$(grep -m1 '^flags' /proc/cpuinfo | cut -d: -f2)"
+)
+
+
+class IncompatibleHostError(RuntimeError):
+    """The target cannot restore this job; retrying will not change that."""
+
+    retryable = False
+
+
+def parse(stdout):
+    """key=value lines from IDENTIFY_COMMAND / PROBE_COMMAND."""
+    facts = {}
+    for line in (stdout or "").splitlines():
+        key, sep, value = line.partition("=")
+        if sep:
+            facts[key.strip()] = value.strip()
+    if "cpu_flags" in facts:
+        facts["cpu_flags"] = sorted(set(facts["cpu_flags"].split()))
+    return facts
+
+
+def missing_cpu_features(source_flags, target_flags):
+    """RESTORE_CPU_FEATURES the source has and the target lacks (CRIU restores need none missing)."""
+    return sorted((set(source_flags or ()) & RESTORE_CPU_FEATURES) - set(target_flags or ()))
+
+
+def ready_for(record, mode):
+    """True if a cached record shows the image can restore jobs in `mode`."""
+    if not record:
+        return False
+    if mode == "app":
+        return str(record.get("python", "")).startswith("Python 3")
+    return record.get("criu_check") == "ok" and bool(record.get("criu_version"))
+
+
+class CapabilityCache:
+    """
+    Read-through cache of capability records in the job registry. Records
+    read from the registry are re-read after `ttl` seconds, so one another
+    replica refreshed is picked up.
+    """
+
+    def __init__(self, registry, ttl=CACHE_TTL, clock=time.monotonic):
+        self.registry = registry
+        self.ttl = ttl
+        self.clock = clock
+        self._local = {}        # (ami, kernel) -> (record, read at)
+
+    @staticmethod
+    def name(ami, kernel=None):
+        return f"{CAPABILITIES_KEY}#{ami}" + (f"#{kernel}" if kernel else "")
+
+    def get(self, ami, kernel):
+        if not ami or not kernel:
+            return None
+        key = (ami, kernel)
+        cached = self._local.get(key)
+        now = self.clock()
+        if cached is None or now - cached[1] >= self.ttl:
+            meta = self.registry.get_meta(self.name(ami, kernel))
+            if not meta or not meta.get("capabilities_json"):
+                self._local.pop(key, None)
+                return None
+            cached = self._local[key] = (json.loads(meta["capabilities_json"]), now)
+        return cached[0]
+
+    def latest(self, ami):
+        """Record for the kernel last seen on `ami`, for hosts not booted yet."""
+        if not ami:
+            return None
+        meta = self.registry.get_meta(self.name(ami))
+        return self.get(ami, meta.get("kernel")) if meta else None
+
+    def cpu_flags(self, ami, kernel, instance_type):
+        record = self.get(ami, kernel) if kernel else self.latest(ami)
+        return ((record or {}).get("cpu_flags") or {}).get(instance_type)
+
+    def record(self, facts):
+        """Store probe results; CPU flags accumulate per instance type. Returns the record."""
+        ami, kernel = facts.get("ami"), facts.get("kernel")
+        if not ami or not kernel:
+            log.warning("Host did not report its AMI and kernel; capabilities not cached")
+            return dict(facts)
+        record = dict(self.get(ami, kernel) or {})
+        cpu_flags = dict(record.get("cpu_flags") or {})
+        if facts.get("cpu_flags") and facts.get("instance_type"):
+            cpu_flags[facts["instance_type"]] = facts["cpu_flags"]
+        record.update({k: v for k, v in facts.items() if k not in ("cpu_flags", "instance_type")})
+        record["cpu_flags"] = cpu_flags
+        record["probed_at"] = int(time.time())
+        self.registry.put_meta(self.name(ami, kernel), capabilities_json=json.dumps(record, sort_keys=True))
+        self.registry.put_meta(self.name(ami), kernel=kernel)
+        self._local[(ami, kernel)] = (record, self.clock())
+        return record
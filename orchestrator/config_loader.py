@@ -1,56 +1,325 @@
 # orchestrator/config_loader.py
+"""
+Runtime configuration (config/runtime.yaml + environment) and the SLA
+policy (orchestrator/sla_policy.yaml), as one immutable snapshot.
+
+A ConfigStore parses and validates both files once; every component
+(DecisionEngine, Migrator, main) holds the same store and reads
+`store.current`, a frozen ConfigSnapshot, so hot paths never touch YAML.
+reload_if_changed() (run by the "config" scheduler task) notices a
+changed mtime, parses and validates the new files and swaps the snapshot
+in with a single reference assignment; a file that fails validation is
+logged and the previous snapshot stays in force. Subscribers are told
+about every new snapshot, so policy changes apply without a restart and
+without losing in-memory state such as cooldowns and price history.
+
+RuntimeConfig and SlaPolicy are also read-only mappings with the keys of
+the dicts they replace (`cfg.get("raw", {})`, `policy.get(...)`).
+"""
+import logging
 import os
-import yaml
+import threading
+import time
+from collections.abc import Mapping
+from dataclasses import dataclass, field, fields, replace
 from pathlib import Path
+from types import MappingProxyType
+from typing import Optional
+
+import yaml
+
+from orchestrator.instance_manager import LAUNCH_MODES
+from orchestrator.metrics import CONFIG_RELOADS
+from storage.s3_manager import COMPRESSION
+
+log = logging.getLogger("orchestrator.config")
 
 RUNTIME_CONFIG_PATH = Path("config/runtime.yaml")
+SLA_POLICY_PATH = Path("orchestrator/sla_policy.yaml")
+
+CHECKPOINT_MODES = ("criu", "app")
+REGISTRY_BACKENDS = ("json", "dynamo")
+DEFAULT_WORKLOAD_THRESHOLDS = {
+    "short": None,           # never migrate
+    "medium": 0.25,          # 25%
+    "long": 0.12,            # 12%
+    "stateful": 0.40,        # 40%
+}
+
+
+class ConfigError(ValueError):
+    """A config file does not parse or fails validation."""
+
+
+def freeze(value):
+    """Read-only copy: dicts become mapping proxies, lists tuples."""
+    if isinstance(value, Mapping):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def _read_yaml(path, required=False):
+    path = Path(path)
+    if not path.exists():
+        if required:
+            raise ConfigError(f"{path} not found")
+        return {}
+    try:
+        with open(path) as f:
+            data = yaml.safe_load(f) or {}
+    except yaml.YAMLError as e:
+        raise ConfigError(f"{path}: {e}") from e
+    if not isinstance(data, Mapping):
+        raise ConfigError(f"{path}: top level must be a mapping")
+    return data
+
+
+def _number(section, key, value, minimum=0.0, allow_none=False, integer=False):
+    if value is None and allow_none:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ConfigError(f"{section}.{key} must be a number, got {value!r}")
+    if value < minimum:
+        raise ConfigError(f"{section}.{key} must be >= {minimum}, got {value!r}")
+    if integer and int(value) != value:
+        raise ConfigError(f"{section}.{key} must be an integer, got {value!r}")
+    return int(value) if integer else float(value)
+
+
+def _choice(key, value, choices):
+    if value is not None and value not in choices:
+        raise ConfigError(f"{key} must be one of {', '.join(choices)}, got {value!r}")
+    return value
+
+
+class _FrozenMapping(Mapping):
+    def __getitem__(self, key):
+        return self._items()[key]
+
+    def __iter__(self):
+        return iter(self._items())
+
+    def __len__(self):
+        return len(self._items())
+
+
+@dataclass(frozen=True, eq=False)
+class RuntimeConfig(_FrozenMapping):
+    checkpoint_bucket: Optional[str] = None
+    source_region: Optional[str] = None
+    instance_type: Optional[str] = None
+    ssh_key_name: Optional[str] = None
+    target_region: Optional[str] = None
+    target_ami_id: Optional[str] = None
+    target_security_group_id: Optional[str] = None
+    max_spot_price: Optional[str] = None
+    registry_backend: Optional[str] = None
+    dynamodb_table: Optional[str] = None
+    dynamodb_region: Optional[str] = None
+    auto_provision: Optional[bool] = None
+    raw: Mapping = field(default_factory=lambda: MappingProxyType({}))
+
+    def _items(self):
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+    @classmethod
+    def from_dict(cls, cfg, env=None):
+        """
+        Environment variables take precedence over the file:
+        CHECKPOINT_BUCKET, SOURCE_REGION, INSTANCE_TYPE, ... (see below).
+        """
+        env = os.environ if env is None else env
+        source_region = env.get("SOURCE_REGION") or cfg.get("source_region")
+        auto_provision = env.get("AUTO_PROVISION")
+        if auto_provision is None:
+            auto_provision = cfg.get("auto_provision")
+        else:
+            auto_provision = str(auto_provision).lower() in ("1", "true", "yes")
+        config = cls(
+            checkpoint_bucket=env.get("CHECKPOINT_BUCKET") or cfg.get("checkpoint_bucket"),
+            source_region=source_region,
+            instance_type=env.get("INSTANCE_TYPE") or cfg.get("instance_type"),
+            ssh_key_name=env.get("SSH_KEY_NAME") or cfg.get("ssh_key_name"),
+            target_region=env.get("TARGET_REGION") or cfg.get("target_region"),
+            target_ami_id=env.get("TARGET_AMI_ID") or cfg.get("target_ami_id"),
+            target_security_group_id=env.get("TARGET_SECURITY_GROUP_ID") or cfg.get("target_security_group_id"),
+            max_spot_price=env.get("MAX_SPOT_PRICE") or cfg.get("max_spot_price"),
+            registry_backend=env.get("REGISTRY_BACKEND") or cfg.get("registry_backend"),
+            dynamodb_table=env.get("DYNAMO_TABLE") or cfg.get("dynamodb_table"),
+            dynamodb_region=env.get("DYNAMO_REGION") or cfg.get("dynamodb_region") or source_region,
+            auto_provision=auto_provision,
+            raw=freeze(cfg),
+        )
+        config.validate()
+        return config
+
+    def section(self, name):
+        """A sub-mapping of runtime.yaml, empty if absent."""
+        return self.raw.get(name) or MappingProxyType({})
+
+    def validate(self):
+        raw = self.raw
+        _choice("registry_backend", self.registry_backend, REGISTRY_BACKENDS)
+        _choice("checkpoint_mode", raw.get("checkpoint_mode"), CHECKPOINT_MODES)
+        _choice("checkpoint_compression", raw.get("checkpoint_compression"), tuple(COMPRESSION))
+        regions = raw.get("candidate_regions")
+        if regions is not None and (not isinstance(regions, tuple) or not all(isinstance(r, str) for r in regions)):
+            raise ConfigError("candidate_regions must be a list of region names")
+        provisioning = self.section("provisioning")
+        _choice("provisioning.mode", provisioning.get("mode"), LAUNCH_MODES)
+        for key in ("batch_window", "poll_interval"):
+            if key in provisioning:
+                _number("provisioning", key, provisioning[key])
+        retry = self.section("retry")
+        for key in ("deadline_seconds", "max_delay", "breaker_reset_seconds"):
+            if key in retry:
+                _number("retry", key, retry[key])
+        for key in ("host_failure_threshold", "region_failure_threshold", "max_resumes"):
+            if key in retry:
+                _number("retry", key, retry[key], minimum=1 if key != "max_resumes" else 0, integer=True)
+
+
+@dataclass(frozen=True, eq=False)
+class SlaPolicy(_FrozenMapping):
+    price_spike_threshold: float = 0.01
+    max_migrations_per_hour: Optional[int] = None
+    workload_thresholds: Mapping = field(default_factory=lambda: MappingProxyType(dict(DEFAULT_WORKLOAD_THRESHOLDS)))
+    raw: Mapping = field(default_factory=lambda: MappingProxyType({}))
+
+    def _items(self):
+        return self.raw
+
+    @classmethod
+    def from_dict(cls, policy):
+        policy = freeze(policy)
+        thresholds = policy.get("workload_thresholds")
+        if thresholds is None:
+            thresholds = DEFAULT_WORKLOAD_THRESHOLDS
+        if not isinstance(thresholds, Mapping):
+            raise ConfigError("workload_thresholds must be a mapping")
+        config = cls(
+            price_spike_threshold=_number("policy", "price_spike_threshold", policy.get("price_spike_threshold", 0.01)),
+            max_migrations_per_hour=_number(
+                "policy", "max_migrations_per_hour", policy.get("max_migrations_per_hour"), allow_none=True, integer=True
+            ),
+            workload_thresholds=MappingProxyType({
+                str(k).lower(): _number("workload_thresholds", k, v, allow_none=True) for k, v in thresholds.items()
+            }),
+            raw=policy,
+        )
+        config.validate()
+        return config
+
+    def validate(self):
+        optimizer = self.raw.get("fleet_optimizer") or {}
+        if not isinstance(optimizer, Mapping):
+            raise ConfigError("fleet_optimizer must be a mapping")
+        for key in ("horizon_hours", "default_downtime_seconds", "migration_cost"):
+            if key in optimizer:
+                _number("fleet_optimizer", key, optimizer[key])
+        for key, limit in (optimizer.get("capacity") or {}).items():
+            _number("fleet_optimizer.capacity", key, limit, allow_none=True, integer=True)
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    runtime: RuntimeConfig
+    policy: SlaPolicy
+    version: int = 1
+    loaded_at: float = 0.0
+
+
+def _stamp(path):
+    """What changes when a file is rewritten or replaced; None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class ConfigStore:
+    def __init__(self, runtime_path=RUNTIME_CONFIG_PATH, policy_path=SLA_POLICY_PATH, env=None):
+        self.runtime_path = Path(runtime_path)
+        self.policy_path = Path(policy_path)
+        self.env = env
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._stamps = self._file_stamps()
+        self._current = self._load(version=1)
+
+    @property
+    def current(self) -> ConfigSnapshot:
+        return self._current
+
+    def _file_stamps(self):
+        return _stamp(self.runtime_path), _stamp(self.policy_path)
+
+    def _load(self, version):
+        runtime = RuntimeConfig.from_dict(_read_yaml(self.runtime_path), self.env)
+        policy = SlaPolicy.from_dict(_read_yaml(self.policy_path, required=True))
+        return ConfigSnapshot(runtime, policy, version, time.time())
+
+    def subscribe(self, fn):
+        """Call fn(snapshot) after every swap (on the reloading thread)."""
+        self._subscribers.append(fn)
+
+    def _swap(self, snapshot):
+        self._current = snapshot
+        for fn in list(self._subscribers):
+            try:
+                fn(snapshot)
+            except Exception:
+                log.exception("Config subscriber %r failed", fn)
+
+    def reload_if_changed(self):
+        """Reload if either file changed since the last attempt. Returns True if a new snapshot is in force."""
+        with self._lock:
+            stamps = self._file_stamps()
+            if stamps == self._stamps:
+                return False
+            # Remembered even on failure, so a bad file is reported once, not every poll
+            self._stamps = stamps
+            try:
+                snapshot = self._load(self._current.version + 1)
+            except (ConfigError, OSError) as e:
+                CONFIG_RELOADS.labels("rejected").inc()
+                log.error("Config change rejected, keeping version %d: %s", self._current.version, e)
+                return False
+            self._swap(snapshot)
+        CONFIG_RELOADS.labels("applied").inc()
+        log.info("Config version %d applied (%s, %s)", snapshot.version, self.runtime_path, self.policy_path)
+        return True
+
+    def replace(self, runtime=None, policy=None):
+        """Swap in a snapshot with the given parts replaced (already validated objects)."""
+        with self._lock:
+            current = self._current
+            parts = {k: v for k, v in (("runtime", runtime), ("policy", policy)) if v is not None}
+            self._swap(replace(current, version=current.version + 1, loaded_at=time.time(), **parts))
+        return self._current
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_store():
+    """Process-wide store for the default paths, loaded on first use."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = ConfigStore()
+        return _default
 
 
 def load_runtime_config():
     """
-    Loads runtime configuration for orchestrator components.
-    Priority:
+    Runtime configuration for orchestrator components, from the shared
+    snapshot. Priority:
       1) Environment variables
       2) config/runtime.yaml (if present)
     """
-    cfg = {}
-
-    # Load from file if it exists
-    if RUNTIME_CONFIG_PATH.exists():
-        with open(RUNTIME_CONFIG_PATH) as f:
-            cfg = yaml.safe_load(f) or {}
-
-    # Env vars take precedence
-    checkpoint_bucket = os.getenv("CHECKPOINT_BUCKET") or cfg.get("checkpoint_bucket")
-    source_region = os.getenv("SOURCE_REGION") or cfg.get("source_region")
-    instance_type = os.getenv("INSTANCE_TYPE") or cfg.get("instance_type")
-    ssh_key_name = os.getenv("SSH_KEY_NAME") or cfg.get("ssh_key_name")
-    target_region = os.getenv("TARGET_REGION") or cfg.get("target_region")
-    target_ami_id = os.getenv("TARGET_AMI_ID") or cfg.get("target_ami_id")
-    target_security_group_id = os.getenv("TARGET_SECURITY_GROUP_ID") or cfg.get("target_security_group_id")
-    max_spot_price = os.getenv("MAX_SPOT_PRICE") or cfg.get("max_spot_price")
-    registry_backend = os.getenv("REGISTRY_BACKEND") or cfg.get("registry_backend")
-    dynamodb_table = os.getenv("DYNAMO_TABLE") or cfg.get("dynamodb_table")
-    dynamodb_region = os.getenv("DYNAMO_REGION") or cfg.get("dynamodb_region") or source_region
-    auto_provision = os.getenv("AUTO_PROVISION")
-    if auto_provision is None:
-        auto_provision = cfg.get("auto_provision")
-    else:
-        auto_provision = str(auto_provision).lower() in ("1", "true", "yes")
-
-    return {
-        "checkpoint_bucket": checkpoint_bucket,
-        "source_region": source_region,
-        "instance_type": instance_type,
-        "ssh_key_name": ssh_key_name,
-        "target_region": target_region,
-        "target_ami_id": target_ami_id,
-        "target_security_group_id": target_security_group_id,
-        "max_spot_price": max_spot_price,
-        "registry_backend": registry_backend,
-        "dynamodb_table": dynamodb_table,
-        "dynamodb_region": dynamodb_region,
-        "auto_provision": auto_provision,
-        "raw": cfg,
-    }
-
+    return default_store().current.runtime
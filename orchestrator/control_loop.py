@@ -0,0 +1,667 @@
+# orchestrator/control_loop.py
+import heapq
+import logging
+import threading
+import time
+
+from orchestrator.decision_engine import Decision
+from orchestrator.fleet_optimizer import FleetOptimizer
+from orchestrator.job_index import JobIndex
+from orchestrator.log_pipeline import Sampler
+from orchestrator.metrics import LOOP_ITERATION_SECONDS
+from orchestrator.placement import cheapest
+from storage.change_feed import ChangeFeedGap
+
+log = logging.getLogger("orchestrator.main")
+TICK_SECONDS = LOOP_ITERATION_SECONDS.labels("tick")
+# Decision for jobs whose workload type is never migrated
+PINNED = Decision("STAY", None, "workload_short_no_migrate")
+
+
+class InterruptionNotice:
+    """
+    Tracks one worker's spot interruption: the recovery thread waits on it
+    while the worker's dump/upload is still running.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.received = time.time()
+        self.checkpoint_key = None
+        self.ok = False
+        self._done = threading.Event()
+
+    def resolve(self, ok, checkpoint_key=None):
+        self.ok = ok
+        self.checkpoint_key = checkpoint_key
+        self._done.set()
+
+    def wait(self, timeout):
+        return self._done.wait(timeout) and self.ok
+
+
+class ControlLoop:
+    """
+    One orchestrator iteration: poll prices -> sync jobs -> evaluate -> migrate.
+
+    Jobs live in a JobIndex maintained from the registry's change feed. A tick
+    re-evaluates only jobs whose record changed or whose region's price
+    changed; if the cheapest (region, price) moved, every job is re-evaluated
+    since all decisions compare against it. The registry is fully re-listed on
+    start, every `resync_seconds`, and whenever the feed reports a gap.
+
+    tick() runs one synchronous pass. The async scheduler in main.py instead
+    calls the individual steps (poll_region, sync_jobs, evaluate_pending,
+    dispatch_pending) from separate tasks; `lock` guards the shared state.
+
+    With a Coordinator (several replicas), only jobs this replica owns are
+    evaluated, and only the leader polls prices; followers read the prices
+    it publishes. Migrations claim the job with the evaluated record's
+    version, so a brief ownership overlap cannot migrate a job twice.
+
+    With `placement` ((shapes, defaults) from placement.load_instance_matrix),
+    dispatch_pending bin-packs the jobs bound for each region by CPU and
+    memory onto as few instances as possible; jobs sharing a source host and
+    a target instance move with one Migrator.migrate_group pass.
+
+    With an `optimizer` (fleet_optimizer.FleetOptimizer), any change runs one
+    fleet-wide assignment instead of per-job engine decisions, limited by the
+    remaining hourly migration budget.
+    """
+
+    def __init__(
+        self,
+        watcher,
+        engine,
+        registry,
+        migrator=None,
+        states=("RUNNING",),
+        job_id=None,
+        default_region=None,
+        migrate=False,
+        cooldown_seconds=10800,
+        target_region=None,
+        migrate_options=None,
+        price_cache_ttl=30,
+        resync_seconds=300,
+        coordinator=None,
+        placement=None,
+        optimizer=None,
+    ):
+        self.watcher = watcher
+        self.engine = engine
+        self.registry = registry
+        self.migrator = migrator
+        self.states = list(states)
+        self.job_id = job_id
+        self.migrate = migrate
+        self.cooldown_seconds = cooldown_seconds
+        self.target_region = target_region
+        self.migrate_options = migrate_options or {}
+        self.price_cache_ttl = price_cache_ttl
+        self.resync_seconds = resync_seconds
+        self.coordinator = coordinator
+        self.placement = placement
+        self.optimizer = optimizer
+
+        self.lock = threading.RLock()
+        self.index = JobIndex(self.states, default_region=default_region, job_ids=[job_id] if job_id else None)
+        self.feed = None
+        self.prices = None
+        self.last_migration_ts = {}
+        self.in_flight = set()
+
+        self._price_ts = 0.0
+        self._evaluated_prices = {}
+        self._evaluated_cheapest = None
+        self._deferred = set()
+        self._queue = {}
+        self._interruptions = {}
+        self._recoveries = []
+        self._last_resync = 0.0
+        self._logged_prices = None
+        # Read by the health server without the lock: replaced or updated one key at a time
+        self.last_sync = None
+        self.decisions = {}     # job_id -> last Decision
+        # Per-job lines are rate limited; STAY decisions only appear in the per-pass summary
+        self.decision_log = Sampler("decision")
+        self.admission_log = Sampler("admission")
+
+    def start(self):
+        try:
+            self.feed = self.registry.change_feed()
+        except (AttributeError, RuntimeError) as e:
+            log.warning("Registry change feed unavailable (%s); re-listing every tick", e)
+            self.feed = None
+        self.resync()
+
+    # ------------------------------------------------------------------
+    # Jobs
+    # ------------------------------------------------------------------
+    def _list_jobs(self):
+        if self.job_id:
+            try:
+                return [{"job_id": self.job_id, **self.registry.get(self.job_id)}]
+            except KeyError:
+                log.warning("Job %s not found in registry", self.job_id)
+                return []
+        jobs = []
+        for state in self.states:
+            jobs.extend(self.registry.list_by_state(state))
+        return jobs
+
+    def resync(self):
+        jobs = self._list_jobs()
+        with self.lock:
+            self.index.load(jobs)
+            self._last_resync = self.last_sync = time.time()
+            self.decisions = {j: d for j, d in self.decisions.items() if j in self.index}
+
+    def sync_jobs(self):
+        """
+        Bring the index up to date. Returns True if any job needs evaluation.
+        """
+        if self.feed is None or time.time() - self._last_resync >= self.resync_seconds:
+            self.resync()
+        else:
+            try:
+                changes = self.feed.poll()
+            except ChangeFeedGap as e:
+                log.warning("Change feed gap (%s); re-listing jobs", e)
+                self.resync()
+            else:
+                with self.lock:
+                    for job_id, record in changes:
+                        self.index.apply(job_id, record)
+        self.last_sync = time.time()
+        with self.lock:
+            return bool(self.index.dirty)
+
+    # ------------------------------------------------------------------
+    # Prices and evaluation
+    # ------------------------------------------------------------------
+    def refresh_prices(self, now=None):
+        now = now or time.time()
+        if self.prices is None or now - self._price_ts >= self.price_cache_ttl:
+            self.prices = self.watcher.poll()
+            self._price_ts = now
+            rounded = {r: round(v["price"], 5) for r, v in self.prices.items()}
+            log.log(logging.INFO if rounded != self._logged_prices else logging.DEBUG, "Prices: %s", rounded)
+            self._logged_prices = rounded
+        return self.prices
+
+    def poll_region(self, region):
+        """
+        Refresh one region's price. Returns True if the price changed.
+        With a coordinator only the leader polls AWS.
+        """
+        if self.coordinator is not None and not self.coordinator.is_leader:
+            return False
+        entry = self.watcher.poll_region(region)
+        with self.lock:
+            prices = dict(self.prices or {})
+            old = prices.get(region)
+            prices[region] = entry
+            self.prices = prices
+            self._price_ts = time.time()
+        if self.coordinator is not None:
+            self.coordinator.publish_prices(prices)
+        changed = old is None or old["price"] != entry["price"]
+        if changed:
+            log.info("Price %s: %.5f", region, entry["price"])
+        return changed
+
+    def coordinate(self):
+        """
+        Run one coordination step. Returns True if evaluation should run:
+        ownership moved (every job we now own is re-evaluated) or, as a
+        follower, the leader published new prices.
+        """
+        if self.coordinator is None:
+            return False
+        wake = False
+        if self.coordinator.step():
+            with self.lock:
+                self.index.dirty |= set(self.index.jobs)
+            wake = True
+        if not self.coordinator.is_leader:
+            prices = self.coordinator.read_prices()
+            if prices:
+                with self.lock:
+                    old = {r: v["price"] for r, v in (self.prices or {}).items()}
+                    self.prices = prices
+                    self._price_ts = time.time()
+                wake = wake or old != {r: v["price"] for r, v in prices.items()}
+        return wake
+
+    def apply_config(self, snapshot):
+        """
+        A reloaded config (config_loader.ConfigStore) can change any decision:
+        every job is evaluated again, and the optimizer is rebuilt from the
+        new policy.
+        """
+        with self.lock:
+            if self.optimizer is not None:
+                self.optimizer = FleetOptimizer(
+                    snapshot.policy, self.optimizer.shapes, self.optimizer.defaults, self.optimizer.threshold_fn
+                )
+            self.index.dirty |= set(self.index.jobs)
+
+    def jobs_to_evaluate(self, prices):
+        """
+        Job ids whose decision may differ from the last evaluation.
+        """
+        current = {r: v["price"] for r, v in prices.items()}
+        cheapest = min(current.items(), key=lambda x: x[1]) if current else None
+
+        if cheapest != self._evaluated_cheapest:
+            ids = set(self.index.jobs)
+        else:
+            changed = {r for r, p in current.items() if self._evaluated_prices.get(r) != p}
+            ids = self.index.in_regions(changed)
+        self._evaluated_prices = current
+        self._evaluated_cheapest = cheapest
+
+        ids |= self.index.take_dirty()
+        ids |= self._deferred
+        self._deferred = set()
+        if self.coordinator is not None:
+            return {j for j in ids if j in self.index and self.coordinator.owns(j)}
+        return {j for j in ids if j in self.index}
+
+    def evaluate_pending(self):
+        """
+        Evaluate every job whose inputs changed. Returns MIGRATE decisions.
+        """
+        with self.lock:
+            # Wait until every region reported; a partial view could pick the wrong target
+            if not self.prices or set(self.watcher.regions) - self.prices.keys():
+                return []
+            prices = self.prices
+            if self.optimizer is not None:
+                return self.optimize(prices, self.jobs_to_evaluate(prices))
+            return self.evaluate(prices, self.jobs_to_evaluate(prices))
+
+    def migration_budget(self, now=None):
+        """Migrations still allowed this hour under max_migrations_per_hour (None = unlimited)."""
+        limit = self.optimizer.max_migrations_per_hour if self.optimizer is not None else None
+        if limit is None:
+            return None
+        now = now or time.time()
+        recent = sum(1 for ts in self.last_migration_ts.values() if now - ts < 3600)
+        return max(int(limit) - recent - len(self.in_flight) - len(self._queue), 0)
+
+    def optimize(self, prices, changed):
+        """
+        One fleet-wide assignment over every job this replica owns, run only
+        if some job or price changed (`changed`, from jobs_to_evaluate).
+        Returns MIGRATE decisions in plan order.
+        """
+        if not changed:
+            return []
+        jobs = {
+            job_id: job
+            for job_id, job in self.index.jobs.items()
+            if job_id not in self.in_flight and (self.coordinator is None or self.coordinator.owns(job_id))
+        }
+        offers = {(region, self.watcher.instance_type): v["price"] for region, v in prices.items()}
+        moves = self.optimizer.plan(
+            jobs, offers, budget=self.migration_budget(),
+            default_region=self.index.default_region, default_type=self.watcher.instance_type,
+            unavailable={region for region in prices if not self._region_available(region)},
+        )
+        for move in moves:
+            self.decision_log.log(log, logging.INFO, "Job %s plan: %s -> %s/%s saves $%.4f/h, score %.6f/s", move.job_id,
+                                  move.source_region, move.target_region, move.instance_type, move.saving_per_hour, move.score)
+        decisions = [(m.job_id, Decision("MIGRATE", m.target_region, "fleet_plan", m.instance_type)) for m in moves]
+        self.decisions.update(decisions)
+        return decisions
+
+    def _pinned_workloads(self):
+        """Workload codes the engine never migrates (threshold None, e.g. "short")."""
+        threshold = getattr(self.engine, "threshold_for_job", None)
+        workloads = self.index.jobs.workloads
+        if threshold is None:
+            return set()
+        return {
+            code for code in range(len(workloads))
+            if workloads[code] is not None and threshold({"workload_type": workloads[code]}) is None
+        }
+
+    def evaluate(self, prices, job_ids):
+        jobs = self.index.jobs
+        regions = jobs.regions
+        pinned = self._pinned_workloads()
+        decisions = []
+        stay = {}
+        for job_id in job_ids:
+            row = jobs.rows[job_id]
+            # The region column already holds default_region for jobs without one
+            current_region = regions[jobs.region[row]]
+            if current_region not in prices:
+                continue
+            if jobs.workload[row] in pinned:
+                # Never migrated whatever the prices, so the engine is not asked
+                decision = PINNED
+            else:
+                decision = self.engine.evaluate(prices, current_region, job=jobs.records[row])
+            self.decisions[job_id] = decision
+            if decision.action == "MIGRATE":
+                decisions.append((job_id, decision))
+                self.decision_log.log(log, logging.INFO, "Job %s decision: action=%s target=%s reason=%s",
+                                      job_id, decision.action, decision.target_region, decision.reason)
+            else:
+                stay[decision.reason] = stay.get(decision.reason, 0) + 1
+        evaluated = len(decisions) + sum(stay.values())
+        if evaluated:
+            log.info(
+                "Evaluated %d jobs: %d MIGRATE, STAY by reason %s", evaluated, len(decisions), stay,
+                extra={"event": {"event": "evaluation", "jobs": evaluated, "migrate": len(decisions), "stay": stay}},
+            )
+        return decisions
+
+    def price_age(self, now=None):
+        """Seconds since prices were last refreshed; None before the first poll."""
+        return (now or time.time()) - self._price_ts if self.prices else None
+
+    def status_snapshot(self, job_id=None, limit=100):
+        """
+        In-memory state for the health server's /status. Reads without the
+        lock (references and C-level copies), so an evaluation pass or a
+        migration holding it never delays the reply.
+        """
+        prices = self.prices or {}
+        decisions = {job_id: self.decisions.get(job_id)} if job_id else dict(self.decisions)
+        counts = {}
+        for decision in decisions.values():
+            if decision is not None:
+                counts[decision.action] = counts.get(decision.action, 0) + 1
+        age = self.price_age()
+        return {
+            "jobs": len(self.index),
+            "in_flight": sorted(self.in_flight),
+            "queued": len(self._queue),
+            "recoveries": sorted(self._interruptions),
+            "prices": {r: {"price": v["price"], "volatility": v.get("volatility")} for r, v in prices.items()},
+            "price_age_s": None if age is None else round(age, 1),
+            "decision_counts": counts,
+            "decisions": {
+                j: None if decisions[j] is None else {
+                    "action": decisions[j].action,
+                    "target_region": decisions[j].target_region,
+                    "reason": decisions[j].reason,
+                    "instance_type": decisions[j].instance_type,
+                }
+                for j in heapq.nsmallest(limit, decisions)
+            },
+        }
+
+    # ------------------------------------------------------------------
+    # Migration
+    # ------------------------------------------------------------------
+    def _admit(self, job_id, now):
+        """
+        Returns the evaluated record's version if the migration may start, else None.
+        """
+        with self.lock:
+            job = self.index.jobs.get(job_id)
+            if job is None or job_id in self.in_flight:
+                return None
+            # Cooldown check per job; re-check next tick even if nothing changes
+            last_ts = self.last_migration_ts.get(job_id)
+            if last_ts and (now - last_ts) < self.cooldown_seconds:
+                self.admission_log.log(log, logging.INFO, "Job %s cooldown active; skipping migration (remaining %ss)",
+                                       job_id, int(self.cooldown_seconds - (now - last_ts)))
+                self._deferred.add(job_id)
+                return None
+            if not self.migrate:
+                self.admission_log.log(log, logging.INFO, "Job %s migration suggested (dry-run). Use --migrate to execute.", job_id)
+                return None
+            self.in_flight.add(job_id)
+            return job.get("version", 0)
+
+    def _run_migration(self, job_id, decision, expected_version=None):
+        try:
+            target_region = self.target_region or decision.target_region
+            options = self.migrate_options
+            if decision.instance_type:
+                options = {**options, "provision_overrides": {**(options.get("provision_overrides") or {}), "instance_type": decision.instance_type}}
+            self.migrator.migrate(job_id, target_region, expected_version=expected_version, **options)
+            with self.lock:
+                self.last_migration_ts[job_id] = time.time()
+        finally:
+            with self.lock:
+                self.in_flight.discard(job_id)
+
+    def _run_bin(self, target_region, instance_type, job_ids, versions):
+        """
+        Move the jobs packed onto one target instance: one migrate_group per
+        source host, the first provisioning the instance and the rest reusing it.
+        """
+        by_host = {}
+        with self.lock:
+            for job_id in job_ids:
+                by_host.setdefault(self.index.jobs.get(job_id, {}).get("public_ip"), []).append(job_id)
+        options = dict(self.migrate_options)
+        options["provision_overrides"] = {**(options.get("provision_overrides") or {}), "instance_type": instance_type}
+        target_ip = options.pop("target_ip", None)
+        remaining = list(by_host.values())
+        try:
+            while remaining:
+                ids = remaining[0]
+                target_ip = self.migrator.migrate_group(
+                    ids, target_region, target_ip=target_ip,
+                    expected_versions={j: versions[j] for j in ids}, **options,
+                )
+                remaining.pop(0)
+                with self.lock:
+                    for job_id in ids:
+                        self.last_migration_ts[job_id] = time.time()
+        finally:
+            with self.lock:
+                self.in_flight.difference_update(job_ids)
+                # Groups not moved, the failed one included, are re-evaluated next pass
+                # (jobs a failed migration left mid-journal are out of the index and skipped)
+                for ids in remaining:
+                    self._deferred.update(ids)
+
+    def pack(self, admitted, prices):
+        """
+        Split admitted migrations ({job_id: decision}) into per-instance bins,
+        at most one job per bin using the default checkpoint dir.
+        Yields (target_region, instance_type, job_ids).
+        """
+        by_target = {}
+        for job_id, decision in admitted.items():
+            by_target.setdefault(self.target_region or decision.target_region, []).append(job_id)
+        shapes, defaults = self.placement
+        instance_type = self.watcher.instance_type
+        for target_region, job_ids in by_target.items():
+            price = (prices or {}).get(target_region, {}).get("price")
+            jobs = {job_id: self.index.jobs.get(job_id, {}) for job_id in job_ids}
+            plan = cheapest(jobs, {(target_region, instance_type): price}, shapes, defaults) if price is not None else None
+            if plan is None:
+                for job_id in job_ids:
+                    yield target_region, instance_type, [job_id]
+                continue
+            log.info("Packed %d jobs for %s onto %d %s instances", len(job_ids), target_region, len(plan.bins), instance_type)
+            for job_ids_in_bin in plan.bins:
+                # Jobs without their own checkpoint_dir all restore into the default
+                # one: a second such job on the instance would overwrite the first's
+                # checkpoint (app.ckpt included), so it gets an instance of its own
+                shared = [job_id for job_id in job_ids_in_bin if not jobs[job_id].get("checkpoint_dir")][1:]
+                yield target_region, plan.instance_type, [job_id for job_id in job_ids_in_bin if job_id not in shared]
+                for job_id in shared:
+                    yield target_region, plan.instance_type, [job_id]
+
+    def dispatch(self, job_id, decision, now=None):
+        """Run one migration synchronously if cooldown and mode allow it."""
+        version = self._admit(job_id, now or time.time())
+        if version is None:
+            return False
+        self._run_migration(job_id, decision, version)
+        return True
+
+    def enqueue(self, decisions):
+        with self.lock:
+            for job_id, decision in decisions:
+                self._queue[job_id] = decision
+            return bool(self._queue)
+
+    # ------------------------------------------------------------------
+    # Spot interruptions
+    # ------------------------------------------------------------------
+    def _region_available(self, region):
+        """False while the engine's circuit breaker for `region` is open."""
+        check = getattr(self.engine, "region_available", None)
+        return check is None or check(region)
+
+    def _recovery_region(self, current_region):
+        if self.target_region:
+            return self.target_region
+        # The current region is reclaiming capacity; prefer anywhere else
+        others = {r: v for r, v in (self.prices or {}).items() if r != current_region}
+        # Skip regions whose circuit breaker is open, unless every one is
+        others = {r: v for r, v in others.items() if self._region_available(r)} or others
+        if not others:
+            return current_region
+        return min(others.items(), key=lambda x: x[1]["price"])[0]
+
+    def handle_interruption(self, payload):
+        """
+        Handle a worker notification (worker/interruption_watcher.py).
+        phase "notice" queues a recovery that provisions the target at once;
+        "checkpointed"/"failed" release it. Returns True if dispatch should run.
+        """
+        job_id = payload.get("job_id")
+        phase = payload.get("phase")
+        if not job_id:
+            raise ValueError("job_id is required")
+        with self.lock:
+            notice = self._interruptions.get(job_id)
+            if phase == "notice":
+                if notice is not None:
+                    return False
+                notice = self._interruptions[job_id] = InterruptionNotice(job_id)
+                self._recoveries.append(notice)
+                self._queue.pop(job_id, None)
+                log.warning("Job %s: spot interruption notice (%s)", job_id, payload.get("reclaim_time"))
+                return True
+            if notice is None:
+                # Completion arrived without a notice (e.g. orchestrator restart)
+                notice = self._interruptions[job_id] = InterruptionNotice(job_id)
+                self._recoveries.append(notice)
+            if phase == "checkpointed":
+                notice.resolve(True, payload.get("checkpoint_key"))
+            elif phase == "failed":
+                log.error("Job %s: emergency checkpoint failed: %s", job_id, payload.get("error"))
+                notice.resolve(False)
+            else:
+                raise ValueError(f"unknown phase {phase!r}")
+            return True
+
+    def _run_recovery(self, notice):
+        job_id = notice.job_id
+        try:
+            job = self.registry.get(job_id)
+            target_region = self._recovery_region(job.get("region") or self.index.default_region)
+            log.warning("Job %s: recovering into %s", job_id, target_region)
+            recovered = self.migrator.recover(job_id, target_region, notice.wait, **self.migrate_options)
+            if not recovered:
+                log.error("Job %s: checkpoint never arrived; job lost", job_id)
+            with self.lock:
+                self.last_migration_ts[job_id] = time.time()
+        finally:
+            with self.lock:
+                self.in_flight.discard(job_id)
+                self._interruptions.pop(job_id, None)
+
+    # ------------------------------------------------------------------
+    # Unfinished migrations
+    # ------------------------------------------------------------------
+    def resume_pending(self, submit, min_age=60, now=None):
+        """
+        Hand migrations left journaled by a crash or a failed step to
+        submit(fn, *args). Skips ones running here, owned by another replica,
+        or touched in the last `min_age` seconds. Returns the number started.
+        """
+        if self.migrator is None or not self.migrate:
+            return 0
+        now = now or time.time()
+        started = 0
+        for journal in self.migrator.pending_journals():
+            job_ids = list(journal["jobs"])
+            if now - journal.get("updated_at", 0) < min_age:
+                continue
+            if self.coordinator is not None and not self.coordinator.owns(job_ids[0]):
+                continue
+            with self.lock:
+                if self.in_flight.intersection(job_ids):
+                    continue
+                self.in_flight.update(job_ids)
+            submit(self._run_resume, job_ids)
+            started += 1
+        return started
+
+    def _run_resume(self, job_ids):
+        try:
+            self.migrator.resume(job_ids[0])
+            with self.lock:
+                for job_id in job_ids:
+                    self.last_migration_ts[job_id] = time.time()
+        finally:
+            with self.lock:
+                self.in_flight.difference_update(job_ids)
+
+    def dispatch_pending(self, submit):
+        """
+        Hand queued migrations to submit(fn, *args), e.g. an executor's
+        submit, so long migrations never block the scheduler. Interruption
+        recoveries go first and bypass cooldown. Returns the number started.
+        """
+        with self.lock:
+            queued, self._queue = self._queue, {}
+            recoveries, self._recoveries = self._recoveries, []
+        now = time.time()
+        started = 0
+        for notice in recoveries:
+            with self.lock:
+                self.in_flight.add(notice.job_id)
+            submit(self._run_recovery, notice)
+            started += 1
+        admitted = {}
+        for job_id, decision in queued.items():
+            version = self._admit(job_id, now)
+            if version is not None:
+                admitted[job_id] = (decision, version)
+        if self.placement is None:
+            for job_id, (decision, version) in admitted.items():
+                submit(self._run_migration, job_id, decision, version)
+                started += 1
+            return started
+        with self.lock:
+            bins = list(self.pack({j: d for j, (d, _) in admitted.items()}, self.prices))
+        for target_region, instance_type, job_ids in bins:
+            if len(job_ids) == 1:
+                decision, version = admitted[job_ids[0]]
+                submit(self._run_migration, job_ids[0], decision, version)
+            else:
+                submit(self._run_bin, target_region, instance_type, job_ids, {j: admitted[j][1] for j in job_ids})
+            started += 1
+        return started
+
+    def tick(self):
+        started = time.perf_counter()
+        now = time.time()
+        prices = self.refresh_prices(now)
+        self.sync_jobs()
+        with self.lock:
+            job_ids = self.jobs_to_evaluate(prices)
+            if self.optimizer is not None:
+                decisions = self.optimize(prices, job_ids)
+            else:
+                decisions = self.evaluate(prices, job_ids)
+        for job_id, decision in decisions:
+            self.dispatch(job_id, decision, now)
+        TICK_SECONDS.observe(time.perf_counter() - started)
+        return len(job_ids)
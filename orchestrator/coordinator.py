@@ -0,0 +1,79 @@
+# orchestrator/coordinator.py
+import json
+import logging
+
+from orchestrator.sharding import HashRing
+
+log = logging.getLogger("orchestrator.coordinator")
+
+PRICES_KEY = "prices"
+
+
+class Coordinator:
+    """
+    Lease-based coordination between orchestrator replicas, stored in the
+    registry table (DynamoRegistry or JobRegistry).
+
+    - Every replica heartbeats into a shared membership record; members
+      whose heartbeat is older than `ttl` are considered dead.
+    - One replica holds the leader lease and runs fleet-wide tasks (price
+      polling); it publishes prices for the followers to read.
+    - Jobs are partitioned over live replicas by consistent hashing of
+      job_id, so a join or death only moves that replica's share.
+
+    Call step() more often than `ttl` (e.g. every ttl/3).
+    """
+
+    def __init__(self, registry, replica_id, group="orchestrators", ttl=15.0, vnodes=64):
+        self.registry = registry
+        self.replica_id = replica_id
+        self.group = group
+        self.ttl = ttl
+        self.vnodes = vnodes
+        self.is_leader = False
+        self.members = []
+        self.ring = HashRing([replica_id], vnodes=vnodes)
+
+    @property
+    def leader_lease(self):
+        return f"{self.group}-leader"
+
+    def step(self):
+        """
+        Heartbeat, refresh membership and (re)try the leader lease.
+        Returns True if membership changed, i.e. job ownership moved.
+        """
+        self.registry.heartbeat(self.group, self.replica_id, self.ttl)
+        members = self.registry.live_members(self.group)
+        if self.replica_id not in members:
+            members = sorted(set(members) | {self.replica_id})
+        changed = members != self.members
+        if changed:
+            log.info("Orchestrator replicas: %s", members)
+            self.members = members
+            self.ring = HashRing(members, vnodes=self.vnodes)
+
+        was_leader = self.is_leader
+        self.is_leader = self.registry.acquire_lease(self.leader_lease, self.replica_id, self.ttl)
+        if self.is_leader != was_leader:
+            log.info("Replica %s %s leadership", self.replica_id, "acquired" if self.is_leader else "lost")
+        return changed
+
+    def owns(self, job_id):
+        return self.ring.owner(job_id) == self.replica_id
+
+    def publish_prices(self, prices):
+        if self.is_leader:
+            self.registry.put_meta(PRICES_KEY, prices_json=json.dumps(prices), publisher=self.replica_id)
+
+    def read_prices(self):
+        record = self.registry.get_meta(PRICES_KEY)
+        if not record or not record.get("prices_json"):
+            return None
+        return json.loads(record["prices_json"])
+
+    def leave(self):
+        """Clean shutdown: hand over leadership and our shard immediately."""
+        self.registry.release_lease(self.leader_lease, self.replica_id)
+        self.registry.leave(self.group, self.replica_id)
+        self.is_leader = False
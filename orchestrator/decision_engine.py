@@ -1,26 +1,45 @@
 # orchestrator/decision_engine.py
-import yaml
 from dataclasses import dataclass
 
+from orchestrator.config_loader import ConfigStore, SlaPolicy, default_store
+
 @dataclass
 class Decision:
     action: str
     target_region: str | None
     reason: str
+    instance_type: str | None = None
 
 class DecisionEngine:
-    def __init__(self, sla_policy_path):
-        with open(sla_policy_path) as f:
-            self.policy = yaml.safe_load(f)
-
-        # Workload thresholds: fallback if not in policy
-        self.workload_thresholds = self.policy.get("workload_thresholds", {
-            "short": None,           # never migrate
-            "medium": 0.25,          # 25%
-            "long": 0.12,            # 12%
-            "stateful": 0.40,        # 40%
-        })
-        self.default_threshold = self.policy.get("price_spike_threshold", 0.01)
+    def __init__(self, sla_policy_path=None, breakers=None, config=None):
+        # The policy is the live config snapshot's: a reloaded sla_policy.yaml applies to the next decision
+        if config is None:
+            config = default_store() if sla_policy_path is None else ConfigStore(policy_path=sla_policy_path)
+        self.config = config
+        # resilience.Breakers shared with the Migrator; regions whose breaker is open are skipped
+        self.breakers = breakers
+
+    @property
+    def policy(self) -> SlaPolicy:
+        return self.config.current.policy
+
+    @policy.setter
+    def policy(self, policy):
+        """Validate a policy mapping and swap it into the shared snapshot."""
+        self.config.replace(policy=SlaPolicy.from_dict(policy))
+
+    @property
+    def workload_thresholds(self):
+        # Fallback if not in policy: see config_loader.DEFAULT_WORKLOAD_THRESHOLDS
+        return self.policy.workload_thresholds
+
+    @property
+    def default_threshold(self):
+        return self.policy.price_spike_threshold
+
+    def threshold_for_job(self, job):
+        """Minimum price delta that justifies moving `job`; None means never move it."""
+        return self._threshold_for_job(job)
 
     def _threshold_for_job(self, job):
         if not job:
@@ -39,11 +58,14 @@ class DecisionEngine:
         # Use the max of workload-specific threshold and default spike threshold
         return max(wt_threshold, self.default_threshold)
 
+    def region_available(self, region):
+        return self.breakers is None or self.breakers.region_available(region)
+
     def evaluate(self, prices, current_region, job=None):
         current_price = prices[current_region]["price"]
 
         cheapest = min(
-            prices.items(),
+            (item for item in prices.items() if item[0] == current_region or self.region_available(item[0])),
             key=lambda x: x[1]["price"]
         )
 
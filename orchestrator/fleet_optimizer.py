@@ -0,0 +1,178 @@
+# orchestrator/fleet_optimizer.py
+"""
+Fleet-wide assignment of jobs to (region, instance type) offers.
+
+DecisionEngine.evaluate looks at one job at a time and sends each to the
+single cheapest region, which piles every job into one region regardless of
+its capacity. FleetOptimizer.plan() instead assigns all jobs at once:
+
+* each job's hourly cost on an offer is the offer price times the job's
+  dominant share of the instance (placement.demand / instance matrix);
+* offers have capacity limits (instances per region or region/type, from
+  the `fleet_optimizer.capacity` section of the SLA policy), tracked in
+  vCPU and memory, and jobs leaving an offer free their share;
+* a move must clear the job's workload threshold and pay back its cost
+  (a fixed `migration_cost` plus the job's cost during the expected
+  downtime) within `horizon_hours`;
+* offers in regions whose circuit breaker is open (`unavailable`) keep
+  their jobs but receive none;
+* moves are taken greedily by net savings per second of downtime, up to the
+  migration budget. Jobs whose best offers filled up are repaired against
+  the capacity that is left, for a few rounds.
+
+Scores are computed for all jobs and offers at once with NumPy, and only the
+best few offers per job enter the greedy pass, so 10k jobs over dozens of
+offers plan in well under a second.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from orchestrator.placement import demand
+
+TOP_OFFERS = 4
+REPAIR_ROUNDS = 3
+
+
+@dataclass
+class Move:
+    job_id: str
+    source_region: str
+    target_region: str
+    instance_type: str
+    saving_per_hour: float
+    downtime_seconds: float
+    score: float
+
+
+class FleetOptimizer:
+    def __init__(self, policy, shapes, defaults=None, threshold_fn=None):
+        cfg = policy.get("fleet_optimizer") or {}
+        self.horizon_hours = float(cfg.get("horizon_hours", 1.0))
+        self.default_downtime = float(cfg.get("default_downtime_seconds", 60.0))
+        self.migration_cost = float(cfg.get("migration_cost", 0.0))
+        self.capacity = cfg.get("capacity") or {}
+        self.max_migrations_per_hour = policy.get("max_migrations_per_hour")
+        self.shapes = shapes
+        self.defaults = defaults or {}
+        # threshold_fn(job) -> minimum per-instance price delta, or None to never move
+        self.threshold_fn = threshold_fn or (lambda job: policy.get("price_spike_threshold", 0.0))
+
+    def capacity_for(self, region, instance_type):
+        """Instance limit for an offer; None means unlimited."""
+        limit = self.capacity.get(f"{region}/{instance_type}", self.capacity.get(region, self.capacity.get("default")))
+        return None if limit is None else int(limit)
+
+    def _downtime(self, job):
+        last = job.get("last_migration") or {}
+        downtime_ms = last.get("downtime_ms") if last.get("ok") else None
+        return float(downtime_ms) / 1000.0 if downtime_ms else self.default_downtime
+
+    def plan(self, jobs, offers, budget=None, default_region=None, default_type=None, unavailable=()):
+        """
+        jobs maps job_id -> record; offers maps (region, instance_type) ->
+        hourly price. Returns Moves ordered by savings per second of downtime,
+        at most `budget` of them (None = unlimited). No job is moved into a
+        region listed in `unavailable`.
+        """
+        keys = [k for k in sorted(offers) if k[1] in self.shapes and offers[k] is not None]
+        if not keys or not jobs or budget == 0:
+            return []
+        offer_index = {k: i for i, k in enumerate(keys)}
+        price = np.array([float(offers[k]) for k in keys])
+        vcpu = np.array([self.shapes[k[1]].vcpu for k in keys])
+        memory = np.array([self.shapes[k[1]].memory_gib for k in keys])
+        limits = [self.capacity_for(*k) for k in keys]
+        free_cpu = np.array([np.inf if n is None else n * v for n, v in zip(limits, vcpu)])
+        free_mem = np.array([np.inf if n is None else n * m for n, m in zip(limits, memory)])
+
+        ids, current, cpu, mem, downtime, threshold = [], [], [], [], [], []
+        for job_id, job in jobs.items():
+            key = (job.get("region") or default_region, job.get("instance_type") or default_type)
+            if key not in offer_index:
+                continue
+            c, m = demand(job, self.defaults)
+            limit = self.threshold_fn(job)
+            if limit is None:
+                # Never moves, but still occupies its offer
+                free_cpu[offer_index[key]] -= c
+                free_mem[offer_index[key]] -= m
+                continue
+            ids.append(job_id)
+            current.append(offer_index[key])
+            cpu.append(c)
+            mem.append(m)
+            downtime.append(self._downtime(job))
+            threshold.append(limit)
+        if not ids:
+            return []
+        current = np.array(current)
+        cpu, mem = np.array(cpu), np.array(mem)
+        downtime, threshold = np.array(downtime), np.array(threshold)
+        np.subtract.at(free_cpu, current, cpu)
+        np.subtract.at(free_mem, current, mem)
+
+        # Per-job cost on every offer: price times dominant share of the instance
+        share = np.maximum(cpu[:, None] / vcpu[None, :], mem[:, None] / memory[None, :])
+        cost = price[None, :] * share
+        rows = np.arange(len(ids))
+        current_cost = cost[rows, current]
+        # A job can only move to instances it fits on
+        cost[share > 1.0] = np.inf
+        saving = current_cost[:, None] - cost
+        payback = self.migration_cost + (downtime / 3600.0 * current_cost)[:, None]
+        net = saving * self.horizon_hours - payback
+        valid = (net > 0) & ((price[current][:, None] - price[None, :]) > threshold[:, None])
+        valid[rows, current] = False
+        valid[:, [i for i, k in enumerate(keys) if k[0] in unavailable]] = False
+        score = np.where(valid, net / downtime[:, None], -np.inf)
+
+        moves = []
+        moved = np.zeros(len(ids), dtype=bool)
+        remaining = None if budget is None else int(budget)
+        candidates = rows[valid.any(axis=1)]
+        for _ in range(REPAIR_ROUNDS):
+            if not len(candidates) or remaining == 0:
+                break
+            sub = score[candidates]
+            k = min(TOP_OFFERS, len(keys))
+            top = np.argpartition(-sub, k - 1, axis=1)[:, :k] if k < len(keys) else np.tile(np.arange(len(keys)), (len(candidates), 1))
+            pair_scores = np.take_along_axis(sub, top, axis=1).ravel()
+            pair_jobs = np.repeat(candidates, top.shape[1])
+            pair_offers = top.ravel()
+            order = np.argsort(-pair_scores, kind="stable")
+            blocked = set()
+            for p in order:
+                s = pair_scores[p]
+                if s == -np.inf:
+                    break
+                j = pair_jobs[p]
+                if moved[j]:
+                    continue
+                o = pair_offers[p]
+                if free_cpu[o] < cpu[j] or free_mem[o] < mem[j]:
+                    blocked.add(j)
+                    continue
+                free_cpu[o] -= cpu[j]
+                free_mem[o] -= mem[j]
+                free_cpu[current[j]] += cpu[j]
+                free_mem[current[j]] += mem[j]
+                moved[j] = True
+                region, instance_type = keys[o]
+                moves.append(Move(
+                    ids[j], keys[current[j]][0], region, instance_type,
+                    float(saving[j, o]), float(downtime[j]), float(s),
+                ))
+                if remaining is not None:
+                    remaining -= 1
+                    if remaining == 0:
+                        break
+            # Repair: jobs whose best offers filled up try the offers that still have room
+            candidates = np.array(sorted(j for j in blocked if not moved[j]), dtype=int)
+            if len(candidates):
+                full = (free_cpu[None, :] < cpu[candidates, None]) | (free_mem[None, :] < mem[candidates, None])
+                score[candidates] = np.where(full, -np.inf, score[candidates])
+                candidates = candidates[np.isfinite(score[candidates]).any(axis=1)]
+
+        moves.sort(key=lambda m: -m.score)
+        return moves
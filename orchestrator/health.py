@@ -0,0 +1,165 @@
+# orchestrator/health.py
+"""
+Health and status HTTP server.
+
+A ThreadingHTTPServer answers each request on its own thread, so a slow
+client or a long /status never holds up liveness probes, and no request
+waits on the control loop's lock or calls AWS; everything is read from
+state the loop already keeps in memory:
+
+    GET  /healthz       liveness: event-loop heartbeat age, scheduler tasks stuck past their deadline
+    GET  /readyz        readiness: prices fresh for every region, registry synced recently
+    GET  /status        in-flight migrations, per-region prices, per-job decisions
+                        (?job=<id> for one job, ?limit=N decisions, default 100)
+    GET  /metrics       Prometheus text format
+    POST /interruption  worker spot-interruption notifications
+
+/healthz and /readyz answer 503 with the failing checks in the body.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from orchestrator import metrics
+
+DEFAULT_STATUS_LIMIT = 100
+
+
+class Health:
+    """
+    Liveness, readiness and status of one orchestrator, from the scheduler
+    and the ControlLoop. Either may be None (then its checks are skipped).
+    """
+
+    def __init__(self, scheduler=None, loop=None, heartbeat_timeout=30.0, price_max_age=90.0, sync_max_age=60.0):
+        self.scheduler = scheduler
+        self.loop = loop
+        self.heartbeat_timeout = heartbeat_timeout
+        self.price_max_age = price_max_age
+        self.sync_max_age = sync_max_age
+
+    def liveness(self):
+        """(ok, body)"""
+        body = {}
+        problems = []
+        if self.scheduler is not None:
+            age = self.scheduler.heartbeat_age()
+            body["heartbeat_age_s"] = None if age is None else round(age, 2)
+            if age is None or age > self.heartbeat_timeout:
+                problems.append("event loop heartbeat stale")
+            stalled = self.scheduler.stalled(self.heartbeat_timeout)
+            if stalled:
+                body["stalled_tasks"] = stalled
+                problems.append("scheduler tasks stalled")
+        return self._result(problems, body)
+
+    def readiness(self):
+        """(ok, body)"""
+        body = {}
+        problems = []
+        loop = self.loop
+        if loop is not None:
+            age = loop.price_age()
+            body["price_age_s"] = None if age is None else round(age, 1)
+            missing = sorted(set(loop.watcher.regions) - (loop.prices or {}).keys())
+            if age is None or age > self.price_max_age:
+                problems.append("prices stale")
+            if missing:
+                body["missing_regions"] = missing
+                problems.append("prices missing for some regions")
+            sync_age = None if loop.last_sync is None else time.time() - loop.last_sync
+            body["registry_sync_age_s"] = None if sync_age is None else round(sync_age, 1)
+            if sync_age is None or sync_age > self.sync_max_age:
+                problems.append("registry not synced recently")
+        return self._result(problems, body)
+
+    def status(self, job_id=None, limit=DEFAULT_STATUS_LIMIT):
+        body = {}
+        if self.loop is not None:
+            body.update(self.loop.status_snapshot(job_id=job_id, limit=limit))
+        if self.scheduler is not None:
+            body["scheduler"] = self.scheduler.status()
+        return body
+
+    @staticmethod
+    def _result(problems, body):
+        body["status"] = "ok" if not problems else "fail"
+        if problems:
+            body["problems"] = problems
+        return not problems, body
+
+
+class HealthHandler(BaseHTTPRequestHandler):
+    # A client that stops sending gives up its thread after this many seconds
+    timeout = 10
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        health = getattr(self.server, "health", None) or Health()
+        if url.path == "/metrics":
+            return self._reply_text(200, metrics.render(), metrics.CONTENT_TYPE)
+        if url.path in ("/", "/healthz"):
+            ok, body = health.liveness()
+            return self._reply(200 if ok else 503, body)
+        if url.path == "/readyz":
+            ok, body = health.readiness()
+            return self._reply(200 if ok else 503, body)
+        if url.path == "/status":
+            query = parse_qs(url.query)
+            try:
+                limit = int(query.get("limit", [DEFAULT_STATUS_LIMIT])[0])
+            except ValueError:
+                return self._reply(400, {"error": "limit must be an integer"})
+            body = health.status(job_id=query.get("job", [None])[0], limit=limit)
+            status_fn = getattr(self.server, "status_fn", None)
+            if status_fn:
+                body.update(status_fn())
+            return self._reply(200, body)
+        self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        # Worker spot-interruption notifications (worker/interruption_watcher.py)
+        handler = getattr(self.server, "interruption_fn", None)
+        if self.path != "/interruption" or handler is None:
+            return self._reply(404, {"error": "not found"})
+        token = getattr(self.server, "interruption_token", None)
+        if token and self.headers.get("X-Notify-Token") != token:
+            return self._reply(403, {"error": "forbidden"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(payload, dict):
+                return self._reply(400, {"error": "payload must be a JSON object"})
+            handler(payload)
+        except (ValueError, TypeError) as e:
+            return self._reply(400, {"error": str(e)})
+        self._reply(202, {"status": "accepted"})
+
+    def _reply(self, code, body):
+        self._reply_text(code, json.dumps(body, default=str), "application/json")
+
+    def _reply_text(self, code, text, content_type):
+        data = text.encode()
+        self.send_response(code)
+        self.send_header("Content-type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # suppress default stdout logging
+        return
+
+
+def start_health_server(port=8080, status_fn=None, interruption_fn=None, interruption_token=None, health=None):
+    server = ThreadingHTTPServer(("0.0.0.0", port), HealthHandler)
+    server.daemon_threads = True
+    server.health = health
+    server.status_fn = status_fn
+    server.interruption_fn = interruption_fn
+    server.interruption_token = interruption_token
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
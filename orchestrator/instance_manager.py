@@ -1,5 +1,342 @@
 # orchestrator/instance_manager.py
+"""
+Spot instance provisioning.
+
+Concurrent migrations into the same region share launch calls: a
+BatchProvisioner collects requests for `window` seconds, then launches each
+(region, launch spec) group with a single run_instances (MinCount=MaxCount=n)
+or, in "fleet" mode, a single instant CreateFleet whose overrides spread the
+request over several instance types (diversified capacity pools). One poller
+thread tracks every pending instance with batched describe_instances calls
+per region instead of a waiter per instance.
+
+provision_instance() keeps its old signature and blocks as before, but goes
+through a shared provisioner so simultaneous callers are coalesced.
+
+Every instance is tagged (MANAGED_TAG), so ones no job refers to any more
+can be found and reaped (Migrator.reap_orphans).
+"""
+import hashlib
+import logging
+import re
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
 import boto3
+from botocore.exceptions import ClientError
+
+log = logging.getLogger("orchestrator.instance_manager")
+
+DESCRIBE_CHUNK = 1000
+LAUNCH_MODES = ("run_instances", "fleet")
+CAPACITY_ERRORS = ("InsufficientInstanceCapacity", "InstanceLimitExceeded", "MaxSpotInstanceCountExceeded", "SpotMaxPriceTooLow")
+FAILED_STATES = ("shutting-down", "terminated", "stopping", "stopped")
+MANAGED_TAG = {"Key": "spot-arbitrage", "Value": "worker"}
+# provision() waits this much longer than the launch window and poll timeout
+RESULT_MARGIN = 60.0
+_INSTANCE_ID = re.compile(r"i-[0-9a-f]+")
+
+
+class BatchProvisioner:
+    def __init__(
+        self,
+        window=0.25,
+        poll_interval=5.0,
+        timeout=600.0,
+        mode="run_instances",
+        client_factory=None,
+    ):
+        if mode not in LAUNCH_MODES:
+            raise ValueError(f"unknown launch mode {mode!r}")
+        self.window = window
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.mode = mode
+        self.client_factory = client_factory or (lambda region: boto3.client("ec2", region_name=region))
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._queued = {}       # group key -> [(spec, future)]
+        self._pending = {}      # region -> {instance_id: (future, deadline)}
+        self._poller = None
+        self._templates = {}
+
+    def _client(self, region):
+        with self._lock:
+            if region not in self._clients:
+                self._clients[region] = self.client_factory(region)
+            return self._clients[region]
+
+    # ------------------------------------------------------------------
+    # Requests
+    # ------------------------------------------------------------------
+    def submit(
+        self,
+        region,
+        ami_id,
+        security_group_id,
+        key_name,
+        instance_type,
+        max_spot_price=None,
+        alternative_types=(),
+    ):
+        """
+        Queue one instance. Returns a Future resolving to
+        (instance_id, public_ip, public_dns) once the instance is running.
+        """
+        spec = {
+            "region": region,
+            "ami_id": ami_id,
+            "security_group_id": security_group_id,
+            "key_name": key_name,
+            "instance_type": instance_type,
+            "max_spot_price": max_spot_price,
+            "alternative_types": tuple(alternative_types or ()),
+        }
+        key = tuple(sorted(spec.items()))
+        future = Future()
+        with self._lock:
+            group = self._queued.setdefault(key, [])
+            group.append(future)
+            leader = len(group) == 1
+        if leader:
+            # The first request of a group launches it after the window
+            timer = threading.Timer(self.window, self._launch, args=(key, spec))
+            timer.daemon = True
+            timer.start()
+        return future
+
+    def provision(self, *args, **kwargs):
+        """Blocking submit(): returns (instance_id, public_ip, public_dns)."""
+        wait = self.timeout + self.window + self.poll_interval + RESULT_MARGIN
+        try:
+            return self.submit(*args, **kwargs).result(timeout=wait)
+        except FutureTimeout:
+            raise TimeoutError(f"no running instance after {wait:.0f}s") from None
+
+    # ------------------------------------------------------------------
+    # Launch
+    # ------------------------------------------------------------------
+    def _launch(self, key, spec):
+        with self._lock:
+            futures = self._queued.pop(key, [])
+        if not futures:
+            return
+        region = spec["region"]
+        try:
+            if self.mode == "fleet":
+                instance_ids = self._create_fleet(spec, len(futures))
+            else:
+                instance_ids = self._run_instances(spec, len(futures))
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        log.info("Launched %d/%d %s instances in %s (%s)", len(instance_ids), len(futures), spec["instance_type"], region, self.mode)
+
+        shortfall = futures[len(instance_ids):]
+        for future in shortfall:
+            future.set_exception(RuntimeError(f"no spot capacity for {spec['instance_type']} in {region}"))
+        deadline = time.monotonic() + self.timeout
+        with self._lock:
+            pending = self._pending.setdefault(region, {})
+            for instance_id, future in zip(instance_ids, futures):
+                pending[instance_id] = (future, deadline)
+            if self._poller is None or not self._poller.is_alive():
+                self._poller = threading.Thread(target=self._poll_loop, name="instance-poller", daemon=True)
+                self._poller.start()
+
+    def _spot_options(self, spec):
+        options = {"SpotInstanceType": "one-time"}
+        if spec["max_spot_price"]:
+            options["MaxPrice"] = str(spec["max_spot_price"])
+        return options
+
+    def _run_instances(self, spec, count):
+        """One call for the whole group; falls back to a partial fill if the pool is short."""
+        ec2 = self._client(spec["region"])
+        launch_spec = {
+            "ImageId": spec["ami_id"],
+            "InstanceType": spec["instance_type"],
+            "KeyName": spec["key_name"],
+            "SecurityGroupIds": [spec["security_group_id"]],
+            "InstanceMarketOptions": {"MarketType": "spot", "SpotOptions": self._spot_options(spec)},
+            "TagSpecifications": [{"ResourceType": "instance", "Tags": [MANAGED_TAG]}],
+        }
+        try:
+            resp = ec2.run_instances(MinCount=count, MaxCount=count, **launch_spec)
+        except ClientError as e:
+            if count == 1 or e.response.get("Error", {}).get("Code") not in CAPACITY_ERRORS:
+                raise
+            resp = ec2.run_instances(MinCount=1, MaxCount=count, **launch_spec)
+        return [i["InstanceId"] for i in resp["Instances"]]
+
+    def _launch_template(self, spec):
+        """Launch template shared by every fleet with the same image, key and security group."""
+        ec2 = self._client(spec["region"])
+        digest = hashlib.sha1(f"{spec['ami_id']}|{spec['key_name']}|{spec['security_group_id']}".encode()).hexdigest()[:12]
+        name = f"spot-arbitrage-{digest}"
+        cache_key = (spec["region"], name)
+        if cache_key not in self._templates:
+            try:
+                ec2.create_launch_template(
+                    LaunchTemplateName=name,
+                    LaunchTemplateData={
+                        "ImageId": spec["ami_id"],
+                        "KeyName": spec["key_name"],
+                        "SecurityGroupIds": [spec["security_group_id"]],
+                        "TagSpecifications": [{"ResourceType": "instance", "Tags": [MANAGED_TAG]}],
+                    },
+                )
+            except ClientError as e:
+                if "AlreadyExists" not in e.response.get("Error", {}).get("Code", ""):
+                    raise
+            self._templates[cache_key] = name
+        return name
+
+    def _create_fleet(self, spec, count):
+        """Instant fleet over the requested type and its alternatives (price-capacity-optimized)."""
+        ec2 = self._client(spec["region"])
+        types = [spec["instance_type"], *[t for t in spec["alternative_types"] if t != spec["instance_type"]]]
+        overrides = []
+        for instance_type in types:
+            override = {"InstanceType": instance_type}
+            if spec["max_spot_price"]:
+                override["MaxPrice"] = str(spec["max_spot_price"])
+            overrides.append(override)
+        resp = ec2.create_fleet(
+            Type="instant",
+            TargetCapacitySpecification={"TotalTargetCapacity": count, "DefaultTargetCapacityType": "spot"},
+            SpotOptions={"AllocationStrategy": "price-capacity-optimized"},
+            LaunchTemplateConfigs=[{
+                "LaunchTemplateSpecification": {"LaunchTemplateName": self._launch_template(spec), "Version": "$Latest"},
+                "Overrides": overrides,
+            }],
+        )
+        for error in resp.get("Errors", []):
+            log.warning("CreateFleet in %s: %s %s", spec["region"], error.get("ErrorCode"), error.get("ErrorMessage"))
+        return [i for group in resp.get("Instances", []) for i in group.get("InstanceIds", [])]
+
+    # ------------------------------------------------------------------
+    # Tracking
+    # ------------------------------------------------------------------
+    def _describe(self, region, instance_ids):
+        """
+        {instance_id: instance} in DESCRIBE_CHUNK batches. IDs EC2 does not
+        know (yet: new instances can be briefly invisible) are left out
+        without dropping the rest of their batch.
+        """
+        found = {}
+        for start in range(0, len(instance_ids), DESCRIBE_CHUNK):
+            chunk = list(instance_ids[start:start + DESCRIBE_CHUNK])
+            while chunk:
+                try:
+                    resp = self._client(region).describe_instances(InstanceIds=chunk)
+                except ClientError as e:
+                    error = e.response.get("Error", {})
+                    if error.get("Code") != "InvalidInstanceID.NotFound":
+                        raise
+                    missing = set(_INSTANCE_ID.findall(error.get("Message", ""))) & set(chunk)
+                    if not missing:
+                        # Message names no IDs we asked for: look them up one at a time
+                        if len(chunk) > 1:
+                            for instance_id in chunk:
+                                found.update(self._describe(region, [instance_id]))
+                        break
+                    chunk = [i for i in chunk if i not in missing]
+                    continue
+                for reservation in resp["Reservations"]:
+                    for instance in reservation["Instances"]:
+                        found[instance["InstanceId"]] = instance
+                break
+        return found
+
+    def poll_once(self):
+        """One batched describe_instances per region with pending instances."""
+        with self._lock:
+            snapshot = {region: dict(pending) for region, pending in self._pending.items() if pending}
+        now = time.monotonic()
+        for region, pending in snapshot.items():
+            try:
+                found = self._describe(region, list(pending))
+            except Exception as e:
+                # Throttling or an unreachable endpoint: deadlines still apply
+                log.warning("describe_instances in %s failed: %s", region, e)
+                found = {}
+            done = []
+            expired = []
+            for instance_id, (future, deadline) in pending.items():
+                instance = found.get(instance_id)
+                state = instance["State"]["Name"] if instance else None
+                if state == "running":
+                    future.set_result((instance_id, instance.get("PublicIpAddress"), instance.get("PublicDnsName")))
+                elif state in FAILED_STATES:
+                    future.set_exception(RuntimeError(f"instance {instance_id} in {region} is {state}"))
+                elif now >= deadline:
+                    future.set_exception(TimeoutError(f"instance {instance_id} in {region} not running after {self.timeout}s"))
+                    expired.append(instance_id)
+                else:
+                    continue
+                done.append(instance_id)
+            with self._lock:
+                for instance_id in done:
+                    self._pending[region].pop(instance_id, None)
+            if expired:
+                # Nobody will use them; don't leave them running
+                try:
+                    self.terminate(region, expired)
+                except Exception as e:
+                    log.warning("Could not terminate timed-out instances %s in %s: %s", expired, region, e)
+
+    def instance_states(self, region, instance_ids):
+        """{instance_id: state name}; instances EC2 no longer knows are left out."""
+        return {
+            instance_id: instance["State"]["Name"]
+            for instance_id, instance in self._describe(region, list(instance_ids)).items()
+        }
+
+    def managed_instances(self, region):
+        """Pending or running instances carrying MANAGED_TAG in `region`."""
+        paginator = self._client(region).get_paginator("describe_instances")
+        filters = [
+            {"Name": f"tag:{MANAGED_TAG['Key']}", "Values": [MANAGED_TAG["Value"]]},
+            {"Name": "instance-state-name", "Values": ["pending", "running"]},
+        ]
+        return [
+            instance
+            for page in paginator.paginate(Filters=filters)
+            for reservation in page["Reservations"]
+            for instance in reservation["Instances"]
+        ]
+
+    def terminate(self, region, instance_ids):
+        if instance_ids:
+            self._client(region).terminate_instances(InstanceIds=list(instance_ids))
+
+    def _poll_loop(self):
+        while True:
+            try:
+                self.poll_once()
+            except Exception:
+                log.exception("Instance poll failed")
+            with self._lock:
+                if not any(self._pending.values()):
+                    self._poller = None
+                    return
+            time.sleep(self.poll_interval)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_provisioner():
+    """Process-wide provisioner, so every migration thread shares launch calls."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = BatchProvisioner()
+        return _default
 
 
 def provision_instance(
@@ -10,39 +347,18 @@ def provision_instance(
     instance_type: str,
     max_spot_price: str | None = None,
     profile: str | None = None,
+    alternative_types=(),
 ):
     """
     Provision a spot instance and return (instance_id, public_ip, public_dns).
     """
-    session = boto3.Session(profile_name=profile, region_name=region) if profile else boto3.Session(region_name=region)
-    ec2 = session.client("ec2", region_name=region)
-
-    launch_spec = {
-        "ImageId": ami_id,
-        "InstanceType": instance_type,
-        "KeyName": key_name,
-        "SecurityGroupIds": [security_group_id],
-        "InstanceMarketOptions": {
-            "MarketType": "spot",
-            "SpotOptions": {
-                "SpotInstanceType": "one-time",
-            },
-        },
-    }
-    if max_spot_price:
-        launch_spec["InstanceMarketOptions"]["SpotOptions"]["MaxPrice"] = max_spot_price
-
-    resp = ec2.run_instances(MinCount=1, MaxCount=1, **launch_spec)
-    instance = resp["Instances"][0]
-    instance_id = instance["InstanceId"]
-
-    waiter = ec2.get_waiter("instance_running")
-    waiter.wait(InstanceIds=[instance_id])
-
-    desc = ec2.describe_instances(InstanceIds=[instance_id])
-    inst = desc["Reservations"][0]["Instances"][0]
-    public_ip = inst.get("PublicIpAddress")
-    public_dns = inst.get("PublicDnsName")
-
-    return instance_id, public_ip, public_dns
-
+    if profile:
+        provisioner = BatchProvisioner(
+            client_factory=lambda r: boto3.Session(profile_name=profile, region_name=r).client("ec2", region_name=r)
+        )
+    else:
+        provisioner = default_provisioner()
+    return provisioner.provision(
+        region, ami_id, security_group_id, key_name, instance_type,
+        max_spot_price=max_spot_price, alternative_types=alternative_types,
+    )
@@ -0,0 +1,271 @@
+# orchestrator/job_index.py
+"""
+In-memory job state of the control loop.
+
+Registry records (DynamoDB items with Decimal numbers, or JSON dicts) are
+reduced once, when a change arrives, to a Job: the fields the orchestrator
+decides on, in __slots__, with numbers converted and repeated strings
+interned. A JobTable holds them in rows, with region and workload type
+also kept as category codes in typed arrays: evaluation reads a job's
+region from its column and skips workload types the engine never migrates
+without touching the Job. JobIndex keeps the table current from the
+registry change feed, one change at a time.
+"""
+import sys
+from array import array
+from collections.abc import Mapping
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _float(value):
+    return None if value is None or value == "" else float(value)
+
+
+class Job:
+    """
+    One job as the orchestrator sees it. get() and [] behave like the
+    registry record's, so placement and the engines accept either.
+    """
+
+    __slots__ = (
+        "job_id", "state", "version", "region", "workload_type", "instance_type",
+        "public_ip", "cpu", "memory_gib", "checkpoint_dir", "last_migration",
+    )
+
+    def __init__(
+        self,
+        job_id,
+        state=None,
+        version=0,
+        region=None,
+        workload_type=None,
+        instance_type=None,
+        public_ip=None,
+        cpu=None,
+        memory_gib=None,
+        checkpoint_dir=None,
+        last_migration=None,
+    ):
+        self.job_id = job_id
+        self.state = state
+        self.version = version
+        self.region = region
+        self.workload_type = workload_type
+        self.instance_type = instance_type
+        self.public_ip = public_ip
+        self.cpu = cpu
+        self.memory_gib = memory_gib
+        # Set for jobs hosted by worker/job_host.py; packing keeps the rest apart
+        self.checkpoint_dir = checkpoint_dir
+        # Migration summary (tracing.MigrationTrace); only the fleet optimizer reads it
+        self.last_migration = last_migration
+
+    @classmethod
+    def from_record(cls, record, job_id=None):
+        return cls(
+            _intern(job_id or record.get("job_id")),
+            state=_intern(record.get("state")),
+            version=int(record.get("version") or 0),
+            region=_intern(record.get("region")),
+            workload_type=_intern(record.get("workload_type")),
+            instance_type=_intern(record.get("instance_type")),
+            public_ip=record.get("public_ip"),
+            cpu=_float(record.get("cpu")),
+            memory_gib=_float(record.get("memory_gib")),
+            checkpoint_dir=record.get("checkpoint_dir"),
+            last_migration=record.get("last_migration"),
+        )
+
+    def _values(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def get(self, name, default=None):
+        value = getattr(self, name) if name in _FIELDS else None
+        return default if value is None else value
+
+    def __getitem__(self, name):
+        if name not in _FIELDS:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __eq__(self, other):
+        return isinstance(other, Job) and self._values() == other._values()
+
+    def __repr__(self):
+        return f"Job({self.job_id!r}, state={self.state!r}, version={self.version}, region={self.region!r})"
+
+
+_FIELDS = frozenset(Job.__slots__)
+
+
+class Categories:
+    """Distinct values of one column, each given a small integer code."""
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def find(self, value):
+        """Code of value, or None if no row ever had it."""
+        return self._codes.get(value)
+
+    def __getitem__(self, code):
+        return self.values[code]
+
+    def __len__(self):
+        return len(self.values)
+
+
+class JobTable(Mapping):
+    """
+    Jobs in rows. Column arrays hold each row's region and workload type
+    codes (-1 for a free row); rows of removed jobs are reused. Reads as a
+    mapping job_id -> Job.
+    """
+
+    def __init__(self):
+        self.regions = Categories()
+        self.workloads = Categories()
+        self.rows = {}          # job_id -> row
+        self.records = []       # row -> Job, or None for a free row
+        self.region = array("i")
+        self.workload = array("i")
+        self._free = []
+
+    def __getitem__(self, job_id):
+        return self.records[self.rows[job_id]]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, job_id):
+        return job_id in self.rows
+
+    def put(self, job, region):
+        """Insert or replace job's row; `region` is its effective region. Returns the row."""
+        row = self.rows.get(job.job_id)
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+            else:
+                row = len(self.records)
+                self.records.append(None)
+                for column in (self.region, self.workload):
+                    column.append(-1)
+            self.rows[job.job_id] = row
+        self.records[row] = job
+        self.region[row] = self.regions.code(region)
+        self.workload[row] = self.workloads.code(job.workload_type)
+        return row
+
+    def remove(self, job_id):
+        row = self.rows.pop(job_id)
+        self.records[row] = None
+        for column in (self.region, self.workload):
+            column[row] = -1
+        self._free.append(row)
+        return row
+
+    def region_of(self, job_id):
+        return self.regions[self.region[self.rows[job_id]]]
+
+
+class JobIndex:
+    """
+    In-memory view of the jobs the orchestrator manages, kept current from a
+    registry change feed instead of re-listing the registry every tick.
+
+    Only jobs whose state is in `states` (and, in single-job mode, whose id is
+    in `job_ids`) are kept. Inserts and changes mark the job dirty so the next
+    evaluation pass picks it up. `jobs` is the JobTable.
+    """
+
+    def __init__(self, states, default_region=None, job_ids=None):
+        self.states = set(states)
+        self.default_region = default_region
+        self.job_ids = set(job_ids) if job_ids else None
+        self.jobs = JobTable()
+        self.by_region = {}     # region code -> job ids
+        self.dirty = set()
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def __contains__(self, job_id):
+        return job_id in self.jobs
+
+    def region_of(self, job):
+        return job.get("region") or self.default_region
+
+    def _put(self, job):
+        table = self.jobs
+        row = table.rows.get(job.job_id)
+        if row is not None:
+            self.by_region[table.region[row]].discard(job.job_id)
+        row = table.put(job, self.region_of(job))
+        self.by_region.setdefault(table.region[row], set()).add(job.job_id)
+
+    def _remove(self, job_id):
+        row = self.jobs.rows[job_id]
+        self.by_region[self.jobs.region[row]].discard(job_id)
+        self.jobs.remove(job_id)
+        self.dirty.discard(job_id)
+
+    def apply(self, job_id, record):
+        """
+        Apply one change. record=None (deleted) or a state outside `states`
+        drops the job. Returns True if the index changed.
+        """
+        if self.job_ids is not None and job_id not in self.job_ids:
+            return False
+        if record is None or record.get("state") not in self.states:
+            if job_id not in self.jobs:
+                return False
+            self._remove(job_id)
+            return True
+        job = record if isinstance(record, Job) else Job.from_record(record, job_id)
+        if self.jobs.get(job_id) == job:
+            return False
+        self._put(job)
+        self.dirty.add(job_id)
+        return True
+
+    def load(self, records):
+        """
+        Full resync from a listing. Jobs absent from `records` are dropped;
+        only records that actually differ are marked dirty.
+        """
+        seen = set()
+        for record in records:
+            job_id = record.get("job_id")
+            if not job_id:
+                continue
+            seen.add(job_id)
+            self.apply(job_id, record)
+        for job_id in list(self.jobs.keys() - seen):
+            self._remove(job_id)
+
+    def in_regions(self, regions):
+        ids = set()
+        for region in regions:
+            code = self.jobs.regions.find(region)
+            if code is not None:
+                ids |= self.by_region.get(code, set())
+        return ids
+
+    def take_dirty(self):
+        dirty, self.dirty = self.dirty, set()
+        return dirty
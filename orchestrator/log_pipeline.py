@@ -0,0 +1,134 @@
+# orchestrator/log_pipeline.py
+"""
+Logging off the control loop's threads.
+
+start() moves the root logger's handlers (from config/logging.yaml) behind
+a QueueListener: loggers only append the record to a bounded queue and a
+background thread formats and writes it. The message and any traceback
+are rendered before the record is queued, as QueueHandler.prepare does,
+so arguments the caller changes afterwards are logged as they were and no
+traceback frames stay referenced from the queue. When the writer falls
+behind and the queue is full, records are dropped and counted
+(spot_log_records_dropped_total) instead of blocking the loop.
+
+JsonFormatter writes one compact JSON object per line; structured events
+(tracing.emit, extra={"event": {...}}) are written as their fields.
+
+Sampler limits routine per-job lines to a rate and reports how many it
+held back in the next line it lets through.
+"""
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+from orchestrator.metrics import LOG_RECORDS_DROPPED, LOG_LINES_SAMPLED
+
+QUEUE_SIZE = 10000
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, msg (or the event's fields)."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        event = getattr(record, "event", None)
+        if isinstance(event, dict):
+            entry.update(event)
+        else:
+            entry["msg"] = record.getMessage()
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, separators=(",", ":"), default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: a full queue drops the record."""
+
+    _tracebacks = logging.Formatter()
+
+    def prepare(self, record):
+        # Like QueueHandler.prepare, but the traceback stays apart from the
+        # message (exc_text), for JsonFormatter's "exc" and plain formatters alike
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or self._tracebacks.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+def start(logger=None, queue_size=QUEUE_SIZE):
+    """
+    Put a queue in front of logger's (default: root) handlers. Returns the
+    started QueueListener; stop() it at shutdown to flush what is queued.
+    """
+    logger = logger or logging.getLogger()
+    handlers = list(logger.handlers)
+    records = queue.Queue(maxsize=queue_size)
+    for handler in handlers:
+        logger.removeHandler(handler)
+    logger.addHandler(DroppingQueueHandler(records))
+    listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+class Sampler:
+    """
+    At most `rate` lines per second (bursts up to `burst`) for one kind of
+    routine log line. allow() says whether to log this one; suppressed()
+    returns and resets how many were held back since the last allowed line.
+    """
+
+    def __init__(self, kind, rate=5.0, burst=20, clock=time.monotonic):
+        self.kind = kind
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._tokens = float(burst)
+        self._last = clock()
+        self._suppressed = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            self._suppressed += 1
+        LOG_LINES_SAMPLED.labels(self.kind).inc()
+        return False
+
+    def suppressed(self):
+        with self._lock:
+            count, self._suppressed = self._suppressed, 0
+            return count
+
+    def log(self, logger, level, msg, *args):
+        """logger.log(level, msg, *args) if allowed, noting how many lines were held back before it."""
+        if not logger.isEnabledFor(level) or not self.allow():
+            return
+        held = self.suppressed()
+        if held:
+            msg, args = msg + " (%d similar lines suppressed)", args + (held,)
+        logger.log(level, msg, *args)
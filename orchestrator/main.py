@@ -1,49 +1,43 @@
 # orchestrator/main.py
 import argparse
+import asyncio
 import logging
 import logging.config
-import time
+import os
+import signal
+import socket
 import yaml
-import threading
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from concurrent.futures import ThreadPoolExecutor
 
 from orchestrator.watcher import SpotPriceWatcher
 from orchestrator.decision_engine import DecisionEngine
 from orchestrator.migrator import Migrator
-from orchestrator.config_loader import load_runtime_config
+from orchestrator.config_loader import ConfigStore, RUNTIME_CONFIG_PATH
+from orchestrator.control_loop import ControlLoop
+from orchestrator.coordinator import Coordinator
+from orchestrator.fleet_optimizer import FleetOptimizer
+from orchestrator.health import Health, start_health_server
+from orchestrator.placement import INSTANCE_MATRIX_PATH, load_instance_matrix
+from orchestrator import log_pipeline, metrics
+from orchestrator.scheduler import Scheduler
 from storage.job_registry import JobRegistry
 from storage.dynamo_registry import DynamoRegistry
 
 
 def load_logging_config(path="config/logging.yaml"):
+    """
+    Configure handlers from `path`, then move them behind a background
+    writer (log_pipeline.start). Returns the QueueListener to stop at exit.
+    """
     try:
         with open(path) as f:
             cfg = yaml.safe_load(f)
         logging.config.dictConfig(cfg)
     except Exception:
-        logging.basicConfig(
-            level=logging.INFO,
-            format='{"time":"%(asctime)s","level":"%(levelname)s","name":"%(name)s","msg":"%(message)s"}',
-        )
-
-
-class HealthHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        self.send_response(200)
-        self.send_header("Content-type", "application/json")
-        self.end_headers()
-        self.wfile.write(b'{"status":"ok"}')
-
-    def log_message(self, format, *args):
-        # suppress default stdout logging
-        return
-
-
-def start_health_server(port=8080):
-    server = HTTPServer(("0.0.0.0", port), HealthHandler)
-    thread = threading.Thread(target=server.serve_forever, daemon=True)
-    thread.start()
-    return server
+        handler = logging.StreamHandler()
+        handler.setFormatter(log_pipeline.JsonFormatter())
+        logging.basicConfig(level=logging.INFO, handlers=[handler])
+    return log_pipeline.start()
 
 
 def main():
@@ -54,7 +48,10 @@ def main():
     parser.add_argument("--instance-type", help="Instance type; defaults to runtime config instance_type")
     parser.add_argument("--policy", default="orchestrator/sla_policy.yaml", help="SLA policy path")
     parser.add_argument("--registry-path", default="storage/job_registry.json", help="Path to job registry JSON")
-    parser.add_argument("--interval", type=int, default=60, help="Poll interval seconds (default 60)")
+    parser.add_argument("--interval", type=int, default=60, help="Max seconds between evaluation passes; price or job changes trigger one immediately (default 60)")
+    parser.add_argument("--price-interval", type=int, default=30, help="Per-region spot price poll interval seconds (default 30)")
+    parser.add_argument("--sync-interval", type=int, default=5, help="Registry change-feed poll interval seconds (default 5)")
+    parser.add_argument("--max-concurrent-migrations", type=int, default=4, help="Migrations run in parallel worker threads (default 4)")
     parser.add_argument("--migrate", action="store_true", help="If set, trigger migrator when decision is MIGRATE")
     parser.add_argument("--cooldown-seconds", type=int, default=10800, help="Min seconds between migrations for a job (default 3h)")
     parser.add_argument("--target-ip", help="Optional target worker IP to skip prompt")
@@ -63,21 +60,36 @@ def main():
     parser.add_argument("--target-ami-id", help="Override target AMI ID")
     parser.add_argument("--target-sg-id", help="Override target security group ID")
     parser.add_argument("--max-spot-price", help="Override max spot price for provisioning")
-    parser.add_argument("--health-port", type=int, default=8080, help="Health check HTTP port (default 8080)")
+    parser.add_argument("--health-port", type=int, default=8080, help="Health check HTTP port: /healthz, /readyz, /status, /metrics (default 8080)")
+    parser.add_argument("--liveness-timeout", type=float, default=30, help="/healthz fails when the event loop has not run, or a task has overrun its deadline, for this many seconds (default 30)")
     parser.add_argument("--multi-job", action="store_true", help="Enable multi-job mode (iterate over all RUNNING jobs)")
     parser.add_argument("--states", default="RUNNING", help="Comma-separated states to include in multi-job mode (default RUNNING)")
+    parser.add_argument("--interruption-token", help="Shared secret required in X-Notify-Token on POST /interruption (or env INTERRUPTION_TOKEN)")
+    parser.add_argument("--resync-seconds", type=int, default=300, help="Full registry re-list interval; the change feed covers ticks in between (default 300)")
+    parser.add_argument("--ha", action="store_true", help="Run as one of several replicas: leader-elected price polling, jobs sharded by consistent hashing")
+    parser.add_argument("--replica-id", default=None, help="Unique replica name in --ha mode (default <hostname>-<pid>)")
+    parser.add_argument("--lease-ttl", type=float, default=15.0, help="Leader lease and membership heartbeat TTL seconds in --ha mode (default 15)")
+    parser.add_argument("--pack", action="store_true", help="Bin-pack jobs bound for a region by CPU/memory onto shared instances; co-located jobs move in one pass")
+    parser.add_argument("--instance-matrix", default=INSTANCE_MATRIX_PATH, help="Instance type capacities for --pack and --fleet-optimizer (default %(default)s)")
+    parser.add_argument("--resume-interval", type=float, default=120, help="Seconds between scans for journaled migrations left unfinished by a crash or failed step (default 120)")
+    parser.add_argument("--reap-orphans", type=float, default=None, metavar="SECONDS", help="Hourly, terminate tagged instances older than SECONDS that no job or journal refers to")
+    parser.add_argument("--fleet-optimizer", action="store_true", help="Assign all jobs at once under regional capacity and the max_migrations_per_hour budget instead of per-job decisions")
+    parser.add_argument("--config-reload-interval", type=float, default=10, help="Seconds between checks of runtime.yaml and the SLA policy for changes; 0 disables hot reload (default 10)")
     args = parser.parse_args()
 
-    load_logging_config()
+    log_listener = load_logging_config()
+    metrics.LOG_QUEUE_DEPTH.set_function(lambda: log_listener.queue.qsize())
     log = logging.getLogger("orchestrator.main")
 
-    cfg = load_runtime_config()
+    # One validated snapshot of runtime.yaml + the SLA policy, shared by every component
+    config = ConfigStore(RUNTIME_CONFIG_PATH, args.policy)
+    cfg = config.current.runtime
 
     regions = []
     if args.regions:
         regions = [r.strip() for r in args.regions.split(",") if r.strip()]
     elif cfg.get("raw", {}).get("candidate_regions"):
-        regions = cfg["raw"]["candidate_regions"]
+        regions = list(cfg["raw"]["candidate_regions"])
     else:
         raise SystemExit("No regions provided (pass --regions or set candidate_regions in config/runtime.yaml)")
 
@@ -86,7 +98,6 @@ def main():
         raise SystemExit("instance_type not set (pass --instance-type or set in config/runtime.yaml)")
 
     watcher = SpotPriceWatcher(regions=regions, instance_type=instance_type)
-    engine = DecisionEngine(args.policy)
     # Select registry backend
     if cfg.get("registry_backend") == "dynamo" and cfg.get("dynamodb_table"):
         registry = DynamoRegistry(cfg["dynamodb_table"], region_name=cfg.get("dynamodb_region"))
@@ -94,22 +105,89 @@ def main():
     else:
         registry = JobRegistry(args.registry_path)
         log.info("Using JSON registry: %s", args.registry_path)
-    migrator = Migrator(registry)
+    metrics.instrument_registry(registry)
+    migrator = Migrator(registry, config=config)
+    # Regions the migrator's circuit breakers cut off are skipped by decisions
+    engine = DecisionEngine(breakers=migrator.breakers, config=config)
 
     # Validate mode
     if not args.multi_job:
         if not args.job_id or not args.current_region:
             raise SystemExit("Single-job mode requires --job-id and --current-region")
-    else:
-        if cfg.get("registry_backend") != "dynamo":
-            raise SystemExit("Multi-job mode requires DynamoDB backend")
 
-    # Per-job cooldown tracker
-    last_migration_ts = {}
-    price_cache = {"ts": 0, "data": None}
-    price_cache_ttl = 30  # seconds
+    include_states = [s.strip() for s in args.states.split(",") if s.strip()] if args.states else ["RUNNING"]
+
+    coordinator = None
+    if args.ha:
+        if not args.multi_job:
+            raise SystemExit("--ha requires --multi-job")
+        replica_id = args.replica_id or f"{socket.gethostname()}-{os.getpid()}"
+        coordinator = Coordinator(registry, replica_id, ttl=args.lease_ttl)
+        coordinator.step()
+        log.info("HA mode: replica=%s leader=%s", replica_id, coordinator.is_leader)
+
+    loop = ControlLoop(
+        watcher,
+        engine,
+        registry,
+        migrator,
+        states=include_states,
+        job_id=None if args.multi_job else args.job_id,
+        default_region=args.current_region,
+        migrate=args.migrate,
+        cooldown_seconds=args.cooldown_seconds,
+        target_region=args.target_region,
+        migrate_options={
+            "target_ip": args.target_ip,
+            "autoprovision": args.auto_provision or cfg.get("auto_provision"),
+            "provision_overrides": {
+                "ami_id": args.target_ami_id,
+                "security_group_id": args.target_sg_id,
+                "max_spot_price": args.max_spot_price,
+                "instance_type": instance_type,
+                "ssh_key_name": cfg.get("ssh_key_name"),
+            },
+        },
+        resync_seconds=args.resync_seconds,
+        coordinator=coordinator,
+        placement=load_instance_matrix(args.instance_matrix) if args.pack else None,
+        optimizer=FleetOptimizer(engine.policy, *load_instance_matrix(args.instance_matrix), threshold_fn=engine.threshold_for_job)
+        if args.fleet_optimizer else None,
+    )
 
-    health_server = start_health_server(port=args.health_port)
+    config.subscribe(loop.apply_config)
+
+    executor = ThreadPoolExecutor(max_workers=args.max_concurrent_migrations, thread_name_prefix="migration")
+
+    def submit(fn, *fn_args):
+        def on_done(future):
+            if future.exception():
+                log.error("Migration failed: %s", future.exception())
+        executor.submit(fn, *fn_args).add_done_callback(on_done)
+
+    scheduler = build_scheduler(loop, args, submit, config)
+    # Read at scrape time, so the hot paths pay nothing for these
+    metrics.MIGRATIONS_IN_FLIGHT.set_function(lambda: len(loop.in_flight))
+    metrics.LOOP_LAG_SECONDS.set_function(lambda: scheduler.loop_lag)
+
+    def on_interruption(payload):
+        if loop.handle_interruption(payload):
+            scheduler.wake("dispatch")
+
+    # Probes read what the loop and scheduler already keep in memory; none of them calls AWS
+    health = Health(
+        scheduler,
+        loop,
+        heartbeat_timeout=args.liveness_timeout,
+        price_max_age=3 * args.price_interval,
+        sync_max_age=max(3 * args.sync_interval, 30),
+    )
+    health_server = start_health_server(
+        port=args.health_port,
+        health=health,
+        interruption_fn=on_interruption,
+        interruption_token=args.interruption_token or os.getenv("INTERRUPTION_TOKEN"),
+    )
     log.info(
         "Starting orchestrator loop | multi_job=%s job=%s interval=%ss migrate=%s health_port=%s",
         args.multi_job,
@@ -119,67 +197,95 @@ def main():
         args.health_port,
     )
 
-    include_states = [s.strip() for s in args.states.split(",") if s.strip()] if args.states else ["RUNNING"]
+    loop.start()
+    try:
+        asyncio.run(run_scheduler(scheduler, loop, executor))
+    finally:
+        health_server.shutdown()
+        # Flush what is still queued
+        log_listener.stop()
 
-    while True:
-        now = time.time()
-        if price_cache["data"] and now - price_cache["ts"] < price_cache_ttl:
-            prices = price_cache["data"]
-        else:
-            prices = watcher.poll()
-            price_cache = {"ts": now, "data": prices}
-
-        log.info("Prices: %s", {r: round(v["price"], 5) for r, v in prices.items()})
-
-        # Determine jobs to process
-        jobs = []
-        if args.multi_job:
-            for st in include_states:
-                jobs.extend(registry.list_by_state(st))
-        else:
-            jobs = [registry.get(args.job_id)]
-
-        for job in jobs:
-            job_id = job.get("job_id")
-            current_region = job.get("region") or args.current_region
-            if not job_id or not current_region:
-                continue
-
-            decision = engine.evaluate(prices, current_region, job=job)
-            log.info("Job %s decision: action=%s target=%s reason=%s", job_id, decision.action, decision.target_region, decision.reason)
-
-            if decision.action != "MIGRATE":
-                continue
-
-            # Cooldown check per job
-            last_ts = last_migration_ts.get(job_id)
-            if last_ts and (now - last_ts) < args.cooldown_seconds:
-                log.info("Job %s cooldown active; skipping migration (remaining %ss)", job_id, int(args.cooldown_seconds - (now - last_ts)))
-                continue
-
-            if args.migrate:
-                target_region = args.target_region or decision.target_region
-                provision_overrides = {
-                    "ami_id": args.target_ami_id,
-                    "security_group_id": args.target_sg_id,
-                    "max_spot_price": args.max_spot_price,
-                    "instance_type": instance_type,
-                    "ssh_key_name": cfg.get("ssh_key_name"),
-                }
-                migrator.migrate(
-                    job_id,
-                    target_region,
-                    target_ip=args.target_ip,
-                    autoprovision=args.auto_provision or cfg.get("auto_provision"),
-                    provision_overrides=provision_overrides,
-                )
-                last_migration_ts[job_id] = time.time()
-            else:
-                log.info("Job %s migration suggested (dry-run). Use --migrate to execute.", job_id)
-
-        time.sleep(args.interval)
+
+def build_scheduler(loop, args, submit, config=None):
+    """
+    Wire ControlLoop steps into independent scheduler tasks. Price changes and
+    job changes wake evaluation immediately; decisions wake dispatch, which
+    hands migrations to submit(fn, *args) so they never block the loop. With
+    a ConfigStore, changed config files are reloaded and re-evaluated.
+    """
+    scheduler = Scheduler()
+
+    def poll_price(region):
+        def run():
+            if loop.poll_region(region):
+                scheduler.wake("evaluate")
+        return run
+
+    for region in loop.watcher.regions:
+        scheduler.add(f"price:{region}", poll_price(region), interval=args.price_interval, deadline=args.price_interval)
+
+    def sync_registry():
+        if loop.sync_jobs():
+            scheduler.wake("evaluate")
+
+    def evaluate():
+        if loop.enqueue(loop.evaluate_pending()):
+            scheduler.wake("dispatch")
+
+    scheduler.add("registry-sync", sync_registry, interval=args.sync_interval, deadline=max(args.sync_interval, 10))
+    scheduler.add("evaluate", evaluate, interval=args.interval, deadline=30)
+
+    # Packs under the loop lock, which evaluate holds for a whole pass: keep it off the event loop
+    scheduler.add("dispatch", lambda: loop.dispatch_pending(submit), interval=args.sync_interval, deadline=30)
+
+    # Journaled migrations go straight to the migration pool
+    scheduler.add("resume", lambda: loop.resume_pending(submit), interval=args.resume_interval, deadline=max(args.resume_interval, 30))
+
+    if args.reap_orphans is not None and loop.migrator is not None:
+        def reap():
+            if loop.coordinator is None or loop.coordinator.is_leader:
+                loop.migrator.reap_orphans(loop.watcher.regions, min_age=args.reap_orphans)
+
+        scheduler.add("reap-orphans", reap, interval=3600, deadline=300)
+
+    if loop.coordinator is not None:
+        def coordinate():
+            if loop.coordinate():
+                scheduler.wake("evaluate")
+
+        ttl = loop.coordinator.ttl
+        scheduler.add("coordination", coordinate, interval=ttl / 3, deadline=ttl / 2)
+
+    reload_interval = getattr(args, "config_reload_interval", 0)
+    if config is not None and reload_interval:
+        def reload_config():
+            # Subscribers (ControlLoop.apply_config) have marked every job for re-evaluation
+            if config.reload_if_changed():
+                scheduler.wake("evaluate")
+
+        scheduler.add("config", reload_config, interval=reload_interval, deadline=max(reload_interval, 10))
+    return scheduler
+
+
+async def run_scheduler(scheduler, loop, executor):
+    """
+    Run until SIGINT/SIGTERM. Queued migrations are dropped on shutdown;
+    ones already running are allowed to finish.
+    """
+    runner = asyncio.create_task(scheduler.run())
+    event_loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        event_loop.add_signal_handler(sig, runner.cancel)
+    try:
+        await runner
+    except asyncio.CancelledError:
+        pass
+    finally:
+        logging.getLogger("orchestrator.main").info("Shutting down; waiting for %d in-flight migrations", len(loop.in_flight))
+        await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+        if loop.coordinator is not None:
+            loop.coordinator.leave()
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,281 @@
+# orchestrator/metrics.py
+"""
+Minimal Prometheus instrumentation, served as text on GET /metrics.
+
+Cheap enough to stay on in production:
+
+- Updates take no lock. Every thread writes to its own preallocated slots
+  (a threading.local created once per thread per metric) and a scrape sums
+  the slots, so concurrent writers never contend or lose increments.
+- Labelled children are resolved once with labels(...) and cached; hot
+  paths keep the child (or look it up by an existing string) and only
+  bump preallocated counters.
+"""
+import functools
+import threading
+import time
+from bisect import bisect_left
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+PHASE_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+_registry = []
+
+
+class _Slots(threading.local):
+    """Per-thread value slots; each thread registers its list once."""
+
+    def __init__(self, size, shards):
+        self.values = [0] * size
+        shards.append(self.values)
+
+
+class _Child:
+    def __init__(self, size):
+        self._shards = []
+        self._local = _Slots(size, self._shards)
+
+    def _sum(self, size):
+        totals = [0] * size
+        for values in list(self._shards):
+            for i in range(size):
+                totals[i] += values[i]
+        return totals
+
+
+class _CounterChild(_Child):
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, amount=1):
+        self._local.values[0] += amount
+
+    def get(self):
+        return self._sum(1)[0]
+
+
+class _GaugeChild:
+    def __init__(self):
+        self._value = 0
+        self._fn = None
+
+    def set(self, value):
+        # A single store; the last writer wins, which is what a gauge means
+        self._value = value
+
+    def set_function(self, fn):
+        self._fn = fn
+
+    def get(self):
+        return self._fn() if self._fn else self._value
+
+
+class _HistogramChild(_Child):
+    def __init__(self, buckets):
+        self._buckets = buckets
+        # One slot per bucket, then +Inf, then the sum
+        super().__init__(len(buckets) + 2)
+
+    def observe(self, value):
+        values = self._local.values
+        values[bisect_left(self._buckets, value)] += 1
+        values[-1] += value
+
+    def get(self):
+        return self._sum(len(self._buckets) + 2)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._new_child()
+            self._children[()] = self._default
+        _registry.append(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        key = values[0] if len(values) == 1 else values
+        child = self._children.get(key)
+        if child is None:
+            # Only the first use of a label set allocates
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _label_str(self, key, extra=""):
+        if not self.labelnames:
+            return "{" + extra + "}" if extra else ""
+        values = (key,) if not isinstance(key, tuple) else key
+        pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in list(self._children.items()):
+            lines.extend(self._samples(key, child))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def _samples(self, key, child):
+        return [f"{self.name}{self._label_str(key)} {_num(child.get())}"]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default.set(value)
+
+    def set_function(self, fn):
+        self._default.set_function(fn)
+
+    def _samples(self, key, child):
+        return [f"{self.name}{self._label_str(key)} {_num(child.get())}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def _samples(self, key, child):
+        values = child.get()
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), values[:-1]):
+            cumulative += count
+            le = 'le="%s"' % ("+Inf" if bound == "+Inf" else _num(bound))
+            lines.append(f"{self.name}_bucket{self._label_str(key, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{self._label_str(key)} {_num(values[-1])}")
+        lines.append(f"{self.name}_count{self._label_str(key)} {cumulative}")
+        return lines
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """Prometheus text exposition of every metric defined in this process."""
+    lines = []
+    for metric in list(_registry):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def timed(child):
+    """Decorator: observe the wrapped call's duration on a histogram child."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - started)
+        return inner
+    return wrap
+
+
+# ---------------------------------------------------------------------------
+# Orchestrator metrics
+# ---------------------------------------------------------------------------
+
+MIGRATION_PHASE_SECONDS = Histogram(
+    "spot_migration_phase_seconds", "Duration of each Migrator.migrate phase", ["phase"], buckets=PHASE_BUCKETS
+)
+MIGRATION_PHASE_FAILURES = Counter(
+    "spot_migration_phase_failures_total", "Migration phases that raised", ["phase"]
+)
+MIGRATIONS_IN_FLIGHT = Gauge("spot_migrations_in_flight", "Migrations and recoveries currently running")
+PRICE_POLL_SECONDS = Histogram(
+    "spot_price_poll_seconds", "SpotPriceWatcher describe_spot_price_history latency", ["region"]
+)
+REGISTRY_OP_SECONDS = Histogram(
+    "spot_registry_op_seconds", "Job registry call latency", ["backend", "op"]
+)
+REGISTRY_RETRIES = Counter(
+    "spot_registry_retries_total", "Registry API calls retried (SDK retries and unprocessed batch items)", ["op"]
+)
+RETRIES = Counter("spot_retries_total", "Failed attempts retried by utils.retry", ["op"])
+RETRIES_EXHAUSTED = Counter("spot_retries_exhausted_total", "utils.retry calls that ran out of attempts", ["op"])
+RETRIES_FATAL = Counter("spot_retries_fatal_total", "utils.retry calls stopped by a non-retryable error", ["op"])
+CIRCUIT_TRIPS = Counter("spot_circuit_trips_total", "Circuit breakers opened", ["scope"])
+CIRCUIT_REJECTED = Counter("spot_circuit_rejected_total", "Calls failed fast by an open circuit breaker", ["scope"])
+LOOP_ITERATION_SECONDS = Histogram(
+    "spot_loop_iteration_seconds", "Duration of one control-loop task run", ["task"]
+)
+LOOP_LAG_SECONDS = Gauge("spot_event_loop_lag_seconds", "Last sampled asyncio event-loop lag")
+CONFIG_RELOADS = Counter("spot_config_reloads_total", "Changed config files applied or rejected by validation", ["result"])
+LOG_RECORDS_DROPPED = Counter("spot_log_records_dropped_total", "Log records dropped because the log queue was full")
+LOG_LINES_SAMPLED = Counter("spot_log_lines_sampled_total", "Routine log lines held back by a rate limit", ["kind"])
+LOG_QUEUE_DEPTH = Gauge("spot_log_queue_depth", "Log records waiting for the background writer")
+
+REGISTRY_OPS = (
+    "get", "create", "update", "batch_create", "update_many", "list_by_state", "iter_jobs",
+    "get_meta", "put_meta", "acquire_lease", "release_lease", "heartbeat", "live_members",
+)
+
+
+def instrument_registry(registry):
+    """
+    Time the registry's public calls and, for DynamoRegistry, count SDK and
+    unprocessed-item retries. Wraps the instance, so the storage package
+    itself stays free of orchestrator imports.
+    """
+    backend = "dynamo" if hasattr(registry, "client") else "json"
+    for op in REGISTRY_OPS:
+        method = getattr(registry, op, None)
+        if method is not None:
+            setattr(registry, op, timed(REGISTRY_OP_SECONDS.labels(backend, op))(method))
+
+    client = getattr(registry, "client", None)
+    if client is not None:
+        def count_retries(parsed=None, model=None, **kwargs):
+            parsed = parsed or {}
+            child = REGISTRY_RETRIES.labels(model.name if model else "unknown")
+            attempts = parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+            if attempts:
+                child.inc(attempts)
+            if parsed.get("UnprocessedItems") or parsed.get("UnprocessedKeys"):
+                child.inc()
+
+        client.meta.events.register("after-call.dynamodb", count_retries)
+    return registry
@@ -1,21 +1,135 @@
 # orchestrator/migrator.py
 from orchestrator.utils import SSHClient
-from orchestrator.config_loader import load_runtime_config
+from orchestrator.config_loader import CHECKPOINT_MODES, ConfigStore, default_store
 from storage.job_registry import JobRegistry
-from orchestrator.instance_manager import provision_instance
+from orchestrator.instance_manager import BatchProvisioner
 from orchestrator.utils import retry
+from orchestrator.metrics import MIGRATION_PHASE_FAILURES, MIGRATION_PHASE_SECONDS
+from orchestrator.resilience import Breakers, CircuitOpenError, Deadline
+from orchestrator.capabilities import IDENTIFY_COMMAND, PROBE_COMMAND, CapabilityCache, IncompatibleHostError, missing_cpu_features, parse, ready_for
+from orchestrator.tracing import MigrationTrace
+from storage.s3_manager import S3Manager
+from contextlib import contextmanager
+import hashlib
+import json
+import logging
 import os
+import time
+
+log = logging.getLogger("orchestrator.migrator")
+
+CRIU_WRAPPER = "/opt/job_workspace/checkpoint/criu_wrapper.sh"
+CHECKPOINT_DIR = "/opt/job_workspace/checkpoint"
+# Registry states of a migration or recovery that has not finished
+MIGRATION_STATES = ("CHECKPOINTING", "UPLOADING", "PROVISIONING", "VALIDATING", "DOWNLOADING", "RESTORING", "INTERRUPTED")
+# Journal steps, in order; each is written to the registry as soon as it is done
+UPLOADED, SOURCE_STOPPED, PROVISIONED, RESTORED = "UPLOADED", "SOURCE_STOPPED", "PROVISIONED", "RESTORED"
+# A worker may start its interruption checkpoint this long before recovery begins
+INTERRUPTION_NOTICE_SECONDS = 120
+
+
+def transfer_stats(result):
+    """
+    Parse the JSON summary line s3_manager.py prints on success
+    ({"key": ..., "bytes": ..., "seconds": ...}); {} if there is none.
+    """
+    lines = (getattr(result, "stdout", None) or "").strip().splitlines()
+    try:
+        stats = json.loads(lines[-1]) if lines else {}
+    except ValueError:
+        return {}
+    return stats if isinstance(stats, dict) else {}
+
+
+def restored_pids(result, job_ids):
+    """
+    PIDs printed by an app-mode restore: a bare PID for one job, or
+    "<job_id> <pid>" lines from restore-group.
+    """
+    lines = (getattr(result, "stdout", None) or "").strip().splitlines()
+    if len(job_ids) == 1:
+        return {job_ids[0]: int(lines[-1].split()[-1])}
+    pids = {}
+    for line in lines:
+        parts = line.split()
+        if len(parts) == 2 and parts[0] in job_ids:
+            pids[parts[0]] = int(parts[1])
+    return pids
+
+
+def group_key(job_ids):
+    """Checkpoint archive key for jobs moved together."""
+    return "group-" + hashlib.sha1(",".join(sorted(job_ids)).encode()).hexdigest()[:12]
 
 
 class Migrator:
-    def __init__(self, registry: JobRegistry, checkpoint_bucket: str | None = None):
+    def __init__(
+        self,
+        registry: JobRegistry,
+        checkpoint_bucket: str | None = None,
+        breakers: Breakers | None = None,
+        config: ConfigStore | None = None,
+    ):
         self.registry = registry
-        config = load_runtime_config()
+        # Shared with the DecisionEngine; a reloaded config reaches apply_config
+        self.config = config or default_store()
+        runtime = self.config.current.runtime
         # Bucket can be provided explicitly, via env var, or config file
-        self.checkpoint_bucket = checkpoint_bucket or os.getenv("CHECKPOINT_BUCKET") or config.get("checkpoint_bucket")
+        self.checkpoint_bucket = checkpoint_bucket or os.getenv("CHECKPOINT_BUCKET") or runtime.checkpoint_bucket
         if not self.checkpoint_bucket:
             raise RuntimeError("checkpoint_bucket is required (env CHECKPOINT_BUCKET or config/runtime.yaml)")
-        self.runtime_config = config
+        # Shared by every migration thread, so launches into one region coalesce
+        self.provisioner = BatchProvisioner()
+        # Retries back off with jitter inside one deadline per migration; hosts
+        # and regions that keep failing are cut off by their circuit breaker
+        self.breakers = breakers or Breakers.from_config(runtime.section("retry"))
+        # Preflight answers per (AMI, kernel), shared through the registry
+        self.capabilities = CapabilityCache(registry)
+        self.apply_config(self.config.current)
+        self.config.subscribe(self.apply_config)
+
+    @property
+    def runtime_config(self):
+        return self.config.current.runtime
+
+    def apply_config(self, snapshot):
+        """
+        Take the runtime settings of a (re)loaded config snapshot. Migrations
+        already running keep the deadline they started with; breakers that
+        already exist keep their thresholds.
+        """
+        runtime = snapshot.runtime
+        provisioning = runtime.section("provisioning")
+        self.provisioner.window = float(provisioning.get("batch_window", 0.25))
+        self.provisioner.poll_interval = float(provisioning.get("poll_interval", 5))
+        self.provisioner.mode = provisioning.get("mode", "run_instances")
+        self.alternative_types = provisioning.get("alternative_types") or ()
+        retry_cfg = runtime.section("retry")
+        self.deadline_seconds = float(retry_cfg.get("deadline_seconds", 900))
+        self.max_delay = float(retry_cfg.get("max_delay", 10))
+        fresh = Breakers.from_config(retry_cfg)
+        self.breakers.thresholds, self.breakers.reset_timeout = fresh.thresholds, fresh.reset_timeout
+        # A journal left behind by a crash or a failed step is resumed at most this often
+        self.max_resumes = int(retry_cfg.get("max_resumes", 3))
+        # Interruption recovery restores the staged background snapshot when the final checkpoint never arrives
+        self.staged_fallback = bool(runtime.section("checkpointing").get("staged_fallback", True))
+        # s3_manager.py archive format; workers uploading on their own must use the same
+        self.checkpoint_compression = runtime.raw.get("checkpoint_compression") or "gz"
+
+    def checkpoint_mode(self, job, override=None):
+        """
+        "criu" dumps the whole process; "app" moves only the state the job
+        registered with worker/checkpoint_hooks.py and restarts it with
+        job_runner.py --resume, so the target needs no CRIU, CPU or kernel match.
+        """
+        mode = override or job.get("checkpoint_mode") or self.runtime_config.raw.get("checkpoint_mode") or "criu"
+        if mode not in CHECKPOINT_MODES:
+            raise ValueError(f"unknown checkpoint mode {mode!r}")
+        return mode
+
+    def checkpoint_dir(self, job):
+        """Jobs hosted by worker/job_host.py record their own checkpoint dir."""
+        return job.get("checkpoint_dir") or CHECKPOINT_DIR
 
     def migrate(
         self,
@@ -24,70 +138,538 @@ class Migrator:
         target_ip=None,
         autoprovision=False,
         provision_overrides=None,
+        expected_version=None,
+        checkpoint_mode=None,
+    ):
+        """Move one job. Returns the target IP."""
+        job = self.registry.get(job_id)
+        mode = self.checkpoint_mode(job, checkpoint_mode)
+        trace = MigrationTrace(job_id, source_region=job.get("region"), target_region=target_region)
+        return self._move(job_id, {job_id: job}, {job_id: expected_version}, mode, trace,
+                          target_region, target_ip, autoprovision, provision_overrides)
+
+    def migrate_group(
+        self,
+        job_ids,
+        target_region,
+        target_ip=None,
+        autoprovision=False,
+        provision_overrides=None,
+        expected_versions=None,
+        checkpoint_mode=None,
+    ):
+        """
+        Move co-located jobs (same source host, one checkpoint dir each) with
+        one dump pass, one upload and one download. The claim is all or
+        nothing. Returns the target IP, so further groups packed onto the same
+        instance can pass it back in.
+        """
+        jobs = {job_id: self.registry.get(job_id) for job_id in sorted(job_ids)}
+        if len({job.get("public_ip") for job in jobs.values()}) != 1:
+            raise ValueError("a migration group must share one source host")
+        modes = {self.checkpoint_mode(job, checkpoint_mode) for job in jobs.values()}
+        if len(modes) != 1:
+            raise ValueError(f"a migration group must share one checkpoint mode, got {sorted(modes)}")
+        dirs = {self.checkpoint_dir(job) for job in jobs.values()}
+        if len(jobs) > 1 and len(dirs) != len(jobs):
+            raise ValueError("co-located jobs need their own checkpoint_dir")
+        first = next(iter(jobs.values()))
+        trace = MigrationTrace(group_key(jobs), kind="group", source_region=first.get("region"), target_region=target_region)
+        return self._move(group_key(jobs), jobs, expected_versions or {}, modes.pop(), trace,
+                          target_region, target_ip, autoprovision, provision_overrides)
+
+    def _move(self, key, jobs, expected_versions, mode, trace, target_region, target_ip, autoprovision, provision_overrides):
+        job_ids = list(jobs)
+        region = self.breakers.region(target_region)
+        journal = {
+            "key": key,
+            "kind": trace.kind,
+            "jobs": job_ids,
+            "mode": mode,
+            "target_region": target_region,
+            "target_ip": target_ip,
+            "autoprovision": bool(autoprovision),
+            "provision_overrides": {k: v for k, v in (provision_overrides or {}).items() if v is not None},
+            "done": [],
+            "resumes": 0,
+        }
+        try:
+            # Fail fast, before the job is frozen, if the target region or host is cut off
+            region.check()
+            if target_ip:
+                self.breakers.host(target_ip).check()
+            self._check_cpu_compatibility(jobs, mode, target_ip, autoprovision, provision_overrides)
+            # Claim the jobs first, before touching the worker
+            self._claim(jobs, expected_versions, journal)
+        except Exception as e:
+            self._record_failure(job_ids, trace, e)
+            raise
+        return self._run(journal, jobs, trace)
+
+    def _run(self, journal, jobs, trace):
+        """Carry a claimed migration through every journal step not done yet. Returns the target IP."""
+        job_ids = list(jobs)
+        deadline = Deadline(self.deadline_seconds)
+        try:
+            if UPLOADED not in journal["done"] or SOURCE_STOPPED not in journal["done"]:
+                self._checkpoint_source(journal, jobs, trace, deadline)
+            with self._target_region(self.breakers.region(journal["target_region"])):
+                with self._phase(trace, job_ids, "PROVISIONING") as span:
+                    target_ip = self._provision_journaled(journal, job_ids)
+                    span.host = target_ip
+            self._restore_on_target(journal["key"], jobs, journal["target_region"], target_ip, trace,
+                                    journal["mode"], deadline, journal)
+        except Exception as e:
+            self._record_failure(job_ids, trace, e)
+            raise
+        return target_ip
+
+    def _journal(self, journal, job_ids, state, step=None, **fields):
+        """Persist the journal on every job of the migration, recording `step` as done."""
+        if step and step not in journal["done"]:
+            journal["done"].append(step)
+        journal.update(fields)
+        journal["updated_at"] = int(time.time())
+        self.registry.update_many([
+            {"job_id": job_id, "state": state, "migration_journal": journal} for job_id in job_ids
+        ])
+
+    def _provision_journaled(self, journal, job_ids):
+        """Provision the target once: a journaled instance that is still running is reused, a dead one reaped."""
+        region = journal["target_region"]
+        if PROVISIONED in journal["done"]:
+            instance_id = journal.get("instance_id")
+            if not instance_id:
+                return journal["target_ip"]
+            state = self.provisioner.instance_states(region, [instance_id]).get(instance_id)
+            if state in ("pending", "running"):
+                log.info("Reusing journaled target %s (%s) for %s", instance_id, journal["target_ip"], journal["key"])
+                return journal["target_ip"]
+            log.warning("Journaled target %s is %s; provisioning a new one", instance_id, state or "gone")
+            self._reap(region, instance_id)
+            journal["done"].remove(PROVISIONED)
+            journal["target_ip"] = None
+        target_ip, instance_id = self._provision_target(
+            region, journal.get("target_ip"), journal["autoprovision"], journal["provision_overrides"]
+        )
+        self._journal(journal, job_ids, "PROVISIONING", PROVISIONED, target_ip=target_ip, instance_id=instance_id)
+        return target_ip
+
+    def _reap(self, region, instance_id):
+        try:
+            self.provisioner.terminate(region, [instance_id])
+            log.warning("Terminated orphaned instance %s in %s", instance_id, region)
+        except Exception as e:
+            log.warning("Could not terminate orphaned instance %s in %s: %s", instance_id, region, e)
+
+    def resume(self, job_id):
+        """
+        Continue the migration journaled on `job_id` (left by a crash or a
+        failed step) from its last completed step. Returns the target IP, or
+        None if there is nothing to resume or the migration was abandoned.
+
+        A dump not yet uploaded is taken again, since the job kept running on
+        the source (CRIU --leave-running, app checkpoints); the source is only
+        stopped once its checkpoint is in S3. An interruption recovery has no
+        source to dump again: it goes on if S3 holds the worker's checkpoint
+        (or, failing that, a staged snapshot) and is abandoned otherwise. After `max_resumes` attempts the
+        migration is abandoned: its target instance is terminated and the jobs
+        go back to RUNNING on the source, or to LOST if the source is stopped.
+        """
+        journal = self.registry.get(job_id).get("migration_journal")
+        if not journal:
+            return None
+        jobs = {j: self.registry.get(j) for j in journal["jobs"]}
+        journal["resumes"] = journal.get("resumes", 0) + 1
+        if journal.get("kind") == "recovery" and UPLOADED not in journal["done"] and journal["resumes"] <= self.max_resumes:
+            # The worker uploads on its own when interrupted; it may have finished after we stopped waiting
+            found = self._uploaded_checkpoint(journal)
+            if found:
+                journal["done"].append(UPLOADED)
+                journal["staged"] = found == "staged"
+        resumable = UPLOADED in journal["done"] or journal.get("kind") != "recovery"
+        if journal["resumes"] > self.max_resumes or not resumable:
+            self.abandon(journal)
+            return None
+        state = jobs[job_id]["state"]
+        self._journal(journal, list(jobs), state)
+        log.warning("Resuming %s %s (attempt %d) after %s", journal.get("kind", "migration"), journal["key"],
+                    journal["resumes"], ", ".join(journal["done"]) or "claim")
+        first = next(iter(jobs.values()))
+        trace = MigrationTrace(journal["key"], kind="resume", source_region=first.get("region"),
+                               target_region=journal["target_region"])
+        return self._run(journal, jobs, trace)
+
+    def _uploaded_checkpoint(self, journal):
+        """
+        "archive" if the interrupted worker's own checkpoint of the journaled
+        job reached S3 after the interruption, "staged" if only its staged
+        snapshots are there, else None.
+        """
+        job_id = journal["key"]
+        manager = S3Manager(self.checkpoint_bucket, compression=self.checkpoint_compression)
+        try:
+            modified = manager.archive_modified(job_id)
+            # An older archive is from an earlier migration and would roll the job back
+            if modified is not None and modified >= journal.get("started_at", 0) - INTERRUPTION_NOTICE_SECONDS:
+                log.warning("Checkpoint of %s arrived after recovery stopped waiting; resuming from it", job_id)
+                return "archive"
+            if self.staged_fallback and (manager.get_manifest(job_id) or {}).get("chain"):
+                log.warning("Checkpoint of %s never arrived; resuming from its staged snapshot", job_id)
+                return "staged"
+        except Exception as e:
+            log.warning("Could not look for the checkpoint of %s in S3: %s", job_id, e)
+        return None
+
+    def abandon(self, journal):
+        """Give up on a journaled migration, reaping the instance it provisioned."""
+        if journal.get("instance_id"):
+            self._reap(journal["target_region"], journal["instance_id"])
+        source_running = SOURCE_STOPPED not in journal["done"] and journal.get("kind") != "recovery"
+        state = "RUNNING" if source_running else "LOST"
+        log.error("Abandoning %s after %d resumes; jobs %s are %s", journal["key"], journal.get("resumes", 0),
+                  ", ".join(journal["jobs"]), state)
+        self.registry.update_many([
+            {"job_id": job_id, "state": state, "migration_journal": None if source_running else journal}
+            for job_id in journal["jobs"]
+        ])
+
+    def pending_journals(self):
+        """The journal of every unfinished migration in the registry, one per migration."""
+        pending = {}
+        # One pass over the registry rather than a scan per migration state
+        for job in self.registry.iter_jobs():
+            journal = job.get("migration_journal")
+            if journal and job.get("state") in MIGRATION_STATES:
+                pending.setdefault(journal["key"], journal)
+        return list(pending.values())
+
+    def reap_orphans(self, regions, min_age=900):
+        """
+        Terminate instances this orchestrator launched (see
+        BatchProvisioner.tags) that no job record or journal refers to and
+        that are older than `min_age` seconds. Returns the terminated IDs.
+        """
+        referenced = set()
+        for job in self.registry.iter_jobs():
+            journal = job.get("migration_journal") or {}
+            referenced.update(v for v in (
+                job.get("instance_id"), job.get("public_ip"), journal.get("instance_id"), journal.get("target_ip"),
+            ) if v)
+        reaped = []
+        now = time.time()
+        for region in regions:
+            for instance in self.provisioner.managed_instances(region):
+                if instance["InstanceId"] in referenced or instance.get("PublicIpAddress") in referenced:
+                    continue
+                if now - instance["LaunchTime"].timestamp() < min_age:
+                    continue
+                self._reap(region, instance["InstanceId"])
+                reaped.append(instance["InstanceId"])
+        return reaped
+
+    @contextmanager
+    def _target_region(self, breaker):
+        """
+        Report provisioning in a region to its circuit breaker. Restores are
+        left out: they fail for reasons of their own job (a bad checkpoint,
+        a CRIU error) that say nothing about the region.
+        """
+        breaker.before_call()
+        try:
+            yield
+        except CircuitOpenError:
+            breaker.release()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+
+    def _retry(self, fn, op, span, host, deadline=None, retries=3, delay=1):
+        return retry(
+            fn,
+            retries=retries,
+            delay=delay,
+            max_delay=self.max_delay,
+            op=op,
+            on_retry=span.retried,
+            deadline=deadline,
+            breaker=self.breakers.host(host),
+        )
+
+    def recover(
+        self,
+        job_id,
+        target_region,
+        wait_for_checkpoint,
+        timeout=150,
+        target_ip=None,
+        autoprovision=False,
+        provision_overrides=None,
+        checkpoint_mode=None,
     ):
+        """
+        Spot interruption fast path. The worker is already dumping and
+        uploading on its own (worker/interruption_watcher.py), so provision
+        the target straight away and restore once wait_for_checkpoint(timeout)
+        reports the upload finished. If it never did, the job is restored
+        from the snapshot its worker staged in the background
+        (worker/background_checkpointer.py), losing the progress since; with
+        no staged snapshot (or staged_fallback off) it is LOST and this
+        returns False.
+        """
         job = self.registry.get(job_id)
-        source_ip = job["public_ip"]
-        pid = job["pid"]
+        mode = self.checkpoint_mode(job, checkpoint_mode)
+        trace = MigrationTrace(job_id, kind="recovery", target_region=target_region)
+        # The worker stops the job itself, so the journal starts past the source steps
+        journal = {
+            "key": job_id,
+            "kind": "recovery",
+            "jobs": [job_id],
+            "mode": mode,
+            "target_region": target_region,
+            "target_ip": target_ip,
+            "autoprovision": bool(autoprovision),
+            "provision_overrides": {k: v for k, v in (provision_overrides or {}).items() if v is not None},
+            "done": [SOURCE_STOPPED],
+            "resumes": 0,
+            "started_at": int(time.time()),
+        }
+        self._journal(journal, [job_id], "INTERRUPTED")
+        deadline = Deadline(self.deadline_seconds)
+        region = self.breakers.region(target_region)
+        try:
+            with trace.span("PROVISIONING") as span:
+                with self._target_region(region):
+                    target_ip = self._provision_journaled(journal, [job_id])
+                span.host = target_ip
+            with trace.span("AWAITING_CHECKPOINT"):
+                received = wait_for_checkpoint(timeout)
+            if not received and not self._staged(job_id, trace, target_ip):
+                summary = trace.finish(False, "worker checkpoint not received")
+                self.registry.update(job_id, "LOST", interrupted_target_ip=target_ip, last_migration=summary)
+                return False
+            self._journal(journal, [job_id], "INTERRUPTED", UPLOADED, staged=not received)
+            self._restore_on_target(job_id, {job_id: job}, target_region, target_ip, trace, mode, deadline, journal)
+        except Exception as e:
+            self._record_failure([job_id], trace, e)
+            raise
+        return True
+
+    def _staged(self, job_id, trace, target_ip):
+        """True if the target can fetch a staged snapshot of job_id."""
+        if not self.staged_fallback:
+            return False
+        target_ssh = SSHClient(target_ip)
+        try:
+            target_ssh.connect()
+            with trace.span("STAGED_LOOKUP", target_ip):
+                target_ssh.run_command(f"python3 /opt/job_workspace/storage/s3_manager.py staged {job_id} --bucket {self.checkpoint_bucket}")
+        except Exception as e:
+            log.warning("No staged snapshot of %s to fall back on: %s", job_id, e)
+            return False
+        finally:
+            target_ssh.close()
+        log.warning("Checkpoint of %s never arrived; restoring its staged snapshot", job_id)
+        return True
+
+    @contextmanager
+    def _phase(self, trace, job_ids, state, host=None, update=True, **attrs):
+        """Enter a registry state and record the phase as a metric and a trace span."""
+        if update:
+            for job_id in job_ids:
+                self.registry.update(job_id, state, **attrs)
+        started = time.perf_counter()
+        try:
+            with trace.span(state, host) as span:
+                yield span
+        except Exception:
+            MIGRATION_PHASE_FAILURES.labels(state).inc()
+            raise
+        MIGRATION_PHASE_SECONDS.labels(state).observe(time.perf_counter() - started)
+
+    def _claim(self, jobs, expected_versions, journal=None):
+        """
+        Move every job to CHECKPOINTING and start its journal. With expected
+        versions, a stale decision (or a second orchestrator replica) fails
+        here before touching the worker; jobs of the group already claimed
+        are put back.
+        """
+        claimed = []
+        if journal is not None:
+            journal["updated_at"] = int(time.time())
+        try:
+            for job_id in jobs:
+                self.registry.update(job_id, "CHECKPOINTING", expected_version=expected_versions.get(job_id),
+                                     migration_journal=journal)
+                claimed.append(job_id)
+        except Exception:
+            for job_id in claimed:
+                self.registry.update(job_id, jobs[job_id].get("state", "RUNNING"), migration_journal=None)
+            raise
+
+    def _record_failure(self, job_ids, trace, error):
+        summary = trace.finish(False, error)
+        if not trace.spans:
+            # Never claimed the job (e.g. lost the version race); leave the record alone
+            return
+        for job_id in job_ids:
+            try:
+                state = self.registry.get(job_id)["state"]
+                self.registry.update(job_id, state, last_migration=summary)
+            except Exception as e:
+                log.warning("Could not record failed migration of %s: %s", job_id, e)
+
+    def _wrapper(self, action, jobs, mode, sudo=True):
+        """criu_wrapper.sh command line: the single-job form, or the -group form for several jobs."""
+        prefix = "sudo " if sudo else ""
+        if len(jobs) > 1:
+            if action == "dump":
+                specs = [f"{job['pid']}:{self.checkpoint_dir(job)}" for job in jobs.values()]
+            else:
+                specs = [f"{job_id}:{self.checkpoint_dir(job)}" for job_id, job in jobs.items()]
+            return f"{prefix}bash {CRIU_WRAPPER} {action}-group {mode} {' '.join(specs)}"
+        (job_id, job), = jobs.items()
+        env = ""
+        if self.checkpoint_dir(job) != CHECKPOINT_DIR:
+            env = f"JOB_ID={job_id} CHECKPOINT_DIR={self.checkpoint_dir(job)} "
+        if action == "dump":
+            return f"{prefix}{env}bash {CRIU_WRAPPER} dump {job['pid']} {mode}"
+        return f"{prefix}{env}bash {CRIU_WRAPPER} restore" + (" app" if mode == "app" else "")
+
+    def _transfer(self, action, key, jobs):
+        """s3_manager.py command line; several jobs share one archive rooted at their common parent."""
+        command = f"python3 /opt/job_workspace/storage/s3_manager.py {action} {key} --bucket {self.checkpoint_bucket}"
+        if self.checkpoint_compression != "gz":
+            command += f" --compression {self.checkpoint_compression}"
+        dirs = [self.checkpoint_dir(job) for job in jobs.values()]
+        if len(dirs) > 1:
+            command += f" --root {os.path.commonpath([os.path.dirname(d) for d in dirs])}"
+            if action == "upload":
+                command += "".join(f" --src {d}" for d in dirs)
+        elif dirs[0] != CHECKPOINT_DIR:
+            command += f" --src {dirs[0]}" if action == "upload" else f" --dst {dirs[0]}"
+        return command
+
+    def _checkpoint_source(self, journal, jobs, trace, deadline=None):
+        job_ids = list(jobs)
+        key, mode = journal["key"], journal["mode"]
+        source_ip = next(iter(jobs.values()))["public_ip"]
+        pids = " ".join(str(job["pid"]) for job in jobs.values())
+        resuming = journal.get("resumes", 0) > 0
 
         # ==========================================
         # STEP 1: FREEZE (SOURCE)
         # ==========================================
         source_ssh = SSHClient(source_ip)
-        source_ssh.connect()
 
         try:
-            self.registry.update(job_id, "CHECKPOINTING")
-            retry(
-                lambda: source_ssh.run_command(
-                    f"sudo bash /opt/job_workspace/checkpoint/criu_wrapper.sh dump {pid}"
-                ),
-                retries=3,
-                delay=5,
-            )
-
-            self.registry.update(job_id, "UPLOADING")
-            retry(
-                lambda: source_ssh.run_command(
-                    f"python3 /opt/job_workspace/storage/s3_manager.py upload {job_id} "
-                    f"--bucket {self.checkpoint_bucket}"
-                ),
-                retries=3,
-                delay=5,
-            )
-
-            # Prevent split-brain
-            source_ssh.run_command(f"sudo kill -9 {pid}")
+            source_ssh.connect()
+            if UPLOADED not in journal["done"]:
+                with self._phase(trace, job_ids, "CHECKPOINTING", source_ip, update=resuming) as span:
+                    self._retry(lambda: source_ssh.run_command(self._wrapper("dump", jobs, mode)), "criu_dump", span, source_ip, deadline)
+
+                with self._phase(trace, job_ids, "UPLOADING", source_ip) as span:
+                    result = self._retry(lambda: source_ssh.run_command(self._transfer("upload", key, jobs)), "s3_upload", span, source_ip, deadline)
+                    span.bytes = transfer_stats(result).get("bytes")
+                self._journal(journal, job_ids, "UPLOADING", UPLOADED, checkpoint_key=key, bytes=span.bytes)
+
+            # Prevent split-brain; on resume the processes may already be gone
+            source_ssh.run_command(f"sudo kill -9 {pids}" + (" 2>/dev/null; true" if resuming else ""))
+            self._journal(journal, job_ids, "UPLOADING", SOURCE_STOPPED)
 
         finally:
             source_ssh.close()
 
+    def _launch_spec(self, provision_overrides=None):
+        """(ami_id, security_group_id, key_name, instance_type, max_spot_price) for an autoprovisioned target."""
+        cfg = self.runtime_config.raw
+        overrides = provision_overrides or {}
+        return (
+            overrides.get("ami_id") or cfg.get("target_ami_id"),
+            overrides.get("security_group_id") or cfg.get("target_security_group_id"),
+            overrides.get("ssh_key_name") or self.runtime_config.ssh_key_name,
+            overrides.get("instance_type") or self.runtime_config.instance_type,
+            overrides.get("max_spot_price") or cfg.get("max_spot_price"),
+        )
+
+    def _check_cpu_compatibility(self, jobs, mode, target_ip, autoprovision, provision_overrides):
+        """
+        Refuse a CRIU move before the freeze when the cache already shows the
+        target image and instance type lack CPU features the source has.
+        Unknown hosts pass here and are checked again in VALIDATING.
+        """
+        if mode != "criu" or target_ip or not autoprovision:
+            return
+        ami_id, _, _, instance_type, _ = self._launch_spec(provision_overrides)
+        target_flags = self.capabilities.cpu_flags(ami_id, None, instance_type)
+        if target_flags is not None:
+            self._require_cpu_features(jobs, target_flags, f"{instance_type} on {ami_id}")
+
+    def _require_cpu_features(self, jobs, target_flags, target):
+        for job_id, job in jobs.items():
+            source_flags = self.capabilities.cpu_flags(job.get("host_ami"), job.get("host_kernel"), job.get("instance_type"))
+            missing = missing_cpu_features(source_flags, target_flags)
+            if missing:
+                raise IncompatibleHostError(f"{target} lacks CPU features used by {job_id}: {' '.join(missing)}")
+
+    def _preflight(self, target_ssh, target_ip, jobs, mode, span, deadline=None):
+        """
+        Identify the target with one SSH call and run the full probe only if
+        its (AMI, kernel) is not cached as able to restore `mode` jobs.
+        Returns the host facts to store on the job records.
+        """
+        op = "app_preflight" if mode == "app" else "criu_preflight"
+        result = self._retry(lambda: target_ssh.run_command(IDENTIFY_COMMAND), op, span, target_ip, deadline, retries=2)
+        host = parse(result.stdout)
+        record = self.capabilities.get(host.get("ami"), host.get("kernel"))
+        target_flags = ((record or {}).get("cpu_flags") or {}).get(host.get("instance_type"))
+        if ready_for(record, mode) and (mode == "app" or target_flags is not None):
+            log.debug("Preflight for %s cached (%s, kernel %s)", target_ip, host.get("ami"), host.get("kernel"))
+        else:
+            result = self._retry(lambda: target_ssh.run_command(PROBE_COMMAND), op, span, target_ip, deadline, retries=2)
+            facts = parse(result.stdout)
+            record = self.capabilities.record(facts)
+            target_flags = facts.get("cpu_flags")
+            if not ready_for(record, mode):
+                raise IncompatibleHostError(
+                    f"{target_ip} cannot restore {mode} checkpoints (criu {record.get('criu_version') or 'missing'}, "
+                    f"criu check {record.get('criu_check')}, {record.get('python') or 'no python3'})"
+                )
+        if mode == "criu":
+            self._require_cpu_features(jobs, target_flags, target_ip)
+        facts = {"host_ami": host.get("ami"), "host_kernel": host.get("kernel"), "instance_type": host.get("instance_type")}
+        return {k: v for k, v in facts.items() if v}
+
+    def _provision_target(self, target_region, target_ip=None, autoprovision=False, provision_overrides=None):
         # ==========================================
         # STEP 2: MOVE (INFRA)
         # ==========================================
-        self.registry.update(job_id, "PROVISIONING")
-
         if not target_ip:
             if autoprovision:
-                cfg = self.runtime_config.get("raw", {})
-                ami_id = (provision_overrides or {}).get("ami_id") or cfg.get("target_ami_id")
-                sg_id = (provision_overrides or {}).get("security_group_id") or cfg.get("target_security_group_id")
-                key_name = (provision_overrides or {}).get("ssh_key_name") or self.runtime_config.get("ssh_key_name")
-                inst_type = (provision_overrides or {}).get("instance_type") or self.runtime_config.get("instance_type")
-                max_price = (provision_overrides or {}).get("max_spot_price") or cfg.get("max_spot_price")
+                ami_id, sg_id, key_name, inst_type, max_price = self._launch_spec(provision_overrides)
                 if not all([ami_id, sg_id, key_name, inst_type]):
                     raise RuntimeError("Auto-provision missing required parameters (ami_id, security_group_id, ssh_key_name, instance_type)")
-                _, target_ip, _ = provision_instance(
+                instance_id, target_ip, _ = self.provisioner.provision(
                     region=target_region,
                     ami_id=ami_id,
                     security_group_id=sg_id,
                     key_name=key_name,
                     instance_type=inst_type,
                     max_spot_price=max_price,
+                    alternative_types=(provision_overrides or {}).get("alternative_types") or self.alternative_types,
                 )
-                print(f"✅ Provisioned target in {target_region}: {target_ip}")
+                log.info("Provisioned target in %s: %s", target_region, target_ip)
+                return target_ip, instance_id
             else:
-                print(f"⚠️ MANUAL STEP: Provision worker in {target_region}")
+                log.warning("MANUAL STEP: Provision worker in %s", target_region)
                 target_ip = input(f"Enter IP of new worker in {target_region}: ")
+        return target_ip, None
+
+    def _restore_on_target(self, key, jobs, target_region, target_ip, trace, mode="criu", deadline=None, journal=None):
+        job_ids = list(jobs)
+        journal = journal or {"done": []}
 
         # ==========================================
         # STEP 3: THAW (TARGET)
@@ -96,36 +678,50 @@ class Migrator:
         target_ssh.connect()
 
         try:
-            # Preflight on target
-            self.registry.update(job_id, "VALIDATING")
-            retry(lambda: target_ssh.run_command("criu --version"), retries=2, delay=3)
-            retry(lambda: target_ssh.run_command("sudo criu check"), retries=2, delay=3)
-
-            self.registry.update(job_id, "DOWNLOADING")
-            retry(
-                lambda: target_ssh.run_command(
-                    f"python3 /opt/job_workspace/storage/s3_manager.py download {job_id} "
-                    f"--bucket {self.checkpoint_bucket}"
-                ),
-                retries=3,
-                delay=5,
-            )
-
-            self.registry.update(job_id, "RESTORING")
-            retry(
-                lambda: target_ssh.run_command(
-                    "sudo bash /opt/job_workspace/checkpoint/criu_wrapper.sh restore"
-                ),
-                retries=3,
-                delay=5,
-            )
-
-            self.registry.update(
-                job_id,
-                "RUNNING",
-                region=target_region,
-                public_ip=target_ip,
-            )
+            if RESTORED not in journal["done"]:
+                # Preflight on target
+                with self._phase(trace, job_ids, "VALIDATING", target_ip) as span:
+                    host_facts = self._preflight(target_ssh, target_ip, jobs, mode, span, deadline)
+
+                # A recovery without the final checkpoint restores the staged snapshot chain
+                download = "download-staged" if journal.get("staged") else "download"
+                with self._phase(trace, job_ids, "DOWNLOADING", target_ip) as span:
+                    result = self._retry(lambda: target_ssh.run_command(self._transfer(download, key, jobs)), "s3_download", span, target_ip, deadline)
+                    span.bytes = transfer_stats(result).get("bytes")
+
+                pids = {}
+                with self._phase(trace, job_ids, "RESTORING", target_ip) as span:
+                    # App restores start a fresh job_runner.py as the job user; CRIU keeps the PID
+                    result = self._retry(
+                        lambda: target_ssh.run_command(self._wrapper("restore", jobs, mode, sudo=mode != "app")),
+                        "app_restore" if mode == "app" else "criu_restore",
+                        span,
+                        target_ip,
+                        deadline,
+                    )
+                    if mode == "app":
+                        pids = restored_pids(result, job_ids)
+                if "key" in journal:
+                    # A crash from here on must not restore the job a second time
+                    self._journal(journal, job_ids, "RESTORING", RESTORED, host_facts=host_facts, pids=pids)
+            else:
+                host_facts, pids = journal.get("host_facts") or {}, journal.get("pids") or {}
+
+            summary = trace.finish(True)
+            instance = {"instance_id": journal["instance_id"]} if journal.get("instance_id") else {}
+            for job_id in job_ids:
+                restored = {"pid": pids[job_id]} if job_id in pids else {}
+                self.registry.update(
+                    job_id,
+                    "RUNNING",
+                    region=target_region,
+                    public_ip=target_ip,
+                    last_migration=summary,
+                    migration_journal=None,
+                    **instance,
+                    **host_facts,
+                    **restored,
+                )
 
         finally:
             target_ssh.close()
@@ -0,0 +1,101 @@
+# orchestrator/placement.py
+"""
+Bin-packing of jobs onto instances.
+
+Jobs declare `cpu` (vCPUs) and `memory_gib` on their registry record; the
+capacity of each instance type comes from config/instance_matrix.yaml.
+pack() places jobs first-fit-decreasing by their dominant resource share,
+which keeps the number of instances close to the minimum; cheapest() picks
+the (region, instance type) offer whose packing costs least per hour.
+"""
+from dataclasses import dataclass
+
+import yaml
+
+INSTANCE_MATRIX_PATH = "config/instance_matrix.yaml"
+
+
+@dataclass(frozen=True)
+class Shape:
+    vcpu: float
+    memory_gib: float
+
+
+@dataclass
+class Placement:
+    region: str
+    instance_type: str
+    bins: list          # one list of job ids per instance
+    hourly_cost: float
+
+
+def load_instance_matrix(path=INSTANCE_MATRIX_PATH):
+    """
+    Returns ({instance_type: Shape}, defaults) where shapes already have the
+    per-instance reserve taken off and defaults is the demand assumed for
+    jobs that do not declare one.
+    """
+    with open(path) as f:
+        cfg = yaml.safe_load(f) or {}
+    reserve = cfg.get("reserve") or {}
+    shapes = {
+        name: Shape(
+            float(spec["vcpu"]) - float(reserve.get("cpu", 0)),
+            float(spec["memory_gib"]) - float(reserve.get("memory_gib", 0)),
+        )
+        for name, spec in (cfg.get("instance_types") or {}).items()
+    }
+    defaults = cfg.get("job_defaults") or {}
+    return shapes, {"cpu": float(defaults.get("cpu", 1)), "memory_gib": float(defaults.get("memory_gib", 0.5))}
+
+
+def demand(job, defaults=None):
+    defaults = defaults or {}
+    return (
+        float(job.get("cpu") or defaults.get("cpu", 1)),
+        float(job.get("memory_gib") or defaults.get("memory_gib", 0.5)),
+    )
+
+
+def pack(jobs, shape, defaults=None):
+    """
+    First-fit-decreasing on the dominant share of `shape`. `jobs` maps
+    job_id -> record. Returns a list of bins (lists of job ids). A job larger
+    than the shape gets an instance of its own.
+    """
+    sized = []
+    for job_id, job in jobs.items():
+        cpu, mem = demand(job, defaults)
+        sized.append((max(cpu / shape.vcpu, mem / shape.memory_gib), job_id, cpu, mem))
+    sized.sort(key=lambda s: (-s[0], s[1]))
+
+    bins = []
+    free = []
+    for share, job_id, cpu, mem in sized:
+        for i, (free_cpu, free_mem) in enumerate(free):
+            if cpu <= free_cpu and mem <= free_mem:
+                bins[i].append(job_id)
+                free[i] = (free_cpu - cpu, free_mem - mem)
+                break
+        else:
+            bins.append([job_id])
+            free.append((shape.vcpu - cpu, shape.memory_gib - mem))
+    return bins
+
+
+def cheapest(jobs, offers, shapes, defaults=None):
+    """
+    offers maps (region, instance_type) -> hourly price. Returns the
+    Placement with the lowest total cost (fewest instances on ties), or
+    None if no offer has a known shape.
+    """
+    best = None
+    for (region, instance_type), price in sorted(offers.items()):
+        shape = shapes.get(instance_type)
+        if shape is None:
+            continue
+        bins = pack(jobs, shape, defaults)
+        cost = price * len(bins)
+        if best is None or (cost, len(bins)) < (best.hourly_cost, len(best.bins)):
+            best = Placement(region, instance_type, bins, cost)
+    return best
@@ -0,0 +1,247 @@
+# orchestrator/resilience.py
+"""
+Building blocks for utils.retry.
+
+* is_retryable(exc) sorts failures into transient (connection drops,
+  timeouts, throttling, capacity) and fatal (a missing binary, bad
+  arguments, access denied), so fatal ones are raised at once instead of
+  being slept on.
+* Backoff is exponential with full jitter, so retries from parallel
+  migrations don't hit a host or API in lockstep.
+* Deadline is the time budget of one whole migration; a retry whose sleep
+  would overrun it gives up instead.
+* CircuitBreaker trips after `failure_threshold` consecutive failures and
+  fails fast until `reset_timeout` has passed, then lets one probe through
+  (half-open). Breakers keeps one per host and per region; the decision
+  engine skips regions whose breaker is open. Only failures to reach a host
+  or API count (trips_breaker); a command that ran and exited non-zero says
+  nothing about the host, and one job's bad checkpoint nothing about a region.
+"""
+import random
+import threading
+import time
+
+from botocore.exceptions import ConnectionError as BotoConnectionError, HTTPClientError
+
+from orchestrator.metrics import CIRCUIT_REJECTED, CIRCUIT_TRIPS
+
+# Exit codes of a remote command that retrying cannot fix
+FATAL_EXIT_CODES = (126, 127)
+FATAL_OUTPUT = ("command not found", "no such file or directory", "permission denied", "invalid option")
+TRANSIENT_AWS_CODES = (
+    "Throttling", "ThrottlingException", "RequestLimitExceeded", "RequestTimeout", "ServiceUnavailable",
+    "InternalError", "InternalFailure", "SlowDown", "InsufficientInstanceCapacity", "ProvisionedThroughputExceededException",
+)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling out when the host's or region's breaker is open."""
+
+    retryable = False
+
+    def __init__(self, scope, name, retry_in):
+        super().__init__(f"circuit open for {scope} {name} (retry in {retry_in:.0f}s)")
+        self.scope = scope
+        self.name = name
+        self.retry_in = retry_in
+
+
+class DeadlineExceeded(TimeoutError):
+    retryable = False
+
+
+def is_retryable(exc):
+    """
+    True if another attempt may succeed. Exceptions can decide for themselves
+    with a `retryable` attribute (utils.SSHError does); botocore errors are
+    judged by their error code; programming errors are never retried.
+    """
+    flag = getattr(exc, "retryable", None)
+    if flag is not None:
+        return bool(flag)
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict) and "Error" in response:
+        code = response["Error"].get("Code", "")
+        status = response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+        return code in TRANSIENT_AWS_CODES or status >= 500
+    if isinstance(exc, (ValueError, TypeError, KeyError, AttributeError, NotImplementedError, PermissionError)):
+        return False
+    return True
+
+
+def trips_breaker(exc):
+    """
+    True if exc means the host or API could not be reached or did not answer
+    (AWS errors, timeouts, connection failures). Exceptions can decide for
+    themselves with a `trips_breaker` attribute (utils.SSHError does).
+    """
+    if isinstance(exc, CircuitOpenError):
+        return False
+    flag = getattr(exc, "trips_breaker", None)
+    if flag is not None:
+        return bool(flag)
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict) and "Error" in response:
+        return True
+    return isinstance(exc, (TimeoutError, ConnectionError, BotoConnectionError, HTTPClientError))
+
+
+class Backoff:
+    def __init__(self, base=2.0, cap=30.0, rng=None):
+        self.base = base
+        self.cap = cap
+        self.rng = rng or random.Random()
+
+    def delay(self, attempt):
+        """Sleep before retry number `attempt` (0-based): uniform in [0, min(cap, base * 2**attempt)]."""
+        return self.rng.uniform(0, min(self.cap, self.base * (2 ** attempt)))
+
+
+class Deadline:
+    def __init__(self, seconds, clock=time.monotonic):
+        self.seconds = seconds
+        self.clock = clock
+        self.expires = clock() + seconds
+
+    def remaining(self):
+        return max(self.expires - self.clock(), 0.0)
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self, what="migration"):
+        if self.expired():
+            raise DeadlineExceeded(f"{what} deadline of {self.seconds:.0f}s exceeded")
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, scope, name, failure_threshold=3, reset_timeout=60.0, clock=time.monotonic):
+        self.scope = scope
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allows(self):
+        """True if a call may go out now (closed, or half-open with no probe running)."""
+        with self._lock:
+            state = self._state()
+            return state == self.CLOSED or (state == self.HALF_OPEN and not self._probing)
+
+    def before_call(self):
+        """Raise CircuitOpenError if open; in half-open state admit a single probe."""
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            retry_in = max(self.opened_at + self.reset_timeout - self.clock(), 0.0)
+        CIRCUIT_REJECTED.labels(self.scope).inc()
+        raise CircuitOpenError(self.scope, self.name, retry_in)
+
+    def check(self):
+        """Like before_call, but without taking the half-open probe."""
+        if not self.allows():
+            with self._lock:
+                retry_in = max(self.opened_at + self.reset_timeout - self.clock(), 0.0) if self.opened_at else 0.0
+            CIRCUIT_REJECTED.labels(self.scope).inc()
+            raise CircuitOpenError(self.scope, self.name, retry_in)
+
+    def release(self):
+        """End a probe that never reached the host or region, without an outcome."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_error(self, exc):
+        """Outcome of a call that raised exc: a failure if trips_breaker(exc), else the probe is released."""
+        if trips_breaker(exc):
+            self.record_failure()
+        else:
+            self.release()
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.opened_at is not None:
+                # A failed probe re-opens for another full timeout
+                self.opened_at = self.clock()
+            elif self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+                CIRCUIT_TRIPS.labels(self.scope).inc()
+            self._probing = False
+
+
+class Breakers:
+    """Lazily created breakers per (scope, name), shared by every migration thread."""
+
+    def __init__(self, host_threshold=5, region_threshold=3, reset_timeout=60.0, clock=time.monotonic):
+        self.thresholds = {"host": host_threshold, "region": region_threshold}
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, cfg):
+        """From the `retry` section of config/runtime.yaml."""
+        cfg = cfg or {}
+        return cls(
+            host_threshold=int(cfg.get("host_failure_threshold", 5)),
+            region_threshold=int(cfg.get("region_failure_threshold", 3)),
+            reset_timeout=float(cfg.get("breaker_reset_seconds", 60)),
+        )
+
+    def get(self, scope, name):
+        with self._lock:
+            key = (scope, name)
+            if key not in self._breakers:
+                self._breakers[key] = CircuitBreaker(
+                    scope, name, self.thresholds.get(scope, 3), self.reset_timeout, self.clock
+                )
+            return self._breakers[key]
+
+    def host(self, name):
+        return self.get("host", name)
+
+    def region(self, name):
+        return self.get("region", name)
+
+    def region_available(self, name):
+        with self._lock:
+            breaker = self._breakers.get(("region", name))
+        return breaker is None or breaker.allows()
+
+    def open(self):
+        """{(scope, name): seconds since it opened} for every breaker not closed."""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {
+            (b.scope, b.name): b.clock() - b.opened_at
+            for b in breakers if b.opened_at is not None
+        }
@@ -0,0 +1,164 @@
+# orchestrator/scheduler.py
+import asyncio
+import inspect
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+from orchestrator.metrics import LOOP_ITERATION_SECONDS
+
+log = logging.getLogger("orchestrator.scheduler")
+
+
+@dataclass
+class ScheduledTask:
+    name: str
+    fn: Callable
+    interval: float
+    deadline: float | None = None
+    # Blocking callables run in the default executor so they never stall the loop
+    blocking: bool = True
+    event: asyncio.Event | None = None
+    runs: int = 0
+    errors: int = 0
+    overruns: int = 0
+    last_started: float | None = None
+    last_duration: float | None = None
+    last_error: str | None = None
+    # time.monotonic() when the current run started; None between runs
+    running_since: float | None = None
+    handle: asyncio.Task | None = field(default=None, repr=False)
+
+
+class Scheduler:
+    """
+    Asyncio scheduler for independent periodic tasks.
+
+    Each task runs on its own cadence and can be woken early with wake(name),
+    which is safe to call from any thread (e.g. a migration worker or the
+    health server). Coroutine tasks are cancelled when they exceed their
+    deadline; blocking tasks cannot be interrupted, so an overrun is counted
+    and logged instead. Event-loop lag is sampled every `lag_interval`, and
+    each sample is also the loop's heartbeat.
+    """
+
+    def __init__(self, lag_interval: float = 0.5):
+        self.lag_interval = lag_interval
+        self.tasks: dict[str, ScheduledTask] = {}
+        self.loop_lag = 0.0
+        self.max_loop_lag = 0.0
+        self.heartbeat: float | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._handles: list[asyncio.Task] = []
+
+    def add(self, name, fn, interval, deadline=None, blocking=None):
+        if blocking is None:
+            blocking = not inspect.iscoroutinefunction(fn)
+        self.tasks[name] = ScheduledTask(name=name, fn=fn, interval=interval, deadline=deadline, blocking=blocking)
+        return self.tasks[name]
+
+    def wake(self, name):
+        task = self.tasks.get(name)
+        if task is None or task.event is None or self._loop is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(task.event.set)
+        except RuntimeError:
+            # Loop already closed during shutdown
+            pass
+
+    async def _call(self, task):
+        if task.blocking:
+            return await asyncio.to_thread(task.fn)
+        if task.deadline:
+            return await asyncio.wait_for(task.fn(), timeout=task.deadline)
+        return await task.fn()
+
+    async def _run_task(self, task):
+        while True:
+            task.event.clear()
+            started = time.monotonic()
+            task.last_started = time.time()
+            task.running_since = started
+            try:
+                await self._call(task)
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError:
+                task.errors += 1
+                task.last_error = f"deadline {task.deadline}s exceeded"
+                log.warning("Task %s cancelled after exceeding its %ss deadline", task.name, task.deadline)
+            except Exception as e:
+                task.errors += 1
+                task.last_error = str(e)
+                log.exception("Task %s failed: %s", task.name, e)
+            task.running_since = None
+            task.runs += 1
+            task.last_duration = time.monotonic() - started
+            LOOP_ITERATION_SECONDS.labels(task.name).observe(task.last_duration)
+            if task.deadline and task.last_duration > task.deadline:
+                task.overruns += 1
+                log.warning("Task %s overran its deadline (%.1fs > %ss)", task.name, task.last_duration, task.deadline)
+
+            try:
+                await asyncio.wait_for(task.event.wait(), timeout=task.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _measure_lag(self):
+        while True:
+            expected = time.monotonic() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            self.heartbeat = time.monotonic()
+            self.loop_lag = max(0.0, self.heartbeat - expected)
+            self.max_loop_lag = max(self.max_loop_lag, self.loop_lag)
+
+    async def run(self):
+        """Run all tasks until cancelled; cancellation stops every task cleanly."""
+        self._loop = asyncio.get_running_loop()
+        self.heartbeat = time.monotonic()
+        self._handles = [asyncio.create_task(self._measure_lag(), name="loop-lag")]
+        for task in self.tasks.values():
+            task.event = asyncio.Event()
+            task.handle = asyncio.create_task(self._run_task(task), name=task.name)
+            self._handles.append(task.handle)
+        try:
+            await asyncio.gather(*self._handles)
+        finally:
+            for handle in self._handles:
+                handle.cancel()
+            await asyncio.gather(*self._handles, return_exceptions=True)
+            self._loop = None
+
+    def heartbeat_age(self, now=None):
+        """Seconds since the event loop last ran the lag sampler; None before it started."""
+        if self.heartbeat is None:
+            return None
+        return (now or time.monotonic()) - self.heartbeat
+
+    def stalled(self, grace, now=None):
+        """{task: seconds running} for runs going on longer than their deadline (or interval) plus `grace`."""
+        now = now or time.monotonic()
+        return {
+            t.name: round(now - t.running_since, 1)
+            for t in self.tasks.values()
+            if t.running_since is not None and now - t.running_since > (t.deadline or t.interval) + grace
+        }
+
+    def status(self):
+        return {
+            "loop_lag_ms": round(self.loop_lag * 1000, 2),
+            "max_loop_lag_ms": round(self.max_loop_lag * 1000, 2),
+            "tasks": {
+                t.name: {
+                    "runs": t.runs,
+                    "errors": t.errors,
+                    "overruns": t.overruns,
+                    "last_started": t.last_started,
+                    "last_duration_s": round(t.last_duration, 3) if t.last_duration is not None else None,
+                    "last_error": t.last_error,
+                }
+                for t in self.tasks.values()
+            },
+        }
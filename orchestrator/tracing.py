@@ -0,0 +1,144 @@
+# orchestrator/tracing.py
+"""
+Per-migration trace spans.
+
+Each phase of a migration becomes a span (start, end, bytes moved, attempts,
+host). Spans are emitted as structured events on the "orchestrator.trace"
+logger as they finish, and the whole trace is summarised onto the job
+record as `last_migration`, so phase timings and downtime can be queried
+per region, job size or phase later.
+
+Summaries hold only ints and strings (milliseconds, ISO timestamps) so they
+store unchanged in both the JSON and DynamoDB registries.
+"""
+import json
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+log = logging.getLogger("orchestrator.trace")
+
+# The job is frozen from the start of the dump until the restore completes
+DOWNTIME_START_PHASE = "CHECKPOINTING"
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
+
+
+def _ms(seconds):
+    return int(round(seconds * 1000))
+
+
+def emit(event):
+    """Write one structured event (a flat dict) as a JSON log line."""
+    log.info(json.dumps(event, separators=(",", ":"), default=str), extra={"event": event})
+
+
+class Span:
+    def __init__(self, trace, phase, host=None):
+        self.trace = trace
+        self.phase = phase
+        self.host = host
+        self.start = time.time()
+        self.end = None
+        self.bytes = None
+        self.attempts = 1
+        self.ok = None
+        self.error = None
+
+    def retried(self, *_):
+        """on_retry callback for utils.retry: counts extra attempts."""
+        self.attempts += 1
+
+    @property
+    def duration(self):
+        return (self.end or time.time()) - self.start
+
+    def to_event(self):
+        return {
+            "event": "span",
+            "trace_id": self.trace.trace_id,
+            "job_id": self.trace.job_id,
+            "kind": self.trace.kind,
+            "phase": self.phase,
+            "host": self.host,
+            "start": _iso(self.start),
+            "duration_ms": _ms(self.duration),
+            "bytes": self.bytes,
+            "attempts": self.attempts,
+            "ok": self.ok,
+            "error": self.error,
+        }
+
+
+class MigrationTrace:
+    def __init__(self, job_id, kind="migration", source_region=None, target_region=None):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.job_id = job_id
+        self.kind = kind
+        self.source_region = source_region
+        self.target_region = target_region
+        self.started = time.time()
+        self.ended = None
+        self.ok = None
+        self.error = None
+        self.spans = []
+
+    @contextmanager
+    def span(self, phase, host=None):
+        span = Span(self, phase, host)
+        self.spans.append(span)
+        try:
+            yield span
+        except Exception as e:
+            span.ok = False
+            span.error = str(e)
+            raise
+        else:
+            span.ok = True
+        finally:
+            span.end = time.time()
+            emit(span.to_event())
+
+    def downtime(self):
+        """Seconds the job was not running: dump start (or trace start) to the end."""
+        start = next((s.start for s in self.spans if s.phase == DOWNTIME_START_PHASE), self.started)
+        return (self.ended or time.time()) - start
+
+    def finish(self, ok, error=None):
+        self.ended = time.time()
+        self.ok = ok
+        self.error = str(error) if error else None
+        summary = self.summary()
+        emit({"event": "trace", "job_id": self.job_id, **summary})
+        return summary
+
+    def summary(self):
+        phases = {}
+        for span in self.spans:
+            entry = {"duration_ms": _ms(span.duration), "attempts": span.attempts}
+            if span.bytes is not None:
+                entry["bytes"] = int(span.bytes)
+            if span.host:
+                entry["host"] = span.host
+            if span.error:
+                entry["error"] = span.error
+            phases[span.phase] = entry
+        summary = {
+            "trace_id": self.trace_id,
+            "kind": self.kind,
+            "ok": bool(self.ok),
+            "source_region": self.source_region,
+            "target_region": self.target_region,
+            "started_at": _iso(self.started),
+            "total_ms": _ms((self.ended or time.time()) - self.started),
+            "downtime_ms": _ms(self.downtime()),
+            "bytes": sum(int(s.bytes) for s in self.spans if s.bytes is not None),
+            "phases": phases,
+        }
+        if self.error:
+            summary["error"] = self.error
+        return summary
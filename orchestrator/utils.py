@@ -5,17 +5,109 @@ import subprocess
 import os
 from typing import Optional
 
+from orchestrator.metrics import RETRIES, RETRIES_EXHAUSTED, RETRIES_FATAL
+from orchestrator.resilience import (
+    FATAL_EXIT_CODES, FATAL_OUTPUT, Backoff, CircuitOpenError, DeadlineExceeded, is_retryable,
+)
+
 logging.basicConfig(level=logging.INFO)
 
-def retry(fn, retries=3, delay=2):
+def retry(
+    fn,
+    retries=3,
+    delay=2,
+    op="other",
+    on_retry=None,
+    max_delay=30,
+    deadline=None,
+    breaker=None,
+    retryable=is_retryable,
+):
+    """
+    Call fn up to `retries` times; `op` labels the retry metrics and
+    on_retry(exc) is called before each further attempt.
+
+    Errors that retryable(exc) calls fatal are raised at once. Retries back
+    off exponentially from `delay` (capped at `max_delay`) with full jitter.
+    A resilience.Deadline stops retrying once the next sleep would overrun
+    it, and a resilience.CircuitBreaker fails fast while open and is told
+    the outcome of every attempt (failures only if they trip breakers).
+    """
+    backoff = Backoff(delay, max_delay)
     for i in range(retries):
+        if deadline is not None:
+            deadline.check(op)
+        if breaker is not None:
+            breaker.before_call()
         try:
-            return fn()
+            result = fn()
+        except CircuitOpenError:
+            # Another breaker stopped the call before it reached this one's host
+            if breaker is not None:
+                breaker.release()
+            raise
         except Exception as e:
+            if breaker is not None:
+                breaker.record_error(e)
+            if not retryable(e):
+                RETRIES_FATAL.labels(op).inc()
+                raise
             if i == retries - 1:
+                RETRIES_EXHAUSTED.labels(op).inc()
                 raise
+            pause = backoff.delay(i)
+            if deadline is not None and pause >= deadline.remaining():
+                RETRIES_EXHAUSTED.labels(op).inc()
+                raise DeadlineExceeded(f"{op} deadline of {deadline.seconds:.0f}s exceeded after: {e}") from e
+            RETRIES.labels(op).inc()
+            if on_retry:
+                on_retry(e)
             logging.warning(f"Retry {i+1}/{retries} failed: {e}")
-            time.sleep(delay)
+            time.sleep(pause)
+        else:
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+
+class SSHError(RuntimeError):
+    """
+    A failed SSH call; `retryable` tells utils.retry whether to try again,
+    `trips_breaker` whether the host's circuit breaker counts it.
+    """
+
+    retryable = True
+    trips_breaker = False
+
+    def __init__(self, message, host=None, command=None):
+        super().__init__(message)
+        self.host = host
+        self.command = command
+
+
+class SSHConnectionError(SSHError):
+    """ssh itself failed (exit 255): host down, refused, unreachable, auth."""
+
+    trips_breaker = True
+
+
+class SSHTimeoutError(SSHError):
+    """The command did not finish within the client timeout."""
+
+    trips_breaker = True
+
+
+class SSHCommandError(SSHError):
+    """The remote command exited non-zero."""
+
+    def __init__(self, message, host=None, command=None, returncode=None, stderr=""):
+        super().__init__(message, host, command)
+        self.returncode = returncode
+        self.stderr = stderr or ""
+        # A missing binary or bad arguments will fail the same way every time
+        self.retryable = returncode not in FATAL_EXIT_CODES and not any(
+            text in self.stderr.lower() for text in FATAL_OUTPUT
+        )
 
 
 class SSHClient:
@@ -136,10 +228,7 @@ class SSHClient:
             )
             
             if result.returncode != 0 and check:
-                error_msg = result.stderr if result.stderr else "Unknown error"
-                raise RuntimeError(
-                    f"SSH command failed (exit code {result.returncode}): {error_msg}"
-                )
+                raise self._command_error(command, result.returncode, result.stderr)
             
             if capture_output and result.stdout:
                 logging.debug(f"Command output: {result.stdout[:200]}")  # Log first 200 chars
@@ -147,13 +236,23 @@ class SSHClient:
             return result
             
         except subprocess.TimeoutExpired:
-            raise RuntimeError(f"SSH command timed out after {self.timeout} seconds")
+            raise SSHTimeoutError(f"SSH command timed out after {self.timeout} seconds", self.host, command)
         except subprocess.CalledProcessError as e:
-            raise RuntimeError(f"SSH command failed: {e.stderr if e.stderr else str(e)}")
+            raise self._command_error(command, e.returncode, e.stderr)
         except FileNotFoundError:
-            raise RuntimeError(
-                "SSH command not found. Ensure OpenSSH client is installed."
-            )
+            error = SSHError("SSH command not found. Ensure OpenSSH client is installed.", self.host, command)
+            error.retryable = False
+            raise error
+
+    def _command_error(self, command, returncode, stderr):
+        """ssh exits 255 for its own failures; anything else is the remote command's exit code."""
+        error_msg = stderr if stderr else "Unknown error"
+        if returncode == 255:
+            return SSHConnectionError(f"SSH connection to {self.host} failed: {error_msg}", self.host, command)
+        return SSHCommandError(
+            f"SSH command failed (exit code {returncode}): {error_msg}",
+            self.host, command, returncode, stderr,
+        )
     
     def close(self):
         """
@@ -3,37 +3,47 @@ import boto3
 import time
 import statistics
 
+from orchestrator.metrics import PRICE_POLL_SECONDS
+
 class SpotPriceWatcher:
     def __init__(self, regions, instance_type):
         self.regions = regions
         self.instance_type = instance_type
         self.history = {r: [] for r in regions}
+        self._clients = {}
+
+    def _client(self, region):
+        # boto3 clients are thread-safe; reuse one per region
+        if region not in self._clients:
+            self._clients[region] = boto3.client("ec2", region_name=region)
+        return self._clients[region]
+
+    def poll_region(self, region):
+        ec2 = self._client(region)
+        started = time.perf_counter()
+        prices = ec2.describe_spot_price_history(
+            InstanceTypes=[self.instance_type],
+            ProductDescriptions=["Linux/UNIX"],
+            MaxResults=5
+        )["SpotPriceHistory"]
+        PRICE_POLL_SECONDS.labels(region).observe(time.perf_counter() - started)
+
+        latest = float(prices[0]["SpotPrice"])
+        self.history[region].append(latest)
+
+        if len(self.history[region]) > 20:
+            self.history[region].pop(0)
+
+        volatility = (
+            statistics.stdev(self.history[region])
+            if len(self.history[region]) > 1 else 0.0
+        )
+
+        return {
+            "price": latest,
+            "volatility": volatility,
+            "timestamp": time.time()
+        }
 
     def poll(self):
-        results = {}
-        for region in self.regions:
-            ec2 = boto3.client("ec2", region_name=region)
-            prices = ec2.describe_spot_price_history(
-                InstanceTypes=[self.instance_type],
-                ProductDescriptions=["Linux/UNIX"],
-                MaxResults=5
-            )["SpotPriceHistory"]
-
-            latest = float(prices[0]["SpotPrice"])
-            self.history[region].append(latest)
-
-            if len(self.history[region]) > 20:
-                self.history[region].pop(0)
-
-            volatility = (
-                statistics.stdev(self.history[region])
-                if len(self.history[region]) > 1 else 0.0
-            )
-
-            results[region] = {
-                "price": latest,
-                "volatility": volatility,
-                "timestamp": time.time()
-            }
-
-        return results
+        return {region: self.poll_region(region) for region in self.regions}
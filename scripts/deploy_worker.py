@@ -1,48 +1,215 @@
-import os
+"""
+Deploy the worker code (worker/, storage/, checkpoint/) to one or many hosts.
+
+Each host is compared against a hash manifest of the local tree: one
+`sha256sum` over SSH tells which files differ, and only those go out, as
+one compressed tar stream. Dependencies are installed (and waited for)
+only when the hash of WORKER_PACKAGES differs from the one recorded on the
+host. Hosts are deployed concurrently, at most --parallel at a time.
+
+    python scripts/deploy_worker.py --ip 1.2.3.4 --key ~/.ssh/key.pem
+    python scripts/deploy_worker.py --hosts-file workers.txt --key ~/.ssh/key.pem --parallel 32 --output deploy.json
+"""
 import argparse
-import paramiko
-from scp import SCPClient
+import hashlib
+import io
+import json
+import os
+import shlex
+import tarfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+REMOTE_BASE = "/opt/job_workspace"
+FOLDERS = ("worker", "storage", "checkpoint")
+WORKER_PACKAGES = ("boto3", "requests", "paramiko", "scp")
+REQUIREMENTS_STAMP = ".requirements.sha256"
 
 
 def create_ssh_client(ip, key_path, user="ubuntu"):
+    # Imported here so the manifest helpers work without paramiko installed
+    import paramiko
+
     client = paramiko.SSHClient()
     client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
     client.connect(ip, username=user, key_filename=key_path)
     return client
 
 
-def deploy(ip, key_path, project_root):
-    print(f"🚀 Deploying code to Worker: {ip}")
+def build_manifest(project_root, folders=FOLDERS):
+    """{path relative to the project root: sha256} for every deployable file."""
+    manifest = {}
+    for folder in folders:
+        for dirpath, dirnames, files in os.walk(os.path.join(project_root, folder)):
+            dirnames[:] = sorted(d for d in dirnames if d != "__pycache__")
+            for name in sorted(files):
+                if name.endswith(".pyc"):
+                    continue
+                path = os.path.join(dirpath, name)
+                with open(path, "rb") as f:
+                    manifest[os.path.relpath(path, project_root)] = hashlib.sha256(f.read()).hexdigest()
+    return manifest
+
+
+def requirements_hash(packages=WORKER_PACKAGES):
+    return hashlib.sha256("\n".join(sorted(packages)).encode()).hexdigest()
+
+
+def parse_sha256sum(output):
+    """`sha256sum` lines -> {path: sha256}."""
+    hashes = {}
+    for line in output.splitlines():
+        digest, _, path = line.strip().partition("  ")
+        if path:
+            hashes[path] = digest
+    return hashes
+
+
+def changed_files(local, remote):
+    return sorted(path for path, digest in local.items() if remote.get(path) != digest)
+
 
-    ssh = create_ssh_client(ip, key_path)
-    scp = SCPClient(ssh.get_transport())
+def parent_dirs(paths):
+    """Every directory above `paths` (relative), e.g. worker/jobs/a.py -> worker, worker/jobs."""
+    dirs = set()
+    for path in paths:
+        parent = os.path.dirname(path)
+        while parent:
+            dirs.add(parent)
+            parent = os.path.dirname(parent)
+    return sorted(dirs)
 
-    remote_base = "/opt/job_workspace"
 
-    # Upload critical folders
-    for folder in ["worker", "storage", "checkpoint"]:
-        local_path = os.path.join(project_root, folder)
-        remote_path = os.path.join(remote_base, folder)
-        print(f"   📂 Copying {folder}...")
-        scp.put(local_path, recursive=True, remote_path=remote_base)
+def run(ssh, command, stdin_data=None):
+    """Run a command and wait for it; returns (exit status, stdout, stderr)."""
+    stdin, stdout, stderr = ssh.exec_command(command)
+    if stdin_data is not None:
+        stdin.write(stdin_data)
+        stdin.channel.shutdown_write()
+    out, err = stdout.read().decode(), stderr.read().decode()
+    return stdout.channel.recv_exit_status(), out, err
 
-    # Fix permissions & install deps
-    print("   🔧 Setting permissions and installing deps...")
-    ssh.exec_command(f"sudo chown -R ubuntu:ubuntu {remote_base}")
-    # Use python3 -m pip to avoid PATH issues on some AMIs
-    ssh.exec_command(f"python3 -m pip install boto3 requests paramiko scp")
 
-    scp.close()
-    ssh.close()
-    print("✅ Deployment Complete.")
+class Deployer:
+    def __init__(self, key_path, project_root=".", user="ubuntu", full=False):
+        self.key_path = key_path
+        self.project_root = project_root
+        self.user = user
+        self.full = full
+        self.manifest = build_manifest(project_root)
+        self.requirements = requirements_hash()
+        # Most hosts miss the same files, so identical archives are built once
+        self._archives = {}
+        self._lock = threading.Lock()
+
+    def archive(self, paths):
+        key = tuple(paths)
+        with self._lock:
+            if key not in self._archives:
+                buf = io.BytesIO()
+                with tarfile.open(fileobj=buf, mode="w:gz", compresslevel=6) as tar:
+                    for path in paths:
+                        tar.add(os.path.join(self.project_root, path), arcname=path)
+                self._archives[key] = buf.getvalue()
+            return self._archives[key]
+
+    def deploy(self, ip):
+        """Bring one host up to date. Returns its report; never raises."""
+        started = time.monotonic()
+        report = {"host": ip, "ok": False, "files": 0, "bytes_sent": 0, "deps": "skipped"}
+        ssh = None
+        try:
+            ssh = create_ssh_client(ip, self.key_path, self.user)
+            run(ssh, f"sudo mkdir -p {REMOTE_BASE} && sudo chown {self.user}:{self.user} {REMOTE_BASE}")
+
+            remote = {}
+            if not self.full:
+                paths = " ".join(shlex.quote(p) for p in self.manifest)
+                _, out, _ = run(ssh, f"cd {REMOTE_BASE} && sha256sum {paths} 2>/dev/null")
+                remote = parse_sha256sum(out)
+            changed = changed_files(self.manifest, remote)
+            if changed:
+                data = self.archive(changed)
+                # tar runs as root (checkpoint/ also holds root-owned dumps), so the
+                # directories it creates are handed to the user along with the files
+                quoted = " ".join(shlex.quote(p) for p in parent_dirs(changed) + changed)
+                status, _, err = run(
+                    ssh,
+                    f"sudo tar -xzf - -C {REMOTE_BASE} --no-same-owner && cd {REMOTE_BASE} && sudo chown {self.user}:{self.user} {quoted}",
+                    stdin_data=data,
+                )
+                if status:
+                    raise RuntimeError(f"extract failed ({status}): {err.strip()}")
+                report["files"], report["bytes_sent"] = len(changed), len(data)
+
+            stamp = f"{REMOTE_BASE}/{REQUIREMENTS_STAMP}"
+            _, out, _ = run(ssh, f"cat {stamp} 2>/dev/null")
+            if out.strip() != self.requirements:
+                # Use python3 -m pip to avoid PATH issues on some AMIs
+                status, _, err = run(ssh, f"python3 -m pip install {' '.join(WORKER_PACKAGES)}")
+                if status:
+                    raise RuntimeError(f"pip install failed ({status}): {err.strip()[-500:]}")
+                run(ssh, f"echo {self.requirements} > {stamp}")
+                report["deps"] = "installed"
+            report["ok"] = True
+        except Exception as e:
+            report["error"] = str(e)
+        finally:
+            if ssh:
+                ssh.close()
+        report["seconds"] = round(time.monotonic() - started, 2)
+        return report
+
+    def deploy_all(self, ips, parallel=16, on_report=None):
+        reports = []
+        with ThreadPoolExecutor(max_workers=max(1, parallel)) as pool:
+            for report in pool.map(self.deploy, ips):
+                reports.append(report)
+                if on_report:
+                    on_report(report)
+        return reports
+
+
+def deploy(ip, key_path, project_root):
+    """Deploy to a single worker (changed files only)."""
+    return Deployer(key_path, project_root).deploy(ip)
+
+
+def print_report(report):
+    if report["ok"]:
+        print(f"✅ {report['host']}: {report['files']} files, {report['bytes_sent']} bytes, deps {report['deps']}, {report['seconds']}s")
+    else:
+        print(f"❌ {report['host']}: {report.get('error')} ({report['seconds']}s)")
+
+
+def read_hosts(path):
+    with open(path) as f:
+        return [line.split("#")[0].strip() for line in f if line.split("#")[0].strip()]
 
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--ip", required=True, help="Public IP of the worker")
+    parser = argparse.ArgumentParser(description="Deploy worker code to one or many hosts (changed files only)")
+    parser.add_argument("--ip", action="append", default=[], help="Public IP of a worker; repeat for several")
+    parser.add_argument("--hosts-file", default=None, help="File with one worker IP per line")
     parser.add_argument("--key", required=True, help="Path to SSH private key")
     parser.add_argument("--root", default=".", help="Project root directory")
+    parser.add_argument("--user", default="ubuntu", help="SSH user")
+    parser.add_argument("--parallel", type=int, default=16, help="Hosts deployed at once")
+    parser.add_argument("--full", action="store_true", help="Send every file, not just the changed ones")
+    parser.add_argument("--output", default=None, help="Write the per-host report as JSON")
     args = parser.parse_args()
 
-    deploy(args.ip, args.key, args.root)
-
+    ips = args.ip + (read_hosts(args.hosts_file) if args.hosts_file else [])
+    if not ips:
+        parser.error("give --ip or --hosts-file")
+    deployer = Deployer(args.key, args.root, user=args.user, full=args.full)
+    print(f"🚀 Deploying {len(deployer.manifest)} files to {len(ips)} worker(s), {args.parallel} at a time")
+    reports = deployer.deploy_all(ips, args.parallel, on_report=print_report)
+    failed = [r for r in reports if not r["ok"]]
+    total = sum(r["bytes_sent"] for r in reports)
+    print(f"Done: {len(reports) - len(failed)}/{len(reports)} hosts, {total} bytes sent")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2)
+    raise SystemExit(1 if failed else 0)
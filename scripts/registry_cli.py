@@ -1,4 +1,7 @@
 import argparse
+import json
+import sys
+from decimal import Decimal
 from storage.dynamo_registry import DynamoRegistry
 from storage.job_registry import JobRegistry
 
@@ -13,6 +16,49 @@ def ensure_json(path, op_fn):
     return op_fn(reg)
 
 
+def _json_default(value):
+    # DynamoDB returns numbers as Decimal
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def read_ndjson(path, parse_float=float):
+    """
+    Yield one row per non-empty line; the file is streamed, never fully loaded.
+    """
+    f = sys.stdin if path == "-" else open(path)
+    try:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line, parse_float=parse_float)
+            except json.JSONDecodeError as e:
+                raise SystemExit(f"{path}:{line_no}: invalid JSON: {e}")
+            if "job_id" not in row:
+                raise SystemExit(f"{path}:{line_no}: missing job_id")
+            yield row
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def write_ndjson(path, rows):
+    f = sys.stdout if path == "-" else open(path, "w")
+    count = 0
+    try:
+        for row in rows:
+            f.write(json.dumps(row, default=_json_default, separators=(",", ":")))
+            f.write("\n")
+            count += 1
+    finally:
+        if f is not sys.stdout:
+            f.close()
+    return count
+
+
 def main():
     parser = argparse.ArgumentParser(description="Registry CLI (DynamoDB or JSON) for creating/updating jobs.")
     parser.add_argument("--backend", choices=["dynamo", "json"], required=True, help="Registry backend to use")
@@ -39,6 +85,13 @@ def main():
     update.add_argument("--workload-type", default=None)
     update.add_argument("--expected-version", type=int, default=None, help="Optimistic lock version (Dynamo only)")
 
+    bulk_import = subparsers.add_parser("import", help="Bulk-create jobs from an NDJSON file (one job object per line)")
+    bulk_import.add_argument("--file", required=True, help="NDJSON path ('-' for stdin)")
+
+    export = subparsers.add_parser("export", help="Export jobs to an NDJSON file")
+    export.add_argument("--file", required=True, help="NDJSON path ('-' for stdout)")
+    export.add_argument("--state", default=None, help="Only export jobs in this state")
+
     args = parser.parse_args()
 
     def do_create(reg):
@@ -67,18 +120,29 @@ def main():
         reg.update(args.job_id, args.state, expected_version=args.expected_version, **extra)
         print(f"Updated job {args.job_id}")
 
+    def do_import(reg):
+        # Dynamo rejects floats; keep them exact as Decimal
+        parse_float = Decimal if args.backend == "dynamo" else float
+        count = reg.batch_create(read_ndjson(args.file, parse_float=parse_float))
+        print(f"Imported {count} jobs", file=sys.stderr)
+
+    def do_export(reg):
+        count = write_ndjson(args.file, reg.iter_jobs(args.state))
+        print(f"Exported {count} jobs", file=sys.stderr)
+
+    commands = {
+        "create": do_create,
+        "update": do_update,
+        "import": do_import,
+        "export": do_export,
+    }
+
     if args.backend == "dynamo":
         if not args.table or not args.region:
             raise SystemExit("Dynamo backend requires --table and --region")
-        if args.command == "create":
-            ensure_dynamo(args.table, args.region, do_create)
-        elif args.command == "update":
-            ensure_dynamo(args.table, args.region, do_update)
+        ensure_dynamo(args.table, args.region, commands[args.command])
     else:
-        if args.command == "create":
-            ensure_json(args.json_path, do_create)
-        elif args.command == "update":
-            ensure_json(args.json_path, do_update)
+        ensure_json(args.json_path, commands[args.command])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,143 @@
+import time
+from threading import Lock
+
+import boto3
+from botocore.exceptions import ClientError
+from boto3.dynamodb.types import TypeDeserializer
+
+from storage.meta import is_meta_key
+
+
+class ChangeFeedGap(Exception):
+    """
+    Raised by poll() when changes may have been missed (e.g. an expired
+    stream iterator). Consumers should fall back to a full re-list.
+    """
+
+
+class LocalChangeFeed:
+    """
+    In-process change feed. Registries publish (job_id, record) pairs and a
+    consumer drains them with poll(). Changes are coalesced per job_id, so
+    memory is bounded by the number of jobs, not the number of updates.
+    A record of None means the job was removed.
+
+    Used by JobRegistry (fed from its log) and as a stand-in for tests.
+    """
+
+    def __init__(self, before_poll=None):
+        self._pending = {}
+        self._lock = Lock()
+        self._before_poll = before_poll
+
+    def publish(self, job_id, record):
+        with self._lock:
+            self._pending[job_id] = record
+
+    def poll(self):
+        if self._before_poll:
+            self._before_poll()
+        with self._lock:
+            changes, self._pending = self._pending, {}
+        return list(changes.items())
+
+
+class DynamoStreamFeed:
+    """
+    Change feed over DynamoDB Streams. The table needs a stream with
+    NEW_IMAGE or NEW_AND_OLD_IMAGES.
+
+    Shards open at start are read from LATEST; shards that appear later
+    (children of split/closed shards) are read from TRIM_HORIZON so nothing
+    written after start is skipped.
+    """
+
+    def __init__(self, table_name: str, region_name: str | None = None,
+                 shard_refresh_seconds: float = 10.0, page_limit: int = 1000):
+        self.table_name = table_name
+        self.shard_refresh_seconds = shard_refresh_seconds
+        self.page_limit = page_limit
+        self.dynamodb = boto3.client("dynamodb", region_name=region_name)
+        self.streams = boto3.client("dynamodbstreams", region_name=region_name)
+        self._deserializer = TypeDeserializer()
+
+        try:
+            table = self.dynamodb.describe_table(TableName=table_name)["Table"]
+        except ClientError as e:
+            raise RuntimeError(f"Dynamo describe_table failed: {e}")
+        self.stream_arn = table.get("LatestStreamArn")
+        spec = table.get("StreamSpecification") or {}
+        if not self.stream_arn or not spec.get("StreamEnabled"):
+            raise RuntimeError(f"DynamoDB Streams not enabled on table {table_name}")
+        if spec.get("StreamViewType") not in ("NEW_IMAGE", "NEW_AND_OLD_IMAGES"):
+            raise RuntimeError("Stream view type must include new images")
+
+        self._iterators = {}   # shard_id -> iterator (None once the shard is exhausted)
+        self._last_shard_refresh = 0.0
+        self._refresh_shards(initial=True)
+
+    def _list_shards(self):
+        shards = []
+        kwargs = {"StreamArn": self.stream_arn}
+        while True:
+            desc = self.streams.describe_stream(**kwargs)["StreamDescription"]
+            shards.extend(desc.get("Shards", []))
+            last = desc.get("LastEvaluatedShardId")
+            if not last:
+                return shards
+            kwargs["ExclusiveStartShardId"] = last
+
+    def _refresh_shards(self, initial=False):
+        try:
+            for shard in self._list_shards():
+                shard_id = shard["ShardId"]
+                if shard_id in self._iterators:
+                    continue
+                closed = "EndingSequenceNumber" in shard.get("SequenceNumberRange", {})
+                if initial and closed:
+                    # Fully written before we started; nothing new there
+                    self._iterators[shard_id] = None
+                    continue
+                self._iterators[shard_id] = self.streams.get_shard_iterator(
+                    StreamArn=self.stream_arn,
+                    ShardId=shard_id,
+                    ShardIteratorType="LATEST" if initial else "TRIM_HORIZON",
+                )["ShardIterator"]
+        except ClientError as e:
+            raise RuntimeError(f"Dynamo stream describe failed: {e}")
+        self._last_shard_refresh = time.time()
+
+    def _record(self, record):
+        data = record["dynamodb"]
+        keys = {k: self._deserializer.deserialize(v) for k, v in data["Keys"].items()}
+        job_id = keys["job_id"]
+        if record["eventName"] == "REMOVE":
+            return job_id, None
+        image = {k: self._deserializer.deserialize(v) for k, v in data.get("NewImage", {}).items()}
+        return job_id, image
+
+    def poll(self):
+        if time.time() - self._last_shard_refresh >= self.shard_refresh_seconds:
+            self._refresh_shards()
+
+        changes = {}
+        for shard_id, iterator in list(self._iterators.items()):
+            while iterator:
+                try:
+                    resp = self.streams.get_records(ShardIterator=iterator, Limit=self.page_limit)
+                except ClientError as e:
+                    if e.response["Error"]["Code"] in ("ExpiredIteratorException", "TrimmedDataAccessException"):
+                        # Re-anchor at LATEST; the caller must re-list to cover the gap
+                        self._iterators = {}
+                        self._refresh_shards(initial=True)
+                        raise ChangeFeedGap(f"stream iterator lost on {shard_id}: {e}")
+                    raise RuntimeError(f"Dynamo stream read failed: {e}")
+                for record in resp.get("Records", []):
+                    job_id, image = self._record(record)
+                    if not is_meta_key(job_id):
+                        changes[job_id] = image
+                iterator = resp.get("NextShardIterator")
+                if len(resp.get("Records", [])) < self.page_limit:
+                    break
+            self._iterators[shard_id] = iterator
+        return list(changes.items())
@@ -0,0 +1,307 @@
+# storage/checkpoint_packer.py
+"""
+Page-aware archive format for checkpoint directories ("pack" in
+S3Manager).
+
+CRIU images are mostly `pages-*.img`: process memory in 4 KiB pages, much
+of it untouched heap that is all zeros, and often the same page many
+times over. tar + gzip compresses every one of those bytes and extraction
+writes them all back out. Here each file is read through mmap and split
+into pages, hashed in place (no copies), and described by a run index:
+
+    [ZERO, n, 0]       n zero pages: nothing stored, a hole on extraction
+    [LITERAL, n, 0]    n pages stored (zlib) in the data frames that follow
+    [DUPLICATE, n, k]  n pages equal to stored pages k, k+1, ... of this archive
+
+Extraction writes literal and duplicate pages at their offsets and leaves
+zero runs as holes (sparse files).
+
+Stream layout, written and read strictly front to back (works over a pipe):
+
+    MAGIC
+    per entry: u32 length + JSON header {name, type, mode, mtime, ...}
+               files: header has "size" and "runs", then data frames
+               (u32 length + zlib bytes), ended by a zero-length frame
+    u32 0
+"""
+import bisect
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import zlib
+
+log = logging.getLogger("storage.checkpoint_packer")
+
+MAGIC = b"SPCKPT1\n"
+PAGE = 4096
+ZERO, LITERAL, DUPLICATE = 0, 1, 2
+# Dedup index cap (pages); about 100 bytes each, so the default stays under 0.5 GB
+DEDUP_LIMIT = 1 << 22
+FRAME = 1 << 20
+_LENGTH = struct.Struct(">I")
+_ZERO_DIGEST = hashlib.blake2b(bytes(PAGE), digest_size=16).digest()
+
+
+class PackFormatError(ValueError):
+    """The stream is not a checkpoint pack, or is truncated."""
+
+
+def _read_exact(fileobj, n):
+    chunks = []
+    while n:
+        data = fileobj.read(n)
+        if not data:
+            raise PackFormatError("truncated checkpoint pack")
+        chunks.append(data)
+        n -= len(data)
+    return b"".join(chunks)
+
+
+def _write_block(fileobj, data):
+    fileobj.write(_LENGTH.pack(len(data)))
+    if data:
+        fileobj.write(data)
+
+
+def _read_block(fileobj):
+    (length,) = _LENGTH.unpack(_read_exact(fileobj, _LENGTH.size))
+    return _read_exact(fileobj, length) if length else b""
+
+
+def _walk(path, arcname):
+    """(full path, archive name) for path and everything under it, parents first."""
+    yield path, arcname
+    if os.path.isdir(path) and not os.path.islink(path):
+        for name in sorted(os.listdir(path)):
+            yield from _walk(os.path.join(path, name), f"{arcname}/{name}")
+
+
+class Packer:
+    """
+    Writes one pack to `fileobj`. Duplicate pages are found across all
+    files of the archive, up to `dedup_limit` distinct pages.
+    """
+
+    def __init__(self, fileobj, level=None, dedup_limit=DEDUP_LIMIT):
+        self.fileobj = fileobj
+        self.level = 1 if level is None else level
+        self.dedup_limit = dedup_limit
+        self._seen = {}         # page digest -> literal page number
+        self._literals = 0      # literal pages written so far
+        self.stats = {"files": 0, "pages": 0, "zero_pages": 0, "duplicate_pages": 0, "literal_pages": 0}
+        fileobj.write(MAGIC)
+
+    def add(self, path, arcname, skip=None):
+        """Add path (recursively for directories); skip(member_name) -> True leaves a member out."""
+        skipped = None
+        for full, name in _walk(path, arcname):
+            if skipped and (name == skipped or name.startswith(skipped + "/")):
+                continue
+            if skip and skip(name):
+                skipped = name
+                continue
+            st = os.lstat(full)
+            header = {"name": name, "mode": st.st_mode & 0o7777, "mtime": st.st_mtime}
+            if os.path.islink(full):
+                self._header(dict(header, type="symlink", target=os.readlink(full)))
+            elif os.path.isdir(full):
+                self._header(dict(header, type="dir"))
+            else:
+                self._file(full, header)
+
+    def close(self):
+        _write_block(self.fileobj, b"")
+        log.info(
+            "Packed %d files: %d pages, %d zero, %d duplicate, %d stored",
+            self.stats["files"], self.stats["pages"], self.stats["zero_pages"],
+            self.stats["duplicate_pages"], self.stats["literal_pages"],
+        )
+        return self.stats
+
+    def _header(self, header):
+        _write_block(self.fileobj, json.dumps(header, separators=(",", ":")).encode())
+
+    def _file(self, path, header):
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if not size:
+                self._header(dict(header, type="file", size=0, runs=[]))
+                _write_block(self.fileobj, b"")
+                self.stats["files"] += 1
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)
+                try:
+                    runs, literal_ranges = self._classify(view, size)
+                    self._header(dict(header, type="file", size=size, runs=runs))
+                    self._write_literals(view, literal_ranges)
+                finally:
+                    view.release()
+        self.stats["files"] += 1
+
+    def _classify(self, view, size):
+        """Run index of one file, and the (start, end) byte ranges of its literal pages."""
+        runs, literal_ranges = [], []
+        for offset in range(0, size, PAGE):
+            page = view[offset:offset + PAGE]
+            full = len(page) == PAGE
+            digest = hashlib.blake2b(page, digest_size=16).digest() if full else None
+            if digest == _ZERO_DIGEST or (not full and not any(page)):
+                kind, ref = ZERO, 0
+            elif digest in self._seen:
+                kind, ref = DUPLICATE, self._seen[digest]
+            else:
+                kind, ref = LITERAL, 0
+                if full and len(self._seen) < self.dedup_limit:
+                    self._seen[digest] = self._literals
+                self._literals += 1
+                if literal_ranges and literal_ranges[-1][1] == offset:
+                    literal_ranges[-1][1] = offset + len(page)
+                else:
+                    literal_ranges.append([offset, offset + len(page)])
+            page.release()
+            last = runs[-1] if runs else None
+            if last and last[0] == kind and (kind != DUPLICATE or last[2] + last[1] == ref):
+                last[1] += 1
+            else:
+                runs.append([kind, 1, ref])
+        for kind, count, _ in runs:
+            self.stats[("zero_pages", "literal_pages", "duplicate_pages")[kind]] += count
+            self.stats["pages"] += count
+        return runs, literal_ranges
+
+    def _write_literals(self, view, literal_ranges):
+        compressor = zlib.compressobj(self.level)
+        for start, end in literal_ranges:
+            for chunk in range(start, end, FRAME):
+                data = compressor.compress(view[chunk:min(chunk + FRAME, end)])
+                if data:
+                    _write_block(self.fileobj, data)
+        data = compressor.flush()
+        if data:
+            _write_block(self.fileobj, data)
+        _write_block(self.fileobj, b"")
+
+
+def pack(fileobj, sources, level=None, skip=None):
+    """Write [(path, arcname), ...] to fileobj. Returns page statistics."""
+    packer = Packer(fileobj, level)
+    for path, arcname in sources:
+        packer.add(path, arcname, skip)
+    return packer.close()
+
+
+class _Literals:
+    """Decompressed literal pages of one file, read frame by frame."""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.decompressor = zlib.decompressobj()
+        self.buffer = bytearray()
+        self.done = False
+
+    def _next_frame(self):
+        frame = _read_block(self.fileobj)
+        if frame:
+            self.buffer += self.decompressor.decompress(frame)
+        else:
+            self.buffer += self.decompressor.flush()
+            self.done = True
+
+    def read(self, n):
+        while len(self.buffer) < n and not self.done:
+            self._next_frame()
+        if len(self.buffer) < n:
+            raise PackFormatError("literal pages shorter than the index")
+        data = bytes(self.buffer[:n])
+        del self.buffer[:n]
+        return data
+
+    def finish(self):
+        while not self.done:
+            self._next_frame()
+        if self.buffer:
+            raise PackFormatError("literal pages longer than the index")
+
+
+def _safe_path(root, name):
+    path = os.path.normpath(os.path.join(root, name))
+    if os.path.isabs(name) or not (path + os.sep).startswith(os.path.normpath(root) + os.sep):
+        raise PackFormatError(f"member {name!r} escapes the extraction root")
+    return path
+
+
+def unpack(fileobj, root):
+    """
+    Extract a pack under root; zero pages become holes. Returns the names
+    of the regular files extracted.
+    """
+    if _read_exact(fileobj, len(MAGIC)) != MAGIC:
+        raise PackFormatError("not a checkpoint pack")
+    os.makedirs(root, exist_ok=True)
+    literal_runs = []       # (first literal page number, count, path, byte offset), in order
+    literal_starts = []
+    literals = 0
+    names = []
+    while True:
+        block = _read_block(fileobj)
+        if not block:
+            break
+        header = json.loads(block)
+        path = _safe_path(root, header["name"])
+        kind = header["type"]
+        if kind == "dir":
+            os.makedirs(path, exist_ok=True)
+            os.chmod(path, header["mode"])
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.lexists(path) and not os.path.isdir(path):
+            os.remove(path)
+        if kind == "symlink":
+            os.symlink(header["target"], path)
+            continue
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            size = header["size"]
+            data = _Literals(fileobj)
+            offset = 0
+            for run_kind, count, ref in header["runs"]:
+                length = min(count * PAGE, size - offset)
+                if run_kind == LITERAL:
+                    os.pwrite(fd, data.read(length), offset)
+                    literal_runs.append((literals, count, path, offset))
+                    literal_starts.append(literals)
+                    literals += count
+                elif run_kind == DUPLICATE:
+                    os.pwrite(fd, _copy_literals(literal_runs, literal_starts, ref, count), offset)
+                offset += length
+            data.finish()
+            # Zero runs are never written: truncate leaves them as holes
+            os.ftruncate(fd, size)
+        finally:
+            os.close(fd)
+        os.chmod(path, header["mode"])
+        os.utime(path, (header["mtime"], header["mtime"]))
+        names.append(header["name"])
+    return names
+
+
+def _copy_literals(literal_runs, literal_starts, ref, count):
+    """Bytes of stored pages ref .. ref + count - 1, read back from the files already extracted."""
+    out = bytearray()
+    while count:
+        i = bisect.bisect_right(literal_starts, ref) - 1
+        first, run_count, path, offset = literal_runs[i]
+        take = min(count, first + run_count - ref)
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            out += os.pread(fd, take * PAGE, offset + (ref - first) * PAGE)
+        finally:
+            os.close(fd)
+        ref += take
+        count -= take
+    return bytes(out)
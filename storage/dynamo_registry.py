@@ -1,9 +1,29 @@
 import boto3
+import random
+import time
+from itertools import islice
 from botocore.exceptions import ClientError
 from boto3.dynamodb.conditions import Attr
 from threading import Lock
 from datetime import datetime
 
+from storage.change_feed import DynamoStreamFeed
+from storage.meta import META_PREFIX, lease_key, members_key, meta_key
+
+# Service limits for the bulk APIs
+BATCH_WRITE_LIMIT = 25
+BATCH_GET_LIMIT = 100
+TRANSACT_WRITE_LIMIT = 100
+
+
+def _chunks(iterable, size):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
 
 class DynamoRegistry:
     """
@@ -16,8 +36,11 @@ class DynamoRegistry:
 
     def __init__(self, table_name: str, region_name: str | None = None):
         self.table_name = table_name
+        self.region_name = region_name
         self.dynamodb = boto3.resource("dynamodb", region_name=region_name)
         self.table = self.dynamodb.Table(table_name)
+        # Resource-level client: accepts plain Python types like Table does
+        self.client = self.dynamodb.meta.client
         self.lock = Lock()
 
     def get(self, job_id: str):
@@ -29,13 +52,16 @@ class DynamoRegistry:
         except ClientError as e:
             raise RuntimeError(f"Dynamo get failed: {e}")
 
-    def create(self, job_id: str, **attrs):
-        item = {
+    def _new_item(self, job_id: str, attrs: dict):
+        return {
             "job_id": job_id,
             "version": 0,
             "last_updated": datetime.utcnow().isoformat(),
             **attrs,
         }
+
+    def create(self, job_id: str, **attrs):
+        item = self._new_item(job_id, attrs)
         try:
             self.table.put_item(Item=item, ConditionExpression="attribute_not_exists(job_id)")
         except ClientError as e:
@@ -52,6 +78,42 @@ class DynamoRegistry:
         except ClientError as e:
             raise RuntimeError(f"Dynamo version check failed: {e}")
 
+    def _update_params(self, job_id: str, state: str, current_version, attrs: dict, steps: int = 1):
+        """
+        Build the UpdateItem parameters shared by update() and update_many().
+        `steps` is how many updates this one stands for (the version moves by as many).
+        """
+        new_version = (current_version or 0) + steps
+
+        names = {"#state": "state"}
+        values = {
+            ":state": state,
+            ":version": new_version,
+            ":last_updated": datetime.utcnow().isoformat(),
+        }
+        expr_parts = ["#state = :state", "version = :version", "last_updated = :last_updated"]
+
+        for k, v in attrs.items():
+            ph_name = f"#{k}"
+            ph_val = f":{k}"
+            names[ph_name] = k
+            values[ph_val] = v
+            expr_parts.append(f"{ph_name} = {ph_val}")
+
+        if current_version is None:
+            condition = "attribute_exists(job_id) AND attribute_not_exists(version)"
+        else:
+            condition = "version = :expected"
+            values[":expected"] = current_version
+
+        return {
+            "Key": {"job_id": job_id},
+            "UpdateExpression": "SET " + ", ".join(expr_parts),
+            "ExpressionAttributeNames": names,
+            "ExpressionAttributeValues": values,
+            "ConditionExpression": condition,
+        }
+
     def update(self, job_id: str, state: str, expected_version: int | None = None, **attrs):
         """
         Update state and attributes with optimistic locking (version check).
@@ -61,44 +123,129 @@ class DynamoRegistry:
             current_version = expected_version
             if current_version is None:
                 current_version = self._current_version(job_id)
-            new_version = (current_version or 0) + 1
-
-            names = {"#state": "state"}
-            values = {
-                ":state": state,
-                ":version": new_version,
-                ":last_updated": datetime.utcnow().isoformat(),
-            }
-            expr_parts = ["#state = :state", "version = :version", "last_updated = :last_updated"]
-
-            for k, v in attrs.items():
-                ph_name = f"#{k}"
-                ph_val = f":{k}"
-                names[ph_name] = k
-                values[ph_val] = v
-                expr_parts.append(f"{ph_name} = {ph_val}")
-
-            update_expr = "SET " + ", ".join(expr_parts)
-            if current_version is None:
-                condition = "attribute_not_exists(version)"
-                values[":expected"] = 0
-            else:
-                condition = "version = :expected"
-                values[":expected"] = current_version
 
             try:
-                self.table.update_item(
-                    Key={"job_id": job_id},
-                    UpdateExpression=update_expr,
-                    ExpressionAttributeNames=names,
-                    ExpressionAttributeValues=values,
-                    ConditionExpression=condition,
-                )
+                self.table.update_item(**self._update_params(job_id, state, current_version, attrs))
             except ClientError as e:
                 if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
                     raise RuntimeError(f"Optimistic lock failed for job_id {job_id}")
                 raise RuntimeError(f"Dynamo update failed: {e}")
 
+    def batch_create(self, items, max_attempts: int = 8, base_delay: float = 0.05):
+        """
+        Bulk-create jobs with BatchWriteItem, 25 items per request.
+
+        items: iterable of dicts, each with a job_id. It is consumed lazily, so
+        generators (e.g. an NDJSON reader) are never fully materialized.
+        UnprocessedItems are retried with exponential backoff and jitter.
+        Unlike create(), BatchWriteItem cannot carry conditions: an existing
+        job_id is overwritten. Returns the number of items written.
+        """
+        written = 0
+        for chunk in _chunks(items, BATCH_WRITE_LIMIT):
+            # Duplicate keys in one request are rejected; last one wins
+            by_id = {}
+            for attrs in chunk:
+                attrs = dict(attrs)
+                job_id = attrs.pop("job_id")
+                by_id[job_id] = self._new_item(job_id, attrs)
+            pending = [{"PutRequest": {"Item": item}} for item in by_id.values()]
+
+            attempt = 0
+            while pending:
+                try:
+                    resp = self.client.batch_write_item(RequestItems={self.table_name: pending})
+                except ClientError as e:
+                    raise RuntimeError(f"Dynamo batch_create failed: {e}")
+                pending = resp.get("UnprocessedItems", {}).get(self.table_name, [])
+                if not pending:
+                    break
+                attempt += 1
+                if attempt >= max_attempts:
+                    raise RuntimeError(
+                        f"Dynamo batch_create gave up with {len(pending)} unprocessed items"
+                    )
+                time.sleep(random.uniform(0, base_delay * (2 ** attempt)))
+            written += len(by_id)
+        return written
+
+    def _current_versions(self, job_ids):
+        """
+        Fetch current versions for many jobs with BatchGetItem.
+        Returns {job_id: version}; raises KeyError for missing jobs.
+        """
+        versions = {}
+        for chunk in _chunks(job_ids, BATCH_GET_LIMIT):
+            request = {
+                self.table_name: {
+                    "Keys": [{"job_id": j} for j in chunk],
+                    "ProjectionExpression": "job_id, version",
+                }
+            }
+            while request:
+                try:
+                    resp = self.client.batch_get_item(RequestItems=request)
+                except ClientError as e:
+                    raise RuntimeError(f"Dynamo version check failed: {e}")
+                for item in resp.get("Responses", {}).get(self.table_name, []):
+                    versions[item["job_id"]] = item.get("version")
+                request = resp.get("UnprocessedKeys") or None
+            missing = [j for j in chunk if j not in versions]
+            if missing:
+                raise KeyError(f"job_id {missing[0]} not found")
+        return versions
+
+    def update_many(self, updates):
+        """
+        Apply grouped state transitions with TransactWriteItems.
+
+        updates: list of dicts {"job_id", "state", "expected_version" (optional), **attrs}.
+        Several updates to one job chain like JobRegistry.update_many's: a
+        transaction may touch an item only once, so they are merged into one
+        write (last state and attrs win, version advanced once per update)
+        after checking each expected version against the one before it.
+        Missing expected versions are read with one BatchGetItem pass. Each
+        group of up to 100 jobs is applied atomically: if any version check
+        fails, none of that group is written and RuntimeError is raised.
+        """
+        merged = {}     # job_id -> [state, expected_version, attrs, steps, later (expected_version, offset) checks]
+        for u in updates:
+            u = dict(u)
+            job_id = u.pop("job_id")
+            state = u.pop("state")
+            expected = u.pop("expected_version", None)
+            if job_id not in merged:
+                merged[job_id] = [state, expected, u, 1, []]
+                continue
+            entry = merged[job_id]
+            if expected is not None:
+                entry[4].append((expected, entry[3]))
+            entry[0] = state
+            entry[2].update(u)
+            entry[3] += 1
+
+        unknown = [job_id for job_id, entry in merged.items() if entry[1] is None]
+        versions = self._current_versions(unknown) if unknown else {}
+        for job_id, (_, expected, _, _, checks) in merged.items():
+            base = expected if expected is not None else (versions.get(job_id) or 0)
+            if any(later != base + offset for later, offset in checks):
+                raise RuntimeError(f"Optimistic lock failed for job_id {job_id}")
+
+        with self.lock:
+            for chunk in _chunks(list(merged.items()), TRANSACT_WRITE_LIMIT):
+                transact_items = []
+                for job_id, (state, expected, attrs, steps, _) in chunk:
+                    if expected is None:
+                        expected = versions.get(job_id)
+                    params = self._update_params(job_id, state, expected, attrs, steps)
+                    transact_items.append({"Update": {"TableName": self.table_name, **params}})
+                try:
+                    self.client.transact_write_items(TransactItems=transact_items)
+                except ClientError as e:
+                    if e.response["Error"]["Code"] == "TransactionCanceledException":
+                        raise RuntimeError(f"Optimistic lock failed for transaction: {e}")
+                    raise RuntimeError(f"Dynamo update_many failed: {e}")
+
     def list_by_state(self, state: str):
         """
         List jobs by state. Uses Scan with a filter (add a GSI on state for scale if needed).
@@ -117,3 +264,128 @@ class DynamoRegistry:
         except ClientError as e:
             raise RuntimeError(f"Dynamo list_by_state failed: {e}")
 
+    def change_feed(self):
+        """
+        Change feed over the table's DynamoDB Stream (must be enabled with
+        NEW_IMAGE or NEW_AND_OLD_IMAGES). Raises RuntimeError otherwise.
+        """
+        return DynamoStreamFeed(self.table_name, region_name=self.region_name)
+
+    def iter_jobs(self, state: str | None = None):
+        """
+        Stream all jobs (optionally filtered by state), one scan page at a time.
+        """
+        scan_kwargs = {"FilterExpression": ~Attr("job_id").begins_with(META_PREFIX)}
+        if state:
+            scan_kwargs["FilterExpression"] = Attr("state").eq(state)
+        try:
+            while True:
+                resp = self.table.scan(**scan_kwargs)
+                yield from resp.get("Items", [])
+                if "LastEvaluatedKey" in resp:
+                    scan_kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+                else:
+                    break
+        except ClientError as e:
+            raise RuntimeError(f"Dynamo scan failed: {e}")
+
+    # ------------------------------------------------------------------
+    # Coordination records (see storage/meta.py)
+    # ------------------------------------------------------------------
+    def get_meta(self, name: str):
+        try:
+            resp = self.table.get_item(Key={"job_id": meta_key(name)})
+        except ClientError as e:
+            raise RuntimeError(f"Dynamo get_meta failed: {e}")
+        return resp.get("Item")
+
+    def put_meta(self, name: str, **attrs):
+        try:
+            self.table.put_item(Item={"job_id": meta_key(name), **attrs})
+        except ClientError as e:
+            raise RuntimeError(f"Dynamo put_meta failed: {e}")
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """
+        Take or renew a lease. Succeeds if it is free, expired, or already ours.
+        Expiry uses wall-clock milliseconds, so replica clocks must be roughly in sync.
+        """
+        now_ms = int(time.time() * 1000)
+        try:
+            self.table.put_item(
+                Item={"job_id": lease_key(name), "owner": owner, "expires_at_ms": now_ms + int(ttl * 1000)},
+                ConditionExpression="attribute_not_exists(job_id) OR expires_at_ms < :now OR #owner = :owner",
+                ExpressionAttributeNames={"#owner": "owner"},
+                ExpressionAttributeValues={":now": now_ms, ":owner": owner},
+            )
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise RuntimeError(f"Dynamo acquire_lease failed: {e}")
+
+    def release_lease(self, name: str, owner: str):
+        try:
+            self.table.delete_item(
+                Key={"job_id": lease_key(name)},
+                ConditionExpression="#owner = :owner",
+                ExpressionAttributeNames={"#owner": "owner"},
+                ExpressionAttributeValues={":owner": owner},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise RuntimeError(f"Dynamo release_lease failed: {e}")
+
+    def heartbeat(self, group: str, member: str, ttl: float):
+        """
+        Record `member` as alive in `group` for `ttl` seconds. All members
+        share one item (a map of member -> expiry) so reading the group is a
+        single GetItem instead of a scan.
+        """
+        key = {"job_id": members_key(group)}
+        expires = int((time.time() + ttl) * 1000)
+        for _ in range(3):
+            try:
+                self.table.update_item(
+                    Key=key,
+                    UpdateExpression="SET members.#m = :exp",
+                    ConditionExpression="attribute_exists(members)",
+                    ExpressionAttributeNames={"#m": member},
+                    ExpressionAttributeValues={":exp": expires},
+                )
+                return
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise RuntimeError(f"Dynamo heartbeat failed: {e}")
+            try:
+                self.table.put_item(
+                    Item={**key, "members": {member: expires}},
+                    ConditionExpression="attribute_not_exists(job_id)",
+                )
+                return
+            except ClientError as e:
+                # Another replica created the item first; update it instead
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise RuntimeError(f"Dynamo heartbeat failed: {e}")
+        raise RuntimeError(f"Dynamo heartbeat for {member} did not converge")
+
+    def live_members(self, group: str):
+        try:
+            resp = self.table.get_item(Key={"job_id": members_key(group)})
+        except ClientError as e:
+            raise RuntimeError(f"Dynamo live_members failed: {e}")
+        now_ms = int(time.time() * 1000)
+        members = resp.get("Item", {}).get("members", {})
+        return sorted(m for m, exp in members.items() if exp >= now_ms)
+
+    def leave(self, group: str, member: str):
+        try:
+            self.table.update_item(
+                Key={"job_id": members_key(group)},
+                UpdateExpression="REMOVE members.#m",
+                ConditionExpression="attribute_exists(members)",
+                ExpressionAttributeNames={"#m": member},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise RuntimeError(f"Dynamo leave failed: {e}")
@@ -1,26 +1,385 @@
-# storage/job_registry.py
+import fcntl
 import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
 from threading import Lock
 
+from storage.change_feed import LocalChangeFeed
+from storage.meta import is_meta_key, lease_key, members_key, meta_key
+
+
 class JobRegistry:
-    def __init__(self, path="storage/job_registry.json"):
+    """
+    Local job registry: a JSON snapshot plus an append-only change log.
+
+    Files (all next to `path`):
+      - <path>        compacted snapshot, {job_id: record}
+      - <path>.log    NDJSON, one full record per change
+      - <path>.lock   flock(2) target that serializes writers across processes
+
+    Reads are served from an in-memory index. Changes made by other processes
+    are picked up by replaying the log tail whenever the log or snapshot
+    changes on disk. Once the log holds `compact_after` records it is folded
+    into a new snapshot (tmp file + fsync + rename) by a background thread.
+
+    change_feed() hands out LocalChangeFeeds that receive every record that
+    changes in the index, whichever process wrote it.
+    """
+
+    def __init__(self, path="storage/job_registry.json", compact_after=1000, fsync=True):
         self.path = path
+        self.log_path = f"{path}.log"
+        self.lock_path = f"{path}.lock"
+        self.compact_after = compact_after
+        self.fsync = fsync
         self.lock = Lock()
 
-    def _load(self):
-        with open(self.path) as f:
-            return json.load(f)
+        self._jobs = {}
+        self._meta = {}
+        self._by_state = {}
+        self._snapshot_sig = None
+        self._log_offset = 0
+        self._log_records = 0
+        self._compactor = None
+        self._feeds = []
+
+        with self._file_lock(exclusive=False), self.lock:
+            self._reload()
+
+    # ------------------------------------------------------------------
+    # File locking and on-disk state
+    # ------------------------------------------------------------------
+    @contextmanager
+    def _file_lock(self, exclusive=True):
+        # A fresh descriptor per acquisition so threads of this process
+        # also exclude each other (flock is per open file description).
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _stat_sig(path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _log_size(self):
+        try:
+            return os.path.getsize(self.log_path)
+        except FileNotFoundError:
+            return 0
+
+    def _is_stale(self):
+        if self._stat_sig(self.path) != self._snapshot_sig:
+            return True
+        return self._log_size() != self._log_offset
+
+    def _index(self, job_id, record, publish=True):
+        if is_meta_key(job_id):
+            self._meta[job_id] = record
+            return
+        old = self._jobs.get(job_id)
+        if old is not None:
+            ids = self._by_state.get(old.get("state"))
+            if ids is not None:
+                ids.discard(job_id)
+        self._jobs[job_id] = record
+        self._by_state.setdefault(record.get("state"), set()).add(job_id)
+        if publish and self._feeds and old != record:
+            self._publish(job_id, record)
+
+    def _publish(self, job_id, record):
+        for feed in self._feeds:
+            feed.publish(job_id, None if record is None else {"job_id": job_id, **record})
 
-    def _save(self, data):
-        with open(self.path, "w") as f:
-            json.dump(data, f, indent=2)
+    def _reload(self):
+        """Rebuild the index from snapshot + full log. Caller holds the file lock and self.lock."""
+        previous = self._jobs
+        self._jobs = {}
+        self._meta = {}
+        self._by_state = {}
+        sig = self._stat_sig(self.path)
+        if sig is not None:
+            with open(self.path) as f:
+                data = json.load(f)
+            for job_id, record in data.items():
+                self._index(job_id, record, publish=False)
+        self._snapshot_sig = sig
+        self._log_offset = 0
+        self._log_records = 0
+        self._replay_tail(publish=False)
 
+        # Report only what differs from the index we had before
+        if self._feeds:
+            for job_id in previous.keys() - self._jobs.keys():
+                self._publish(job_id, None)
+            for job_id, record in self._jobs.items():
+                if previous.get(job_id) != record:
+                    self._publish(job_id, record)
+
+    def _replay_tail(self, publish=True):
+        """Apply complete log lines past the current offset; a torn last line is left alone."""
+        try:
+            f = open(self.log_path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(self._log_offset)
+            chunk = f.read()
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            self._index(entry["job_id"], entry["record"], publish=publish)
+            self._log_records += 1
+        self._log_offset += end
+
+    def _refresh(self):
+        """Catch up with other processes. Caller holds the file lock and self.lock."""
+        if self._stat_sig(self.path) != self._snapshot_sig or self._log_size() < self._log_offset:
+            self._reload()
+        else:
+            self._replay_tail()
+
+    def _ensure_fresh(self):
+        with self.lock:
+            if not self._is_stale():
+                return
+        with self._file_lock(exclusive=False), self.lock:
+            self._refresh()
+
+    def _commit(self, build):
+        """
+        Run build(jobs) -> {job_id: new_record} under the exclusive file lock,
+        append the results to the log and apply them to the index.
+        build() raises to abort; nothing is written in that case.
+        """
+        with self._file_lock(exclusive=True), self.lock:
+            self._refresh()
+            changes = build(self._jobs)
+            if not changes:
+                return changes
+            payload = b"".join(
+                json.dumps({"op": "put", "job_id": job_id, "record": record}, separators=(",", ":")).encode() + b"\n"
+                for job_id, record in changes.items()
+            )
+            fd = os.open(self.log_path, os.O_WRONLY | os.O_CREAT, 0o644)
+            try:
+                # Drop a torn tail left by a writer that crashed mid-append
+                if os.fstat(fd).st_size != self._log_offset:
+                    os.ftruncate(fd, self._log_offset)
+                os.lseek(fd, self._log_offset, os.SEEK_SET)
+                os.write(fd, payload)
+                if self.fsync:
+                    os.fsync(fd)
+            finally:
+                os.close(fd)
+            for job_id, record in changes.items():
+                self._index(job_id, record)
+            self._log_offset += len(payload)
+            self._log_records += len(changes)
+            should_compact = self._log_records >= self.compact_after
+        if should_compact:
+            self._start_compaction()
+        return changes
+
+    def _start_compaction(self):
+        with self.lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            self._compactor = threading.Thread(target=self.compact, name="registry-compactor", daemon=True)
+            self._compactor.start()
+
+    def compact(self):
+        """
+        Fold the log into a new snapshot atomically, then truncate the log.
+        Readers in this process keep serving from the index meanwhile.
+        """
+        with self._file_lock(exclusive=True):
+            with self.lock:
+                self._refresh()
+                data = {**self._jobs, **self._meta}
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            # A crash here is harmless: replaying the old log over the new
+            # snapshot yields the same records.
+            with open(self.log_path, "a") as f:
+                f.truncate(0)
+                os.fsync(f.fileno())
+            dir_fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+            with self.lock:
+                self._snapshot_sig = self._stat_sig(self.path)
+                self._log_offset = 0
+                self._log_records = 0
+
+    # ------------------------------------------------------------------
+    # Public API (mirrors DynamoRegistry)
+    # ------------------------------------------------------------------
     def get(self, job_id):
-        return self._load()[job_id]
+        self._ensure_fresh()
+        with self.lock:
+            return dict(self._jobs[job_id])
+
+    def _new_record(self, job_id, attrs):
+        return {
+            "job_id": job_id,
+            "version": 0,
+            "last_updated": datetime.utcnow().isoformat(),
+            **attrs,
+        }
+
+    def create(self, job_id, **attrs):
+        def build(jobs):
+            if job_id in jobs:
+                raise KeyError(f"job_id {job_id} already exists")
+            return {job_id: self._new_record(job_id, attrs)}
+
+        self._commit(build)
 
-    def update(self, job_id, state, **kwargs):
+    def _updated(self, jobs, job_id, state, expected_version, attrs):
+        record = dict(jobs[job_id])
+        current_version = record.get("version", 0)
+        if expected_version is not None and expected_version != current_version:
+            raise RuntimeError(f"Optimistic lock failed for job_id {job_id}")
+        record["state"] = state
+        record.update(attrs)
+        record["version"] = current_version + 1
+        record["last_updated"] = datetime.utcnow().isoformat()
+        return record
+
+    def update(self, job_id, state, expected_version=None, **kwargs):
+        self._commit(lambda jobs: {job_id: self._updated(jobs, job_id, state, expected_version, kwargs)})
+
+    def batch_create(self, items):
+        """
+        Bulk-create jobs in one log append. Like DynamoRegistry.batch_create,
+        existing job_ids are overwritten. Returns the number of items written.
+        """
+        def build(jobs):
+            changes = {}
+            for attrs in items:
+                attrs = dict(attrs)
+                job_id = attrs.pop("job_id")
+                changes[job_id] = self._new_record(job_id, attrs)
+            return changes
+
+        return len(self._commit(build))
+
+    def update_many(self, updates):
+        """
+        Apply grouped state transitions all-or-nothing.
+        updates: list of dicts {"job_id", "state", "expected_version" (optional), **attrs}.
+        """
+        def build(jobs):
+            changes = {}
+            for u in updates:
+                u = dict(u)
+                job_id = u.pop("job_id")
+                state = u.pop("state")
+                expected = u.pop("expected_version", None)
+                # Chain onto earlier updates to the same job in this group
+                view = {job_id: changes[job_id]} if job_id in changes else jobs
+                changes[job_id] = self._updated(view, job_id, state, expected, u)
+            return changes
+
+        self._commit(build)
+
+    def change_feed(self):
+        """
+        Subscribe to record changes. poll() first catches up with the log, so
+        writes from other processes (e.g. registry_cli.py) are included.
+        """
+        feed = LocalChangeFeed(before_poll=self._ensure_fresh)
+        with self.lock:
+            self._feeds.append(feed)
+        return feed
+
+    def list_by_state(self, state):
+        self._ensure_fresh()
+        with self.lock:
+            return [{"job_id": j, **self._jobs[j]} for j in self._by_state.get(state, ())]
+
+    def iter_jobs(self, state=None):
+        if state is not None:
+            yield from self.list_by_state(state)
+            return
+        self._ensure_fresh()
+        with self.lock:
+            jobs = [{"job_id": j, **r} for j, r in self._jobs.items()]
+        yield from jobs
+
+    # ------------------------------------------------------------------
+    # Coordination records (see storage/meta.py); same API as DynamoRegistry
+    # ------------------------------------------------------------------
+    def get_meta(self, name):
+        self._ensure_fresh()
+        with self.lock:
+            record = self._meta.get(meta_key(name))
+            return dict(record) if record is not None else None
+
+    def put_meta(self, name, **attrs):
+        self._commit(lambda jobs: {meta_key(name): dict(attrs)})
+
+    def acquire_lease(self, name, owner, ttl):
+        key = lease_key(name)
+        now_ms = int(time.time() * 1000)
+
+        def build(jobs):
+            current = self._meta.get(key)
+            if current and current.get("owner") != owner and current.get("expires_at_ms", 0) >= now_ms:
+                return {}
+            return {key: {"owner": owner, "expires_at_ms": now_ms + int(ttl * 1000)}}
+
+        return bool(self._commit(build))
+
+    def release_lease(self, name, owner):
+        key = lease_key(name)
+
+        def build(jobs):
+            current = self._meta.get(key)
+            if not current or current.get("owner") != owner:
+                return {}
+            return {key: {"owner": None, "expires_at_ms": 0}}
+
+        self._commit(build)
+
+    def _update_members(self, group, fn):
+        key = members_key(group)
+
+        def build(jobs):
+            members = dict((self._meta.get(key) or {}).get("members", {}))
+            fn(members)
+            return {key: {"members": members}}
+
+        self._commit(build)
+
+    def heartbeat(self, group, member, ttl):
+        expires = int((time.time() + ttl) * 1000)
+        self._update_members(group, lambda members: members.__setitem__(member, expires))
+
+    def live_members(self, group):
+        self._ensure_fresh()
+        now_ms = int(time.time() * 1000)
         with self.lock:
-            data = self._load()
-            data[job_id]["state"] = state
-            data[job_id].update(kwargs)
-            self._save(data)
+            members = (self._meta.get(members_key(group)) or {}).get("members", {})
+            return sorted(m for m, exp in members.items() if exp >= now_ms)
+
+    def leave(self, group, member):
+        self._update_members(group, lambda members: members.pop(member, None))
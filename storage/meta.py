@@ -0,0 +1,22 @@
+"""
+Reserved registry keys for non-job records (leases, membership, shared
+state) stored in the same table/log as jobs. Job listings, exports and
+change feeds skip every key with META_PREFIX.
+"""
+META_PREFIX = "__"
+
+
+def is_meta_key(key):
+    return str(key).startswith(META_PREFIX)
+
+
+def meta_key(name):
+    return f"{META_PREFIX}{name}"
+
+
+def lease_key(name):
+    return meta_key(f"lease#{name}")
+
+
+def members_key(group):
+    return meta_key(f"members#{group}")
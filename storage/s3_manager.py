@@ -1,59 +1,470 @@
 # storage/s3_manager.py
 import argparse
 import boto3
+import bz2
+import gzip
+import json
+import logging
+import lzma
 import tarfile
 import os
+import shutil
 import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+
+from storage.checkpoint_packer import Packer, unpack
+
+log = logging.getLogger("storage.s3_manager")
+
+MB = 1024 * 1024
+# S3's smallest multipart part (all but the last)
+MIN_PART = 5 * MB
+CHECKPOINT_DIR = "/opt/job_workspace/checkpoint"
+# Background snapshots (worker/background_checkpointer.py) live in <checkpoint dir>/snapshots;
+# a dump on top of them lists the snapshots it needs in <checkpoint dir>/chain.json
+SNAPSHOTS_DIR = "snapshots"
+CHAIN_FILE = "chain.json"
+# criu_wrapper.sh dump pins the snapshot chain it builds on with snapshots/HOLD until its archive is uploaded
+HOLD_FILE = "HOLD"
+
+# name -> (archive suffix, opener(fileobj, level) or None for plain tar);
+# "pack" is not tar but storage/checkpoint_packer.py (zero/duplicate pages as runs, sparse restore)
+PACK = "pack"
+COMPRESSION = {
+    PACK: (".pack", None),
+    "none": (".tar", None),
+    "gz": (".tar.gz", lambda f, level: gzip.GzipFile(fileobj=f, mode="wb", compresslevel=6 if level is None else level)),
+    "bz2": (".tar.bz2", lambda f, level: bz2.BZ2File(f, mode="wb", compresslevel=9 if level is None else level)),
+    "xz": (".tar.xz", lambda f, level: lzma.LZMAFile(f, mode="wb", preset=level)),
+}
+
+
+class _CountingReader:
+    """File-like wrapper that counts bytes read through it."""
+
+    def __init__(self, f):
+        self.f = f
+        self.bytes = 0
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.bytes += len(data)
+        return data
 
 
 class S3Manager:
-    def __init__(self, bucket):
+    """
+    Moves checkpoint archives between the worker and S3. After each
+    transfer `last_transfer` holds {"action", "key", "bytes", "seconds"};
+    the CLI prints it as a JSON line for the orchestrator's trace spans.
+
+    compression is one of COMPRESSION ("gz" by default); `level` is passed
+    to the compressor. chunk_mb/concurrency tune multipart transfers.
+    Upload and download must use the same compression (it picks the key).
+
+    Staged snapshots are uploaded once each as <job>.snapshots/<name><suffix>
+    and listed in the manifest <job>.chain.json. Checkpoint archives leave
+    the local snapshots dir out; downloads fetch the snapshots a dump's
+    chain.json refers to, so only the delta since the last snapshot moves
+    at migration time.
+    """
+
+    def __init__(self, bucket, compression="gz", level=None, chunk_mb=None, concurrency=None, tmp_dir="/tmp"):
+        if compression not in COMPRESSION:
+            raise ValueError(f"compression must be one of {sorted(COMPRESSION)}")
         self.bucket = bucket
+        self.compression = compression
+        self.level = level
+        self.tmp_dir = tmp_dir
         self.s3 = boto3.client("s3")
+        options = {}
+        if chunk_mb:
+            options["multipart_chunksize"] = int(chunk_mb * MB)
+            options["multipart_threshold"] = int(chunk_mb * MB)
+        if concurrency:
+            options["max_concurrency"] = concurrency
+            options["use_threads"] = concurrency > 1
+        self.transfer_config = TransferConfig(**options)
+        self.last_transfer = None
+
+    def archive_name(self, job_id):
+        return f"{job_id}{COMPRESSION[self.compression][0]}"
+
+    def snapshot_key(self, job_id, name):
+        return f"{job_id}.snapshots/{name}{COMPRESSION[self.compression][0]}"
+
+    @staticmethod
+    def manifest_key(job_id):
+        return f"{job_id}.{CHAIN_FILE}"
+
+    def _record(self, action, key, nbytes, started):
+        self.last_transfer = {
+            "action": action,
+            "key": key,
+            "bytes": nbytes,
+            "seconds": round(time.monotonic() - started, 3),
+        }
+        log.info("%s s3://%s/%s: %d bytes in %.1fs", action, self.bucket, key, nbytes, self.last_transfer["seconds"])
+
+    @contextmanager
+    def _tar_writer(self, fileobj):
+        """Stream-mode tar writer over a compressor wrapping fileobj."""
+        opener = COMPRESSION[self.compression][1]
+        out = opener(fileobj, self.level) if opener else fileobj
+        try:
+            with tarfile.open(fileobj=out, mode="w|") as tar:
+                yield tar
+        finally:
+            if opener:
+                out.close()
+
+    @staticmethod
+    def _sources(src, root=None):
+        """
+        src is one directory or several (co-located jobs moved in one pass);
+        members are named relative to `root`, or by basename without one.
+        """
+        return [
+            (path, os.path.relpath(path, root) if root else os.path.basename(path))
+            for path in ([src] if isinstance(src, str) else src)
+        ]
+
+    def _write_archive(self, fileobj, src, root=None):
+        # Staged snapshots are already in S3
+        if self.compression == PACK:
+            packer = Packer(fileobj, self.level)
+            for path, arcname in self._sources(src, root):
+                staged = f"{arcname}/{SNAPSHOTS_DIR}"
+                packer.add(path, arcname, skip=lambda name, staged=staged: name == staged)
+            packer.close()
+            return
+        with self._tar_writer(fileobj) as tar:
+            for path, arcname in self._sources(src, root):
+                staged = f"{arcname}/{SNAPSHOTS_DIR}"
+
+                def skip_snapshots(member, staged=staged):
+                    return None if member.name == staged or member.name.startswith(staged + "/") else member
+
+                tar.add(path, arcname=arcname, filter=skip_snapshots)
 
-    def upload(self, job_id, src="/opt/job_workspace/checkpoint"):
-        archive_name = f"{job_id}.tar.gz"
-        archive_path = os.path.join("/tmp", archive_name)
+    @staticmethod
+    def _extract(fileobj, root, packed):
+        """Extract an archive read front to back; returns the names of its regular files."""
+        if packed:
+            return unpack(fileobj, root)
+        names = []
+        with tarfile.open(fileobj=fileobj, mode="r|*") as tar:
+            for member in tar:
+                tar.extract(member, path=root)
+                if member.isfile():
+                    names.append(member.name)
+        return names
 
-        print(f"📦 Compressing {src} to {archive_path}...")
-        with tarfile.open(archive_path, "w:gz") as tar:
-            tar.add(src, arcname=os.path.basename(src))
+    def _upload_archive(self, key, src, root, action):
+        archive_path = os.path.join(self.tmp_dir, key.replace("/", "_"))
+        started = time.monotonic()
 
-        print(f"⬆️  Uploading to s3://{self.bucket}/{archive_name}...")
-        self.s3.upload_file(archive_path, self.bucket, archive_name)
+        log.info("Compressing %s to %s", src, archive_path)
+        try:
+            with open(archive_path, "wb") as f:
+                self._write_archive(f, src, root)
+
+            log.info("Uploading to s3://%s/%s", self.bucket, key)
+            self.s3.upload_file(archive_path, self.bucket, key, Config=self.transfer_config)
+            self._record(action, key, os.path.getsize(archive_path), started)
+        finally:
+            if action != "upload" and os.path.exists(archive_path):
+                os.remove(archive_path)
+        return key
+
+    def _release_snapshots(self, src, root=None):
+        """The dump in src is in S3: background snapshots may go on (and prune) again."""
+        for path, _ in self._sources(src, root):
+            try:
+                os.remove(os.path.join(path, SNAPSHOTS_DIR, HOLD_FILE))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                log.warning("Could not release the snapshots of %s: %s", path, e)
+
+    def upload(self, job_id, src=CHECKPOINT_DIR, root=None):
+        key = self._upload_archive(self.archive_name(job_id), src, root, "upload")
+        self._release_snapshots(src, root)
+        return key
+
+    def upload_stream(self, job_id, src=CHECKPOINT_DIR, root=None):
+        """
+        Tar+compress straight into a multipart upload through a pipe: no temp
+        archive on disk, and bytes go out while later files are still being
+        compressed. Used on the spot-interruption path where time is short.
+        If the archive cannot be written in full the upload is aborted, so
+        the job's previous archive stays in place.
+        """
+        archive_name = self.archive_name(job_id)
+        read_fd, write_fd = os.pipe()
+        errors = []
+
+        def produce():
+            w = os.fdopen(write_fd, "wb")
+            try:
+                self._write_archive(w, src, root)
+                w.flush()
+            except Exception as e:
+                # Recorded before the pipe closes, so the reader sees it at EOF
+                errors.append(e)
+            finally:
+                try:
+                    w.close()
+                except OSError:
+                    pass
+
+        started = time.monotonic()
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        log.info("Streaming %s to s3://%s/%s", src, self.bucket, archive_name)
+        try:
+            with os.fdopen(read_fd, "rb") as r:
+                reader = _CountingReader(r)
+                self._put_stream(reader, archive_name, errors)
+        finally:
+            producer.join()
+        self._record("upload-stream", archive_name, reader.bytes, started)
+        self._release_snapshots(src, root)
         return archive_name
 
-    def download(self, job_id, dst="/opt/job_workspace/checkpoint"):
-        archive_name = f"{job_id}.tar.gz"
-        archive_path = os.path.join("/tmp", archive_name)
+    def _put_stream(self, reader, key, errors):
+        """
+        Upload reader to key in parts, up to max_concurrency at a time.
+        Nothing is completed (or put) unless reader reached EOF with no
+        entry in `errors`; a started multipart upload is aborted otherwise.
+        """
+        part_size = max(self.transfer_config.multipart_chunksize, MIN_PART)
+        data = reader.read(part_size)
+        if len(data) < part_size:
+            # The whole archive fits in one part
+            if errors:
+                raise errors[0]
+            self.s3.put_object(Bucket=self.bucket, Key=key, Body=data)
+            return
+
+        upload_id = self.s3.create_multipart_upload(Bucket=self.bucket, Key=key)["UploadId"]
+
+        def upload_part(number, body):
+            resp = self.s3.upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=body)
+            return {"PartNumber": number, "ETag": resp["ETag"]}
+
+        concurrency = self.transfer_config.max_concurrency if self.transfer_config.use_threads else 1
+        try:
+            parts = []
+            with ThreadPoolExecutor(concurrency) as pool:
+                in_flight = deque()
+                number = 1
+                while data:
+                    if len(in_flight) >= concurrency:
+                        in_flight.popleft().result()
+                    future = pool.submit(upload_part, number, data)
+                    in_flight.append(future)
+                    parts.append(future)
+                    number += 1
+                    data = reader.read(part_size)
+                parts = [future.result() for future in parts]
+            if errors:
+                raise errors[0]
+            self.s3.complete_multipart_upload(
+                Bucket=self.bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts},
+            )
+        except BaseException:
+            log.warning("Aborting upload of s3://%s/%s", self.bucket, key)
+            self.s3.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+
+    def download(self, job_id, dst=CHECKPOINT_DIR, root=None):
+        archive_name = self.archive_name(job_id)
+        archive_path = os.path.join(self.tmp_dir, archive_name)
+        started = time.monotonic()
+
+        log.info("Downloading s3://%s/%s", self.bucket, archive_name)
+        try:
+            self.s3.download_file(self.bucket, archive_name, archive_path, Config=self.transfer_config)
+
+            root = root or os.path.dirname(dst)
+            log.info("Extracting to %s", root)
+            os.makedirs(root, exist_ok=True)
+            with open(archive_path, "rb") as f:
+                names = self._extract(f, root, self.compression == PACK)
+            nbytes = os.path.getsize(archive_path)
+        finally:
+            if os.path.exists(archive_path):
+                os.remove(archive_path)
+        nbytes += sum(self.fetch_chain(d) for d in self._chain_dirs(names, root))
+        self._record("download", archive_name, nbytes, started)
+
+    def download_stream(self, job_id, dst=CHECKPOINT_DIR, root=None):
+        """Extract while downloading (single GET, no temp archive on disk)."""
+        archive_name = self.archive_name(job_id)
+        started = time.monotonic()
+
+        root = root or os.path.dirname(dst)
+        log.info("Streaming s3://%s/%s into %s", self.bucket, archive_name, root)
+        os.makedirs(root, exist_ok=True)
+        body = _CountingReader(self.s3.get_object(Bucket=self.bucket, Key=archive_name)["Body"])
+        names = self._extract(body, root, self.compression == PACK)
+        nbytes = body.bytes + sum(self.fetch_chain(d) for d in self._chain_dirs(names, root))
+        self._record("download-stream", archive_name, nbytes, started)
+
+    # ------------------------------------------------------------------
+    # Staged snapshots
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _chain_dirs(names, root):
+        """Extracted checkpoint dirs whose dump builds on staged snapshots."""
+        return [os.path.join(root, os.path.dirname(name)) for name in names if os.path.basename(name) == CHAIN_FILE]
+
+    def upload_snapshot(self, job_id, snapshot_dir):
+        """Upload one snapshot dir (<checkpoint dir>/snapshots/<name>); returns its key."""
+        name = os.path.basename(os.path.normpath(snapshot_dir))
+        return self._upload_archive(self.snapshot_key(job_id, name), snapshot_dir, None, "upload-snapshot")
+
+    def put_manifest(self, job_id, manifest):
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=self.manifest_key(job_id),
+            Body=json.dumps(manifest, sort_keys=True).encode(),
+            ContentType="application/json",
+        )
+
+    def archive_modified(self, job_id):
+        """Upload time (epoch seconds) of the job's checkpoint archive, or None if there is none."""
+        try:
+            head = self.s3.head_object(Bucket=self.bucket, Key=self.archive_name(job_id))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+        return head["LastModified"].timestamp()
+
+    def get_manifest(self, job_id):
+        """The job's staged snapshot chain, or None if nothing is staged."""
+        try:
+            body = self.s3.get_object(Bucket=self.bucket, Key=self.manifest_key(job_id))["Body"].read()
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+        return json.loads(body)
+
+    def delete_keys(self, keys):
+        keys = list(keys)
+        for start in range(0, len(keys), 1000):
+            self.s3.delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": k} for k in keys[start:start + 1000]], "Quiet": True},
+            )
 
-        print(f"⬇️  Downloading s3://{self.bucket}/{archive_name}...")
-        self.s3.download_file(self.bucket, archive_name, archive_path)
+    def fetch_chain(self, checkpoint_dir, chain=None):
+        """
+        Download the snapshots in `chain` (default: checkpoint_dir/chain.json)
+        that are not already in checkpoint_dir/snapshots. Returns bytes fetched.
+        """
+        if chain is None:
+            with open(os.path.join(checkpoint_dir, CHAIN_FILE)) as f:
+                chain = json.load(f)["chain"]
+        snapshots = os.path.join(checkpoint_dir, SNAPSHOTS_DIR)
+        os.makedirs(snapshots, exist_ok=True)
+        nbytes = 0
+        for entry in chain:
+            if os.path.isdir(os.path.join(snapshots, entry["name"])):
+                continue
+            body = _CountingReader(self.s3.get_object(Bucket=self.bucket, Key=entry["key"])["Body"])
+            # The snapshot's key says which format it was uploaded in
+            self._extract(body, snapshots, entry["key"].endswith(COMPRESSION[PACK][0]))
+            nbytes += body.bytes
+        log.info("Fetched %d staged snapshot(s) into %s", len(chain), snapshots)
+        return nbytes
 
-        print(f"📂 Extracting to {dst}...")
-        os.makedirs(os.path.dirname(dst), exist_ok=True)
-        with tarfile.open(archive_path) as tar:
-            tar.extractall(path=os.path.dirname(dst))
+    def download_staged(self, job_id, dst=CHECKPOINT_DIR):
+        """
+        Restore point from the staged snapshots alone, for when the final
+        checkpoint never made it: the latest snapshot is laid out in dst as
+        a normal checkpoint (its images, plus a `parent` link into the chain).
+        """
+        started = time.monotonic()
+        manifest = self.get_manifest(job_id)
+        if not manifest or not manifest.get("chain"):
+            raise FileNotFoundError(f"no staged snapshots for {job_id} in s3://{self.bucket}")
+        chain = manifest["chain"]
+        nbytes = self.fetch_chain(dst, chain)
+        latest = os.path.join(dst, SNAPSHOTS_DIR, chain[-1]["name"])
+        for name in os.listdir(latest):
+            target = os.path.join(dst, name)
+            if os.path.lexists(target):
+                os.remove(target)
+            if name == "parent":
+                os.symlink(os.path.join(SNAPSHOTS_DIR, chain[-2]["name"]), target)
+            else:
+                shutil.copy2(os.path.join(latest, name), target)
+        with open(os.path.join(dst, CHAIN_FILE), "w") as f:
+            json.dump({"chain": chain[:-1]}, f)
+        self._record("download-staged", self.manifest_key(job_id), nbytes, started)
 
 
 def main():
     parser = argparse.ArgumentParser(description="Worker S3 Checkpoint Manager")
-    parser.add_argument("action", choices=["upload", "download"], help="Action to perform")
+    parser.add_argument("action", choices=["upload", "upload-stream", "download", "download-stream", "download-staged", "staged"], help="Action to perform")
     parser.add_argument("job_id", help="Unique Job ID")
     parser.add_argument("--bucket", required=True, help="S3 Bucket Name")
+    parser.add_argument("--compression", choices=sorted(COMPRESSION), default="gz", help="Archive compression (default gz)")
+    parser.add_argument("--level", type=int, default=None, help="Compression level")
+    parser.add_argument("--chunk-mb", type=float, default=None, help="Multipart chunk size in MiB")
+    parser.add_argument("--concurrency", type=int, default=None, help="Parallel multipart transfers")
+    parser.add_argument("--src", action="append", default=None, help="Checkpoint dir to upload; repeat to move several jobs in one archive")
+    parser.add_argument("--dst", default=CHECKPOINT_DIR, help="Checkpoint dir to restore into")
+    parser.add_argument("--root", default=None, help="Archive members are relative to this dir (required with several --src)")
 
     args = parser.parse_args()
 
-    manager = S3Manager(bucket=args.bucket)
+    # Progress goes to stderr; stdout carries only the JSON transfer summary
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    manager = S3Manager(
+        bucket=args.bucket,
+        compression=args.compression,
+        level=args.level,
+        chunk_mb=args.chunk_mb,
+        concurrency=args.concurrency,
+    )
 
     try:
+        src = args.src or CHECKPOINT_DIR
         if args.action == "upload":
-            manager.upload(args.job_id)
+            manager.upload(args.job_id, src=src, root=args.root)
+        elif args.action == "upload-stream":
+            manager.upload_stream(args.job_id, src=src, root=args.root)
         elif args.action == "download":
-            manager.download(args.job_id)
-        print("✅ Operation successful")
+            manager.download(args.job_id, dst=args.dst, root=args.root)
+        elif args.action == "download-stream":
+            manager.download_stream(args.job_id, dst=args.dst, root=args.root)
+        elif args.action == "download-staged":
+            manager.download_staged(args.job_id, dst=args.dst)
+        elif args.action == "staged":
+            chain = (manager.get_manifest(args.job_id) or {}).get("chain")
+            if not chain:
+                raise FileNotFoundError(f"no staged snapshots for {args.job_id}")
+            manager.last_transfer = {
+                "action": "staged",
+                "key": manager.manifest_key(args.job_id),
+                "snapshots": len(chain),
+                "bytes": sum(e.get("bytes", 0) for e in chain),
+            }
+        print(json.dumps(manager.last_transfer))
     except Exception as e:
-        print(f"❌ Error: {e}", file=sys.stderr)
+        log.error("%s failed: %s", args.action, e)
         sys.exit(1)
 
 
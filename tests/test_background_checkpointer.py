@@ -0,0 +1,169 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import boto3
+from moto import mock_aws
+
+from storage.s3_manager import S3Manager
+from worker.background_checkpointer import MB, BackgroundCheckpointer, price_volatility
+
+# Stands in for criu_wrapper.sh snapshot: pages-<name>.img of the given size, and a parent link
+FAKE_SNAPSHOT = """
+import os, sys
+snapshots, name, prev, size = sys.argv[1:5]
+os.makedirs(os.path.join(snapshots, name))
+with open(os.path.join(snapshots, name, "pages-1.img"), "wb") as f:
+    f.write(os.urandom(int(size)))
+if prev:
+    os.symlink(os.path.join("..", prev), os.path.join(snapshots, name, "parent"))
+"""
+
+
+@patch.dict(os.environ, {"AWS_DEFAULT_REGION": "us-east-1"})
+class TestBackgroundCheckpointer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = os.path.join(self.tmp.name, "checkpoint")
+        os.makedirs(os.path.join(self.dir, "snapshots"))
+        self.size = 4096
+        self.mock = mock_aws()
+        self.mock.start()
+        self.s3 = boto3.client("s3", region_name="us-east-1")
+        self.s3.create_bucket(Bucket="bkt")
+        self.manager = S3Manager("bkt", tmp_dir=self.tmp.name)
+
+    def tearDown(self):
+        self.mock.stop()
+        self.tmp.cleanup()
+
+    def command(self, name, prev):
+        return [sys.executable, "-c", FAKE_SNAPSHOT, os.path.join(self.dir, "snapshots"), name, prev or "", str(self.size)]
+
+    def checkpointer(self, **kwargs):
+        return BackgroundCheckpointer("job-1", os.getpid(), self.manager, checkpoint_dir=self.dir,
+                                      snapshot_command=self.command, **kwargs)
+
+    def keys(self):
+        return sorted(o["Key"] for o in self.s3.list_objects_v2(Bucket="bkt").get("Contents", []))
+
+    def test_chain_grows_then_compacts(self):
+        """Test snapshots build on each other, and a full one replaces the chain after max_chain"""
+        checkpointer = self.checkpointer(max_chain=3)
+        for i in range(3):
+            checkpointer.snapshot_once(now=1000 + 60 * i)
+        self.assertEqual([e["name"] for e in checkpointer.chain], ["1000000", "1060000", "1120000"])
+        self.assertEqual(self.manager.get_manifest("job-1")["chain"], checkpointer.chain)
+        with open(os.path.join(self.dir, "snapshots", "LATEST")) as f:
+            self.assertEqual(f.read(), "1120000")
+        self.assertEqual(os.readlink(os.path.join(self.dir, "snapshots", "1120000", "parent")), "../1060000")
+
+        checkpointer.snapshot_once(now=1180)
+        self.assertEqual([e["name"] for e in checkpointer.chain], ["1180000"])
+        self.assertEqual(self.keys(), ["job-1.chain.json", "job-1.snapshots/1180000.tar.gz"])
+        self.assertEqual(os.listdir(os.path.join(self.dir, "snapshots", "1180000")), ["pages-1.img"])
+        self.assertFalse(os.path.exists(os.path.join(self.dir, "snapshots", "1000000")))
+
+    def test_final_dump_moves_only_the_delta(self):
+        """Test the archive leaves staged snapshots out and the download fetches them back"""
+        self.size = 64 * 1024
+        checkpointer = self.checkpointer()
+        checkpointer.snapshot_once(now=1000)
+        checkpointer.snapshot_once(now=1060)
+        # What criu_wrapper.sh dump does on top of snapshots/LATEST
+        with open(os.path.join(self.dir, "pages-1.img"), "wb") as f:
+            f.write(os.urandom(1024))
+        os.symlink("snapshots/1060000", os.path.join(self.dir, "parent"))
+        shutil.copy(os.path.join(self.dir, "snapshots", "chain.json"), os.path.join(self.dir, "chain.json"))
+
+        self.manager.upload_stream("job-1", src=self.dir)
+        self.assertLess(self.manager.last_transfer["bytes"], 16 * 1024)
+        dst = os.path.join(self.tmp.name, "target", "checkpoint")
+        self.manager.download("job-1", dst=dst)
+        self.assertEqual(sorted(os.listdir(os.path.join(dst, "snapshots"))), ["1000000", "1060000"])
+        parent = os.path.join(dst, "parent")
+        self.assertTrue(os.path.isfile(os.path.join(parent, "pages-1.img")))
+        self.assertTrue(os.path.isfile(os.path.join(parent, "parent", "pages-1.img")))
+
+    def test_staged_snapshot_restores_without_final_dump(self):
+        """Test download-staged lays out the newest snapshot with its parent link"""
+        checkpointer = self.checkpointer()
+        checkpointer.snapshot_once(now=1000)
+        checkpointer.snapshot_once(now=1060)
+        dst = os.path.join(self.tmp.name, "target", "checkpoint")
+        self.manager.download_staged("job-1", dst=dst)
+        self.assertEqual(os.readlink(os.path.join(dst, "parent")), "snapshots/1000000")
+        self.assertEqual(os.path.getsize(os.path.join(dst, "pages-1.img")), self.size)
+        with self.assertRaises(FileNotFoundError):
+            self.manager.download_staged("job-2", dst=dst)
+
+    def test_restart_replaces_earlier_chain(self):
+        """Test a restarted checkpointer starts a new chain and deletes the one staged before"""
+        first = self.checkpointer()
+        first.snapshot_once(now=1000)
+        second = self.checkpointer()
+        stale = second.reset()
+        self.assertFalse(os.path.exists(os.path.join(self.dir, "snapshots", "LATEST")))
+        second.snapshot_once(now=2000)
+        second._prune(stale)
+        self.assertEqual(self.keys(), ["job-1.chain.json", "job-1.snapshots/2000000.tar.gz"])
+
+    def test_app_state_unchanged_is_skipped(self):
+        """Test app mode uploads a snapshot only when the state changed"""
+        state = os.path.join(self.tmp.name, "app.ckpt")
+
+        def command(name, prev):
+            self.assertIsNone(prev)
+            return [sys.executable, "-c", "import os, shutil, sys; os.makedirs(sys.argv[2]); shutil.copy(sys.argv[1], sys.argv[2])",
+                    state, os.path.join(self.dir, "snapshots", name)]
+
+        checkpointer = BackgroundCheckpointer("job-1", os.getpid(), self.manager, checkpoint_dir=self.dir,
+                                              mode="app", snapshot_command=command)
+        with open(state, "w") as f:
+            f.write("step=1")
+        self.assertIsNotNone(checkpointer.snapshot_once(now=1000))
+        self.assertIsNone(checkpointer.snapshot_once(now=1060))
+        self.assertEqual(checkpointer.next_interval(), checkpointer.max_interval)
+        with open(state, "w") as f:
+            f.write("step=2")
+        self.assertIsNotNone(checkpointer.snapshot_once(now=1120))
+        self.assertEqual(len(checkpointer.chain), 1)
+        self.assertEqual(len([k for k in self.keys() if ".snapshots/" in k]), 1)
+
+    def test_held_chain_is_not_snapshotted(self):
+        """Test a snapshot refused while a final dump holds the chain changes nothing"""
+        checkpointer = BackgroundCheckpointer("job-1", os.getpid(), self.manager, checkpoint_dir=self.dir,
+                                              snapshot_command=lambda name, prev: [sys.executable, "-c", "raise SystemExit(3)"])
+        self.assertIsNone(checkpointer.snapshot_once(now=1000))
+        self.assertEqual((checkpointer.chain, self.keys()), ([], []))
+
+
+class TestCadence(unittest.TestCase):
+    def test_interval_follows_dirty_rate_and_volatility(self):
+        """Test deltas aim for the target size, sooner when prices are volatile, within bounds"""
+        checkpointer = BackgroundCheckpointer("job-1", 1, None, min_interval=60, max_interval=1800, target_delta_mb=256)
+        self.assertEqual(checkpointer.next_interval(), 60)
+        checkpointer.dirty_rate = 1 * MB
+        self.assertEqual(checkpointer.next_interval(), 256)
+        checkpointer.volatility = 0.05
+        self.assertEqual(checkpointer.next_interval(), 128)
+        checkpointer.dirty_rate = 100 * MB
+        self.assertEqual(checkpointer.next_interval(), 60)
+        checkpointer.dirty_rate, checkpointer.volatility = 0.01 * MB, 0.0
+        self.assertEqual(checkpointer.next_interval(), 1800)
+
+    def test_price_volatility(self):
+        """Test volatility is the spread of recent spot prices relative to their mean"""
+        ec2 = MagicMock()
+        ec2.describe_spot_price_history.return_value = {"SpotPriceHistory": [{"SpotPrice": p} for p in ("0.1", "0.1")]}
+        self.assertEqual(price_volatility(ec2, "t3.micro", "us-east-1a"), 0.0)
+        ec2.describe_spot_price_history.return_value = {"SpotPriceHistory": [{"SpotPrice": p} for p in ("0.05", "0.15")]}
+        self.assertAlmostEqual(price_volatility(ec2, "t3.micro", "us-east-1a"), 0.5)
+        self.assertEqual(ec2.describe_spot_price_history.call_args.kwargs["InstanceTypes"], ["t3.micro"])
+
+
+if __name__ == "__main__":
+    unittest.main()
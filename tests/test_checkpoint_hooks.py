@@ -0,0 +1,66 @@
+import os
+import signal
+import tempfile
+import unittest
+
+import numpy as np
+
+from worker.checkpoint_hooks import READY_SUFFIX, CheckpointError, CheckpointRegistry, read, write
+
+
+class TestCheckpointFormat(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "app.ckpt")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip_each_codec(self):
+        """Test bytes, JSON and arrays survive both plain and mmap reads"""
+        grid = np.arange(12, dtype=np.float32).reshape(3, 4)
+        write(self.path, {"meta": (2, {"done": 5, "rng": [1, 2]}), "blob": (1, b"\x00\x01"), "grid": (1, grid)})
+        for mmap in (False, True):
+            with read(self.path, mmap=mmap) as checkpoint:
+                self.assertEqual(checkpoint.sections["meta"], (2, {"done": 5, "rng": [1, 2]}))
+                self.assertEqual(bytes(checkpoint.sections["blob"][1]), b"\x00\x01")
+                array = checkpoint.sections["grid"][1]
+                self.assertEqual(array.dtype, np.float32)
+                np.testing.assert_array_equal(array, grid)
+                del array
+
+    def test_corruption_detected(self):
+        """Test a flipped byte fails the CRC"""
+        write(self.path, {"meta": (1, {"a": 1})})
+        with open(self.path, "r+b") as f:
+            f.seek(-6, os.SEEK_END)
+            f.write(b"\xff")
+        with self.assertRaises(CheckpointError):
+            read(self.path)
+
+    def test_registry_signal_and_restore(self):
+        """Test a SIGUSR1 request is written at poll() and restored into the hook"""
+        state = {"done": 3}
+        restored = {}
+        hooks = CheckpointRegistry()
+        hooks.register("job", save=lambda: state, load=restored.update, version=1)
+        previous = signal.getsignal(signal.SIGUSR1)
+        try:
+            hooks.install_signal(self.path)
+            self.assertFalse(hooks.poll())
+            os.kill(os.getpid(), signal.SIGUSR1)
+            self.assertTrue(hooks.poll())
+        finally:
+            signal.signal(signal.SIGUSR1, previous)
+        self.assertTrue(os.path.exists(self.path + READY_SUFFIX))
+        self.assertEqual(hooks.restore(mmap=True), ["job"])
+        self.assertEqual(restored, {"done": 3})
+
+        newer = CheckpointRegistry()
+        newer.register("job", save=lambda: state, load=restored.update, version=0)
+        with self.assertRaises(CheckpointError):
+            newer.restore(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import boto3
+from moto import mock_aws
+
+from benchmarks.bench_checkpoint_io import parse_compression, run_case
+from benchmarks.checkpoint_images import PAGE, dir_size, make_checkpoint
+from storage.s3_manager import COMPRESSION, MB, S3Manager
+
+
+class TestSyntheticImages(unittest.TestCase):
+    def test_image_set_shape(self):
+        """Test CRIU-like files, size and zero-page ratio"""
+        with tempfile.TemporaryDirectory() as tmp:
+            stats = make_checkpoint(tmp, size_mb=2, zero_ratio=0.5, entropy=0.1, pages_files=2, seed=1)
+            names = sorted(os.listdir(tmp))
+            self.assertIn("inventory.img", names)
+            self.assertEqual([n for n in names if n.startswith("pages-")], ["pages-1.img", "pages-2.img"])
+            self.assertTrue(any(n.startswith("core-") for n in names))
+            self.assertEqual(stats["bytes"], dir_size(tmp))
+            self.assertEqual(stats["pages"], 2 * 1024 * 1024 // PAGE)
+            self.assertAlmostEqual(stats["zero_pages"] / stats["pages"], 0.5, delta=0.05)
+
+
+@patch.dict(os.environ, {"AWS_DEFAULT_REGION": "us-east-1"})
+class TestS3ManagerFormats(unittest.TestCase):
+    @mock_aws
+    def test_round_trip_each_compression(self):
+        """Test file and stream transfers restore identical bytes for every format"""
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="bkt")
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "checkpoint")
+            make_checkpoint(src, size_mb=0.5, seed=2)
+            for compression in COMPRESSION:
+                manager = S3Manager("bkt", compression=compression, level=1 if compression != "none" else None,
+                                    chunk_mb=5, concurrency=2, tmp_dir=tmp)
+                for upload, download in ((manager.upload, manager.download), (manager.upload_stream, manager.download_stream)):
+                    dst = os.path.join(tmp, f"restore-{compression}-{upload.__name__}", "checkpoint")
+                    upload(f"job-{compression}", src=src)
+                    download(f"job-{compression}", dst=dst)
+                    self.assertEqual(dir_size(dst), dir_size(src), (compression, upload.__name__))
+                self.assertTrue(manager.archive_name("j").endswith(COMPRESSION[compression][0]))
+
+    @mock_aws
+    def test_upload_releases_snapshots_and_download_cleans_up(self):
+        """Test an uploaded dump removes its snapshot HOLD and a download leaves no archive in tmp_dir"""
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="bkt")
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "checkpoint")
+            make_checkpoint(src, size_mb=0.1, seed=4)
+            work = os.path.join(tmp, "work")
+            os.makedirs(work)
+            manager = S3Manager("bkt", tmp_dir=work)
+            for upload in (manager.upload, manager.upload_stream):
+                hold = os.path.join(src, "snapshots", "HOLD")
+                os.makedirs(os.path.dirname(hold), exist_ok=True)
+                open(hold, "w").close()
+                upload("job", src=src)
+                self.assertFalse(os.path.exists(hold), upload.__name__)
+            for name in os.listdir(work):
+                os.remove(os.path.join(work, name))
+            manager.download("job", dst=os.path.join(tmp, "restore", "checkpoint"))
+            self.assertEqual(os.listdir(work), [])
+
+    @mock_aws
+    def test_failed_stream_keeps_previous_archive(self):
+        """Test an archive that fails partway is aborted instead of replacing the last good one"""
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="bkt")
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "checkpoint")
+            make_checkpoint(src, size_mb=0.5, seed=3)
+            manager = S3Manager("bkt", compression="none", chunk_mb=5, concurrency=2, tmp_dir=tmp)
+            manager.upload_stream("job", src=src)
+            good = s3.get_object(Bucket="bkt", Key="job.tar")["Body"].read()
+
+            for size in (MB, 12 * MB):
+                def broken(fileobj, *args, size=size):
+                    fileobj.write(b"x" * size)
+                    raise OSError("disk went away")
+
+                with patch.object(manager, "_write_archive", broken):
+                    with self.assertRaisesRegex(OSError, "disk went away"):
+                        manager.upload_stream("job", src=src)
+                self.assertEqual(s3.get_object(Bucket="bkt", Key="job.tar")["Body"].read(), good)
+            self.assertEqual(s3.list_multipart_uploads(Bucket="bkt").get("Uploads", []), [])
+
+    def test_run_case_report(self):
+        """Test one benchmark case end to end in-process"""
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "checkpoint")
+            make_checkpoint(src, size_mb=1, zero_ratio=0.5, entropy=0.2)
+            name, level = parse_compression("gz:1")
+            report = run_case({"compression": name, "level": level, "mode": "stream", "chunk_mb": 5, "concurrency": 2}, src, tmp)
+        self.assertEqual(report["compression"], "gz:1")
+        self.assertLess(report["ratio"], 0.6)
+        self.assertEqual(report["tmp_peak_mb"], 0)
+        self.assertGreater(report["upload_mbps"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
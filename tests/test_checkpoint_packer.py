@@ -0,0 +1,113 @@
+import io
+import os
+import tempfile
+import unittest
+
+from benchmarks.checkpoint_images import make_checkpoint
+from storage.checkpoint_packer import DUPLICATE, LITERAL, PAGE, ZERO, Packer, PackFormatError, pack, unpack
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class TestCheckpointPacker(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.tmp.name, "checkpoint")
+        os.makedirs(self.src)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def round_trip(self, **kwargs):
+        buf = io.BytesIO()
+        stats = pack(buf, [(self.src, "checkpoint")], **kwargs)
+        buf.seek(0)
+        out = os.path.join(self.tmp.name, "out")
+        names = unpack(buf, out)
+        return stats, names, os.path.join(out, "checkpoint"), len(buf.getvalue())
+
+    def test_zero_pages_become_holes(self):
+        """Test zero runs are not stored and are restored as sparse holes"""
+        data = os.urandom(PAGE) + bytes(256 * PAGE) + os.urandom(PAGE)
+        with open(os.path.join(self.src, "pages-1.img"), "wb") as f:
+            f.write(data)
+        stats, names, out, size = self.round_trip()
+        self.assertEqual(names, ["checkpoint/pages-1.img"])
+        self.assertEqual(read(os.path.join(out, "pages-1.img")), data)
+        self.assertEqual((stats["zero_pages"], stats["literal_pages"]), (256, 2))
+        self.assertLess(size, 4 * PAGE)
+        self.assertLess(os.stat(os.path.join(out, "pages-1.img")).st_blocks * 512, len(data) // 2)
+
+    def test_duplicate_pages_across_files(self):
+        """Test repeated pages are stored once and copied back on extraction, also across files"""
+        page, other = os.urandom(PAGE), os.urandom(PAGE)
+        with open(os.path.join(self.src, "pages-1.img"), "wb") as f:
+            f.write(page + other + page + other)
+        with open(os.path.join(self.src, "pages-2.img"), "wb") as f:
+            f.write(other + page + b"tail")
+        buf = io.BytesIO()
+        packer = Packer(buf)
+        packer.add(self.src, "checkpoint")
+        self.assertEqual(packer.close()["duplicate_pages"], 4)
+        buf.seek(0)
+        out = os.path.join(self.tmp.name, "out")
+        unpack(buf, out)
+        for name in ("pages-1.img", "pages-2.img"):
+            self.assertEqual(read(os.path.join(out, "checkpoint", name)), read(os.path.join(self.src, name)))
+
+    def test_run_index(self):
+        """Test consecutive pages of a kind, and consecutive duplicates, share one run"""
+        a, b = os.urandom(PAGE), os.urandom(PAGE)
+        with open(os.path.join(self.src, "pages-1.img"), "wb") as f:
+            f.write(a + b + bytes(2 * PAGE) + a + b + a)
+        packer = Packer(io.BytesIO())
+        with open(os.path.join(self.src, "pages-1.img"), "rb") as f:
+            runs, ranges = packer._classify(memoryview(f.read()), 7 * PAGE)
+        self.assertEqual(runs, [[LITERAL, 2, 0], [ZERO, 2, 0], [DUPLICATE, 2, 0], [DUPLICATE, 1, 0]])
+        self.assertEqual(ranges, [[0, 2 * PAGE]])
+
+    def test_tree_with_links_and_skips(self):
+        """Test directories, symlinks, empty and partial-page files, and skipped subtrees"""
+        images = os.path.join(self.src, "snapshots", "1")
+        make_checkpoint(images, size_mb=0.1, seed=3)
+        os.symlink("snapshots/1", os.path.join(self.src, "parent"))
+        open(os.path.join(self.src, "empty.img"), "wb").close()
+        with open(os.path.join(self.src, "inventory.img"), "wb") as f:
+            f.write(b"CRIU" + bytes(10))
+
+        _, names, out, _ = self.round_trip()
+        self.assertEqual(os.readlink(os.path.join(out, "parent")), "snapshots/1")
+        self.assertEqual(read(os.path.join(out, "parent", "inventory.img")), read(os.path.join(images, "inventory.img")))
+        self.assertEqual(read(os.path.join(out, "inventory.img")), b"CRIU" + bytes(10))
+        self.assertEqual(os.path.getsize(os.path.join(out, "empty.img")), 0)
+
+        buf = io.BytesIO()
+        packer = Packer(buf)
+        packer.add(self.src, "checkpoint", skip=lambda name: name == "checkpoint/snapshots")
+        packer.close()
+        buf.seek(0)
+        names = unpack(buf, os.path.join(self.tmp.name, "skipped"))
+        self.assertEqual(sorted(names), ["checkpoint/empty.img", "checkpoint/inventory.img"])
+
+    def test_rejects_bad_streams(self):
+        """Test foreign, truncated and escaping archives fail instead of extracting"""
+        with self.assertRaises(PackFormatError):
+            unpack(io.BytesIO(b"not a pack"), self.tmp.name)
+        with open(os.path.join(self.src, "pages-1.img"), "wb") as f:
+            f.write(os.urandom(4 * PAGE))
+        buf = io.BytesIO()
+        pack(buf, [(self.src, "checkpoint")])
+        with self.assertRaises(PackFormatError):
+            unpack(io.BytesIO(buf.getvalue()[:-100]), os.path.join(self.tmp.name, "truncated"))
+        buf = io.BytesIO()
+        pack(buf, [(self.src, "../escape")])
+        buf.seek(0)
+        with self.assertRaises(PackFormatError):
+            unpack(buf, os.path.join(self.tmp.name, "root"))
+
+
+if __name__ == "__main__":
+    unittest.main()
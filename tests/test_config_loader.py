@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+
+from orchestrator.config_loader import ConfigError, ConfigStore, RuntimeConfig
+from orchestrator.decision_engine import DecisionEngine
+
+RUNTIME = """
+checkpoint_bucket: "bkt"
+instance_type: "t3.micro"
+retry:
+  deadline_seconds: 900
+candidate_regions: [us-east-1, us-west-2]
+"""
+POLICY = """
+price_spike_threshold: 0.01
+workload_thresholds:
+  medium: 0.25
+"""
+
+
+class TestConfigStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.runtime_path = os.path.join(self.tmp.name, "runtime.yaml")
+        self.policy_path = os.path.join(self.tmp.name, "sla_policy.yaml")
+        self.write(self.runtime_path, RUNTIME)
+        self.write(self.policy_path, POLICY)
+        self.store = ConfigStore(self.runtime_path, self.policy_path, env={})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, path, text):
+        with open(path, "w") as f:
+            f.write(text)
+        # Distinct mtimes even on filesystems with coarse timestamps
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+    def test_snapshot_is_typed_and_read_only(self):
+        """Test fields are parsed once, env wins over the file, and nothing can be mutated"""
+        runtime = self.store.current.runtime
+        self.assertEqual((runtime.checkpoint_bucket, runtime["instance_type"]), ("bkt", "t3.micro"))
+        self.assertEqual(runtime.get("raw", {}).get("candidate_regions"), ("us-east-1", "us-west-2"))
+        self.assertEqual(self.store.current.policy.workload_thresholds["medium"], 0.25)
+        with self.assertRaises(TypeError):
+            runtime.raw["retry"]["deadline_seconds"] = 1
+        with self.assertRaises(AttributeError):
+            runtime.instance_type = "c5.large"
+        self.assertEqual(RuntimeConfig.from_dict({"instance_type": "a"}, env={"INSTANCE_TYPE": "b"}).instance_type, "b")
+
+    def test_reload_on_change(self):
+        """Test an unchanged file is not re-read, and a changed one is swapped in and announced"""
+        seen = []
+        self.store.subscribe(seen.append)
+        self.assertFalse(self.store.reload_if_changed())
+        self.write(self.policy_path, POLICY.replace("0.01", "0.05"))
+        self.assertTrue(self.store.reload_if_changed())
+        self.assertEqual(self.store.current.policy.price_spike_threshold, 0.05)
+        self.assertEqual(self.store.current.version, 2)
+        self.assertEqual(seen, [self.store.current])
+
+    def test_invalid_change_keeps_current_snapshot(self):
+        """Test a file failing validation is rejected once and the previous snapshot stays"""
+        before = self.store.current
+        self.write(self.runtime_path, RUNTIME + "checkpoint_compression: zip\n")
+        with self.assertLogs("orchestrator.config", "ERROR"):
+            self.assertFalse(self.store.reload_if_changed())
+        self.assertIs(self.store.current, before)
+        self.assertFalse(self.store.reload_if_changed())
+        self.write(self.policy_path, "price_spike_threshold: -1\n")
+        self.assertFalse(self.store.reload_if_changed())
+        self.assertIs(self.store.current, before)
+
+    def test_engine_follows_reloaded_policy(self):
+        """Test a DecisionEngine on the shared store decides with the newest policy"""
+        engine = DecisionEngine(config=self.store)
+        prices = {"us-east-1": {"price": 0.10}, "us-west-2": {"price": 0.08}}
+        self.assertEqual(engine.evaluate(prices, "us-east-1").action, "MIGRATE")
+        self.write(self.policy_path, "price_spike_threshold: 0.05\n")
+        self.store.reload_if_changed()
+        self.assertEqual(engine.evaluate(prices, "us-east-1").action, "STAY")
+        with self.assertRaises(ConfigError):
+            engine.policy = {"workload_thresholds": {"long": "high"}}
+        self.assertEqual(engine.default_threshold, 0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
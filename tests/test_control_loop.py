@@ -0,0 +1,162 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from orchestrator.control_loop import ControlLoop
+from orchestrator.decision_engine import Decision
+from storage.job_registry import JobRegistry
+
+
+class FakeWatcher:
+    def __init__(self, prices):
+        self.prices = prices
+
+    def poll(self):
+        return {r: {"price": p, "volatility": 0.0} for r, p in self.prices.items()}
+
+
+class RecordingEngine:
+    """Always STAY; records which jobs were evaluated."""
+
+    def __init__(self):
+        self.seen = []
+
+    def evaluate(self, prices, current_region, job=None):
+        self.seen.append(job["job_id"])
+        return Decision("STAY", None, "test")
+
+
+class TestControlLoop(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.registry = JobRegistry(os.path.join(self.tmp, "registry.json"), fsync=False)
+        self.registry.batch_create([
+            {"job_id": "a", "state": "RUNNING", "region": "us-east-1"},
+            {"job_id": "b", "state": "RUNNING", "region": "us-west-2"},
+            {"job_id": "c", "state": "RUNNING", "region": "eu-west-1"},
+        ])
+        self.watcher = FakeWatcher({"us-east-1": 0.10, "us-west-2": 0.20, "eu-west-1": 0.30})
+        self.engine = RecordingEngine()
+        self.loop = ControlLoop(self.watcher, self.engine, self.registry, price_cache_ttl=0)
+        self.loop.start()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def tick(self):
+        self.engine.seen = []
+        self.loop.tick()
+        return sorted(self.engine.seen)
+
+    def test_idle_tick_evaluates_nothing(self):
+        """Test unchanged prices and records skip evaluation"""
+        self.assertEqual(self.tick(), ["a", "b", "c"])
+        self.assertEqual(self.tick(), [])
+
+    def test_record_change_reevaluates_only_that_job(self):
+        """Test a registry write reaches the loop through the change feed"""
+        self.tick()
+        self.registry.update("b", "RUNNING", note="touched")
+        self.assertEqual(self.tick(), ["b"])
+
+    def test_region_price_change(self):
+        """Test a non-cheapest region's price change only affects its jobs"""
+        self.tick()
+        self.watcher.prices["eu-west-1"] = 0.35
+        self.assertEqual(self.tick(), ["c"])
+
+    def test_cheapest_change_reevaluates_all(self):
+        """Test moving the cheapest offer invalidates every decision"""
+        self.tick()
+        self.watcher.prices["us-east-1"] = 0.15
+        self.assertEqual(self.tick(), ["a", "b", "c"])
+
+    def test_jobs_leaving_state_are_dropped(self):
+        """Test jobs moving out of the watched states leave the index"""
+        self.tick()
+        self.registry.update("a", "CHECKPOINTING")
+        self.registry.batch_create([{"job_id": "d", "state": "RUNNING", "region": "us-east-1"}])
+        self.assertEqual(self.tick(), ["d"])
+        self.assertNotIn("a", self.loop.index)
+
+    def test_stay_decisions_are_summarized(self):
+        """Test STAY decisions produce one summary line per pass, not one line per job"""
+        with self.assertLogs("orchestrator.main", "INFO") as logs:
+            self.tick()
+        lines = [line for line in logs.output if "decision" in line or "Evaluated" in line]
+        self.assertEqual(lines, ["INFO:orchestrator.main:Evaluated 3 jobs: 0 MIGRATE, STAY by reason {'test': 3}"])
+
+    def test_pinned_workloads_skip_the_engine(self):
+        """Test jobs whose workload type is never migrated are settled from the workload column"""
+        self.engine.threshold_for_job = lambda job: None if job.get("workload_type") == "short" else 0.01
+        self.registry.update("b", "RUNNING", workload_type="short")
+        self.registry.update("c", "RUNNING", workload_type="long")
+        self.assertEqual(self.tick(), ["a", "c"])
+        self.assertEqual(self.loop.decisions["b"].reason, "workload_short_no_migrate")
+
+    def test_cooldown_deferred_jobs_are_rechecked(self):
+        """Test a MIGRATE blocked by cooldown is re-evaluated next tick"""
+        self.loop.engine = MagicMock()
+        self.loop.engine.evaluate.return_value = Decision("MIGRATE", "us-east-1", "price_spike")
+        self.loop.last_migration_ts["c"] = 10**12
+        self.loop.tick()
+        self.loop.engine.evaluate.reset_mock()
+        self.loop.tick()
+        self.assertEqual(self.loop.engine.evaluate.call_count, 1)
+
+    def test_coordinator_limits_to_owned_jobs(self):
+        """Test a sharded replica only evaluates the jobs it owns"""
+        self.loop.coordinator = MagicMock(is_leader=True)
+        self.loop.coordinator.owns.side_effect = lambda job_id: job_id != "b"
+        self.assertEqual(self.tick(), ["a", "c"])
+        self.loop.coordinator.publish_prices.assert_not_called()
+
+    def test_migration_claims_evaluated_version(self):
+        """Test dispatched migrations carry the evaluated record version"""
+        self.loop.migrate = True
+        self.loop.migrator = MagicMock()
+        self.loop.engine = MagicMock()
+        self.loop.engine.evaluate.return_value = Decision("MIGRATE", "us-east-1", "price_spike")
+        self.registry.update("c", "RUNNING", note="touched")
+        self.loop.tick()
+        calls = {c.args[0]: c.kwargs for c in self.loop.migrator.migrate.call_args_list}
+        self.assertEqual(calls["c"]["expected_version"], 1)
+
+    def test_failed_bin_group_is_reevaluated(self):
+        """Test a bin whose first group fails re-defers that group as well as the ones not tried"""
+        self.loop.migrator = MagicMock()
+        self.loop.migrator.migrate_group.side_effect = RuntimeError("claim lost")
+        self.registry.update("a", "RUNNING", public_ip="10.0.0.1")
+        self.registry.update("b", "RUNNING", public_ip="10.0.0.2")
+        self.tick()
+        self.loop.in_flight.update({"a", "b"})
+        with self.assertRaises(RuntimeError):
+            self.loop._run_bin("us-east-1", "t3.micro", ["a", "b"], {"a": 1, "b": 1})
+        self.assertEqual(self.loop.migrator.migrate_group.call_count, 1)
+        self.assertEqual(self.loop._deferred, {"a", "b"})
+        self.assertEqual(self.loop.in_flight, set())
+
+    def test_resume_pending_migrations(self):
+        """Test journaled migrations are resumed once, skipping fresh and in-flight ones"""
+        self.loop.migrate = True
+        self.loop.migrator = MagicMock()
+        self.loop.migrator.pending_journals.return_value = [
+            {"key": "group-1", "jobs": ["a", "b"], "updated_at": 100},
+            {"key": "c", "jobs": ["c"], "updated_at": 990},
+            {"key": "d", "jobs": ["d"], "updated_at": 100},
+        ]
+        self.loop.in_flight.add("d")
+        submitted = []
+        self.assertEqual(self.loop.resume_pending(lambda fn, *args: submitted.append(args), now=1000), 1)
+        self.assertEqual(submitted, [(["a", "b"],)])
+        self.assertEqual(self.loop.in_flight, {"a", "b", "d"})
+        self.assertEqual(self.loop.resume_pending(lambda fn, *args: submitted.append(args), now=1000), 0)
+        self.loop._run_resume(["a", "b"])
+        self.loop.migrator.resume.assert_called_once_with("a")
+        self.assertEqual(self.loop.in_flight, {"d"})
+
+
+if __name__ == '__main__':
+    unittest.main()
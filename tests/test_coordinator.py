@@ -0,0 +1,113 @@
+import os
+import tempfile
+import time
+import unittest
+
+import boto3
+from moto import mock_aws
+
+from orchestrator.coordinator import Coordinator
+from orchestrator.sharding import HashRing
+from storage.dynamo_registry import DynamoRegistry
+from storage.job_registry import JobRegistry
+
+TABLE = "spot_arbitrage_registry"
+JOBS = [f"job-{i}" for i in range(200)]
+
+
+class TestHashRing(unittest.TestCase):
+    def test_join_moves_only_new_members_share(self):
+        """Test that adding a member only reassigns keys to that member"""
+        before = HashRing(["a", "b", "c"])
+        after = HashRing(["a", "b", "c", "d"])
+        for job_id in JOBS:
+            if before.owner(job_id) != after.owner(job_id):
+                self.assertEqual(after.owner(job_id), "d")
+        self.assertEqual(len({before.owner(j) for j in JOBS}), 3)
+
+
+class CoordinatorCases:
+    def make_registry(self):
+        raise NotImplementedError
+
+    def test_single_leader_and_disjoint_ownership(self):
+        """Test one leader and a complete, disjoint job split across replicas"""
+        a = Coordinator(self.make_registry(), "a", ttl=5)
+        b = Coordinator(self.make_registry(), "b", ttl=5)
+        a.step(), b.step(), a.step()
+        self.assertEqual(a.members, ["a", "b"])
+        self.assertEqual(sum((a.is_leader, b.is_leader)), 1)
+        for job_id in JOBS:
+            self.assertTrue(a.owns(job_id) != b.owns(job_id))
+
+    def test_failover_after_ttl(self):
+        """Test that a dead leader's lease and shard are taken over"""
+        a = Coordinator(self.make_registry(), "a", ttl=0.3)
+        b = Coordinator(self.make_registry(), "b", ttl=0.3)
+        a.step(), b.step()
+        self.assertTrue(a.is_leader)
+        self.assertFalse(b.is_leader)
+        time.sleep(0.4)
+        self.assertTrue(b.step())
+        self.assertTrue(b.is_leader)
+        self.assertEqual(b.members, ["b"])
+        self.assertTrue(all(b.owns(j) for j in JOBS))
+
+    def test_leave_hands_over_and_shares_prices(self):
+        """Test clean shutdown and price publishing from the leader"""
+        a = Coordinator(self.make_registry(), "a", ttl=5)
+        b = Coordinator(self.make_registry(), "b", ttl=5)
+        a.step(), b.step()
+        prices = {"us-east-1": {"price": 0.05, "timestamp": "t"}}
+        b.publish_prices(prices)
+        self.assertIsNone(b.read_prices())
+        a.publish_prices(prices)
+        self.assertEqual(b.read_prices(), prices)
+        a.leave()
+        b.step()
+        self.assertTrue(b.is_leader)
+        self.assertEqual(b.members, ["b"])
+
+
+class TestJsonCoordinator(CoordinatorCases, unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".json")
+        os.write(fd, b"{}")
+        os.close(fd)
+
+    def tearDown(self):
+        for suffix in ("", ".log", ".lock", ".tmp"):
+            if os.path.exists(self.path + suffix):
+                os.unlink(self.path + suffix)
+
+    def make_registry(self):
+        # One instance per replica, sharing the file like separate processes
+        return JobRegistry(self.path, fsync=False)
+
+    def test_meta_hidden_from_jobs(self):
+        """Test that coordination records do not show up as jobs"""
+        registry = self.make_registry()
+        Coordinator(registry, "a").step()
+        self.assertEqual(list(registry.iter_jobs()), [])
+
+
+class TestDynamoCoordinator(CoordinatorCases, unittest.TestCase):
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        boto3.client("dynamodb", region_name="us-east-1").create_table(
+            TableName=TABLE,
+            KeySchema=[{"AttributeName": "job_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "job_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+    def tearDown(self):
+        self.mock.stop()
+
+    def make_registry(self):
+        return DynamoRegistry(TABLE, region_name="us-east-1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from scripts.deploy_worker import Deployer, build_manifest, changed_files, parent_dirs, parse_sha256sum
+
+
+def write(root, path, data):
+    path = os.path.join(root, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        write(self.root, "worker/job_runner.py", b"runner")
+        write(self.root, "worker/jobs/train.py", b"train")
+        write(self.root, "worker/__pycache__/job_runner.cpython-312.pyc", b"\0")
+        write(self.root, "storage/stray.pyc", b"\0")
+        write(self.root, "checkpoint/criu_wrapper.sh", b"#!/bin/bash")
+        write(self.root, "orchestrator/main.py", b"not deployed")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_build_manifest(self):
+        """Test the manifest hashes deployable files only, keyed by relative path"""
+        manifest = build_manifest(self.root)
+        self.assertEqual(sorted(manifest), ["checkpoint/criu_wrapper.sh", "worker/job_runner.py", "worker/jobs/train.py"])
+        self.assertEqual(manifest["worker/jobs/train.py"], hashlib.sha256(b"train").hexdigest())
+
+    def test_parse_sha256sum(self):
+        """Test sha256sum output maps path to digest, skipping blank and partial lines"""
+        output = "aa11  worker/job_runner.py\n\nbb22  worker/jobs/my file.py\ngarbage\n"
+        self.assertEqual(parse_sha256sum(output), {"worker/job_runner.py": "aa11", "worker/jobs/my file.py": "bb22"})
+
+    def test_changed_files(self):
+        """Test files that differ or are missing on the host are sent, sorted"""
+        local = {"a.py": "1", "b.py": "2", "c.py": "3"}
+        self.assertEqual(changed_files(local, {"a.py": "1", "b.py": "x"}), ["b.py", "c.py"])
+        self.assertEqual(changed_files(local, local), [])
+
+    def test_changed_files_round_trip(self):
+        """Test a host reporting the local manifest via sha256sum needs nothing"""
+        manifest = build_manifest(self.root)
+        output = "".join(f"{digest}  {path}\n" for path, digest in manifest.items())
+        self.assertEqual(changed_files(manifest, parse_sha256sum(output)), [])
+
+    def test_extract_hands_new_dirs_to_user(self):
+        """Test directories created by the root tar are chowned along with the files"""
+        self.assertEqual(parent_dirs(["worker/jobs/train.py", "worker/a.py", "top.py"]), ["worker", "worker/jobs"])
+        commands = []
+
+        class FakeSSH:
+            def exec_command(self, command):
+                commands.append(command)
+                stream = MagicMock()
+                stream.read.return_value = b""
+                stream.channel.recv_exit_status.return_value = 0
+                return stream, stream, stream
+
+            def close(self):
+                pass
+
+        with patch("scripts.deploy_worker.create_ssh_client", return_value=FakeSSH()):
+            report = Deployer("key.pem", project_root=self.root, full=True).deploy("10.0.0.1")
+
+        self.assertTrue(report["ok"], report)
+        extract = next(c for c in commands if "tar -xzf" in c)
+        chowned = extract.split("chown ubuntu:ubuntu ", 1)[1].split()
+        self.assertEqual(chowned[:4], ["checkpoint", "worker", "worker/jobs", "checkpoint/criu_wrapper.sh"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+
+import boto3
+from moto import mock_aws
+
+from storage.change_feed import DynamoStreamFeed
+from storage.dynamo_registry import DynamoRegistry
+
+TABLE = "spot_arbitrage_registry"
+
+
+class TestDynamoRegistry(unittest.TestCase):
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        boto3.client("dynamodb", region_name="us-east-1").create_table(
+            TableName=TABLE,
+            KeySchema=[{"AttributeName": "job_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "job_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+            StreamSpecification={"StreamEnabled": True, "StreamViewType": "NEW_AND_OLD_IMAGES"},
+        )
+        self.registry = DynamoRegistry(TABLE, region_name="us-east-1")
+
+    def tearDown(self):
+        self.mock.stop()
+
+    def test_create_and_update(self):
+        """Test create followed by a versioned update"""
+        self.registry.create("job-1", state="RUNNING", region="us-east-1")
+        self.registry.update("job-1", "CHECKPOINTING")
+        job = self.registry.get("job-1")
+        self.assertEqual(job["state"], "CHECKPOINTING")
+        self.assertEqual(job["version"], 1)
+
+    def test_batch_create_spans_requests(self):
+        """Test bulk creation beyond the 25-item BatchWriteItem limit"""
+        rows = ({"job_id": f"job-{i}", "state": "RUNNING"} for i in range(60))
+        self.assertEqual(self.registry.batch_create(rows), 60)
+        self.assertEqual(len(self.registry.list_by_state("RUNNING")), 60)
+
+    def test_update_many(self):
+        """Test grouped transitions with and without explicit versions"""
+        self.registry.batch_create([{"job_id": f"job-{i}", "state": "RUNNING"} for i in range(3)])
+        self.registry.update_many([
+            {"job_id": "job-0", "state": "PAUSED", "expected_version": 0},
+            {"job_id": "job-1", "state": "PAUSED"},
+        ])
+        self.assertEqual(self.registry.get("job-0")["state"], "PAUSED")
+        self.assertEqual(self.registry.get("job-1")["version"], 1)
+
+    def test_update_many_version_conflict(self):
+        """Test a stale version cancels the whole transaction"""
+        self.registry.batch_create([{"job_id": f"job-{i}", "state": "RUNNING"} for i in range(2)])
+        with self.assertRaises(RuntimeError):
+            self.registry.update_many([
+                {"job_id": "job-0", "state": "PAUSED", "expected_version": 0},
+                {"job_id": "job-1", "state": "PAUSED", "expected_version": 5},
+            ])
+        self.assertEqual(self.registry.get("job-0")["state"], "RUNNING")
+
+    def test_update_many_chains_updates_to_one_job(self):
+        """Test several updates to one job are merged into one write, as JobRegistry chains them"""
+        self.registry.batch_create([{"job_id": f"job-{i}", "state": "RUNNING"} for i in range(2)])
+        self.registry.update_many([
+            {"job_id": "job-0", "state": "CHECKPOINTING", "expected_version": 0, "region": "us-east-1"},
+            {"job_id": "job-1", "state": "PAUSED"},
+            {"job_id": "job-0", "state": "MIGRATING", "expected_version": 1, "target": "us-west-2"},
+            {"job_id": "job-0", "state": "RUNNING", "region": "us-west-2"},
+        ])
+        job = self.registry.get("job-0")
+        self.assertEqual((job["state"], job["version"], job["region"], job["target"]), ("RUNNING", 3, "us-west-2", "us-west-2"))
+        self.assertEqual(self.registry.get("job-1")["version"], 1)
+
+        # A link that does not follow the one before it fails the whole call
+        with self.assertRaisesRegex(RuntimeError, "job-1"):
+            self.registry.update_many([
+                {"job_id": "job-0", "state": "PAUSED"},
+                {"job_id": "job-1", "state": "RUNNING"},
+                {"job_id": "job-1", "state": "PAUSED", "expected_version": 1},
+            ])
+        self.assertEqual(self.registry.get("job-0")["state"], "RUNNING")
+
+    def test_iter_jobs(self):
+        """Test streaming export with a state filter"""
+        self.registry.batch_create([
+            {"job_id": "a", "state": "RUNNING"},
+            {"job_id": "b", "state": "FAILED"},
+        ])
+        self.assertEqual([j["job_id"] for j in self.registry.iter_jobs("FAILED")], ["b"])
+        self.assertEqual(len(list(self.registry.iter_jobs())), 2)
+
+    def test_change_feed(self):
+        """Test the stream feed yields coalesced new images"""
+        feed = self.registry.change_feed()
+        self.assertIsInstance(feed, DynamoStreamFeed)
+        self.registry.create("job-1", state="RUNNING")
+        self.registry.update("job-1", "CHECKPOINTING")
+        changes = dict(feed.poll())
+        self.assertEqual(changes["job-1"]["state"], "CHECKPOINTING")
+        self.assertEqual(feed.poll(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import random
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from orchestrator.control_loop import ControlLoop
+from orchestrator.fleet_optimizer import FleetOptimizer
+from orchestrator.placement import Shape, load_instance_matrix
+from storage.job_registry import JobRegistry
+
+SHAPES = {"small": Shape(2, 4), "large": Shape(8, 32)}
+
+
+def optimizer(**cfg):
+    policy = {"price_spike_threshold": 0.0, "fleet_optimizer": {"default_downtime_seconds": 60, **cfg}}
+    return FleetOptimizer(policy, SHAPES)
+
+
+class TestFleetOptimizer(unittest.TestCase):
+    def test_capacity_spreads_jobs(self):
+        """Test jobs overflow to the next-cheapest region once the cheapest is full"""
+        jobs = {f"j{i}": {"region": "expensive", "instance_type": "small", "cpu": 2, "memory_gib": 1} for i in range(5)}
+        offers = {("expensive", "small"): 1.0, ("cheap", "small"): 0.1, ("mid", "small"): 0.4}
+        moves = optimizer(capacity={"cheap": 2}).plan(jobs, offers)
+        targets = sorted(m.target_region for m in moves)
+        self.assertEqual(targets, ["cheap", "cheap", "mid", "mid", "mid"])
+        self.assertTrue(all(m.saving_per_hour > 0 for m in moves))
+
+    def test_plan_order_budget_and_payback(self):
+        """Test ordering by savings per downtime second, the budget, and migration cost"""
+        jobs = {
+            "fast": {"region": "a", "instance_type": "small", "last_migration": {"ok": True, "downtime_ms": 5000}},
+            "slow": {"region": "a", "instance_type": "small", "last_migration": {"ok": True, "downtime_ms": 600000}},
+            "short": {"region": "a", "instance_type": "small", "workload_type": "short"},
+        }
+        offers = {("a", "small"): 1.0, ("b", "small"): 0.5}
+        opt = optimizer()
+        opt.threshold_fn = lambda job: None if job.get("workload_type") == "short" else 0.0
+        self.assertEqual([m.job_id for m in opt.plan(jobs, offers)], ["fast", "slow"])
+        self.assertEqual([m.job_id for m in opt.plan(jobs, offers, budget=1)], ["fast"])
+        # Saving $0.25/h per job can't pay back a $1 migration within an hour
+        self.assertEqual(optimizer(migration_cost=1.0).plan(jobs, offers), [])
+
+    def test_moves_into_freed_capacity(self):
+        """Test a job leaving a full offer frees its share for another"""
+        jobs = {
+            "x": {"region": "a", "instance_type": "small", "cpu": 2},
+            "y": {"region": "c", "instance_type": "small", "cpu": 2, "last_migration": {"ok": True, "downtime_ms": 600000}},
+        }
+        # x wins b on savings per downtime second; y then takes the slot x left in a
+        offers = {("a", "small"): 0.5, ("b", "small"): 0.1, ("c", "small"): 0.8}
+        moves = optimizer(capacity={"a": 1, "b": 1}).plan(jobs, offers)
+        self.assertEqual({(m.job_id, m.target_region) for m in moves}, {("x", "b"), ("y", "a")})
+
+    def test_ten_thousand_jobs_under_a_second(self):
+        """Test the 10k-job fleet plans in well under a second"""
+        rng = random.Random(1)
+        regions = [f"r{i}" for i in range(8)]
+        shapes, defaults = load_instance_matrix()
+        offers = {(r, t): rng.uniform(0.01, 0.5) * shapes[t].vcpu for r in regions for t in shapes}
+        jobs = {
+            f"job-{i}": {"region": rng.choice(regions), "instance_type": rng.choice(list(shapes)),
+                         "cpu": rng.choice([0.5, 1, 2]), "memory_gib": rng.choice([0.5, 1, 4])}
+            for i in range(10_000)
+        }
+        opt = FleetOptimizer({"fleet_optimizer": {"capacity": {"default": 400}}}, shapes, defaults)
+        started = time.perf_counter()
+        moves = opt.plan(jobs, offers)
+        elapsed = time.perf_counter() - started
+        self.assertGreater(len(moves), 1000)
+        self.assertLess(elapsed, 1.0)
+        scores = [m.score for m in moves]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+
+class FakeWatcher:
+    regions = ["us-east-1", "us-west-2"]
+    instance_type = "small"
+
+    def poll(self):
+        return {"us-east-1": {"price": 0.30}, "us-west-2": {"price": 0.10}}
+
+
+class TestOptimizedLoop(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.registry = JobRegistry(os.path.join(self.tmp, "registry.json"), fsync=False)
+        self.registry.batch_create([{"job_id": f"j{i}", "state": "RUNNING", "region": "us-east-1"} for i in range(4)])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_budget_limits_plan(self):
+        """Test the loop plans at most max_migrations_per_hour moves and passes the instance type"""
+        opt = FleetOptimizer({"max_migrations_per_hour": 2, "fleet_optimizer": {}}, SHAPES)
+        migrator = MagicMock()
+        loop = ControlLoop(FakeWatcher(), MagicMock(), self.registry, migrator, migrate=True, price_cache_ttl=0, optimizer=opt)
+        loop.start()
+        self.assertEqual(loop.tick(), 4)
+        self.assertEqual(migrator.migrate.call_count, 2)
+        self.assertEqual(migrator.migrate.call_args.kwargs["provision_overrides"]["instance_type"], "small")
+        self.assertEqual(loop.migration_budget(), 0)
+        loop.engine.evaluate.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
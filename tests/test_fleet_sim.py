@@ -0,0 +1,36 @@
+import unittest
+
+from benchmarks.bench_control_loop import compare
+from benchmarks.fleet_sim import FleetSimulation, simulate
+
+
+class TestFleetSimulation(unittest.TestCase):
+    def test_dry_run_dynamo(self):
+        """Test the loop evaluates every job on the first tick over the Dynamo stream"""
+        report = simulate(ticks=3, jobs=60, regions=3, backend="dynamo", churn=0.1)
+        self.assertEqual(report["jobs"], 60)
+        self.assertGreaterEqual(report["evaluations"], 60)
+        self.assertGreater(report["decisions_per_s"], 0)
+        self.assertEqual(report["migrations"], 0)
+
+    def test_migrations_run_against_fakes(self):
+        """Test MIGRATE decisions provision on moto EC2 and move jobs"""
+        with FleetSimulation(jobs=8, regions=2, migrate=True, seed=3) as sim:
+            report = sim.run(ticks=2)
+            moved = [j for j in sim.registry.iter_jobs() if j.get("last_migration")]
+        self.assertEqual(report["migrations"], len(moved))
+        for job in moved:
+            self.assertEqual(job["state"], "RUNNING")
+            self.assertTrue(job["last_migration"]["ok"])
+        self.assertEqual(report["migrations"] > 0, report["ssh_commands"] > 0)
+
+    def test_regression_check(self):
+        """Test baseline comparison flags slower ticks"""
+        old = {"backend": "json", "jobs": 10, "regions": 2, "migrate": False, "tick_ms_p95": 10, "registry_calls_per_tick": 1}
+        new = dict(old, tick_ms_p95=20)
+        self.assertEqual(len(compare([new], [old], 0.25)), 1)
+        self.assertEqual(compare([old], [old], 0.25), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import json
+import os
+import shutil
+import socket
+import tempfile
+import time
+import unittest
+import urllib.error
+import urllib.request
+
+from orchestrator.control_loop import ControlLoop
+from orchestrator.decision_engine import Decision
+from orchestrator.health import Health, start_health_server
+from orchestrator.scheduler import Scheduler
+from storage.job_registry import JobRegistry
+
+
+class FakeWatcher:
+    regions = ["us-east-1", "us-west-2"]
+    instance_type = "t3.micro"
+
+    def poll(self):
+        return {"us-east-1": {"price": 0.10, "volatility": 0.0}, "us-west-2": {"price": 0.05, "volatility": 0.0}}
+
+
+class FakeEngine:
+    def evaluate(self, prices, current_region, job=None):
+        if current_region == "us-east-1":
+            return Decision("MIGRATE", "us-west-2", "price_spike")
+        return Decision("STAY", None, "already_cheapest")
+
+
+class TestHealthServer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.registry = JobRegistry(os.path.join(self.tmp, "registry.json"), fsync=False)
+        self.registry.batch_create([
+            {"job_id": "a", "state": "RUNNING", "region": "us-east-1"},
+            {"job_id": "b", "state": "RUNNING", "region": "us-west-2"},
+        ])
+        self.loop = ControlLoop(FakeWatcher(), FakeEngine(), self.registry, price_cache_ttl=0)
+        self.scheduler = Scheduler()
+        self.scheduler.add("evaluate", lambda: None, interval=60, deadline=5)
+        self.health = Health(self.scheduler, self.loop, heartbeat_timeout=2, price_max_age=60, sync_max_age=60)
+        self.server = start_health_server(port=0, health=self.health)
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp)
+
+    def get(self, path):
+        try:
+            with urllib.request.urlopen(self.base + path, timeout=5) as resp:
+                return resp.status, json.loads(resp.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def test_liveness_follows_heartbeat_and_stalled_tasks(self):
+        """Test /healthz fails on a stale event-loop heartbeat or a task stuck past its deadline"""
+        self.assertEqual(self.get("/healthz")[0], 503)
+        self.scheduler.heartbeat = time.monotonic()
+        code, body = self.get("/healthz")
+        self.assertEqual((code, body["status"]), (200, "ok"))
+        self.assertLess(body["heartbeat_age_s"], 2)
+        self.scheduler.tasks["evaluate"].running_since = time.monotonic() - 600
+        code, body = self.get("/healthz")
+        self.assertEqual(code, 503)
+        self.assertEqual(list(body["stalled_tasks"]), ["evaluate"])
+
+    def test_readiness_needs_fresh_prices_and_registry_sync(self):
+        """Test /readyz fails until prices and the registry have been read, and again once prices go stale"""
+        code, body = self.get("/readyz")
+        self.assertEqual(code, 503)
+        self.assertEqual(body["missing_regions"], ["us-east-1", "us-west-2"])
+        self.loop.start()
+        self.loop.refresh_prices()
+        self.assertEqual(self.get("/readyz")[0], 200)
+        self.loop._price_ts -= 120
+        code, body = self.get("/readyz")
+        self.assertEqual((code, body["problems"]), (503, ["prices stale"]))
+
+    def test_status_serves_snapshot_while_loop_is_busy(self):
+        """Test /status answers from memory even while the loop lock is held and a client stalls"""
+        self.loop.start()
+        self.loop.tick()
+        self.loop.in_flight.add("a")
+        # A client that connects and sends nothing holds only its own thread
+        stalled = socket.create_connection(("127.0.0.1", self.server.server_address[1]))
+        try:
+            with self.loop.lock:
+                code, body = self.get("/status")
+                self.assertEqual(self.get("/status?job=b")[1]["decisions"], {"b": {
+                    "action": "STAY", "target_region": None, "reason": "already_cheapest", "instance_type": None,
+                }})
+        finally:
+            stalled.close()
+        self.assertEqual(code, 200)
+        self.assertEqual(body["in_flight"], ["a"])
+        self.assertEqual(body["decision_counts"], {"MIGRATE": 1, "STAY": 1})
+        self.assertEqual(body["decisions"]["a"]["target_region"], "us-west-2")
+        self.assertEqual(body["prices"]["us-west-2"]["price"], 0.05)
+        self.assertIn("evaluate", body["scheduler"]["tasks"])
+        self.assertEqual(self.get("/status?limit=x")[0], 400)
+        self.assertEqual(self.get("/nope")[0], 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
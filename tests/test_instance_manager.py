@@ -0,0 +1,105 @@
+import os
+import unittest
+from collections import Counter
+from concurrent.futures import Future
+from unittest.mock import MagicMock, patch
+
+import boto3
+from botocore.exceptions import ClientError, EndpointConnectionError
+from botocore.stub import Stubber
+from moto import mock_aws
+
+from orchestrator.instance_manager import BatchProvisioner
+
+
+@mock_aws
+@patch.dict(os.environ, {"AWS_DEFAULT_REGION": "us-east-1"})
+class TestBatchProvisioner(unittest.TestCase):
+    def setUp(self):
+        self.calls = Counter()
+        ec2 = boto3.client("ec2", region_name="us-west-2")
+        self.ami = ec2.register_image(Name="worker-ami", RootDeviceName="/dev/sda1")["ImageId"]
+        self.sg = ec2.create_security_group(GroupName="workers", Description="w")["GroupId"]
+
+    def client(self, region):
+        client = boto3.client("ec2", region_name=region)
+        client.meta.events.register("before-call.ec2.*", lambda model, **_: self.calls.update([model.name]))
+        return client
+
+    def submit_many(self, provisioner, count, **kw):
+        return [provisioner.submit("us-west-2", self.ami, self.sg, "key", "t3.micro", **kw) for _ in range(count)]
+
+    def test_requests_coalesce_into_one_launch(self):
+        """Test concurrent requests share one run_instances call and one describe poll"""
+        provisioner = BatchProvisioner(window=0.2, poll_interval=0.05, client_factory=self.client)
+        futures = self.submit_many(provisioner, 5, max_spot_price="0.05")
+        results = [f.result(timeout=10) for f in futures]
+        self.assertEqual(len({instance_id for instance_id, _, _ in results}), 5)
+        self.assertTrue(all(ip for _, ip, _ in results))
+        self.assertEqual(self.calls["RunInstances"], 1)
+        self.assertEqual(self.calls["DescribeInstances"], 1)
+
+        # Different instance types are separate launch groups
+        other = provisioner.submit("us-west-2", self.ami, self.sg, "key", "t3.small")
+        other.result(timeout=10)
+        self.assertEqual(self.calls["RunInstances"], 2)
+
+    def test_fleet_mode_diversifies_pools(self):
+        """Test fleet mode launches with one CreateFleet and reuses the launch template"""
+        provisioner = BatchProvisioner(window=0.1, poll_interval=0.05, mode="fleet", client_factory=self.client)
+        for _ in range(2):
+            futures = self.submit_many(provisioner, 3, alternative_types=("t3a.micro", "t2.micro"))
+            self.assertEqual(len({f.result(timeout=10)[0] for f in futures}), 3)
+        self.assertEqual(self.calls["CreateFleet"], 2)
+        self.assertEqual(self.calls["CreateLaunchTemplate"], 1)
+        self.assertEqual(self.calls["RunInstances"], 0)
+
+    def test_launch_errors_fail_every_request(self):
+        """Test a rejected launch fails the whole batch with the EC2 error"""
+        client = self.client("us-west-2")
+        stubber = Stubber(client)
+        stubber.add_client_error("run_instances", "InvalidAMIID.NotFound")
+        stubber.activate()
+        provisioner = BatchProvisioner(window=0.05, client_factory=lambda region: client)
+        futures = self.submit_many(provisioner, 2)
+        for future in futures:
+            with self.assertRaisesRegex(Exception, "InvalidAMIID.NotFound"):
+                future.result(timeout=10)
+        stubber.assert_no_pending_responses()
+
+
+class TestInstancePolling(unittest.TestCase):
+    def running(self, instance_id):
+        return {"InstanceId": instance_id, "State": {"Name": "running"}, "PublicIpAddress": "10.0.0.1"}
+
+    def test_unknown_id_does_not_hold_back_its_chunk(self):
+        """Test a NotFound for one ID retries the chunk without it; the rest still resolve"""
+        ec2 = MagicMock()
+        not_found = ClientError(
+            {"Error": {"Code": "InvalidInstanceID.NotFound", "Message": "The instance ID 'i-0bad' does not exist"}},
+            "DescribeInstances",
+        )
+        ec2.describe_instances.side_effect = [not_found, {"Reservations": [{"Instances": [self.running("i-0a")]}]}]
+        provisioner = BatchProvisioner(client_factory=lambda region: ec2)
+        good, bad = MagicMock(), MagicMock()
+        provisioner._pending["us-west-2"] = {"i-0a": (good, 1e12), "i-0bad": (bad, 1e12)}
+        provisioner.poll_once()
+        good.set_result.assert_called_once_with(("i-0a", "10.0.0.1", None))
+        self.assertEqual(ec2.describe_instances.call_args.kwargs["InstanceIds"], ["i-0a"])
+        self.assertEqual(list(provisioner._pending["us-west-2"]), ["i-0bad"])
+
+    def test_describe_errors_keep_deadlines_and_terminate_expired(self):
+        """Test a connection error neither kills polling nor skips deadlines; expired instances are terminated"""
+        ec2 = MagicMock()
+        ec2.describe_instances.side_effect = EndpointConnectionError(endpoint_url="https://ec2")
+        provisioner = BatchProvisioner(poll_interval=0.01, client_factory=lambda region: ec2)
+        future = Future()
+        provisioner._pending["us-west-2"] = {"i-0a": (future, 0)}
+        provisioner._poll_loop()
+        with self.assertRaises(TimeoutError):
+            future.result(timeout=1)
+        ec2.terminate_instances.assert_called_once_with(InstanceIds=["i-0a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
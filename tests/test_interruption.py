@@ -0,0 +1,112 @@
+import tempfile
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+from unittest.mock import MagicMock
+
+from orchestrator.control_loop import ControlLoop
+from orchestrator.main import start_health_server
+from worker.interruption_watcher import InterruptionWatcher, MetadataClient, reclaim_deadline
+from worker.metadata_stub import MetadataStub
+
+
+class FakeUploader:
+    def __init__(self):
+        self.uploaded = []
+
+    def upload_stream(self, job_id, src):
+        self.uploaded.append((job_id, src))
+        return f"{job_id}.tar.gz"
+
+
+class TestInterruptionWatcher(unittest.TestCase):
+    def setUp(self):
+        self.stub = MetadataStub().start()
+        self.notifications = []
+        self.server = start_health_server(port=0, interruption_fn=self.notifications.append, interruption_token="s3cret")
+        self.notify_url = f"http://127.0.0.1:{self.server.server_address[1]}/interruption"
+
+    def tearDown(self):
+        self.stub.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def make_watcher(self, dump_command):
+        return InterruptionWatcher(
+            "job-1",
+            4242,
+            "bucket",
+            metadata=MetadataClient(self.stub.url),
+            notify_url=self.notify_url,
+            notify_token="s3cret",
+            poll_interval=0.05,
+            checkpoint_dir=tempfile.gettempdir(),
+            uploader=FakeUploader(),
+            dump_command=dump_command,
+        )
+
+    def test_no_notice_means_404(self):
+        """Test the metadata client treats a missing notice as None"""
+        self.assertIsNone(MetadataClient(self.stub.url).instance_action())
+
+    def test_notice_triggers_dump_upload_and_notifications(self):
+        """Test the full fast path well inside the two-minute budget"""
+        watcher = self.make_watcher(["true"])
+        self.stub.schedule_interruption(after=0.2)
+        started = time.time()
+        self.assertTrue(watcher.run())
+        self.assertLess(time.time() - started, 5)
+        self.assertEqual(watcher.uploader.uploaded[0][0], "job-1")
+        self.assertEqual([n["phase"] for n in self.notifications], ["notice", "checkpointed"])
+        self.assertEqual(self.notifications[1]["checkpoint_key"], "job-1.tar.gz")
+
+    def test_failed_dump_is_reported(self):
+        """Test a failing dump notifies the orchestrator instead of uploading"""
+        watcher = self.make_watcher(["false"])
+        self.stub.schedule_interruption()
+        self.assertFalse(watcher.run())
+        self.assertEqual(self.notifications[-1]["phase"], "failed")
+        self.assertEqual(watcher.uploader.uploaded, [])
+
+    def test_non_object_payload_is_rejected(self):
+        """Test valid JSON that is not an object gets a 400 and never reaches the handler"""
+        for body in (b"[]", b'"notice"', b"42", b"{"):
+            request = urllib.request.Request(self.notify_url, data=body, headers={"X-Notify-Token": "s3cret"})
+            with self.assertRaises(urllib.error.HTTPError) as ctx:
+                urllib.request.urlopen(request, timeout=5)
+            self.assertEqual(ctx.exception.code, 400, body)
+        self.assertEqual(self.notifications, [])
+
+    def test_reclaim_deadline(self):
+        """Test the reclaim time parses as UTC with a fallback budget"""
+        self.assertEqual(reclaim_deadline({"time": "1970-01-01T00:02:00Z"}), 120)
+        self.assertEqual(reclaim_deadline({}, now=1000), 1120)
+
+
+class TestInterruptionRecovery(unittest.TestCase):
+    def test_recovery_waits_for_checkpoint(self):
+        """Test the orchestrator provisions at notice time and restores after upload"""
+        registry = MagicMock()
+        registry.get.return_value = {"job_id": "job-1", "region": "us-east-1"}
+        migrator = MagicMock()
+        results = []
+        migrator.recover.side_effect = lambda job_id, region, wait, **kw: results.append((region, wait(5)))
+
+        loop = ControlLoop(MagicMock(), MagicMock(), registry, migrator)
+        loop.prices = {"us-east-1": {"price": 0.05}, "us-west-2": {"price": 0.09}, "eu-west-1": {"price": 0.08}}
+
+        self.assertTrue(loop.handle_interruption({"job_id": "job-1", "phase": "notice"}))
+        self.assertFalse(loop.handle_interruption({"job_id": "job-1", "phase": "notice"}))
+        threads = []
+        loop.dispatch_pending(lambda fn, *a: threads.append(threading.Thread(target=fn, args=a)) or threads[-1].start())
+        loop.handle_interruption({"job_id": "job-1", "phase": "checkpointed", "checkpoint_key": "job-1.tar.gz"})
+        threads[0].join(timeout=5)
+
+        self.assertEqual(results, [("eu-west-1", True)])
+        self.assertNotIn("job-1", loop.in_flight)
+
+
+if __name__ == '__main__':
+    unittest.main()
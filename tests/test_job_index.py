@@ -0,0 +1,54 @@
+import unittest
+from decimal import Decimal
+
+from orchestrator.job_index import Job, JobIndex
+
+
+class TestJobIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = JobIndex(["RUNNING"], default_region="us-east-1")
+
+    def test_job_from_dynamo_item(self):
+        """Test Decimal numbers are converted and the record interface is kept"""
+        job = Job.from_record({
+            "job_id": "a", "state": "RUNNING", "version": Decimal("3"), "cpu": Decimal("1.5"),
+            "region": "us-west-2", "workload_type": "long", "note": "not kept",
+        })
+        self.assertEqual((job.version, job.cpu), (3, 1.5))
+        self.assertIsInstance(job.version, int)
+        self.assertEqual((job["job_id"], job.get("memory_gib", 0.5), job.get("note")), ("a", 0.5, None))
+        with self.assertRaises(KeyError):
+            job["note"]
+        with self.assertRaises(AttributeError):
+            job.note = "x"
+
+    def test_columns_and_row_reuse(self):
+        """Test category codes and the default region land in the columns; freed rows are reused"""
+        self.index.apply("a", {"state": "RUNNING", "region": "us-west-2", "workload_type": "long", "version": 1})
+        self.index.apply("b", {"state": "RUNNING", "workload_type": "long", "version": 2})
+        table = self.index.jobs
+        rows = [table.rows["a"], table.rows["b"]]
+        self.assertEqual([table.region_of("a"), table.region_of("b")], ["us-west-2", "us-east-1"])
+        self.assertEqual(table.workload[rows[0]], table.workload[rows[1]])
+        self.assertEqual(table.workloads[table.workload[rows[0]]], "long")
+
+        self.index.apply("a", {"state": "STOPPED"})
+        self.assertEqual(table.region[rows[0]], -1)
+        self.index.apply("c", {"state": "RUNNING", "region": "eu-west-1", "version": 1})
+        self.assertEqual(table.rows["c"], rows[0])
+        self.assertEqual(len(table.records), 2)
+        self.assertEqual(self.index.in_regions(["eu-west-1", "us-west-2", "ap-south-1"]), {"c"})
+
+    def test_only_decision_fields_mark_dirty(self):
+        """Test a change to a field the orchestrator ignores leaves the job clean"""
+        self.index.apply("a", {"state": "RUNNING", "version": 1, "updated_at": "t1"})
+        self.index.take_dirty()
+        self.assertFalse(self.index.apply("a", {"state": "RUNNING", "version": 1, "updated_at": "t2"}))
+        self.assertTrue(self.index.apply("a", {"state": "RUNNING", "version": 2, "region": "us-west-2"}))
+        self.assertEqual(self.index.in_regions(["us-west-2"]), {"a"})
+        self.assertEqual(self.index.in_regions(["us-east-1"]), set())
+        self.assertEqual(self.index.take_dirty(), {"a"})
+
+
+if __name__ == "__main__":
+    unittest.main()
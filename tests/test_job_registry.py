@@ -21,9 +21,10 @@ class TestJobRegistry(unittest.TestCase):
         self.registry = JobRegistry(self.temp_file.name)
     
     def tearDown(self):
-        """Clean up temporary file"""
-        if os.path.exists(self.temp_file.name):
-            os.unlink(self.temp_file.name)
+        """Clean up temporary files"""
+        for suffix in ("", ".log", ".lock", ".tmp"):
+            if os.path.exists(self.temp_file.name + suffix):
+                os.unlink(self.temp_file.name + suffix)
     
     def test_get_job(self):
         """Test retrieving a job"""
@@ -52,6 +53,86 @@ class TestJobRegistry(unittest.TestCase):
         with self.assertRaises(KeyError):
             self.registry.get("job-nonexistent")
 
+    def test_update_version_conflict(self):
+        """Test stale expected_version is rejected"""
+        self.registry.update("job-1", "CHECKPOINTING", expected_version=0)
+        with self.assertRaises(RuntimeError):
+            self.registry.update("job-1", "UPLOADING", expected_version=0)
+
+    def test_batch_create(self):
+        """Test bulk creation from a generator"""
+        rows = ({"job_id": f"job-{i}", "state": "RUNNING", "region": "us-east-1"} for i in range(2, 6))
+        self.assertEqual(self.registry.batch_create(rows), 4)
+        self.assertEqual(self.registry.get("job-5")["version"], 0)
+        self.assertEqual(len(list(self.registry.iter_jobs("RUNNING"))), 5)
+
+    def test_update_many_is_all_or_nothing(self):
+        """Test a failed version check leaves every job untouched"""
+        self.registry.batch_create([{"job_id": "job-2", "state": "RUNNING"}])
+        with self.assertRaises(RuntimeError):
+            self.registry.update_many([
+                {"job_id": "job-1", "state": "PAUSED", "expected_version": 0},
+                {"job_id": "job-2", "state": "PAUSED", "expected_version": 7},
+            ])
+        self.assertEqual(self.registry.get("job-1")["state"], "RUNNING")
+
+        self.registry.update_many([
+            {"job_id": "job-1", "state": "PAUSED", "expected_version": 0},
+            {"job_id": "job-2", "state": "PAUSED", "reason": "price_spike"},
+        ])
+        self.assertEqual(self.registry.get("job-2")["state"], "PAUSED")
+        self.assertEqual(self.registry.get("job-2")["reason"], "price_spike")
+
+    def test_list_by_state(self):
+        """Test state index follows transitions"""
+        self.registry.batch_create([{"job_id": "job-2", "state": "RUNNING"}])
+        self.registry.update("job-1", "CHECKPOINTING")
+        self.assertEqual([j["job_id"] for j in self.registry.list_by_state("RUNNING")], ["job-2"])
+        self.assertEqual(self.registry.list_by_state("CHECKPOINTING")[0]["job_id"], "job-1")
+
+    def test_sees_writes_from_other_instance(self):
+        """Test a second registry on the same files (another process) stays in sync"""
+        other = JobRegistry(self.temp_file.name)
+        other.update("job-1", "UPLOADING", region="eu-west-1")
+        job = self.registry.get("job-1")
+        self.assertEqual(job["state"], "UPLOADING")
+        self.assertEqual(job["region"], "eu-west-1")
+        with self.assertRaises(RuntimeError):
+            self.registry.update("job-1", "RUNNING", expected_version=0)
+
+    def test_updates_append_without_rewriting_snapshot(self):
+        """Test updates go to the log and compaction folds them into the snapshot"""
+        with open(self.temp_file.name) as f:
+            before = f.read()
+        self.registry.update("job-1", "CHECKPOINTING")
+        with open(self.temp_file.name) as f:
+            self.assertEqual(f.read(), before)
+
+        self.registry.compact()
+        self.assertEqual(os.path.getsize(self.temp_file.name + ".log"), 0)
+        with open(self.temp_file.name) as f:
+            self.assertEqual(json.load(f)["job-1"]["state"], "CHECKPOINTING")
+        self.assertEqual(JobRegistry(self.temp_file.name).get("job-1")["version"], 1)
+
+    def test_background_compaction(self):
+        """Test the log is compacted once it reaches the threshold"""
+        registry = JobRegistry(self.temp_file.name, compact_after=3, fsync=False)
+        for state in ("A", "B", "C"):
+            registry.update("job-1", state)
+        registry._compactor.join(timeout=5)
+        self.assertEqual(os.path.getsize(self.temp_file.name + ".log"), 0)
+        self.assertEqual(registry.get("job-1")["state"], "C")
+
+    def test_torn_log_tail_is_ignored(self):
+        """Test a partially written log line from a crashed writer is skipped and overwritten"""
+        self.registry.update("job-1", "CHECKPOINTING")
+        with open(self.temp_file.name + ".log", "a") as f:
+            f.write('{"op":"put","job_id":"job-1","rec')
+        fresh = JobRegistry(self.temp_file.name)
+        self.assertEqual(fresh.get("job-1")["state"], "CHECKPOINTING")
+        fresh.update("job-1", "UPLOADING")
+        self.assertEqual(JobRegistry(self.temp_file.name).get("job-1")["state"], "UPLOADING")
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,89 @@
+import json
+import logging
+import queue
+import unittest
+
+from orchestrator import metrics
+from orchestrator.log_pipeline import DroppingQueueHandler, JsonFormatter, Sampler, start
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+class TestLogPipeline(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger("test.log_pipeline")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+
+    def tearDown(self):
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+
+    def test_records_written_by_background_listener_as_json(self):
+        """Test handlers move behind the queue and write compact JSON, events as their fields"""
+        sink = ListHandler()
+        sink.setFormatter(JsonFormatter())
+        self.logger.addHandler(sink)
+        listener = start(self.logger)
+        self.assertIsInstance(self.logger.handlers[0], DroppingQueueHandler)
+        self.logger.info("job %s", "a")
+        self.logger.info("summary", extra={"event": {"event": "evaluation", "jobs": 3}})
+        listener.stop()
+        first, second = (json.loads(line) for line in sink.lines)
+        self.assertEqual((first["msg"], first["logger"]), ("job a", "test.log_pipeline"))
+        self.assertEqual((second["event"], second["jobs"]), ("evaluation", 3))
+        self.assertNotIn("msg", second)
+
+    def test_records_rendered_before_queueing(self):
+        """Test arguments changed after the call are logged as they were, tracebacks kept but frames dropped"""
+        handler = DroppingQueueHandler(queue.Queue())
+        self.logger.addHandler(handler)
+        job = {"state": "RUNNING"}
+        self.logger.info("job %s", job)
+        job["state"] = "MIGRATING"
+        try:
+            raise ValueError("bad checkpoint")
+        except ValueError:
+            self.logger.exception("restore failed")
+        first, second = handler.queue.get_nowait(), handler.queue.get_nowait()
+        self.assertEqual((first.getMessage(), first.args), ("job {'state': 'RUNNING'}", None))
+        self.assertIsNone(second.exc_info)
+        entry = json.loads(JsonFormatter().format(second))
+        self.assertEqual(entry["msg"], "restore failed")
+        self.assertIn("ValueError: bad checkpoint", entry["exc"])
+        self.assertIn("ValueError: bad checkpoint", logging.Formatter().format(second))
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        """Test a full queue drops and counts the record"""
+        handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+        self.logger.addHandler(handler)
+        before = metrics.LOG_RECORDS_DROPPED._default.get()
+        self.logger.info("kept")
+        self.logger.info("dropped")
+        self.assertEqual(handler.queue.qsize(), 1)
+        self.assertEqual(metrics.LOG_RECORDS_DROPPED._default.get(), before + 1)
+
+    def test_sampler_rate_limits_and_reports_suppressed(self):
+        """Test bursts beyond the rate are held back and counted in the next line"""
+        now = [0.0]
+        sampler = Sampler("test", rate=1.0, burst=2, clock=lambda: now[0])
+        sink = ListHandler()
+        self.logger.addHandler(sink)
+        for i in range(5):
+            sampler.log(self.logger, logging.INFO, "line %d", i)
+        now[0] = 1.0
+        sampler.log(self.logger, logging.INFO, "line %d", 5)
+        self.assertEqual(sink.lines, ["line 0", "line 1", "line 5 (3 similar lines suppressed)"])
+        sampler.log(self.logger, logging.DEBUG, "not enabled")
+        self.assertEqual(sampler.suppressed(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
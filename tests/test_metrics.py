@@ -0,0 +1,101 @@
+import tempfile
+import os
+import threading
+import unittest
+import urllib.request
+
+import boto3
+from moto import mock_aws
+
+from orchestrator import metrics
+from orchestrator.main import start_health_server
+from orchestrator.utils import retry
+from storage.dynamo_registry import DynamoRegistry
+from storage.job_registry import JobRegistry
+
+
+class TestMetrics(unittest.TestCase):
+    def test_counter_is_exact_across_threads(self):
+        """Test per-thread slots lose no increments under concurrency"""
+        counter = metrics.Counter("test_threads_total", "test", ["op"]).labels("x")
+
+        def work():
+            for _ in range(10000):
+                counter.inc()
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(counter.get(), 80000)
+
+    def test_histogram_exposition(self):
+        """Test cumulative buckets, sum and count in the text format"""
+        hist = metrics.Histogram("test_latency_seconds", "test", ["phase"], buckets=(1, 5))
+        child = hist.labels("UPLOADING")
+        for value in (0.5, 1, 3, 7):
+            child.observe(value)
+        text = "\n".join(hist.render())
+        self.assertIn('test_latency_seconds_bucket{phase="UPLOADING",le="1"} 2', text)
+        self.assertIn('test_latency_seconds_bucket{phase="UPLOADING",le="5"} 3', text)
+        self.assertIn('test_latency_seconds_bucket{phase="UPLOADING",le="+Inf"} 4', text)
+        self.assertIn('test_latency_seconds_sum{phase="UPLOADING"} 11.5', text)
+        self.assertIn('test_latency_seconds_count{phase="UPLOADING"} 4', text)
+
+    def test_retry_counts(self):
+        """Test utils.retry reports retried and exhausted attempts"""
+        retried = metrics.RETRIES.labels("test_op").get()
+        exhausted = metrics.RETRIES_EXHAUSTED.labels("test_op").get()
+        fatal = metrics.RETRIES_FATAL.labels("test_op").get()
+        with self.assertRaises(RuntimeError):
+            retry(lambda: (_ for _ in ()).throw(RuntimeError("boom")), retries=3, delay=0, op="test_op")
+        self.assertEqual(metrics.RETRIES.labels("test_op").get() - retried, 2)
+        self.assertEqual(metrics.RETRIES_EXHAUSTED.labels("test_op").get() - exhausted, 1)
+        with self.assertRaises(ValueError):
+            retry(lambda: (_ for _ in ()).throw(ValueError("bad argument")), retries=3, delay=0, op="test_op")
+        self.assertEqual(metrics.RETRIES.labels("test_op").get() - retried, 2)
+        self.assertEqual(metrics.RETRIES_FATAL.labels("test_op").get() - fatal, 1)
+
+    def test_instrumented_json_registry(self):
+        """Test registry calls are timed per backend and operation"""
+        with tempfile.TemporaryDirectory() as tmp:
+            registry = metrics.instrument_registry(JobRegistry(os.path.join(tmp, "r.json"), fsync=False))
+            child = metrics.REGISTRY_OP_SECONDS.labels("json", "create")
+            before = sum(child.get()[:-1])
+            registry.create("job-1", state="RUNNING")
+            self.assertEqual(registry.get("job-1")["state"], "RUNNING")
+            self.assertEqual(sum(child.get()[:-1]) - before, 1)
+
+    @mock_aws
+    def test_instrumented_dynamo_registry(self):
+        """Test Dynamo registry calls are timed through the wrapper"""
+        boto3.client("dynamodb", region_name="us-east-1").create_table(
+            TableName="metrics_table",
+            KeySchema=[{"AttributeName": "job_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "job_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        registry = metrics.instrument_registry(DynamoRegistry("metrics_table", region_name="us-east-1"))
+        registry.batch_create([{"job_id": f"job-{i}", "state": "RUNNING"} for i in range(30)])
+        hist = metrics.REGISTRY_OP_SECONDS.labels("dynamo", "batch_create").get()
+        self.assertGreaterEqual(sum(hist[:-1]), 1)
+
+    def test_metrics_endpoint(self):
+        """Test GET /metrics serves the Prometheus text format"""
+        metrics.MIGRATION_PHASE_SECONDS.labels("CHECKPOINTING").observe(2.0)
+        server = start_health_server(port=0)
+        try:
+            port = server.server_address[1]
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as resp:
+                self.assertTrue(resp.headers["Content-Type"].startswith("text/plain"))
+                body = resp.read().decode()
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertIn("# TYPE spot_migration_phase_seconds histogram", body)
+        self.assertIn('spot_migration_phase_seconds_count{phase="CHECKPOINTING"}', body)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,445 @@
+import json
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import boto3
+from moto import mock_aws
+
+from orchestrator.decision_engine import DecisionEngine
+from orchestrator.migrator import Migrator
+from orchestrator.capabilities import CapabilityCache, IncompatibleHostError, missing_cpu_features
+from orchestrator.resilience import CircuitOpenError
+from orchestrator.utils import SSHCommandError
+from storage.job_registry import JobRegistry
+from storage.s3_manager import S3Manager
+
+
+class FakeSSH:
+    """Records commands; the first dump fails once, transfers report bytes."""
+
+    failures = {}
+    fatal = set()
+    commands = []
+    host = {"ami": "ami-1", "instance_type": "t3.micro", "kernel": "6.1.0-aws"}
+    probe = {"criu_version": "Version: 3.19", "criu_check": "ok", "python": "Python 3.11.4", "cpu_flags": "fpu sse2 avx"}
+
+    def __init__(self, host):
+        self.host = host
+
+    def connect(self):
+        pass
+
+    def close(self):
+        pass
+
+    def run_command(self, command, check=True):
+        for pattern in FakeSSH.fatal:
+            if pattern in command:
+                FakeSSH.commands.append(command)
+                raise SSHCommandError(f"{pattern}: command not found", self.host, command, 127)
+        for pattern, remaining in list(FakeSSH.failures.items()):
+            if pattern in command and remaining:
+                FakeSSH.failures[pattern] -= 1
+                raise RuntimeError(f"{pattern} failed")
+        FakeSSH.commands.append(command)
+        stdout = ""
+        if "restore-group app" in command:
+            stdout = "job-2 5001\njob-3 5002\n"
+        elif "meta-data" in command:
+            facts = dict(FakeSSH.host, **(FakeSSH.probe if "criu check" in command else {}))
+            stdout = "".join(f"{k}={v}\n" for k, v in facts.items())
+        elif "restore app" in command:
+            stdout = "4242\n"
+        elif "s3_manager.py" in command:
+            stdout = "progress\n" + json.dumps({"key": "job-1.tar.gz", "bytes": 4096, "seconds": 0.1})
+        return SimpleNamespace(stdout=stdout, returncode=0)
+
+
+@patch("orchestrator.utils.time.sleep", lambda _: None)
+@patch("orchestrator.migrator.SSHClient", FakeSSH)
+class TestMigratorTrace(unittest.TestCase):
+    host = dict(FakeSSH.host)
+    probe = dict(FakeSSH.probe)
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.registry = JobRegistry(os.path.join(self.tmp.name, "registry.json"), fsync=False)
+        self.registry.create("job-1", state="RUNNING", region="us-east-1", pid=42, public_ip="10.0.0.1")
+        self.migrator = Migrator(self.registry, checkpoint_bucket="bkt")
+
+    def tearDown(self):
+        FakeSSH.failures = {}
+        FakeSSH.fatal = set()
+        FakeSSH.commands = []
+        FakeSSH.host = dict(TestMigratorTrace.host)
+        FakeSSH.probe = dict(TestMigratorTrace.probe)
+        self.tmp.cleanup()
+
+    def test_summary_persisted_on_success(self):
+        """Test phase timings, bytes, attempts and downtime land on the job record"""
+        FakeSSH.failures = {"criu_wrapper.sh dump": 1}
+        with self.assertLogs("orchestrator.trace", level="INFO") as logs:
+            self.migrator.migrate("job-1", "us-west-2", target_ip="10.0.0.2")
+
+        job = self.registry.get("job-1")
+        self.assertEqual(job["state"], "RUNNING")
+        summary = job["last_migration"]
+        self.assertTrue(summary["ok"])
+        self.assertEqual(summary["source_region"], "us-east-1")
+        self.assertEqual(
+            list(summary["phases"]),
+            ["CHECKPOINTING", "UPLOADING", "PROVISIONING", "VALIDATING", "DOWNLOADING", "RESTORING"],
+        )
+        self.assertEqual(summary["phases"]["CHECKPOINTING"]["attempts"], 2)
+        self.assertEqual(summary["phases"]["UPLOADING"]["bytes"], 4096)
+        self.assertEqual(summary["phases"]["RESTORING"]["host"], "10.0.0.2")
+        self.assertEqual(summary["bytes"], 8192)
+        self.assertGreaterEqual(summary["total_ms"], summary["downtime_ms"])
+
+        events = [json.loads(line.split(":", 2)[2]) for line in logs.output]
+        self.assertEqual([e["event"] for e in events], ["span"] * 6 + ["trace"])
+
+    def test_summary_persisted_on_failure(self):
+        """Test a failed phase is recorded with its error"""
+        FakeSSH.failures = {"criu_wrapper.sh restore": 3}
+        with self.assertRaises(RuntimeError):
+            self.migrator.migrate("job-1", "us-west-2", target_ip="10.0.0.2")
+        job = self.registry.get("job-1")
+        self.assertEqual(job["state"], "RESTORING")
+        summary = job["last_migration"]
+        self.assertFalse(summary["ok"])
+        self.assertEqual(summary["phases"]["RESTORING"]["attempts"], 3)
+        self.assertIn("restore failed", summary["phases"]["RESTORING"]["error"])
+
+    def test_lost_claim_leaves_record(self):
+        """Test a stale expected_version fails before any phase is recorded"""
+        with self.assertRaises(RuntimeError):
+            self.migrator.migrate("job-1", "us-west-2", target_ip="10.0.0.2", expected_version=7)
+        self.assertNotIn("last_migration", self.registry.get("job-1"))
+
+    def test_app_checkpoint_mode(self):
+        """Test app mode skips the CRIU preflight and records the resumed PID"""
+        self.registry.update("job-1", "RUNNING", checkpoint_mode="app")
+        self.migrator.migrate("job-1", "us-west-2", target_ip="10.0.0.2")
+        self.assertFalse(any(c.startswith(("criu", "sudo criu")) for c in FakeSSH.commands))
+        self.assertIn("criu_wrapper.sh dump 42 app", " ".join(FakeSSH.commands))
+        job = self.registry.get("job-1")
+        self.assertEqual(job["pid"], 4242)
+        self.assertTrue(job["last_migration"]["ok"])
+        with self.assertRaises(ValueError):
+            self.migrator.migrate("job-1", "us-west-2", target_ip="10.0.0.2", checkpoint_mode="vm")
+
+    def test_group_moves_in_one_pass(self):
+        """Test co-located jobs share one dump, one upload and one download"""
+        for job_id, pid in (("job-2", 51), ("job-3", 52)):
+            self.registry.create(job_id, state="RUNNING", region="us-east-1", pid=pid, public_ip="10.0.0.5",
+                                 checkpoint_mode="app", checkpoint_dir=f"/opt/job_workspace/jobs/{job_id}/checkpoint")
+        target_ip = self.migrator.migrate_group(["job-3", "job-2"], "us-west-2", target_ip="10.0.0.9")
+        self.assertEqual(target_ip, "10.0.0.9")
+
+        dumps = [c for c in FakeSSH.commands if "dump" in c]
+        self.assertEqual(len(dumps), 1)
+        self.assertIn("dump-group app 51:/opt/job_workspace/jobs/job-2/checkpoint 52:/opt/job_workspace/jobs/job-3/checkpoint", dumps[0])
+        uploads = [c for c in FakeSSH.commands if "s3_manager.py upload" in c]
+        self.assertEqual(len(uploads), 1)
+        self.assertIn("--root /opt/job_workspace/jobs --src /opt/job_workspace/jobs/job-2/checkpoint", uploads[0])
+        self.assertEqual(len([c for c in FakeSSH.commands if "s3_manager.py download" in c]), 1)
+        self.assertIn("sudo kill -9 51 52", FakeSSH.commands)
+
+        for job_id, pid in (("job-2", 5001), ("job-3", 5002)):
+            job = self.registry.get(job_id)
+            self.assertEqual((job["state"], job["public_ip"], job["pid"]), ("RUNNING", "10.0.0.9", pid))
+            self.assertEqual(job["last_migration"]["kind"], "group")
+
+    def test_group_claim_is_all_or_nothing(self):
+        """Test a stale version on one member puts the others back"""
+        for job_id in ("job-2", "job-3"):
+            self.registry.create(job_id, state="RUNNING", region="us-east-1", pid=5, public_ip="10.0.0.5",
+                                 checkpoint_dir=f"/opt/job_workspace/jobs/{job_id}/checkpoint")
+        with self.assertRaises(RuntimeError):
+            self.migrator.migrate_group(["job-2", "job-3"], "us-west-2", target_ip="10.0.0.9",
+                                        expected_versions={"job-3": 99})
+        self.assertEqual([self.registry.get(j)["state"] for j in ("job-2", "job-3")], ["RUNNING", "RUNNING"])
+        self.assertEqual(FakeSSH.commands, [])
+        with self.assertRaises(ValueError):
+            self.migrator.migrate_group(["job-1", "job-2"], "us-west-2", target_ip="10.0.0.9")
+
+    def test_fatal_errors_are_not_retried(self):
+        """Test a missing binary on the target fails at once instead of sleeping through retries"""
+        FakeSSH.fatal = {"s3_manager.py download"}
+        with self.assertRaises(SSHCommandError):
+            self.migrator.migrate("job-1", "us-west-2", target_ip="10.0.0.2")
+        self.assertEqual(len([c for c in FakeSSH.commands if "s3_manager.py download" in c]), 1)
+        self.assertEqual(self.registry.get("job-1")["last_migration"]["phases"]["DOWNLOADING"]["attempts"], 1)
+
+    def test_preflight_cached_per_image(self):
+        """Test the full probe runs once per AMI and kernel and host facts land on the job"""
+        self.migrator.migrate("job-1", "us-west-2", target_ip="10.0.0.2")
+        self.registry.update("job-1", "RUNNING")
+        self.migrator.migrate("job-1", "eu-west-1", target_ip="10.0.0.3")
+        self.assertEqual(len([c for c in FakeSSH.commands if "criu check" in c]), 1)
+        self.assertEqual(len([c for c in FakeSSH.commands if "meta-data" in c]), 3)
+        job = self.registry.get("job-1")
+        self.assertEqual((job["host_ami"], job["host_kernel"], job["instance_type"]), ("ami-1", "6.1.0-aws", "t3.micro"))
+        # A new kernel on the same AMI is probed again
+        FakeSSH.host["kernel"] = "6.2.0-aws"
+        self.registry.update("job-1", "RUNNING")
+        self.migrator.migrate("job-1", "us-west-2", target_ip="10.0.0.4")
+        self.assertEqual(len([c for c in FakeSSH.commands if "criu check" in c]), 2)
+
+    def test_failed_criu_check_is_fatal(self):
+        """Test a target that fails criu check is refused without retries or caching it as good"""
+        FakeSSH.probe["criu_check"] = "failed"
+        with self.assertRaises(IncompatibleHostError):
+            self.migrator.migrate("job-1", "us-west-2", target_ip="10.0.0.2")
+        self.assertEqual(len([c for c in FakeSSH.commands if "criu check" in c]), 1)
+        self.assertFalse([c for c in FakeSSH.commands if "s3_manager.py download" in c])
+
+    def test_cpu_features_checked_before_freeze(self):
+        """Test a cached target lacking the source's CPU features is refused before the dump"""
+        self.migrator.migrate("job-1", "us-west-2", target_ip="10.0.0.2")
+        self.migrator.capabilities.record({"ami": "ami-2", "kernel": "6.1.0-aws", "instance_type": "t3.micro",
+                                           "criu_version": "3.19", "criu_check": "ok", "cpu_flags": ["fpu", "sse2"]})
+        self.registry.update("job-1", "RUNNING")
+        FakeSSH.commands = []
+        with self.assertRaisesRegex(IncompatibleHostError, "avx"):
+            self.migrator.migrate("job-1", "eu-west-1", autoprovision=True,
+                                  provision_overrides={"ami_id": "ami-2", "security_group_id": "sg-1"})
+        self.assertEqual(FakeSSH.commands, [])
+        self.assertEqual(self.registry.get("job-1")["state"], "RUNNING")
+        # Unknown source flags, or a target probed only at VALIDATING, are checked there
+        FakeSSH.host["ami"], FakeSSH.probe["cpu_flags"] = "ami-3", "fpu sse2"
+        with self.assertRaisesRegex(IncompatibleHostError, "avx"):
+            self.migrator.migrate("job-1", "eu-west-1", target_ip="10.0.0.5")
+        self.assertFalse([c for c in FakeSSH.commands if "s3_manager.py download" in c])
+
+    def test_region_breaker_skips_region(self):
+        """Test repeated provisioning failures open a region's breaker, fail fast and steer decisions away"""
+        # Restore failures are the job's own: they leave the region open
+        FakeSSH.fatal = {"s3_manager.py download"}
+        for _ in range(3):
+            self.registry.update("job-1", "RUNNING")
+            with self.assertRaises(SSHCommandError):
+                self.migrator.migrate("job-1", "us-west-2", target_ip="10.0.0.2")
+        self.assertEqual(self.migrator.breakers.open(), {})
+
+        self.migrator.provisioner = MagicMock()
+        self.migrator.provisioner.provision.side_effect = RuntimeError("no spot capacity for t3.micro in us-west-2")
+        overrides = {"ami_id": "ami-1", "security_group_id": "sg-1", "ssh_key_name": "key", "instance_type": "t3.micro"}
+        for _ in range(3):
+            self.registry.update("job-1", "RUNNING")
+            with self.assertRaisesRegex(RuntimeError, "no spot capacity"):
+                self.migrator.migrate("job-1", "us-west-2", autoprovision=True, provision_overrides=overrides)
+        FakeSSH.commands = []
+        self.registry.update("job-1", "RUNNING")
+        with self.assertRaises(CircuitOpenError):
+            self.migrator.migrate("job-1", "us-west-2", target_ip="10.0.0.3")
+        self.assertEqual(FakeSSH.commands, [])
+        self.assertEqual(self.registry.get("job-1")["state"], "RUNNING")
+
+        engine = DecisionEngine("orchestrator/sla_policy.yaml", breakers=self.migrator.breakers)
+        prices = {r: {"price": p} for r, p in (("us-east-1", 0.5), ("us-west-2", 0.1), ("eu-west-1", 0.2))}
+        decision = engine.evaluate(prices, "us-east-1")
+        self.assertEqual((decision.action, decision.target_region), ("MIGRATE", "eu-west-1"))
+
+
+@patch("orchestrator.utils.time.sleep", lambda _: None)
+@patch("orchestrator.migrator.SSHClient", FakeSSH)
+class TestMigrationJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.registry = JobRegistry(os.path.join(self.tmp.name, "registry.json"), fsync=False)
+        self.registry.create("job-1", state="RUNNING", region="us-east-1", pid=42, public_ip="10.0.0.1")
+        self.migrator = Migrator(self.registry, checkpoint_bucket="bkt")
+
+    def tearDown(self):
+        FakeSSH.failures = {}
+        FakeSSH.fatal = set()
+        FakeSSH.commands = []
+        self.tmp.cleanup()
+
+    def ran(self, pattern):
+        return len([c for c in FakeSSH.commands if pattern in c])
+
+    def test_resume_skips_completed_steps(self):
+        """Test a migration that failed after the upload resumes at the target without dumping again"""
+        FakeSSH.fatal = {"s3_manager.py download"}
+        with self.assertRaises(SSHCommandError):
+            self.migrator.migrate("job-1", "us-west-2", target_ip="10.0.0.2")
+        journal = self.registry.get("job-1")["migration_journal"]
+        self.assertEqual(journal["done"], ["UPLOADED", "SOURCE_STOPPED", "PROVISIONED"])
+        self.assertEqual(journal["checkpoint_key"], "job-1")
+        with patch.object(self.registry, "list_by_state", wraps=self.registry.list_by_state) as list_by_state:
+            self.assertEqual([j["key"] for j in self.migrator.pending_journals()], ["job-1"])
+        list_by_state.assert_not_called()
+
+        FakeSSH.fatal, FakeSSH.commands = set(), []
+        self.assertEqual(self.migrator.resume("job-1"), "10.0.0.2")
+        self.assertEqual((self.ran("dump"), self.ran("upload"), self.ran("kill")), (0, 0, 0))
+        self.assertEqual((self.ran("s3_manager.py download"), self.ran("criu_wrapper.sh restore")), (1, 1))
+        job = self.registry.get("job-1")
+        self.assertEqual((job["state"], job["public_ip"]), ("RUNNING", "10.0.0.2"))
+        self.assertIsNone(job["migration_journal"])
+        self.assertEqual(job["last_migration"]["kind"], "resume")
+        self.assertIsNone(self.migrator.resume("job-1"))
+
+    def test_recovery_falls_back_to_staged_snapshot(self):
+        """Test an interrupted job whose checkpoint never arrives restores its staged snapshot, or is LOST without one"""
+        self.assertTrue(self.migrator.recover("job-1", "us-west-2", lambda timeout: False, target_ip="10.0.0.2"))
+        self.assertEqual((self.ran("s3_manager.py download-staged"), self.ran("criu_wrapper.sh restore")), (1, 1))
+        self.assertEqual(self.registry.get("job-1")["public_ip"], "10.0.0.2")
+
+        FakeSSH.fatal = {"s3_manager.py staged"}
+        self.assertFalse(self.migrator.recover("job-1", "us-west-2", lambda timeout: False, target_ip="10.0.0.3"))
+        self.assertEqual(self.registry.get("job-1")["state"], "LOST")
+
+    @mock_aws
+    @patch.dict(os.environ, {"AWS_DEFAULT_REGION": "us-east-1"})
+    def test_recovery_resumes_from_checkpoint_found_in_s3(self):
+        """Test a recovery journaled before the upload looks in S3 before the job is given up as LOST"""
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="bkt")
+
+        def interrupted_wait(timeout):
+            raise RuntimeError("orchestrator restarted")
+
+        with self.assertRaises(RuntimeError):
+            self.migrator.recover("job-1", "us-west-2", interrupted_wait, target_ip="10.0.0.2")
+        self.assertNotIn("UPLOADED", self.registry.get("job-1")["migration_journal"]["done"])
+        s3.put_object(Bucket="bkt", Key="job-1.tar.gz", Body=b"archive")
+        FakeSSH.commands = []
+        self.assertEqual(self.migrator.resume("job-1"), "10.0.0.2")
+        self.assertEqual((self.ran("s3_manager.py download "), self.ran("download-staged")), (1, 0))
+        self.assertEqual(self.registry.get("job-1")["state"], "RUNNING")
+
+        # Nothing in S3 from after the interruption: the job is LOST
+        with self.assertRaises(RuntimeError):
+            self.migrator.recover("job-1", "us-west-2", interrupted_wait, target_ip="10.0.0.3")
+        journal = self.registry.get("job-1")["migration_journal"]
+        journal["started_at"] += 3600
+        self.registry.update("job-1", "INTERRUPTED", migration_journal=journal)
+        self.assertIsNone(self.migrator.resume("job-1"))
+        self.assertEqual(self.registry.get("job-1")["state"], "LOST")
+
+    def test_unuploaded_dump_is_retaken_then_abandoned(self):
+        """Test a failed upload dumps again on resume, and repeated failures hand the job back to its source"""
+        FakeSSH.failures = {"s3_manager.py upload": 3}
+        with self.assertRaises(RuntimeError):
+            self.migrator.migrate("job-1", "us-west-2", target_ip="10.0.0.2")
+        self.assertEqual(self.registry.get("job-1")["migration_journal"]["done"], [])
+        self.assertEqual(self.ran("kill"), 0)
+
+        FakeSSH.commands = []
+        self.migrator.max_resumes = 1
+        FakeSSH.failures = {"s3_manager.py upload": 3}
+        with self.assertRaises(RuntimeError):
+            self.migrator.resume("job-1")
+        self.assertEqual(self.ran("criu_wrapper.sh dump"), 1)
+        self.assertEqual(self.registry.get("job-1")["state"], "UPLOADING")
+
+        self.assertIsNone(self.migrator.resume("job-1"))
+        job = self.registry.get("job-1")
+        self.assertEqual((job["state"], job["public_ip"], job["migration_journal"]), ("RUNNING", "10.0.0.1", None))
+
+    @mock_aws
+    @patch.dict(os.environ, {"AWS_DEFAULT_REGION": "us-east-1"})
+    def test_journaled_instance_reused_or_reaped(self):
+        """Test resume reuses a live provisioned target, replaces a dead one and orphans are reaped"""
+        ec2 = boto3.client("ec2", region_name="us-west-2")
+        overrides = {
+            "ami_id": ec2.register_image(Name="worker-ami", RootDeviceName="/dev/sda1")["ImageId"],
+            "security_group_id": ec2.create_security_group(GroupName="workers", Description="w")["GroupId"],
+            "ssh_key_name": "key",
+            "instance_type": "t3.micro",
+        }
+        self.migrator.provisioner.poll_interval = 0.05
+        FakeSSH.fatal = {"s3_manager.py download"}
+        with self.assertRaises(SSHCommandError):
+            self.migrator.migrate("job-1", "us-west-2", autoprovision=True, provision_overrides=overrides)
+        first = self.registry.get("job-1")["migration_journal"]["instance_id"]
+
+        with self.assertRaises(SSHCommandError):
+            self.migrator.resume("job-1")
+        self.assertEqual(self.registry.get("job-1")["migration_journal"]["instance_id"], first)
+
+        ec2.terminate_instances(InstanceIds=[first])
+        FakeSSH.fatal = set()
+        self.migrator.resume("job-1")
+        job = self.registry.get("job-1")
+        self.assertNotEqual(job["instance_id"], first)
+        self.assertEqual(len(self.migrator.provisioner.managed_instances("us-west-2")), 1)
+
+        # An instance nobody refers to is reaped; the job's own instance is kept
+        orphan, _, _ = self.migrator.provisioner.provision("us-west-2", overrides["ami_id"], overrides["security_group_id"], "key", "t3.micro")
+        self.assertEqual(self.migrator.reap_orphans(["us-west-2"], min_age=3600), [])
+        self.assertEqual(self.migrator.reap_orphans(["us-west-2"], min_age=0), [orphan])
+        self.assertEqual([i["InstanceId"] for i in self.migrator.provisioner.managed_instances("us-west-2")], [job["instance_id"]])
+
+
+class TestS3ManagerStats(unittest.TestCase):
+    @mock_aws
+    @patch.dict(os.environ, {"AWS_DEFAULT_REGION": "us-east-1"})
+    def test_transfer_stats(self):
+        """Test uploads and downloads report their byte counts"""
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="bkt")
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "checkpoint")
+            os.makedirs(src)
+            with open(os.path.join(src, "pages-1.img"), "wb") as f:
+                f.write(os.urandom(10000))
+            manager = S3Manager("bkt")
+            manager.upload_stream("job-s", src=src)
+            self.assertEqual(manager.last_transfer["action"], "upload-stream")
+            self.assertGreater(manager.last_transfer["bytes"], 10000)
+            manager.download("job-s", dst=os.path.join(tmp, "restored", "checkpoint"))
+            self.assertEqual(manager.last_transfer["bytes"], manager.s3.head_object(Bucket="bkt", Key="job-s.tar.gz")["ContentLength"])
+
+    @mock_aws
+    @patch.dict(os.environ, {"AWS_DEFAULT_REGION": "us-east-1"})
+    def test_group_archive(self):
+        """Test several job checkpoint dirs travel in one archive and land in their own dirs"""
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="bkt")
+        with tempfile.TemporaryDirectory() as tmp:
+            src_root, dst_root = os.path.join(tmp, "src"), os.path.join(tmp, "dst")
+            dirs = []
+            for job_id in ("a", "b"):
+                d = os.path.join(src_root, job_id, "checkpoint")
+                os.makedirs(d)
+                with open(os.path.join(d, "app.ckpt"), "w") as f:
+                    f.write(job_id)
+                dirs.append(d)
+            manager = S3Manager("bkt", tmp_dir=tmp)
+            manager.upload_stream("group-x", src=dirs, root=src_root)
+            manager.download("group-x", root=dst_root)
+            for job_id in ("a", "b"):
+                with open(os.path.join(dst_root, job_id, "checkpoint", "app.ckpt")) as f:
+                    self.assertEqual(f.read(), job_id)
+
+
+class TestCapabilityCache(unittest.TestCase):
+    def test_only_restore_features_compared(self):
+        """Test flags CRIU does not check on restore never make a target incompatible"""
+        source = ["fpu", "sse", "avx", "avx512f", "hypervisor", "constant_tsc", "arat"]
+        self.assertEqual(missing_cpu_features(source, ["fpu", "sse", "avx", "avx512f"]), [])
+        self.assertEqual(missing_cpu_features(source, ["fpu", "sse", "avx", "hypervisor"]), ["avx512f"])
+
+    def test_records_are_reread_after_ttl(self):
+        """Test a record another replica refreshed is picked up once the local copy expires"""
+        with tempfile.TemporaryDirectory() as tmp:
+            registry = JobRegistry(os.path.join(tmp, "registry.json"), fsync=False)
+            now = [0.0]
+            cache = CapabilityCache(registry, ttl=60, clock=lambda: now[0])
+            other = CapabilityCache(registry)
+            other.record({"ami": "ami-1", "kernel": "6.1", "criu_check": "failed"})
+            self.assertEqual(cache.get("ami-1", "6.1")["criu_check"], "failed")
+            other.record({"ami": "ami-1", "kernel": "6.1", "criu_check": "ok"})
+            self.assertEqual(cache.get("ami-1", "6.1")["criu_check"], "failed")
+            now[0] = 61
+            self.assertEqual(cache.get("ami-1", "6.1")["criu_check"], "ok")
+
+
+if __name__ == "__main__":
+    unittest.main()
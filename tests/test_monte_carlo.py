@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+
+from worker.jobs.monte_carlo import load_state, run
+
+
+class TestMonteCarlo(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.state = os.path.join(self.tmp.name, "state.ckpt")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_reproducible_across_pool_and_inline(self):
+        """Test per-worker streams give the same result with or without a pool"""
+        inline = run(iterations=200_000, workers=1, batch_size=50_000, seed=7)
+        again = run(iterations=200_000, workers=1, batch_size=50_000, seed=7)
+        self.assertEqual(inline["inside"], again["inside"])
+        self.assertAlmostEqual(inline["pi"], 3.1416, delta=0.02)
+
+        pooled = run(iterations=200_000, workers=2, batch_size=50_000, seed=7)
+        self.assertEqual(pooled["done"], 200_000)
+        self.assertAlmostEqual(pooled["pi"], 3.1416, delta=0.02)
+
+    def test_resume_matches_uninterrupted_run(self):
+        """Test stopping at a state record and resuming gives the same estimate"""
+        straight = run(iterations=400_000, workers=2, batch_size=50_000, seed=11)
+
+        run(iterations=200_000, workers=2, batch_size=50_000, seed=11, state_path=self.state, checkpoint_every=0)
+        record = load_state(self.state)
+        self.assertEqual(record["done"], 200_000)
+        self.assertEqual(len(record["rng"]), 2)
+        self.assertLess(os.path.getsize(self.state), 2048)
+
+        resumed = run(iterations=400_000, state_path=self.state, resume=True)
+        self.assertEqual(resumed["inside"], straight["inside"])
+
+    def test_resume_requires_record(self):
+        """Test resume without a state record fails loudly"""
+        with self.assertRaises(FileNotFoundError):
+            run(iterations=10, state_path=self.state, resume=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
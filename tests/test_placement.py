@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from orchestrator.control_loop import ControlLoop
+from orchestrator.decision_engine import Decision
+from orchestrator.placement import Shape, cheapest, load_instance_matrix, pack
+from storage.job_registry import JobRegistry
+
+
+class TestPacking(unittest.TestCase):
+    def test_first_fit_decreasing(self):
+        """Test jobs fill instances by dominant resource, oversized jobs alone"""
+        jobs = {
+            "big": {"cpu": 3, "memory_gib": 2},
+            "mem": {"cpu": 0.5, "memory_gib": 6},
+            "s1": {"cpu": 1, "memory_gib": 1},
+            "s2": {"cpu": 1, "memory_gib": 1},
+            "huge": {"cpu": 8, "memory_gib": 1},
+        }
+        bins = pack(jobs, Shape(4, 8))
+        self.assertEqual(bins, [["huge"], ["big", "mem"], ["s1", "s2"]])
+
+    def test_cheapest_offer(self):
+        """Test total cost picks between regions and instance types"""
+        shapes = {"small": Shape(2, 4), "large": Shape(8, 16)}
+        jobs = {f"j{i}": {"cpu": 2, "memory_gib": 1} for i in range(4)}
+        offers = {("us-east-1", "small"): 0.05, ("us-east-1", "large"): 0.18, ("us-west-2", "large"): 0.15}
+        plan = cheapest(jobs, offers, shapes)
+        self.assertEqual((plan.region, plan.instance_type, len(plan.bins)), ("us-west-2", "large", 1))
+        self.assertIsNone(cheapest(jobs, {("us-east-1", "unknown"): 0.01}, shapes))
+
+    def test_instance_matrix(self):
+        """Test the shipped matrix loads with the reserve applied"""
+        shapes, defaults = load_instance_matrix()
+        self.assertEqual(shapes["t3.micro"], Shape(2, 0.75))
+        self.assertEqual(defaults, {"cpu": 1.0, "memory_gib": 0.5})
+
+
+class FakeWatcher:
+    regions = ["us-east-1", "us-west-2"]
+    instance_type = "c5.xlarge"
+
+    def poll(self):
+        return {"us-east-1": {"price": 0.30}, "us-west-2": {"price": 0.10}}
+
+
+class TestPackedDispatch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.registry = JobRegistry(os.path.join(self.tmp, "registry.json"), fsync=False)
+        jobs = [
+            {"job_id": f"j{i}", "state": "RUNNING", "region": "us-east-1", "public_ip": "10.0.0.1" if i < 3 else "10.0.0.2",
+             "cpu": 1, "memory_gib": 1, "checkpoint_dir": f"/opt/job_workspace/jobs/j{i}/checkpoint"}
+            for i in range(5)
+        ]
+        self.registry.batch_create(jobs)
+        engine = MagicMock()
+        engine.evaluate.return_value = Decision("MIGRATE", "us-west-2", "price_spike")
+        self.migrator = MagicMock()
+        self.migrator.migrate_group.return_value = "10.1.0.9"
+        self.loop = ControlLoop(
+            FakeWatcher(), engine, self.registry, self.migrator, migrate=True, price_cache_ttl=0,
+            migrate_options={"autoprovision": True, "provision_overrides": {"instance_type": "t3.micro"}},
+            placement=load_instance_matrix(),
+        )
+        self.loop.start()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_bins_move_per_source_host(self):
+        """Test packed jobs share one target instance and move one group per source host"""
+        self.loop.refresh_prices()
+        self.loop.sync_jobs()
+        self.loop.enqueue(self.loop.evaluate_pending())
+        calls = []
+        self.assertEqual(self.loop.dispatch_pending(lambda fn, *a: calls.append((fn, a))), 2)
+        for fn, a in calls:
+            fn(*a)
+
+        groups = [c.args[0] for c in self.migrator.migrate_group.call_args_list]
+        # c5.xlarge fits four 1-vCPU jobs: j0-j3 share an instance, j4 moves alone
+        self.assertEqual(sorted(map(sorted, groups)), [["j0", "j1", "j2"], ["j3"]])
+        self.assertEqual(self.migrator.migrate.call_args.args[:2], ("j4", "us-west-2"))
+        # The second group of the bin lands on the instance the first provisioned
+        self.assertEqual([c.kwargs["target_ip"] for c in self.migrator.migrate_group.call_args_list], [None, "10.1.0.9"])
+        self.assertEqual(self.migrator.migrate_group.call_args.kwargs["provision_overrides"]["instance_type"], "c5.xlarge")
+        self.assertEqual(self.loop.in_flight, set())
+
+    def test_default_checkpoint_dirs_get_own_instances(self):
+        """Test jobs without their own checkpoint_dir never share a target instance"""
+        for job_id in ("j0", "j3"):
+            self.registry.update(job_id, "RUNNING", checkpoint_dir=None)
+        self.loop.refresh_prices()
+        self.loop.sync_jobs()
+        admitted = {f"j{i}": Decision("MIGRATE", "us-west-2", "price_spike") for i in range(5)}
+        bins = [job_ids for _, _, job_ids in self.loop.pack(admitted, self.loop.prices)]
+
+        self.assertEqual(sorted(job_id for job_ids in bins for job_id in job_ids), ["j0", "j1", "j2", "j3", "j4"])
+        for job_ids in bins:
+            shared = [j for j in job_ids if not self.registry.get(j).get("checkpoint_dir")]
+            self.assertLessEqual(len(shared), 1, job_ids)
+        # j0 (10.0.0.1) and j3 (10.0.0.2) would otherwise have shared the first instance
+        self.assertFalse(any({"j0", "j3"} <= set(job_ids) for job_ids in bins))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from botocore.exceptions import ClientError
+
+from orchestrator.resilience import Backoff, Breakers, CircuitBreaker, CircuitOpenError, Deadline, DeadlineExceeded, is_retryable
+from orchestrator.utils import SSHClient, SSHCommandError, SSHConnectionError, retry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResilience(unittest.TestCase):
+    def test_classification(self):
+        """Test transient errors are retried and permanent ones are not"""
+        self.assertTrue(is_retryable(SSHConnectionError("refused")))
+        self.assertTrue(is_retryable(SSHCommandError("dump failed", returncode=1, stderr="Error (criu/cr-dump.c)")))
+        self.assertFalse(is_retryable(SSHCommandError("no criu", returncode=127)))
+        self.assertFalse(is_retryable(SSHCommandError("bad", returncode=2, stderr="bash: /opt/x: No such file or directory")))
+        self.assertTrue(is_retryable(ClientError({"Error": {"Code": "RequestLimitExceeded"}}, "RunInstances")))
+        self.assertFalse(is_retryable(ClientError({"Error": {"Code": "InvalidAMIID.NotFound"}}, "RunInstances")))
+        self.assertFalse(is_retryable(ValueError("bad")))
+        self.assertTrue(is_retryable(RuntimeError("flaky")))
+
+    @patch("subprocess.run")
+    def test_ssh_errors(self, mock_run):
+        """Test SSHClient tells connection failures from remote command failures"""
+        mock_run.return_value = MagicMock(returncode=255, stdout="", stderr="Connection refused")
+        with self.assertRaises(SSHConnectionError):
+            SSHClient("1.2.3.4").run_command("true")
+        mock_run.return_value = MagicMock(returncode=127, stdout="", stderr="criu: command not found")
+        with self.assertRaises(SSHCommandError) as ctx:
+            SSHClient("1.2.3.4").run_command("criu --version")
+        self.assertFalse(ctx.exception.retryable)
+
+    def test_backoff_is_bounded_jitter(self):
+        """Test sleeps grow exponentially up to the cap, with full jitter"""
+        backoff = Backoff(base=1, cap=8)
+        for attempt, limit in enumerate((1, 2, 4, 8, 8)):
+            delays = [backoff.delay(attempt) for _ in range(200)]
+            self.assertTrue(all(0 <= d <= limit for d in delays))
+            self.assertGreater(len(set(delays)), 1)
+
+    @patch("orchestrator.utils.time.sleep")
+    def test_deadline_stops_retries(self, sleep):
+        """Test retry gives up once the next sleep would overrun the deadline"""
+        clock = FakeClock()
+        deadline = Deadline(5, clock)
+        sleep.side_effect = lambda seconds: setattr(clock, "now", clock.now + seconds)
+        calls = []
+
+        def flaky():
+            calls.append(clock.now)
+            raise RuntimeError("flaky")
+
+        with self.assertRaises(DeadlineExceeded):
+            retry(flaky, retries=100, delay=1, max_delay=2, deadline=deadline)
+        self.assertLessEqual(clock.now, 5)
+        self.assertGreater(len(calls), 1)
+
+    def test_breaker_opens_and_probes(self):
+        """Test the breaker trips, fails fast, then lets one probe through"""
+        clock = FakeClock()
+        breaker = CircuitBreaker("host", "10.0.0.1", failure_threshold=2, reset_timeout=30, clock=clock)
+        for _ in range(2):
+            breaker.before_call()
+            breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+        clock.now = 31
+        self.assertEqual(breaker.state, "half_open")
+        breaker.before_call()
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()  # only one probe at a time
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+
+        clock.now = 62
+        breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+
+    @patch("orchestrator.utils.time.sleep", lambda _: None)
+    def test_retry_feeds_breaker(self):
+        """Test an open host breaker stops retry without calling out; failed commands don't count"""
+        breakers = Breakers(host_threshold=2)
+        failed = MagicMock(side_effect=SSHCommandError("exit 1", "10.0.0.1", "criu restore", 1))
+        with self.assertRaises(SSHCommandError):
+            retry(failed, retries=3, delay=0, breaker=breakers.host("10.0.0.1"))
+        self.assertEqual(breakers.open(), {})
+        fn = MagicMock(side_effect=SSHConnectionError("down"))
+        with self.assertRaises(CircuitOpenError):
+            retry(fn, retries=5, delay=0, breaker=breakers.host("10.0.0.1"))
+        self.assertEqual(fn.call_count, 2)
+        self.assertTrue(breakers.region_available("us-east-1"))
+        self.assertIn(("host", "10.0.0.1"), breakers.open())
+
+
+    def test_nested_open_breaker_releases_probe(self):
+        """Test a half-open probe stopped by another breaker is released, not left taken"""
+        clock = FakeClock()
+        host = CircuitBreaker("host", "10.0.0.1", failure_threshold=1, reset_timeout=30, clock=clock)
+        host.before_call()
+        host.record_failure()
+        clock.now = 31
+        region = CircuitOpenError("region", "us-west-2", 10)
+        with self.assertRaises(CircuitOpenError):
+            retry(MagicMock(side_effect=region), retries=1, breaker=host)
+        self.assertTrue(host.allows())
+        self.assertEqual(host.state, "half_open")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import asyncio
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from orchestrator.main import build_scheduler
+from orchestrator.scheduler import Scheduler
+
+
+class TestScheduler(unittest.TestCase):
+    def run_for(self, scheduler, seconds, during=None):
+        async def main():
+            runner = asyncio.create_task(scheduler.run())
+            await asyncio.sleep(0.05)
+            if during:
+                during()
+            await asyncio.sleep(seconds)
+            runner.cancel()
+            try:
+                await runner
+            except asyncio.CancelledError:
+                pass
+
+        asyncio.run(main())
+
+    def test_tasks_run_on_their_own_cadence(self):
+        """Test a fast task runs more often than a slow one"""
+        counts = {"fast": 0, "slow": 0}
+        scheduler = Scheduler(lag_interval=0.05)
+        scheduler.add("fast", lambda: counts.__setitem__("fast", counts["fast"] + 1), interval=0.05)
+        scheduler.add("slow", lambda: counts.__setitem__("slow", counts["slow"] + 1), interval=10)
+        self.run_for(scheduler, 0.3)
+        self.assertEqual(counts["slow"], 1)
+        self.assertGreater(counts["fast"], 3)
+
+    def test_wake_runs_task_immediately(self):
+        """Test wake() cuts a long interval short, even from another thread"""
+        runs = []
+        scheduler = Scheduler()
+        scheduler.add("evaluate", lambda: runs.append(time.monotonic()), interval=60)
+        self.run_for(scheduler, 0.2, during=lambda: scheduler.wake("evaluate"))
+        self.assertEqual(len(runs), 2)
+
+    def test_errors_and_deadlines_are_recorded(self):
+        """Test failures are counted and coroutine tasks are cut at their deadline"""
+        def boom():
+            raise RuntimeError("boom")
+
+        async def slow():
+            await asyncio.sleep(5)
+
+        scheduler = Scheduler()
+        scheduler.add("boom", boom, interval=60)
+        scheduler.add("slow", slow, interval=60, deadline=0.05)
+        self.run_for(scheduler, 0.2)
+        status = scheduler.status()
+        self.assertEqual(status["tasks"]["boom"]["last_error"], "boom")
+        self.assertEqual(status["tasks"]["slow"]["errors"], 1)
+        self.assertIn("loop_lag_ms", status)
+
+    def test_loop_lag_is_measured(self):
+        """Test a blocking coroutine shows up as event-loop lag"""
+        async def hog():
+            time.sleep(0.2)
+
+        scheduler = Scheduler(lag_interval=0.02)
+        scheduler.add("hog", hog, interval=60)
+        self.run_for(scheduler, 0.1)
+        self.assertGreater(scheduler.max_loop_lag, 0.1)
+
+
+class TestBuildScheduler(unittest.TestCase):
+    def test_lock_taking_steps_run_off_the_event_loop(self):
+        """Test evaluate and dispatch, which take the loop lock, run as blocking tasks"""
+        loop = MagicMock(coordinator=None, migrator=None)
+        loop.watcher.regions = ["us-east-1"]
+        args = SimpleNamespace(price_interval=60, sync_interval=5, interval=60, resume_interval=60, reap_orphans=None)
+        scheduler = build_scheduler(loop, args, submit=MagicMock())
+        self.assertTrue(scheduler.tasks["evaluate"].blocking)
+        self.assertTrue(scheduler.tasks["dispatch"].blocking)
+
+
+if __name__ == '__main__':
+    unittest.main()
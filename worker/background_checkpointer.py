@@ -0,0 +1,260 @@
+# worker/background_checkpointer.py
+"""
+Periodic non-disruptive checkpoints, staged in S3 ahead of need.
+
+While the job runs, a thread takes snapshots with criu_wrapper.sh snapshot:
+in CRIU mode `criu dump --leave-running --track-mem`, each one on top of
+the previous (--prev-images-dir), so it holds only the pages dirtied since;
+in app mode a copy of the registered application state, skipped when it
+has not changed. Each snapshot is uploaded once and the chain is listed in
+the job's S3 manifest (S3Manager.put_manifest). Every `max_chain`
+snapshots a new full one starts the chain again and the old snapshots are
+deleted, so restores never walk a long chain.
+
+The final dump of a migration or interruption builds on the newest
+snapshot, so only the last delta is uploaded then; if it never arrives,
+the orchestrator restores the staged snapshot itself (s3_manager.py
+download-staged).
+
+The interval between snapshots adapts: it aims for `target_delta_mb` per
+delta at the measured dirty rate, and shrinks as spot prices get volatile
+(more likely to be interrupted), within [min_interval, max_interval].
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import statistics
+import subprocess
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+log = logging.getLogger("worker.background_checkpointer")
+
+CRIU_WRAPPER = "/opt/job_workspace/checkpoint/criu_wrapper.sh"
+CHECKPOINT_DIR = "/opt/job_workspace/checkpoint"
+SNAPSHOTS_DIR = "snapshots"
+MB = 1024 * 1024
+# criu_wrapper.sh snapshot exits with this while a final dump holds the chain
+HELD_EXIT_CODE = 3
+
+
+def dir_size(path):
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        for name in files:
+            full = os.path.join(dirpath, name)
+            if not os.path.islink(full):
+                total += os.path.getsize(full)
+    return total
+
+
+def price_volatility(ec2, instance_type, availability_zone, hours=6, now=None):
+    """
+    Coefficient of variation (stdev / mean) of the spot price over the last
+    `hours`; 0 when the price was flat or there is too little history.
+    """
+    now = now or datetime.now(timezone.utc)
+    resp = ec2.describe_spot_price_history(
+        InstanceTypes=[instance_type],
+        AvailabilityZone=availability_zone,
+        ProductDescriptions=["Linux/UNIX"],
+        StartTime=now - timedelta(hours=hours),
+        EndTime=now,
+    )
+    prices = [float(p["SpotPrice"]) for p in resp.get("SpotPriceHistory", [])]
+    if len(prices) < 2 or not statistics.fmean(prices):
+        return 0.0
+    return statistics.pstdev(prices) / statistics.fmean(prices)
+
+
+class BackgroundCheckpointer:
+    def __init__(
+        self,
+        job_id,
+        pid,
+        uploader,
+        checkpoint_dir=CHECKPOINT_DIR,
+        mode="criu",
+        min_interval=60.0,
+        max_interval=1800.0,
+        target_delta_mb=256.0,
+        max_chain=8,
+        volatility_fn=None,
+        volatility_weight=20.0,
+        snapshot_command=None,
+    ):
+        self.job_id = job_id
+        self.pid = pid
+        self.uploader = uploader
+        self.checkpoint_dir = checkpoint_dir
+        self.mode = mode
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_delta_bytes = target_delta_mb * MB
+        self.max_chain = max(1, int(max_chain))
+        self.volatility_fn = volatility_fn
+        self.volatility_weight = volatility_weight
+        # snapshot_command(name, prev) -> argv
+        self.snapshot_command = snapshot_command or self._wrapper_command
+        self.snapshots = os.path.join(checkpoint_dir, SNAPSHOTS_DIR)
+        self.chain = []
+        self.dirty_rate = None      # bytes per second, from the last delta
+        self.volatility = 0.0
+        self._last_at = None
+        self._last_digest = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _wrapper_command(self, name, prev):
+        command = ["sudo", f"CHECKPOINT_DIR={self.checkpoint_dir}", "bash", CRIU_WRAPPER,
+                   "snapshot", str(self.pid), self.mode, name]
+        return command + ([prev] if prev else [])
+
+    # ------------------------------------------------------------------
+    # Snapshots
+    # ------------------------------------------------------------------
+    def _write_local(self, name, content):
+        path = os.path.join(self.snapshots, name)
+        with open(path + ".tmp", "w") as f:
+            f.write(content)
+        os.replace(path + ".tmp", path)
+
+    def _digest(self, path):
+        h = hashlib.sha256()
+        with open(os.path.join(path, "app.ckpt"), "rb") as f:
+            for block in iter(lambda: f.read(MB), b""):
+                h.update(block)
+        return h.hexdigest()
+
+    def snapshot_once(self, now=None):
+        """
+        Take, upload and publish one snapshot. Returns its chain entry, or
+        None if nothing changed (app mode) or a final dump holds the chain.
+        """
+        now = time.time() if now is None else now
+        name = str(int(now * 1000))
+        # App state is whole every time; CRIU snapshots extend the chain up to max_chain
+        incremental = self.mode != "app" and 0 < len(self.chain) < self.max_chain
+        prev = self.chain[-1]["name"] if incremental else None
+        result = subprocess.run(self.snapshot_command(name, prev), capture_output=True, text=True)
+        if result.returncode == HELD_EXIT_CODE:
+            log.info("Snapshots of %s held by a final dump", self.job_id)
+            return None
+        if result.returncode != 0:
+            raise RuntimeError(f"snapshot {name} failed ({result.returncode}): {result.stderr.strip()}")
+
+        path = os.path.join(self.snapshots, name)
+        nbytes = dir_size(path)
+        elapsed = now - self._last_at if self._last_at is not None else None
+        self._last_at = now
+        if self.mode == "app":
+            digest = self._digest(path)
+            if digest == self._last_digest:
+                shutil.rmtree(path, ignore_errors=True)
+                self.dirty_rate = 0.0
+                return None
+            self._last_digest = digest
+        if elapsed and (incremental or self.mode == "app"):
+            # A full snapshot measures memory size, not how fast it changes
+            self.dirty_rate = nbytes / elapsed
+
+        key = self.uploader.upload_snapshot(self.job_id, path)
+        entry = {"name": name, "key": key, "bytes": nbytes, "created": int(now)}
+        superseded = [] if incremental else self.chain
+        self.chain = self.chain + [entry] if incremental else [entry]
+        manifest = {"job_id": self.job_id, "mode": self.mode, "chain": self.chain, "updated": int(now)}
+        self.uploader.put_manifest(self.job_id, manifest)
+        self._write_local("chain.json", json.dumps(manifest, sort_keys=True))
+        self._write_local("LATEST", name)
+        log.info("Staged snapshot %s of %s: %d bytes, chain of %d", name, self.job_id, nbytes, len(self.chain))
+        self._prune(superseded)
+        return entry
+
+    def _prune(self, superseded):
+        if not superseded:
+            return
+        try:
+            self.uploader.delete_keys([e["key"] for e in superseded])
+        except Exception as e:
+            log.warning("Could not delete superseded snapshots of %s: %s", self.job_id, e)
+        for entry in superseded:
+            shutil.rmtree(os.path.join(self.snapshots, entry["name"]), ignore_errors=True)
+
+    def reset(self):
+        """
+        Forget local snapshot state from an earlier run, so the next snapshot
+        starts a chain. Returns the chain that run staged in S3.
+        """
+        for name in ("LATEST", "chain.json", "HOLD"):
+            try:
+                os.remove(os.path.join(self.snapshots, name))
+            except FileNotFoundError:
+                pass
+        try:
+            staged = self.uploader.get_manifest(self.job_id)
+        except Exception as e:
+            log.warning("Could not read the staged manifest of %s: %s", self.job_id, e)
+            staged = None
+        self.chain = []
+        # Deleted once the first snapshot of this run replaces them in the manifest
+        return list((staged or {}).get("chain") or [])
+
+    # ------------------------------------------------------------------
+    # Cadence
+    # ------------------------------------------------------------------
+    def next_interval(self):
+        """Seconds until the next snapshot."""
+        if self.dirty_rate is None:
+            interval = self.min_interval
+        elif self.dirty_rate <= 0:
+            interval = self.max_interval
+        else:
+            interval = self.target_delta_bytes / self.dirty_rate
+        interval /= 1.0 + self.volatility_weight * max(self.volatility, 0.0)
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def _refresh_volatility(self):
+        if not self.volatility_fn:
+            return
+        try:
+            self.volatility = float(self.volatility_fn())
+        except Exception as e:
+            log.warning("Spot price volatility unavailable: %s", e)
+
+    # ------------------------------------------------------------------
+    # Thread
+    # ------------------------------------------------------------------
+    def _alive(self):
+        try:
+            os.kill(self.pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def run(self):
+        stale = self.reset()
+        while not self._stop.is_set() and self._alive():
+            self._refresh_volatility()
+            try:
+                if self.snapshot_once() and stale:
+                    self._prune(stale)
+                    stale = []
+            except Exception as e:
+                log.warning("Background checkpoint of %s failed: %s", self.job_id, e)
+            self._stop.wait(self.next_interval())
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name=f"checkpointer-{self.job_id}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stop taking snapshots; waits for one in progress (the final dump needs the lock anyway)."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
@@ -1,6 +1,278 @@
 # worker/checkpoint_hooks.py
-def pre_checkpoint():
-    print("Pre-checkpoint hook: flushing state")
+"""
+Application-level checkpoints: a fast alternative to CRIU for jobs that opt in.
 
-def post_restore():
-    print("Post-restore hook: resuming")
+A job registers a serializer per piece of state:
+
+    hooks = CheckpointRegistry()
+    hooks.register("monte_carlo", save=lambda: state, load=restore_fn, version=1)
+    hooks.install_signal("/opt/job_workspace/checkpoint/app.ckpt")
+    while working:
+        ...
+        hooks.poll()             # writes a checkpoint here if one was requested
+
+`criu_wrapper.sh dump <pid> app` sends SIGUSR1 and waits for the
+"<path>.ready" marker; `criu_wrapper.sh restore app` starts
+`job_runner.py --resume`, which calls hooks.restore(path).
+
+Only the registered state moves (kilobytes to megabytes), and since no
+process image is restored the target needs no matching CPU or kernel.
+
+File format (little-endian):
+
+    header   b"SPCK" | u16 format | u16 sections | u64 created_ns
+    section  u16 name_len | name | u32 version | u8 codec | u8 pad[1]
+             | u64 payload_len | zero pad to 8-byte alignment | payload
+    trailer  u32 crc32 of everything before it
+
+Codecs: raw bytes, JSON, and NumPy arrays (dtype, shape, raw buffer).
+Payloads are 8-byte aligned so read(path, mmap=True) can hand out
+zero-copy memoryviews and read-only arrays backed by the mapped file.
+"""
+import json
+import logging
+import mmap as _mmap
+import os
+import signal
+import struct
+import time
+import zlib
+
+log = logging.getLogger("worker.checkpoint_hooks")
+
+MAGIC = b"SPCK"
+FORMAT_VERSION = 1
+READY_SUFFIX = ".ready"
+
+CODEC_BYTES = 0
+CODEC_JSON = 1
+CODEC_NDARRAY = 2
+
+_HEADER = struct.Struct("<4sHHQ")
+_SECTION = struct.Struct("<IBxQ")
+_CRC = struct.Struct("<I")
+
+
+class CheckpointError(Exception):
+    """Raised for unreadable, truncated or incompatible checkpoint files."""
+
+
+def _pad(offset):
+    return -offset % 8
+
+
+def _encode(value):
+    """Returns (codec, header bytes, payload buffer)."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return CODEC_BYTES, b"", memoryview(value).cast("B")
+    if type(value).__module__ == "numpy" and hasattr(value, "dtype"):
+        import numpy as np
+        array = np.ascontiguousarray(value)
+        dtype = array.dtype.str.encode()
+        header = struct.pack("<B", len(dtype)) + dtype + struct.pack("<B", array.ndim)
+        header += struct.pack(f"<{array.ndim}Q", *array.shape)
+        header += bytes(_pad(len(header)))
+        return CODEC_NDARRAY, header, memoryview(array).cast("B")
+    return CODEC_JSON, b"", memoryview(json.dumps(value, separators=(",", ":")).encode())
+
+
+def _decode(codec, payload):
+    if codec == CODEC_BYTES:
+        return payload
+    if codec == CODEC_JSON:
+        return json.loads(bytes(payload))
+    if codec == CODEC_NDARRAY:
+        import numpy as np
+        (dtype_len,) = struct.unpack_from("<B", payload, 0)
+        dtype = bytes(payload[1:1 + dtype_len]).decode()
+        (ndim,) = struct.unpack_from("<B", payload, 1 + dtype_len)
+        offset = 2 + dtype_len
+        shape = struct.unpack_from(f"<{ndim}Q", payload, offset)
+        offset += 8 * ndim
+        offset += _pad(offset)
+        return np.frombuffer(payload[offset:], dtype=np.dtype(dtype)).reshape(shape)
+    raise CheckpointError(f"unknown codec {codec}")
+
+
+def write(path, sections):
+    """
+    Atomically write {name: (version, value)} to path. Values are bytes-like,
+    NumPy arrays or JSON-serialisable objects. Returns the file size.
+    """
+    tmp = f"{path}.tmp"
+    crc = 0
+    size = 0
+
+    def put(f, data):
+        nonlocal crc, size
+        f.write(data)
+        crc = zlib.crc32(data, crc)
+        size += len(data)
+
+    with open(tmp, "wb") as f:
+        put(f, _HEADER.pack(MAGIC, FORMAT_VERSION, len(sections), time.time_ns()))
+        for name, (version, value) in sections.items():
+            codec, header, payload = _encode(value)
+            encoded = name.encode()
+            put(f, struct.pack("<H", len(encoded)) + encoded)
+            put(f, _SECTION.pack(version, codec, len(header) + payload.nbytes))
+            put(f, bytes(_pad(size)))
+            if header:
+                put(f, header)
+            put(f, payload)
+        f.write(_CRC.pack(crc))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return size + _CRC.size
+
+
+class Checkpoint:
+    """A parsed checkpoint file: `sections` maps name -> (version, value)."""
+
+    def __init__(self, sections, created_ns, mapping=None, view=None):
+        self.sections = sections
+        self.created_ns = created_ns
+        self._mapping = mapping
+        self._view = view
+
+    def close(self):
+        if self._mapping is None:
+            return
+        self.sections = {}
+        self._view.release()
+        try:
+            self._mapping.close()
+        except BufferError:
+            # Views handed out are still alive; the mapping is freed with them
+            pass
+        self._mapping = self._view = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read(path, mmap=False):
+    """
+    Parse and CRC-check a checkpoint. With mmap=True, bytes and array
+    sections are views into the mapped file (no copy); keep the returned
+    Checkpoint open while using them.
+    """
+    with open(path, "rb") as f:
+        if mmap:
+            mapping = _mmap.mmap(f.fileno(), 0, access=_mmap.ACCESS_READ)
+            data = memoryview(mapping)
+        else:
+            mapping = None
+            data = memoryview(f.read())
+
+    if len(data) < _HEADER.size + _CRC.size:
+        raise CheckpointError(f"{path}: truncated")
+    (expected,) = _CRC.unpack_from(data, len(data) - _CRC.size)
+    if zlib.crc32(data[:-_CRC.size]) != expected:
+        raise CheckpointError(f"{path}: checksum mismatch")
+    magic, fmt, count, created_ns = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise CheckpointError(f"{path}: not a checkpoint file")
+    if fmt != FORMAT_VERSION:
+        raise CheckpointError(f"{path}: unsupported format {fmt}")
+
+    offset = _HEADER.size
+    sections = {}
+    for _ in range(count):
+        (name_len,) = struct.unpack_from("<H", data, offset)
+        offset += 2
+        name = bytes(data[offset:offset + name_len]).decode()
+        offset += name_len
+        version, codec, length = _SECTION.unpack_from(data, offset)
+        offset += _SECTION.size
+        offset += _pad(offset)
+        payload = data[offset:offset + length]
+        offset += length
+        value = _decode(codec, payload)
+        if codec == CODEC_BYTES and mapping is None:
+            value = bytes(value)
+        sections[name] = (version, value)
+    return Checkpoint(sections, created_ns, mapping, data)
+
+
+class _Hook:
+    __slots__ = ("name", "save", "load", "version")
+
+    def __init__(self, name, save, load, version):
+        self.name = name
+        self.save = save
+        self.load = load
+        self.version = version
+
+
+class CheckpointRegistry:
+    """Serializers registered by a job, plus on-demand checkpoint requests."""
+
+    def __init__(self):
+        self._hooks = {}
+        self.path = None
+        self.requested = False
+
+    def register(self, name, save, load, version=1):
+        """
+        save() returns the state to store; load(value) puts it back. A
+        checkpoint written by a newer `version` than registered is refused.
+        """
+        self._hooks[name] = _Hook(name, save, load, version)
+
+    def checkpoint(self, path=None):
+        path = path or self.path
+        if not path:
+            raise ValueError("no checkpoint path")
+        size = write(path, {h.name: (h.version, h.save()) for h in self._hooks.values()})
+        log.info("Checkpoint written: %s (%d bytes)", path, size)
+        return size
+
+    def restore(self, path=None, mmap=False):
+        """
+        Load every registered hook's section. Returns the restored names.
+        With mmap=True, loaders receive views and must copy what they keep.
+        """
+        path = path or self.path
+        restored = []
+        with read(path, mmap=mmap) as checkpoint:
+            for hook in self._hooks.values():
+                if hook.name not in checkpoint.sections:
+                    log.warning("Checkpoint %s has no section for %s", path, hook.name)
+                    continue
+                version, value = checkpoint.sections[hook.name]
+                if version > hook.version:
+                    raise CheckpointError(f"{hook.name}: checkpoint version {version} is newer than {hook.version}")
+                hook.load(value)
+                restored.append(hook.name)
+        return restored
+
+    def install_signal(self, path, signum=signal.SIGUSR1):
+        """Make `signum` request a checkpoint to `path` at the next poll()."""
+        self.path = path
+
+        def request(*_):
+            self.requested = True
+
+        signal.signal(signum, request)
+
+    def poll(self):
+        """
+        Call at safe points. Writes a requested checkpoint and then the
+        "<path>.ready" marker criu_wrapper.sh waits for. Returns True if it wrote one.
+        """
+        if not self.requested:
+            return False
+        self.requested = False
+        self.checkpoint()
+        with open(self.path + READY_SUFFIX, "w") as f:
+            f.write(str(os.getpid()))
+        return True
+
+
+# Process-wide registry used by job_runner.py
+hooks = CheckpointRegistry()
@@ -0,0 +1,250 @@
+# worker/interruption_watcher.py
+"""
+Spot interruption fast path, run next to the job on the worker.
+
+Polls the metadata spot/instance-action endpoint at sub-second intervals.
+When a notice appears it tells the orchestrator (which provisions the
+target right away), dumps the job with criu_wrapper.sh, streams the images
+to S3 and reports back, all inside the two-minute reclaim budget.
+
+With --background the job is also snapshotted periodically while it runs
+(worker/background_checkpointer.py), so the dump at notice time is an
+incremental one on top of the staged chain and only the last delta goes
+out in the reclaim window.
+"""
+import argparse
+import json
+import logging
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Ensure project root is on sys.path (works on remote worker)
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from storage.s3_manager import COMPRESSION, S3Manager
+from worker.background_checkpointer import BackgroundCheckpointer, price_volatility
+
+METADATA_URL = "http://169.254.169.254"
+CRIU_WRAPPER = "/opt/job_workspace/checkpoint/criu_wrapper.sh"
+CHECKPOINT_DIR = "/opt/job_workspace/checkpoint"
+# AWS gives two minutes; keep a margin for the final notification
+RECLAIM_BUDGET = 120
+SAFETY_MARGIN = 5
+
+
+class MetadataClient:
+    """Minimal IMDSv2 client (token + GET) with short timeouts."""
+
+    TOKEN_TTL = 21600
+
+    def __init__(self, base_url=METADATA_URL, timeout=0.5):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._token = None
+        self._token_expiry = 0.0
+
+    def _fetch_token(self):
+        req = urllib.request.Request(
+            f"{self.base_url}/latest/api/token",
+            method="PUT",
+            headers={"X-aws-ec2-metadata-token-ttl-seconds": str(self.TOKEN_TTL)},
+        )
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            self._token = resp.read().decode()
+        self._token_expiry = time.time() + self.TOKEN_TTL - 60
+
+    def get(self, path):
+        """Return the value at latest/meta-data/<path>, or None on 404."""
+        for attempt in range(2):
+            if not self._token or time.time() >= self._token_expiry:
+                self._fetch_token()
+            req = urllib.request.Request(
+                f"{self.base_url}/latest/meta-data/{path}",
+                headers={"X-aws-ec2-metadata-token": self._token},
+            )
+            try:
+                with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                    return resp.read().decode()
+            except urllib.error.HTTPError as e:
+                if e.code == 404:
+                    return None
+                if e.code == 401 and attempt == 0:
+                    self._token = None
+                    continue
+                raise
+        return None
+
+    def instance_action(self):
+        body = self.get("spot/instance-action")
+        return json.loads(body) if body else None
+
+
+def reclaim_deadline(notice, now=None):
+    """Epoch seconds at which AWS reclaims the instance."""
+    now = now or time.time()
+    try:
+        reclaim = datetime.strptime(notice["time"], "%Y-%m-%dT%H:%M:%SZ")
+        return reclaim.replace(tzinfo=timezone.utc).timestamp()
+    except (KeyError, ValueError):
+        return now + RECLAIM_BUDGET
+
+
+class InterruptionWatcher:
+    def __init__(
+        self,
+        job_id,
+        pid,
+        bucket,
+        metadata=None,
+        notify_url=None,
+        notify_token=None,
+        poll_interval=0.5,
+        checkpoint_dir=CHECKPOINT_DIR,
+        uploader=None,
+        dump_command=None,
+        checkpoint_mode="criu",
+        checkpointer=None,
+    ):
+        self.job_id = job_id
+        self.pid = pid
+        self.metadata = metadata or MetadataClient()
+        self.notify_url = notify_url
+        self.notify_token = notify_token
+        self.poll_interval = poll_interval
+        self.checkpoint_dir = checkpoint_dir
+        self.uploader = uploader or S3Manager(bucket)
+        self.dump_command = dump_command or ["sudo", "bash", CRIU_WRAPPER, "dump", str(pid), checkpoint_mode]
+        self.checkpointer = checkpointer
+
+    def notify(self, phase, **extra):
+        if not self.notify_url:
+            return
+        body = json.dumps({"job_id": self.job_id, "phase": phase, **extra}).encode()
+        headers = {"Content-Type": "application/json"}
+        if self.notify_token:
+            headers["X-Notify-Token"] = self.notify_token
+        req = urllib.request.Request(self.notify_url, data=body, headers=headers, method="POST")
+        try:
+            urllib.request.urlopen(req, timeout=2).close()
+        except Exception as e:
+            # Never let a slow orchestrator eat the dump budget
+            print(f"⚠️ Notify ({phase}) failed: {e}", file=sys.stderr)
+
+    def wait_for_notice(self):
+        while True:
+            try:
+                notice = self.metadata.instance_action()
+            except Exception as e:
+                print(f"⚠️ Metadata poll failed: {e}", file=sys.stderr)
+                notice = None
+            if notice:
+                return notice
+            time.sleep(self.poll_interval)
+
+    def handle(self, notice):
+        deadline = reclaim_deadline(notice) - SAFETY_MARGIN
+        print(f"🚨 Spot interruption notice: {notice} ({deadline - time.time():.0f}s budget)")
+        self.notify("notice", action=notice.get("action"), reclaim_time=notice.get("time"))
+        if self.checkpointer:
+            # No more snapshots; one in progress finishes first (the dump waits on its lock)
+            self.checkpointer.stop(timeout=0)
+        try:
+            started = time.time()
+            subprocess.run(self.dump_command, check=True, timeout=max(deadline - time.time(), 1))
+            print(f"   dump done in {time.time() - started:.1f}s")
+
+            started = time.time()
+            key = self.uploader.upload_stream(self.job_id, src=self.checkpoint_dir)
+            print(f"   upload done in {time.time() - started:.1f}s")
+        except Exception as e:
+            print(f"❌ Emergency checkpoint failed: {e}", file=sys.stderr)
+            self.notify("failed", error=str(e))
+            return False
+        if time.time() > deadline:
+            print("⚠️ Checkpoint finished after the reclaim deadline", file=sys.stderr)
+        self.notify("checkpointed", checkpoint_key=key)
+        return True
+
+    def run(self):
+        if self.checkpointer:
+            self.checkpointer.start()
+        return self.handle(self.wait_for_notice())
+
+
+def volatility_from_metadata(metadata):
+    """volatility_fn for this instance's own spot market (needs ec2:DescribeSpotPriceHistory)."""
+    import boto3
+
+    zone = metadata.get("placement/availability-zone")
+    instance_type = metadata.get("instance-type")
+    ec2 = boto3.client("ec2", region_name=zone[:-1])
+    return lambda: price_volatility(ec2, instance_type, zone)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch for spot interruption notices and checkpoint the job")
+    parser.add_argument("--job-id", required=True)
+    parser.add_argument("--pid", required=True, type=int)
+    parser.add_argument("--bucket", required=True, help="S3 checkpoint bucket")
+    parser.add_argument("--notify-url", default=None, help="Orchestrator endpoint, e.g. http://<orchestrator>:8080/interruption")
+    parser.add_argument("--notify-token", default=None, help="Shared secret sent as X-Notify-Token")
+    parser.add_argument("--metadata-url", default=METADATA_URL, help="Metadata service base URL (use worker/metadata_stub.py locally)")
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--checkpoint-mode", choices=["criu", "app"], default="criu", help="app: ask the job for its registered state instead of a CRIU dump")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR)
+    parser.add_argument("--compression", choices=sorted(COMPRESSION), default="gz", help="Archive format; match checkpoint_compression in the orchestrator's runtime.yaml")
+    parser.add_argument("--background", action="store_true", help="Stage periodic incremental snapshots in S3 while the job runs")
+    parser.add_argument("--min-interval", type=float, default=60, help="Seconds between snapshots, at least")
+    parser.add_argument("--max-interval", type=float, default=1800, help="Seconds between snapshots, at most")
+    parser.add_argument("--target-delta-mb", type=float, default=256, help="Aim for deltas of about this size")
+    parser.add_argument("--max-chain", type=int, default=8, help="Start a new full snapshot after this many")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    metadata = MetadataClient(args.metadata_url)
+    uploader = S3Manager(args.bucket, compression=args.compression)
+    checkpointer = None
+    if args.background:
+        try:
+            volatility_fn = volatility_from_metadata(metadata)
+        except Exception as e:
+            print(f"⚠️ Spot price volatility unavailable, cadence follows the dirty rate only: {e}", file=sys.stderr)
+            volatility_fn = None
+        checkpointer = BackgroundCheckpointer(
+            args.job_id,
+            args.pid,
+            uploader,
+            checkpoint_dir=args.checkpoint_dir,
+            mode=args.checkpoint_mode,
+            min_interval=args.min_interval,
+            max_interval=args.max_interval,
+            target_delta_mb=args.target_delta_mb,
+            max_chain=args.max_chain,
+            volatility_fn=volatility_fn,
+        )
+
+    watcher = InterruptionWatcher(
+        args.job_id,
+        args.pid,
+        args.bucket,
+        metadata=metadata,
+        notify_url=args.notify_url,
+        notify_token=args.notify_token,
+        poll_interval=args.poll_interval,
+        checkpoint_dir=args.checkpoint_dir,
+        uploader=uploader,
+        checkpoint_mode=args.checkpoint_mode,
+        checkpointer=checkpointer,
+    )
+    sys.exit(0 if watcher.run() else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# worker/job_host.py
+"""
+Several jobs per worker instance.
+
+Each job gets its own directory, /opt/job_workspace/jobs/<job_id>/, holding
+its checkpoint dir and a pid file, so co-located jobs can be dumped,
+uploaded and restored independently, or together in one pass
+(criu_wrapper.sh dump-group / restore-group).
+
+    python worker/job_host.py start job-1 -- --iterations 50000000
+    python worker/job_host.py list
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+JOBS_ROOT = os.getenv("JOBS_ROOT", "/opt/job_workspace/jobs")
+RUNNER = str(Path(__file__).resolve().parent / "job_runner.py")
+
+
+def job_dir(job_id, root=JOBS_ROOT):
+    if not job_id or "/" in job_id or job_id in (".", ".."):
+        raise ValueError(f"invalid job id {job_id!r}")
+    return os.path.join(root, job_id)
+
+
+def checkpoint_dir(job_id, root=JOBS_ROOT):
+    return os.path.join(job_dir(job_id, root), "checkpoint")
+
+
+def write_pid(job_id, pid, root=JOBS_ROOT):
+    path = os.path.join(job_dir(job_id, root), "pid")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(str(pid))
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def list_jobs(root=JOBS_ROOT):
+    """{job_id: {"pid", "alive", "checkpoint_dir"}} for every job dir with a pid file."""
+    jobs = {}
+    if not os.path.isdir(root):
+        return jobs
+    for job_id in sorted(os.listdir(root)):
+        try:
+            with open(os.path.join(root, job_id, "pid")) as f:
+                pid = int(f.read().strip())
+        except (OSError, ValueError):
+            continue
+        jobs[job_id] = {"pid": pid, "alive": _alive(pid), "checkpoint_dir": checkpoint_dir(job_id, root)}
+    return jobs
+
+
+def start(job_id, runner_args=(), resume=False, root=JOBS_ROOT):
+    """Start job_runner.py for job_id in its own session. Returns the PID."""
+    os.makedirs(checkpoint_dir(job_id, root), exist_ok=True)
+    command = [sys.executable, RUNNER, "--job-id", job_id, "--jobs-root", root, *runner_args]
+    if resume:
+        command.append("--resume")
+    with open(os.path.join(job_dir(job_id, root), "job.log"), "ab") as log_file:
+        proc = subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    write_pid(job_id, proc.pid, root)
+    return proc.pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run several jobs on this worker, one directory each")
+    parser.add_argument("--root", default=JOBS_ROOT, help="Per-job directories live here (default %(default)s)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    start_parser = sub.add_parser("start", help="Start a job; arguments after -- go to job_runner.py")
+    start_parser.add_argument("job_id")
+    start_parser.add_argument("--resume", action="store_true")
+    start_parser.add_argument("runner_args", nargs=argparse.REMAINDER)
+    sub.add_parser("list", help="Print the jobs on this host as JSON")
+    args = parser.parse_args()
+
+    if args.command == "start":
+        runner_args = [a for a in args.runner_args if a != "--"]
+        print(json.dumps({"job_id": args.job_id, "pid": start(args.job_id, runner_args, args.resume, args.root)}))
+    else:
+        print(json.dumps(list_jobs(args.root)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 # worker/job_runner.py
+import argparse
 import os
 import sys
-import time
 from pathlib import Path
 
 # Ensure project root is on sys.path (works on remote worker)
@@ -9,12 +9,46 @@ ROOT = Path(__file__).resolve().parent.parent
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
+from worker.checkpoint_hooks import hooks
+from worker.job_host import JOBS_ROOT, checkpoint_dir, write_pid
 from worker.jobs.monte_carlo import run
 
+# criu_wrapper.sh's app mode signals this process and ships this file
+STATE_PATH = "/opt/job_workspace/checkpoint/app.ckpt"
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Run the reference Monte Carlo job")
+    parser.add_argument("--iterations", type=int, default=None, help="Total samples (default 10M, or the resumed record's target)")
+    parser.add_argument("--workers", type=int, default=None, help="Sampling processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=1_000_000, help="Samples per worker per round")
+    parser.add_argument("--seed", type=int, default=None, help="Root seed; omit for a fresh random seed")
+    parser.add_argument("--job-id", default=os.getenv("JOB_ID"), help="Run as one of several jobs on this host, with its own checkpoint dir and pid file")
+    parser.add_argument("--jobs-root", default=JOBS_ROOT, help="Per-job directories for --job-id (default %(default)s)")
+    parser.add_argument("--state-file", default=os.getenv("JOB_STATE_FILE"), help=f"Where the progress record is written (default {STATE_PATH}, or app.ckpt in the job's checkpoint dir)")
+    parser.add_argument("--checkpoint-every", type=float, default=5.0, help="Seconds between state records (default 5)")
+    parser.add_argument("--resume", action="store_true", help="Continue from --state-file instead of starting over")
+    args = parser.parse_args()
+
     pid = os.getpid()
     print(f"Job started with PID {pid}")
-    run()
+    if args.job_id:
+        write_pid(args.job_id, pid, args.jobs_root)
+        args.state_file = args.state_file or os.path.join(checkpoint_dir(args.job_id, args.jobs_root), "app.ckpt")
+    args.state_file = args.state_file or STATE_PATH
+    os.makedirs(os.path.dirname(os.path.abspath(args.state_file)), exist_ok=True)
+    # SIGUSR1 asks for an application checkpoint at the next round boundary
+    hooks.install_signal(args.state_file)
+    run(
+        iterations=args.iterations,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        seed=args.seed,
+        state_path=args.state_file,
+        checkpoint_every=args.checkpoint_every,
+        resume=args.resume,
+        hooks=hooks,
+    )
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,125 @@
+# worker/metadata_stub.py
+"""
+Local stand-in for the EC2 instance metadata service (IMDSv2), so the
+interruption watcher can be exercised without a spot instance:
+
+    python worker/metadata_stub.py --port 1338 --interrupt-after 10
+    python worker/interruption_watcher.py --metadata-url http://127.0.0.1:1338 ...
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOKEN_HEADER = "X-aws-ec2-metadata-token"
+
+DEFAULT_METADATA = {
+    "instance-id": "i-0stub0000000000000",
+    "ami-id": "ami-0stub000000000000",
+    "instance-type": "t3.micro",
+    "placement/region": "us-east-1",
+    "local-ipv4": "127.0.0.1",
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def _reply(self, code, body=""):
+        data = body.encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_PUT(self):
+        if self.path != "/latest/api/token":
+            return self._reply(404)
+        self._reply(200, self.server.stub.token)
+
+    def do_GET(self):
+        stub = self.server.stub
+        if self.headers.get(TOKEN_HEADER) != stub.token:
+            return self._reply(401)
+        prefix = "/latest/meta-data/"
+        if not self.path.startswith(prefix):
+            return self._reply(404)
+        key = self.path[len(prefix):]
+        if key == "spot/instance-action":
+            action = stub.instance_action()
+            return self._reply(200, json.dumps(action)) if action else self._reply(404)
+        if key in stub.metadata:
+            return self._reply(200, stub.metadata[key])
+        self._reply(404)
+
+    def log_message(self, format, *args):
+        return
+
+
+class MetadataStub:
+    """
+    Serves the IMDSv2 token endpoint, a few static metadata keys, and
+    spot/instance-action once an interruption is scheduled.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, metadata=None):
+        self.metadata = dict(DEFAULT_METADATA, **(metadata or {}))
+        self.token = uuid.uuid4().hex
+        self._action = None
+        self._visible_at = None
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def schedule_interruption(self, action="terminate", after=0.0, notice_seconds=120):
+        """Publish a notice `after` seconds from now, with `notice_seconds` until reclaim."""
+        visible_at = time.time() + after
+        reclaim = datetime.fromtimestamp(visible_at, tz=timezone.utc) + timedelta(seconds=notice_seconds)
+        self._action = {"action": action, "time": reclaim.strftime("%Y-%m-%dT%H:%M:%SZ")}
+        self._visible_at = visible_at
+
+    def clear_interruption(self):
+        self._action = None
+        self._visible_at = None
+
+    def instance_action(self):
+        if self._action and time.time() >= self._visible_at:
+            return self._action
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local EC2 metadata service stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1338)
+    parser.add_argument("--interrupt-after", type=float, default=None, help="Seconds until a spot interruption notice appears")
+    args = parser.parse_args()
+
+    stub = MetadataStub(args.host, args.port)
+    if args.interrupt_after is not None:
+        stub.schedule_interruption(after=args.interrupt_after)
+    print(f"Metadata stub listening on {stub.url}")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()